@@ -0,0 +1,118 @@
+"""Bulk requests module."""
+
+import json
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Type,
+)
+
+from fastapi import Request
+from pydantic import BaseModel, ValidationError
+
+from app.domain.bulk import BulkError, BulkResult
+from config import settings
+
+# Content types of request bodies holding one JSON document per line
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl")
+
+
+class InvalidBulkBody(Exception):
+    """Custom error that is raised when a bulk request body is not a list."""
+
+    def __init__(self, message: str) -> None:
+        self.message = message
+        super().__init__(message)
+
+
+async def bulk_create(
+    request: Request,
+    model: Type[BaseModel],
+    create_many: Callable[[List[Any]], Awaitable[Dict[int, str]]],
+) -> BulkResult:
+    """
+    Validate the items of a bulk request and create them in chunks.
+
+    Only a chunk of items is held in memory at a time when the body is
+    streamed as NDJSON. Items that can not be parsed, validated or created
+    are reported by their index in the request.
+    """
+    result = BulkResult()
+    chunk: List[Tuple[int, BaseModel]] = []
+
+    async def flush() -> None:
+        errors = await create_many([item for _, item in chunk])
+        result.created += len(chunk) - len(errors)
+        result.errors += [
+            BulkError(index=chunk[i][0], error=error)
+            for i, error in sorted(errors.items())
+        ]
+        chunk.clear()
+
+    async for index, item, error in read_items(request):
+        if error is None:
+            try:
+                chunk.append((index, model.parse_obj(item)))
+            except ValidationError as err:
+                error = _describe(err)
+        if error is not None:
+            result.errors.append(BulkError(index=index, error=error))
+        if len(chunk) >= settings.bulk_chunk_size:
+            await flush()
+    if chunk:
+        await flush()
+    return result
+
+
+async def read_items(
+    request: Request,
+) -> AsyncIterator[Tuple[int, Any, Optional[str]]]:
+    """
+    Read the items of a bulk request body, along with their parse error.
+
+    The body is either a JSON list, or NDJSON streamed line by line.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.split(";")[0].strip() in NDJSON_TYPES:
+        index = 0
+        buffer = b""
+        async for data in request.stream():
+            *lines, buffer = (buffer + data).split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield (index, *_parse(line))
+                    index += 1
+        if buffer.strip():
+            yield (index, *_parse(buffer))
+        return
+
+    try:
+        items = await request.json()
+    except ValueError as err:
+        raise InvalidBulkBody(message=f"invalid JSON body: {err}")
+    if not isinstance(items, list):
+        raise InvalidBulkBody(message="body must be a list")
+    for index, item in enumerate(items):
+        yield index, item, None
+
+
+def _parse(line: bytes) -> Tuple[Any, Optional[str]]:
+    """Parse a line of NDJSON."""
+    try:
+        return json.loads(line), None
+    except ValueError as err:
+        return None, f"invalid JSON: {err}"
+
+
+def _describe(err: ValidationError) -> str:
+    """Summarize a validation error in a line."""
+    return "; ".join(
+        f"{error['msg']}: {'.'.join(str(loc) for loc in error['loc'])}"
+        for error in err.errors()
+    )
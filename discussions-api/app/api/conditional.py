@@ -0,0 +1,126 @@
+"""Conditional requests module."""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi import Request, Response, status
+
+from app.api.responses import FastJSONResponse
+from config import settings
+
+# Fields that change whenever the representation of a document changes
+VALIDATOR_FIELDS = (
+    "_id",
+    "created",
+    "updated",
+    "comment_count",
+    "last_comment_at",
+    "reply_count",
+)
+# Fields holding the dates a document was modified at
+MODIFIED_FIELDS = ("created", "updated")
+
+
+class Validators:
+    """Validators of a representation, computed without serializing it."""
+
+    def __init__(self, etag: str, last_modified: Optional[datetime]) -> None:
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @classmethod
+    def of(
+        cls,
+        request: Request,
+        docs: Iterable[Any],
+        *extra: Any,
+        dated: bool = False,
+    ) -> "Validators":
+        """
+        Validators of documents served for a request.
+
+        The entity tag hashes the query string, any `extra` value (such as
+        page cursors) and the fields that change along with each document.
+        Only `dated` representations, which can not change without a
+        modification date of their documents changing too, get the latest
+        one as last modification date: pages can lose documents and topics
+        lose comments while their dates stay the same.
+        """
+        digest = hashlib.sha1(str(request.url.query).encode())
+        last_modified: Optional[datetime] = None
+        for doc in docs:
+            for field in VALIDATOR_FIELDS:
+                digest.update(f"\x1f{doc.get(field)}".encode())
+            for field in MODIFIED_FIELDS if dated else ():
+                modified = _as_datetime(doc.get(field))
+                if modified is not None and (
+                    last_modified is None or modified > last_modified
+                ):
+                    last_modified = modified
+            digest.update(b"\x1e")
+        for value in extra:
+            digest.update(f"\x1f{value}".encode())
+        return cls(f'"{digest.hexdigest()}"', last_modified)
+
+    def headers(self) -> Dict[str, str]:
+        """Validator and caching headers."""
+        headers = {"ETag": self.etag}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(
+                self.last_modified, usegmt=True
+            )
+        if settings.http_cache_control:
+            headers["Cache-Control"] = settings.http_cache_control
+        return headers
+
+    def not_modified(self, request: Request) -> bool:
+        """Whether the client copy is still fresh."""
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            # If-None-Match uses the weak comparison
+            return "*" in tags or self.etag in [
+                tag[2:] if tag.startswith("W/") else tag for tag in tags
+            ]
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since is not None and self.last_modified is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            # HTTP dates have a one second resolution
+            return self.last_modified.replace(microsecond=0) <= since
+        return False
+
+
+def conditional_response(
+    request: Request,
+    content: Any,
+    docs: Iterable[Any],
+    *extra: Any,
+    dated: bool = False,
+) -> Response:
+    """Respond 304 Not Modified if the client copy is fresh, else `content`."""
+    validators = Validators.of(request, docs, *extra, dated=dated)
+    if validators.not_modified(request):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers=validators.headers(),
+        )
+    return FastJSONResponse(content=content, headers=validators.headers())
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    """Parse a stored date, naive dates being local, from datetime.now()."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return value.astimezone(timezone.utc)
@@ -0,0 +1,81 @@
+"""Consistency tokens module."""
+
+import math
+import time
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.repository.routing import READ_YOUR_WRITES
+
+# Header of the token writes answer with and clients send back
+CONSISTENCY_HEADER = "X-Consistency-Token"
+# Methods of the requests that do not write
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class ConsistencyMiddleware:
+    """
+    ASGI middleware giving clients read-your-writes consistency over reads
+    sent to the replicas.
+
+    Successful writes answer with a token holding the time they were
+    acknowledged. Requests sending it back within `window` seconds, the
+    most the replicas read from can lag behind, read from the primary;
+    later ones read from the replicas again, which have caught up. Tokens
+    are compared with the server clock, so any process can check them.
+    The clocks of the processes may be a little apart, so tokens up to
+    `window` seconds in the future are accepted too, the later ones are
+    ignored rather than pinning reads to the primary until then.
+    """
+
+    def __init__(self, app: ASGIApp, window: float) -> None:
+        self.app = app
+        self.window = window
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        written_at = decode_token(Headers(scope=scope).get(CONSISTENCY_HEADER))
+        now = time.time()
+        read_your_writes = (
+            written_at is not None
+            and now - self.window < written_at <= now + self.window
+        )
+        writes = scope["method"] not in SAFE_METHODS
+
+        async def send_with_token(message: Message) -> None:
+            if (
+                writes
+                and message["type"] == "http.response.start"
+                and message["status"] < 400
+            ):
+                headers = MutableHeaders(scope=message)
+                headers.append(CONSISTENCY_HEADER, encode_token(time.time()))
+            await send(message)
+
+        context = READ_YOUR_WRITES.set(read_your_writes)
+        try:
+            await self.app(scope, receive, send_with_token)
+        finally:
+            READ_YOUR_WRITES.reset(context)
+
+
+def encode_token(written_at: float) -> str:
+    """Token of a write acknowledged at `written_at`."""
+    return f"{written_at:.3f}"
+
+
+def decode_token(token: Optional[str]) -> Optional[float]:
+    """Time of the write of a token, None if missing or invalid."""
+    if token is None:
+        return None
+    try:
+        written_at = float(token)
+    except ValueError:
+        return None
+    return written_at if math.isfinite(written_at) else None
@@ -1,35 +1,341 @@
 """API Dependencies module."""
 
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import Request
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import WriteConcern, read_preferences
 
+from app.domain.live import LiveHub
+from app.metrics import timed_stage
+from app.repository.base import CommentRepository, TopicRepository
+from app.repository.batching import (
+    BatchedCommentRepository,
+    InsertBatcher,
+    InsertBatchStats,
+)
+from app.repository.cache import (
+    Cache,
+    CacheBackend,
+    CachedCommentRepository,
+    CachedTopicRepository,
+    MemoryCacheBackend,
+)
 from app.repository.comment import CommentRepositoryMongo
+from app.repository.dual_write import (
+    DualWriteCommentRepository,
+    DualWriteTopicRepository,
+)
+from app.repository.redis_cache import RedisCacheBackend, RedisClient
+from app.repository.routing import (
+    ReadRoutingCommentRepository,
+    ReadRoutingTopicRepository,
+)
+from app.repository.search_index import (
+    IndexedCommentRepository,
+    IndexedTopicRepository,
+    MemorySearchBackend,
+    SearchBackend,
+)
+from app.repository.sharding import (
+    HashRing,
+    ShardedCommentRepository,
+    ShardedTopicRepository,
+)
+from app.repository.single_flight import (
+    SingleFlight,
+    SingleFlightCommentRepository,
+    SingleFlightTopicRepository,
+)
 from app.repository.topic import TopicRepositoryMongo
 from app.usecase.comment import CommentUsecase
 from app.usecase.topic import TopicUsecase
-from config import settings
+from config import REPLICA_READS, settings
+
+MongoRepositories = Tuple[TopicRepositoryMongo, CommentRepositoryMongo]
+
+# Seconds by which the lag of a secondary can be underestimated, as it is
+# measured by the heartbeats of the driver
+HEARTBEAT_SECONDS = 10
+
+# Clients of the shards on other clusters than `DB_URL`, by URL
+SHARD_CLIENTS: Dict[str, AsyncIOMotorClient] = {}
 
 
-async def get_topic_usecase() -> TopicUsecase:
+@timed_stage("dependencies")
+async def get_topic_usecase(request: Request) -> TopicUsecase:
     """Get topic usecase."""
-    return TopicUsecase(__get_topic_repo(), __get_comment_repo())
+    usecase: TopicUsecase = request.app.state.topic_usecase
+    return usecase
 
 
-async def get_comment_usecase() -> CommentUsecase:
+@timed_stage("dependencies")
+async def get_comment_usecase(request: Request) -> CommentUsecase:
     """Get comment usecase."""
-    return CommentUsecase(__get_topic_repo(), __get_comment_repo())
+    usecase: CommentUsecase = request.app.state.comment_usecase
+    return usecase
+
+
+def mongo_layouts(
+    mongodb: AsyncIOMotorDatabase,
+) -> Tuple[MongoRepositories, MongoRepositories]:
+    """
+    MongoDB repositories of the collection layout read from, and of the
+    other one, which dual writes keep up to date during a migration.
+    """
+    shared = (TopicRepositoryMongo(mongodb), CommentRepositoryMongo(mongodb))
+    split = (
+        TopicRepositoryMongo(mongodb, settings.db_topics_collection),
+        CommentRepositoryMongo(mongodb, settings.db_comments_collection),
+    )
+    if settings.db_collections == "shared":
+        return shared, split
+    if settings.db_collections == "split":
+        return split, shared
+    raise ValueError(f"unknown collections layout {settings.db_collections}")
+
+
+def mongo_repositories(mongodb: AsyncIOMotorDatabase) -> List[Any]:
+    """MongoDB repositories whose indexes are managed by the migrations."""
+    layout, other = mongo_layouts(mongodb)
+    if settings.db_dual_write:
+        return [*layout, *other]
+    return list(layout)
+
+
+def shard_databases(
+    mongodb: AsyncIOMotorDatabase,
+) -> List[AsyncIOMotorDatabase]:
+    """
+    Databases of the shards, in the order of `DB_SHARDS`, or `mongodb`
+    alone when the topics are not sharded. Shards are databases of the
+    client of `mongodb`, unless `DB_SHARD_URLS` puts them on another one.
+    """
+    if not settings.db_shards:
+        return [mongodb]
+    databases = []
+    for name in settings.db_shards:
+        client = mongodb.client
+        url = settings.db_shard_urls.get(name)
+        if url is not None:
+            if url not in SHARD_CLIENTS:
+                SHARD_CLIENTS[url] = get_mongodb_client(url)
+            client = SHARD_CLIENTS[url]
+        databases.append(client[name])
+    return databases
+
+
+def close_shard_clients() -> None:
+    """Close the clients of the shards on other clusters."""
+    while SHARD_CLIENTS:
+        SHARD_CLIENTS.popitem()[1].close()
+
+
+def build_hash_ring() -> HashRing:
+    """Build the placement of the topics on the configured shards."""
+    return HashRing(settings.db_shards, settings.db_shard_vnodes)
+
+
+def replica_database(
+    mongodb: AsyncIOMotorDatabase,
+) -> Optional[AsyncIOMotorDatabase]:
+    """
+    The database with the read preference of the reads that can lag, None
+    if they go to the primary too.
+    """
+    if settings.db_replica_read_preference == "primary":
+        return None
+    mode = read_preferences.read_pref_mode_from_name(
+        settings.db_replica_read_preference
+    )
+    read_preference = read_preferences.make_read_preference(
+        mode, None, settings.db_replica_max_staleness_seconds,
+    )
+    return mongodb.with_options(read_preference=read_preference)
+
+
+def consistency_window() -> float:
+    """Seconds after a write its client has to read from the primary."""
+    return settings.db_replica_max_staleness_seconds + HEARTBEAT_SECONDS
+
+
+def shard_repositories(
+    topic_repos: List[TopicRepository], comment_repos: List[CommentRepository]
+) -> Tuple[TopicRepository, CommentRepository]:
+    """Route to the repositories of each shard, if there are several."""
+    if len(topic_repos) == 1:
+        return topic_repos[0], comment_repos[0]
+    ring = build_hash_ring()
+    return (
+        ShardedTopicRepository(topic_repos, ring),
+        ShardedCommentRepository(comment_repos, ring),
+    )
+
+
+def build_cache() -> Optional[Cache]:
+    """Build the read cache on the configured backend, if enabled."""
+    if not settings.cache_enabled:
+        return None
+    backend: CacheBackend
+    if settings.cache_backend == "memory":
+        backend = MemoryCacheBackend(max_size=settings.cache_max_size)
+    elif settings.cache_backend == "redis":
+        backend = RedisCacheBackend(
+            RedisClient(
+                settings.cache_redis_url,
+                pool_size=settings.cache_redis_pool_size,
+                timeout=settings.cache_redis_timeout,
+            )
+        )
+    else:
+        raise ValueError(f"unknown cache backend {settings.cache_backend}")
+    return Cache(backend, settings.cache_ttl, settings.cache_key_prefix)
+
+
+def build_single_flight() -> Optional[SingleFlight]:
+    """Build the coalescing of identical concurrent reads, if enabled."""
+    if not settings.single_flight_enabled:
+        return None
+    # A zero timeout waits for the query in flight however long it takes
+    return SingleFlight(settings.single_flight_timeout or None)
+
+
+def build_insert_batchers(
+    mongodb: AsyncIOMotorDatabase,
+) -> List[InsertBatcher]:
+    """
+    Build the batching of the comment inserts of every shard, if enabled,
+    counted together.
+    """
+    if not settings.write_behind_enabled:
+        return []
+    stats = InsertBatchStats()
+    batchers = []
+    for database in shard_databases(mongodb):
+        (_, comment_repo), _ = mongo_layouts(database)
+        collection = comment_repo.mongodb.with_options(
+            write_concern=WriteConcern(
+                w=settings.write_behind_w, j=settings.write_behind_journal
+            )
+        )
+        batchers.append(
+            InsertBatcher(
+                collection,
+                settings.write_behind_max_size,
+                settings.write_behind_max_delay,
+                stats,
+            )
+        )
+    return batchers
+
+
+def build_live_hub() -> LiveHub:
+    """Build the hub of the comment changes, fed by the configured feed."""
+    if settings.live_feed not in ("memory", "change_stream"):
+        raise ValueError(f"unknown live feed {settings.live_feed}")
+    return LiveHub(
+        settings.live_queue_size,
+        settings.live_history_size,
+        local=settings.live_feed == "memory",
+    )
+
+
+def build_search_backend() -> Optional[SearchBackend]:
+    """Build the configured search engine, None for MongoDB text search."""
+    if settings.search_backend == "mongo":
+        return None
+    if settings.search_backend == "memory":
+        return MemorySearchBackend(settings.search_snapshot_path or None)
+    raise ValueError(f"unknown search backend {settings.search_backend}")
+
+
+async def open_search_backend(
+    backend: SearchBackend, mongodb: AsyncIOMotorDatabase
+) -> None:
+    """Load the persisted search index, or build it from the database."""
+    if not await backend.open():
+        topic_repo, comment_repo = build_mongo_repositories(mongodb)
+        await backend.rebuild(
+            topic_repo.export(settings.export_batch_size),
+            comment_repo.export(None, settings.export_batch_size),
+        )
 
 
-def __get_topic_repo() -> TopicRepositoryMongo:
-    """Get topic repository."""
-    return TopicRepositoryMongo(__get_mongodb())
+def build_mongo_repositories(
+    mongodb: AsyncIOMotorDatabase, batchers: Sequence[InsertBatcher] = ()
+) -> Tuple[TopicRepository, CommentRepository]:
+    """
+    Build the repositories of the collection layout read from, on every
+    shard, with the batchers of the shards, if any, given in order.
+    """
+    topic_repos: List[TopicRepository] = []
+    comment_repos: List[CommentRepository] = []
+    for index, database in enumerate(shard_databases(mongodb)):
+        (topic_mongo, comment_mongo), other = mongo_layouts(database)
+        topic_repo: TopicRepository = topic_mongo
+        comment_repo: CommentRepository = comment_mongo
+        replica = replica_database(database)
+        if replica is not None:
+            (topic_replica, comment_replica), _ = mongo_layouts(replica)
+            topic_repo = ReadRoutingTopicRepository(
+                topic_repo, topic_replica, REPLICA_READS["topic"]
+            )
+            comment_repo = ReadRoutingCommentRepository(
+                comment_repo, comment_replica, REPLICA_READS["comment"]
+            )
+        if batchers:
+            comment_repo = BatchedCommentRepository(
+                comment_repo, batchers[index]
+            )
+        if settings.db_dual_write:
+            topic_repo = DualWriteTopicRepository(topic_repo, other[0])
+            comment_repo = DualWriteCommentRepository(comment_repo, other[1])
+        topic_repos.append(topic_repo)
+        comment_repos.append(comment_repo)
+    return shard_repositories(topic_repos, comment_repos)
 
 
-def __get_comment_repo() -> CommentRepositoryMongo:
-    """Get comment repository."""
-    return CommentRepositoryMongo(__get_mongodb())
+def build_usecases(
+    mongodb: AsyncIOMotorDatabase,
+    cache: Optional[Cache] = None,
+    search_backend: Optional[SearchBackend] = None,
+    flights: Optional[SingleFlight] = None,
+    hub: Optional[LiveHub] = None,
+    batchers: Sequence[InsertBatcher] = (),
+) -> Tuple[TopicUsecase, CommentUsecase]:
+    """Build the usecases shared by every request."""
+    topic_repo, comment_repo = build_mongo_repositories(mongodb, batchers)
+    if flights is not None:
+        # Right over MongoDB, so the reads the cache misses are coalesced
+        topic_repo = SingleFlightTopicRepository(topic_repo, flights)
+        comment_repo = SingleFlightCommentRepository(comment_repo, flights)
+    if cache is not None:
+        topic_repo = CachedTopicRepository(
+            topic_repo, cache, settings.search_cache_ttl
+        )
+        comment_repo = CachedCommentRepository(
+            comment_repo, cache, settings.search_cache_ttl
+        )
+    if search_backend is not None:
+        # Rankings of the backend are not cached, it follows every write
+        topic_repo = IndexedTopicRepository(topic_repo, search_backend)
+        comment_repo = IndexedCommentRepository(comment_repo, search_backend)
+    return (
+        TopicUsecase(topic_repo, comment_repo),
+        CommentUsecase(topic_repo, comment_repo, hub),
+    )
 
 
-def __get_mongodb() -> AsyncIOMotorDatabase:
-    """Get MongoDB database."""
-    mongodb_client = AsyncIOMotorClient(settings.db_url)
-    return mongodb_client[settings.db_name]
+def get_mongodb_client(url: Optional[str] = None) -> AsyncIOMotorClient:
+    """Get a MongoDB client configured with the connection pool settings."""
+    return AsyncIOMotorClient(
+        url or settings.db_url,
+        maxPoolSize=settings.db_max_pool_size,
+        minPoolSize=settings.db_min_pool_size,
+        maxIdleTimeMS=settings.db_max_idle_time_ms,
+        connectTimeoutMS=settings.db_connect_timeout_ms,
+        socketTimeoutMS=settings.db_socket_timeout_ms,
+        serverSelectionTimeoutMS=settings.db_server_selection_timeout_ms,
+        waitQueueTimeoutMS=settings.db_wait_queue_timeout_ms,
+        readPreference=settings.db_read_preference,
+    )
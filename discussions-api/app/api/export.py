@@ -0,0 +1,47 @@
+"""Export module."""
+
+from typing import Any, AsyncGenerator, AsyncIterator
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from app.api.responses import dumps
+
+# Bytes of NDJSON sent at once
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+def ndjson_response(
+    request: Request, docs: AsyncGenerator[Any, None]
+) -> StreamingResponse:
+    """
+    Stream documents as NDJSON while they are read.
+
+    Each chunk is only sent once the client has taken the previous one, and
+    documents are only read as chunks are sent, so memory stays constant
+    whatever the size of the export.
+    """
+    return StreamingResponse(
+        _ndjson(request, docs), media_type="application/x-ndjson"
+    )
+
+
+async def _ndjson(
+    request: Request, docs: AsyncGenerator[Any, None]
+) -> AsyncIterator[bytes]:
+    """Encode documents as NDJSON chunks, until the client disconnects."""
+    buffer = bytearray()
+    try:
+        async for doc in docs:
+            buffer += dumps(doc)
+            buffer += b"\n"
+            if len(buffer) >= EXPORT_CHUNK_SIZE:
+                if await request.is_disconnected():
+                    return
+                yield bytes(buffer)
+                buffer.clear()
+        if buffer:
+            yield bytes(buffer)
+    finally:
+        # Closes the database cursor when the export stops early
+        await docs.aclose()
@@ -0,0 +1,108 @@
+"""Live updates module."""
+
+import asyncio
+from typing import Any, AsyncIterator, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from starlette.websockets import WebSocket
+
+from app.api.responses import dumps
+from app.domain.live import LiveEvent, SubscriberEvicted, Subscription
+
+# Close code of the WebSocket of an evicted subscriber, "try again later"
+TRY_AGAIN_LATER = 1013
+
+
+def encode(event: LiveEvent) -> bytes:
+    """Encode an event once, whatever the number of its subscribers."""
+    if event.encoded is None:
+        event.encoded = dumps(
+            {
+                "id": event.event_id,
+                "type": event.kind,
+                "comment": event.comment,
+            }
+        )
+    return event.encoded
+
+
+def sse_response(
+    request: Request, subscription: Subscription, heartbeat: float
+) -> StreamingResponse:
+    """
+    Stream the events of a subscription as server-sent events.
+
+    A comment line is sent when nothing happened for `heartbeat` seconds,
+    so proxies keep the connection open and a gone client is noticed.
+    """
+    return StreamingResponse(
+        _server_sent_events(request, subscription, heartbeat),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _server_sent_events(
+    request: Request, subscription: Subscription, heartbeat: float
+) -> AsyncIterator[bytes]:
+    """Encode the events, until the client disconnects or is evicted."""
+    try:
+        if subscription.reset:
+            yield b"event: reset\ndata: {}\n\n"
+        while True:
+            try:
+                event = await subscription.next(heartbeat)
+            except SubscriberEvicted as err:
+                data = dumps({"last_event_id": err.last_event_id})
+                yield b"event: evicted\ndata: " + data + b"\n\n"
+                return
+            if await request.is_disconnected():
+                return
+            if event is None:
+                yield b": keepalive\n\n"
+                continue
+            yield (
+                f"id: {event.event_id}\nevent: {event.kind}\n".encode()
+                + b"data: "
+                + encode(event)
+                + b"\n\n"
+            )
+    finally:
+        subscription.close()
+
+
+async def forward(websocket: WebSocket, subscription: Subscription) -> None:
+    """
+    Send the events of a subscription over a WebSocket, until the client
+    closes it or is evicted. Messages of the client are ignored.
+    """
+    receiving: Optional["asyncio.Future[Any]"] = None
+    try:
+        if subscription.reset:
+            await websocket.send_text('{"type":"reset"}')
+        receiving = asyncio.ensure_future(websocket.receive())
+        while True:
+            next_event = asyncio.ensure_future(subscription.next())
+            await asyncio.wait(
+                {receiving, next_event}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if next_event.done():
+                try:
+                    event = next_event.result()
+                except SubscriberEvicted:
+                    await websocket.close(code=TRY_AGAIN_LATER)
+                    return
+                if event is not None:
+                    await websocket.send_text(encode(event).decode())
+            else:
+                # Nothing was taken from the queue yet, nothing is lost
+                next_event.cancel()
+            if receiving.done():
+                if receiving.result()["type"] == "websocket.disconnect":
+                    return
+                receiving = asyncio.ensure_future(websocket.receive())
+    finally:
+        if receiving is not None:
+            receiving.cancel()
+        subscription.close()
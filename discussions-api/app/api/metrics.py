@@ -0,0 +1,70 @@
+"""Metrics middleware module."""
+
+import time
+from typing import Any, Dict, Optional
+
+from fastapi.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.metrics import REGISTRY, REQUEST_LATENCY, REQUESTS_IN_FLIGHT
+
+# Route label of the requests no route matched, to bound the label values
+UNMATCHED = "unmatched"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency of every request by method, route
+    template and status, and the requests in flight.
+
+    The route is the template of the matched endpoint, never the raw path.
+    Streamed responses are timed until their last chunk is sent.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.routes: Optional[Dict[Any, str]] = None
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec(method)
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - started,
+                method,
+                self.route(scope),
+                str(status),
+            )
+
+    def route(self, scope: Scope) -> str:
+        """Template of the route the router matched, from its endpoint."""
+        if self.routes is None:
+            self.routes = {
+                route.endpoint: route.path
+                for route in scope["app"].routes
+                if hasattr(route, "endpoint")
+            }
+        return self.routes.get(scope.get("endpoint"), UNMATCHED)
+
+
+def metrics_response() -> Response:
+    """Every metric in the Prometheus text format."""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,40 @@
+"""Responses module."""
+
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from app.domain.serializer import json_default
+from app.metrics import timed_stage
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+
+@timed_stage("serialize")
+def dumps(content: Any) -> bytes:
+    """Encode content as JSON, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(content, default=json_default)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+        default=json_default,
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response encoding raw documents and models directly.
+
+    Unlike returning content from a route, nothing goes through the generic
+    `jsonable_encoder` first.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,31 +1,188 @@
 """Comment router module."""
 
-from typing import List, Union
+from datetime import datetime
+from typing import Optional
 
-from fastapi import APIRouter, Body, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    status,
+)
+from fastapi.responses import Response
 
 from app.api import deps
+from app.api.bulk import InvalidBulkBody, bulk_create
+from app.api.conditional import conditional_response
+from app.api.live import forward, sse_response
+from app.api.responses import FastJSONResponse
 from app.domain.comment import Comment, UpdateComment
+from app.domain.page import MAX_PAGE_SIZE, InvalidCursor
+from app.domain.projection import InvalidFields
+from app.domain.search import SearchFilters, SearchTooDeep
+from app.domain.thread import MAX_THREAD_SIZE
 from app.usecase.comment import (
     CommentNotFoundToBeReplied,
     CommentUsecase,
     TopicNotFound,
 )
+from config import settings
 
-router = APIRouter()
+router = APIRouter(default_response_class=FastJSONResponse)
 
 
 @router.get("", response_description="List comments by topic")
 async def list_comments_by_topic(
     topic_id: str,
-    skip: int = 0,
-    limit: int = 10,
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    fields: Optional[str] = None,
+    usecase: CommentUsecase = Depends(deps.get_comment_usecase),
+) -> Response:
+    """List comments by topic, with only the comma separated `fields`."""
+    try:
+        comments = await usecase.find_by_topic(
+            topic_id, skip, limit, after, before, fields
+        )
+    except (InvalidCursor, InvalidFields) as err:
+        return FastJSONResponse(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=str(err)
+        )
+    else:
+        return conditional_response(
+            request,
+            comments,
+            comments.items,
+            comments.next_cursor,
+            comments.prev_cursor,
+        )
+
+
+# Declared before /{comment_id}, which would match it otherwise
+@router.get("/search", response_description="Search for comments")
+async def search_comments(
+    topic_id: str,
+    term: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    fields: Optional[str] = None,
+    username: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    usecase: CommentUsecase = Depends(deps.get_comment_usecase),
+) -> FastJSONResponse:
+    """
+    Search for comments of a topic matching the filters, by relevance to
+    `term` if given, with the matches of the term highlighted.
+    """
+    filters = SearchFilters(
+        username=username,
+        created_after=created_after,
+        created_before=created_before,
+    )
+    try:
+        comments = await usecase.search(
+            topic_id,
+            term,
+            skip,
+            limit,
+            after,
+            before,
+            fields,
+            filters,
+            settings.search_window,
+        )
+    except (InvalidCursor, InvalidFields, SearchTooDeep) as err:
+        return FastJSONResponse(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=str(err)
+        )
+    else:
+        return FastJSONResponse(content=comments)
+
+
+@router.get("/tree", response_description="Get the comment tree of a topic")
+async def get_comment_tree(
+    topic_id: str,
+    request: Request,
+    comment_id: Optional[str] = None,
+    depth: Optional[int] = Query(None, ge=0),
+    limit: int = Query(1000, ge=1, le=MAX_THREAD_SIZE),
+    usecase: CommentUsecase = Depends(deps.get_comment_usecase),
+) -> Response:
+    """
+    Get the comments of a topic nested under the comments they reply to,
+    or only the replies under `comment_id`.
+    """
+    try:
+        thread = await usecase.thread(topic_id, comment_id, depth, limit)
+    except TopicNotFound as err:
+        return FastJSONResponse(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=str(err)
+        )
+    else:
+        if thread is not None:
+            return conditional_response(
+                request, thread, thread.walk(), thread.truncated
+            )
+        raise HTTPException(
+            status_code=404,
+            detail=f"comment {comment_id} not found in topic {topic_id}",
+        )
+
+
+@router.get("/stream", response_description="Stream the comment changes")
+async def stream_comments(
+    topic_id: str,
+    request: Request,
+    last_event_id: Optional[str] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
     usecase: CommentUsecase = Depends(deps.get_comment_usecase),
-) -> List[Comment]:
-    """List comments by topic."""
-    comments = await usecase.find_by_topic(topic_id, skip, limit)
-    return comments
+) -> Response:
+    """
+    Stream the comments created, updated and deleted in a topic as
+    server-sent events, from the ones following the `Last-Event-ID` header
+    or `last_event_id` if given. A `reset` event tells the changes since
+    then are lost and the comments should be read again, an `evicted` event
+    that the client fell behind and should reconnect.
+    """
+    try:
+        subscription = await usecase.subscribe(
+            topic_id, last_event_id_header or last_event_id
+        )
+    except TopicNotFound as err:
+        return FastJSONResponse(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=str(err)
+        )
+    else:
+        return sse_response(request, subscription, settings.live_heartbeat)
+
+
+@router.websocket("/ws")
+async def stream_comments_websocket(
+    websocket: WebSocket, topic_id: str, last_event_id: Optional[str] = None
+) -> None:
+    """
+    Send the comments created, updated and deleted in a topic over a
+    WebSocket, as the server-sent events do.
+    """
+    usecase: CommentUsecase = websocket.app.state.comment_usecase
+    try:
+        subscription = await usecase.subscribe(topic_id, last_event_id)
+    except TopicNotFound:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    await forward(websocket, subscription)
 
 
 @router.get(
@@ -34,18 +191,22 @@ async def list_comments_by_topic(
 async def get_comment(
     topic_id: str,
     comment_id: str,
+    request: Request,
+    fields: Optional[str] = None,
     usecase: CommentUsecase = Depends(deps.get_comment_usecase),
-) -> Union[Comment, JSONResponse]:
-    """Get a single comment in a topic."""
+) -> Response:
+    """Get a single comment in a topic, with only the given `fields`."""
     try:
-        comment = await usecase.get(topic_id, comment_id)
-    except TopicNotFound as err:
-        return JSONResponse(
+        comment = await usecase.get(topic_id, comment_id, fields)
+    except (TopicNotFound, InvalidFields) as err:
+        return FastJSONResponse(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=str(err)
         )
     else:
         if comment is not None:
-            return comment
+            return conditional_response(
+                request, comment, [comment], dated=True
+            )
         raise HTTPException(
             status_code=404,
             detail=f"comment {comment_id} not found in topic {topic_id}",
@@ -57,20 +218,45 @@ async def create_comment(
     topic_id: str,
     comment: Comment = Body(...),
     usecase: CommentUsecase = Depends(deps.get_comment_usecase),
-) -> JSONResponse:
+) -> FastJSONResponse:
     """Create a new comment in a topic."""
     try:
         created_comment = await usecase.create(topic_id, comment)
     except (TopicNotFound, CommentNotFoundToBeReplied) as err:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=str(err)
         )
     else:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=status.HTTP_201_CREATED, content=created_comment
         )
 
 
+@router.post(":bulk", response_description="Create comments in bulk")
+async def create_comments(
+    topic_id: str,
+    request: Request,
+    usecase: CommentUsecase = Depends(deps.get_comment_usecase),
+) -> FastJSONResponse:
+    """
+    Create comments in a topic in bulk, from a JSON list or from NDJSON
+    streamed with the `application/x-ndjson` content type. Errors are
+    reported item by item.
+    """
+    try:
+        result = await bulk_create(
+            request,
+            Comment,
+            lambda comments: usecase.create_many(topic_id, comments),
+        )
+    except (InvalidBulkBody, TopicNotFound) as err:
+        return FastJSONResponse(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=str(err)
+        )
+    else:
+        return FastJSONResponse(content=result)
+
+
 @router.put(
     "/{comment_id}",
     response_description="Update an existing comment in a topic",
@@ -80,17 +266,17 @@ async def update_comment(
     comment_id: str,
     comment: UpdateComment = Body(...),
     usecase: CommentUsecase = Depends(deps.get_comment_usecase),
-) -> Union[Comment, JSONResponse]:
+) -> FastJSONResponse:
     """Update an existing comment in a topic."""
     try:
         updated_comment = await usecase.update(topic_id, comment_id, comment)
     except TopicNotFound as err:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=str(err)
         )
     else:
         if updated_comment is not None:
-            return updated_comment
+            return FastJSONResponse(content=updated_comment)
         raise HTTPException(
             status_code=404,
             detail=f"comment {comment_id} not found in topic {topic_id}",
@@ -104,17 +290,17 @@ async def delete_comment(
     topic_id: str,
     comment_id: str,
     usecase: CommentUsecase = Depends(deps.get_comment_usecase),
-) -> JSONResponse:
+) -> FastJSONResponse:
     """Delete a comment in a topic."""
     try:
         deleted: bool = await usecase.delete(topic_id, comment_id)
     except TopicNotFound as err:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=str(err)
         )
     else:
         if deleted:
-            return JSONResponse(status_code=status.HTTP_204_NO_CONTENT)
+            return FastJSONResponse(status_code=status.HTTP_204_NO_CONTENT)
         raise HTTPException(
             status_code=404,
             detail=f"comment {comment_id} not found in topic {topic_id}",
@@ -1,47 +1,152 @@
 """Topic router module."""
 
-from typing import List, Optional, Union
-
-from fastapi import APIRouter, Body, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
+from datetime import datetime
+from typing import Optional
+
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
 
 from app.api import deps
+from app.api.bulk import InvalidBulkBody, bulk_create
+from app.api.conditional import conditional_response
+from app.api.export import ndjson_response
+from app.api.responses import FastJSONResponse
+from app.domain.page import MAX_PAGE_SIZE, InvalidCursor, Page
+from app.domain.projection import InvalidFields
+from app.domain.search import SearchFilters, SearchTooDeep
 from app.domain.topic import Topic, UpdateTopic
 from app.usecase.topic import TopicCanNotBeChanged, TopicUsecase
+from config import settings
 
-router = APIRouter()
+router = APIRouter(default_response_class=FastJSONResponse)
 
 
 @router.get("", response_description="List topics")
 async def list_topics(
-    skip: int = 0,
-    limit: int = 10,
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    fields: Optional[str] = None,
     usecase: TopicUsecase = Depends(deps.get_topic_usecase),
-) -> List[Topic]:
-    """List topics."""
-    topics = await usecase.find(skip, limit)
-    return topics
+) -> Response:
+    """List topics, with only the comma separated `fields` if given."""
+    try:
+        topics = await usecase.find(skip, limit, after, before, fields)
+    except (InvalidCursor, InvalidFields) as err:
+        return FastJSONResponse(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=str(err)
+        )
+    else:
+        return conditional_response(
+            request,
+            topics,
+            topics.items,
+            topics.next_cursor,
+            topics.prev_cursor,
+        )
 
 
 @router.get("/search", response_description="Search for topics")
 async def search_topics(
-    term: str,
-    skip: int = 0,
-    limit: int = 10,
+    term: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    fields: Optional[str] = None,
+    username: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    has_comments: Optional[bool] = None,
+    usecase: TopicUsecase = Depends(deps.get_topic_usecase),
+) -> FastJSONResponse:
+    """
+    Search for topics matching the filters, by relevance to `term` if given,
+    with the matches of the term highlighted.
+    """
+    filters = SearchFilters(
+        username=username,
+        created_after=created_after,
+        created_before=created_before,
+        has_comments=has_comments,
+    )
+    try:
+        topics: Page = await usecase.search(
+            term,
+            skip,
+            limit,
+            after,
+            before,
+            fields,
+            filters,
+            settings.search_window,
+        )
+    except (InvalidCursor, InvalidFields, SearchTooDeep) as err:
+        return FastJSONResponse(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=str(err)
+        )
+    else:
+        return FastJSONResponse(content=topics)
+
+
+# Declared before /{topic_id}, which would match it otherwise
+@router.get("/export", response_description="Export topics as NDJSON")
+async def export_topics(
+    request: Request,
+    include_comments: bool = False,
     usecase: TopicUsecase = Depends(deps.get_topic_usecase),
-) -> List[Topic]:
-    """Search for topics."""
-    topics: List[Topic] = await usecase.search(term, skip, limit)
-    return topics
+) -> Response:
+    """Export every topic, then every comment if asked to, as NDJSON."""
+    return ndjson_response(
+        request, usecase.export(settings.export_batch_size, include_comments)
+    )
 
 
 @router.get("/{topic_id}", response_description="Get a single topic")
 async def get_topic(
-    topic_id: str, usecase: TopicUsecase = Depends(deps.get_topic_usecase)
-) -> Optional[Topic]:
-    """Get a single topic."""
-    if (topic := await usecase.get(topic_id)) is not None:
-        return topic
+    topic_id: str,
+    request: Request,
+    fields: Optional[str] = None,
+    usecase: TopicUsecase = Depends(deps.get_topic_usecase),
+) -> Response:
+    """Get a single topic, with only the comma separated `fields` if given."""
+    try:
+        topic = await usecase.get(topic_id, fields)
+    except InvalidFields as err:
+        return FastJSONResponse(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=str(err)
+        )
+    else:
+        if topic is not None:
+            return conditional_response(request, topic, [topic])
+        raise HTTPException(
+            status_code=404, detail=f"topic {topic_id} not found"
+        )
+
+
+@router.get(
+    "/{topic_id}/export",
+    response_description="Export a topic and its comments as NDJSON",
+)
+async def export_topic(
+    topic_id: str,
+    request: Request,
+    usecase: TopicUsecase = Depends(deps.get_topic_usecase),
+) -> Response:
+    """Export a topic followed by its comments as NDJSON."""
+    docs = await usecase.export_topic(topic_id, settings.export_batch_size)
+    if docs is not None:
+        return ndjson_response(request, docs)
     raise HTTPException(status_code=404, detail=f"topic {topic_id} not found")
 
 
@@ -49,28 +154,46 @@ async def get_topic(
 async def create_topic(
     topic: Topic = Body(...),
     usecase: TopicUsecase = Depends(deps.get_topic_usecase),
-) -> JSONResponse:
+) -> FastJSONResponse:
     """Create a new topic."""
     created_topic = await usecase.create(topic)
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=status.HTTP_201_CREATED, content=created_topic
     )
 
 
+@router.post(":bulk", response_description="Create topics in bulk")
+async def create_topics(
+    request: Request, usecase: TopicUsecase = Depends(deps.get_topic_usecase),
+) -> FastJSONResponse:
+    """
+    Create topics in bulk, from a JSON list or from NDJSON streamed with the
+    `application/x-ndjson` content type. Errors are reported item by item.
+    """
+    try:
+        result = await bulk_create(request, Topic, usecase.create_many)
+    except InvalidBulkBody as err:
+        return FastJSONResponse(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=str(err)
+        )
+    else:
+        return FastJSONResponse(content=result)
+
+
 @router.put("/{topic_id}", response_description="Update an existing topic")
 async def update_topic(
     topic_id: str,
     topic: UpdateTopic = Body(...),
     usecase: TopicUsecase = Depends(deps.get_topic_usecase),
-) -> Union[Topic, JSONResponse]:
+) -> FastJSONResponse:
     """Update an existing topic."""
     try:
         if (
             updated_topic := await usecase.update(topic_id, topic)
         ) is not None:
-            return updated_topic
+            return FastJSONResponse(content=updated_topic)
     except TopicCanNotBeChanged as err:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=str(err)
         )
     else:
@@ -82,17 +205,17 @@ async def update_topic(
 @router.delete("/{topic_id}", response_description="Delete a topic")
 async def delete_topic(
     topic_id: str, usecase: TopicUsecase = Depends(deps.get_topic_usecase)
-) -> JSONResponse:
+) -> FastJSONResponse:
     """Delete a topic."""
     try:
         deleted: bool = await usecase.delete(topic_id)
     except TopicCanNotBeChanged as err:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=str(err)
         )
     else:
         if deleted:
-            return JSONResponse(status_code=status.HTTP_204_NO_CONTENT)
+            return FastJSONResponse(status_code=status.HTTP_204_NO_CONTENT)
         raise HTTPException(
             status_code=404, detail=f"topic {topic_id} not found"
         )
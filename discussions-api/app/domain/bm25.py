@@ -0,0 +1,222 @@
+"""BM25 inverted index domain module."""
+
+import bisect
+import heapq
+import math
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.domain.search import WORD, RankedId
+
+# Okapi BM25 parameters: term frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+# Weights of the terms that only start with, or are close to, a query word
+PREFIX_WEIGHT = 0.5
+FUZZY_WEIGHT = 0.3
+MAX_EXPANSIONS = 50
+# Words shorter than this are not matched fuzzily
+FUZZY_MIN_LENGTH = 4
+
+
+def tokenize(text: str) -> List[str]:
+    """Split a text into lower case words."""
+    return WORD.findall(text.lower())
+
+
+def within_one_edit(a: str, b: str) -> bool:
+    """Whether two words differ by at most one edit."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    rest = i + 1
+    if len(a) == len(b):
+        return a[rest:] == b[rest:]
+    return a[i:] == b[rest:]
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index of documents with weighted text fields, ranked
+    with BM25 over the weighted term frequencies.
+
+    Query words also match the indexed terms they are a prefix of, or, when
+    they match nothing, the terms one edit away from them, both at a lower
+    weight. Words prefixed with `-` exclude the documents having them.
+    Every document keeps attributes the searches can be filtered on.
+    """
+
+    def __init__(self, weights: Dict[str, float]) -> None:
+        self.weights = weights
+        # Term counts by field and attributes, by document id
+        self.fields: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self.attributes: Dict[str, Dict[str, Any]] = {}
+        # Weighted term frequencies by document id, by term
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.lengths: Dict[str, float] = {}
+        self.total_length = 0.0
+        # Sorted terms, for the prefix matches
+        self.vocabulary: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.fields)
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self.fields
+
+    def add(
+        self,
+        doc_id: str,
+        texts: Dict[str, str],
+        attributes: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Index a document, or the given fields and attributes of an indexed
+        one, the others are kept.
+        """
+        fields = dict(self.fields.get(doc_id, {}))
+        for field, text in texts.items():
+            if field in self.weights:
+                fields[field] = dict(Counter(tokenize(text)))
+        merged = {**self.attributes.get(doc_id, {}), **(attributes or {})}
+        self.__index(doc_id, fields, merged)
+
+    def update_attributes(self, doc_id: str, **attributes: Any) -> None:
+        """Update attributes of an indexed document."""
+        if doc_id in self.attributes:
+            self.attributes[doc_id].update(attributes)
+
+    def remove(self, doc_id: str) -> None:
+        """Remove a document, if it is indexed."""
+        fields = self.fields.pop(doc_id, None)
+        if fields is None:
+            return
+        del self.attributes[doc_id]
+        self.total_length -= self.lengths.pop(doc_id)
+        for term in {term for counts in fields.values() for term in counts}:
+            postings = self.postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self.postings[term]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, term)]
+
+    def clear(self) -> None:
+        """Remove every document."""
+        self.fields.clear()
+        self.attributes.clear()
+        self.postings.clear()
+        self.lengths.clear()
+        self.total_length = 0.0
+        self.vocabulary.clear()
+
+    def search(
+        self,
+        term: str,
+        limit: int,
+        accept: Callable[[Dict[str, Any]], bool] = lambda _: True,
+    ) -> List[RankedId]:
+        """
+        Score and id of the `limit` best documents matching the words of a
+        term whose attributes are accepted, by descending score then id.
+        """
+        excluded: Set[str] = set()
+        scores: Dict[str, float] = {}
+        for part in term.split():
+            if part.startswith("-"):
+                for word in tokenize(part):
+                    excluded.update(self.postings.get(word, ()))
+                continue
+            for word in tokenize(part):
+                # A document scores the best of the terms a word matches
+                best: Dict[str, float] = {}
+                for match, weight in self.__expand(word):
+                    for doc_id, score in self.__score(match, weight):
+                        if score > best.get(doc_id, 0.0):
+                            best[doc_id] = score
+                for doc_id, score in best.items():
+                    scores[doc_id] = scores.get(doc_id, 0.0) + score
+        ranked = (
+            (-score, doc_id)
+            for doc_id, score in scores.items()
+            if doc_id not in excluded and accept(self.attributes[doc_id])
+        )
+        return [
+            [-score, doc_id]
+            for score, doc_id in heapq.nsmallest(limit, ranked)
+        ]
+
+    def dump(self) -> Dict[str, Any]:
+        """Snapshot of the indexed documents, as term counts."""
+        return {
+            doc_id: {"fields": fields, "attributes": self.attributes[doc_id]}
+            for doc_id, fields in self.fields.items()
+        }
+
+    def load(self, docs: Dict[str, Any]) -> None:
+        """Replace the indexed documents with a snapshot."""
+        self.clear()
+        for doc_id, doc in docs.items():
+            self.__index(doc_id, doc["fields"], doc["attributes"])
+
+    def __index(
+        self,
+        doc_id: str,
+        fields: Dict[str, Dict[str, int]],
+        attributes: Dict[str, Any],
+    ) -> None:
+        """Index a document from its term counts, replacing it if indexed."""
+        self.remove(doc_id)
+        self.fields[doc_id] = fields
+        self.attributes[doc_id] = attributes
+        frequencies: Dict[str, float] = {}
+        for field, counts in fields.items():
+            weight = self.weights[field]
+            for term, count in counts.items():
+                frequencies[term] = frequencies.get(term, 0.0) + weight * count
+        for term, frequency in frequencies.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                bisect.insort(self.vocabulary, term)
+            postings[doc_id] = frequency
+        length = sum(frequencies.values())
+        self.lengths[doc_id] = length
+        self.total_length += length
+
+    def __expand(self, word: str) -> Iterable[Tuple[str, float]]:
+        """Indexed terms matching a query word, with their weights."""
+        start = bisect.bisect_left(self.vocabulary, word)
+        end = start + MAX_EXPANSIONS
+        expansions = 0
+        for term in self.vocabulary[start:end]:
+            if not term.startswith(word):
+                break
+            expansions += 1
+            yield term, 1.0 if term == word else PREFIX_WEIGHT
+        if expansions or len(word) < FUZZY_MIN_LENGTH:
+            return
+        # Fuzzy matches share the first letter, to keep the scan short
+        start = bisect.bisect_left(self.vocabulary, word[0])
+        end = bisect.bisect_left(self.vocabulary, chr(ord(word[0]) + 1))
+        fuzzy = [
+            term
+            for term in self.vocabulary[start:end]
+            if within_one_edit(word, term)
+        ]
+        for term in fuzzy[:MAX_EXPANSIONS]:
+            yield term, FUZZY_WEIGHT
+
+    def __score(self, term: str, weight: float) -> Iterable[Tuple[str, float]]:
+        """BM25 score of a term, times `weight`, in the documents having it."""
+        postings = self.postings[term]
+        count = len(self.fields)
+        frequency = len(postings)
+        idf = math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+        average = self.total_length / count
+        for doc_id, tf in postings.items():
+            norm = K1 * (1 - B + B * self.lengths[doc_id] / average)
+            yield doc_id, weight * idf * tf * (K1 + 1) / (tf + norm)
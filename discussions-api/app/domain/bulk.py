@@ -0,0 +1,29 @@
+"""Bulk domain module."""
+
+from typing import List
+
+from pydantic import BaseModel, Field
+
+
+class BulkError(BaseModel):
+    """Item of a bulk request that could not be created."""
+
+    index: int = Field(...)
+    error: str = Field(...)
+
+
+class BulkResult(BaseModel):
+    """Outcome of a bulk request, item by item."""
+
+    created: int = Field(default=0)
+    errors: List[BulkError] = Field(default=[])
+
+    class Config:
+        """Pydantic config class."""
+
+        schema_extra = {
+            "example": {
+                "created": 2,
+                "errors": [{"index": 1, "error": "field required: content"}],
+            }
+        }
@@ -0,0 +1,221 @@
+"""Live updates domain module."""
+
+import asyncio
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set
+
+# Field set on a comment right before deleting it, as the change stream
+# only tells the id of a deleted document
+DELETE_MARK = "deleting_from"
+
+
+class LiveEvent:
+    """
+    A change of a comment, sent to the subscribers of its topic.
+
+    The id doubles as the resume token of the subscribers. The encoded
+    comment is kept once computed, so it is encoded once per event however
+    many subscribers it is sent to.
+    """
+
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+
+    def __init__(
+        self, event_id: str, kind: str, topic: str, comment: Dict[str, Any]
+    ) -> None:
+        self.event_id = event_id
+        self.kind = kind
+        self.topic = topic
+        self.comment = comment
+        self.encoded: Optional[bytes] = None
+
+
+class SubscriberEvicted(Exception):
+    """
+    Custom error that is raised when a subscriber fell too far behind and
+    was dropped.
+    """
+
+    def __init__(self, last_event_id: Optional[str], message: str) -> None:
+        self.last_event_id = last_event_id
+        self.message = message
+        super().__init__(message)
+
+
+class LiveStats:
+    """Live updates counters."""
+
+    def __init__(self) -> None:
+        self.published = 0
+        self.delivered = 0
+        self.evicted = 0
+        self.resets = 0
+
+    def dict(self) -> Dict[str, float]:
+        """Counters as a dict."""
+        return {
+            "published": self.published,
+            "delivered": self.delivered,
+            "evicted": self.evicted,
+            "resets": self.resets,
+        }
+
+
+class Subscription:
+    """
+    Events of a topic waiting to be sent to a subscriber, up to `max_size`.
+
+    `reset` tells the events since the resume token are lost, and the
+    subscriber should read the comments again.
+    """
+
+    def __init__(self, hub: "LiveHub", topic_id: str, max_size: int) -> None:
+        self.hub = hub
+        self.topic_id = topic_id
+        self.max_size = max_size
+        self.reset = False
+        self.evicted = False
+        self.last_event_id: Optional[str] = None
+        self._events: Deque[LiveEvent] = deque()
+        self._ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def push(self, event: LiveEvent) -> bool:
+        """Queue an event, unless the queue is full."""
+        if len(self._events) >= self.max_size:
+            return False
+        self._events.append(event)
+        self._ready.set()
+        return True
+
+    async def next(
+        self, timeout: Optional[float] = None
+    ) -> Optional[LiveEvent]:
+        """
+        Wait for the next event, None if none came within `timeout` seconds.
+        Raises once the subscriber was evicted.
+        """
+        if not self._events and not self.evicted:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if self.evicted:
+            raise SubscriberEvicted(
+                last_event_id=self.last_event_id,
+                message="subscriber too slow, resume from the last event",
+            )
+        event = self._events.popleft()
+        self.last_event_id = event.event_id
+        self.hub.stats.delivered += 1
+        return event
+
+    def evict(self) -> None:
+        """Drop the queued events and wake the subscriber up to raise."""
+        self.evicted = True
+        self._events.clear()
+        self._ready.set()
+
+    def close(self) -> None:
+        """Stop receiving events."""
+        self.hub.unsubscribe(self)
+
+
+class LiveHub:
+    """
+    In-process pub/sub of the comment changes, by topic.
+
+    Publishing queues the event of every subscriber of its topic without
+    waiting for any of them: a subscriber whose queue is full is evicted
+    and has to resume. The last `history_size` events are kept so that
+    subscribers can resume after the event id they last received.
+
+    `local` tells the hub is fed by the writes of this process, rather
+    than by a change stream seeing the writes of every process.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = 100,
+        history_size: int = 10000,
+        local: bool = True,
+    ) -> None:
+        self.queue_size = queue_size
+        self.local = local
+        self.stats = LiveStats()
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._history: Deque[LiveEvent] = deque(maxlen=history_size)
+        # Ids of a previous process are never mistaken for ours
+        self._prefix = uuid.uuid4().hex[:8]
+        self._sequence = 0
+
+    def __len__(self) -> int:
+        return sum(len(subs) for subs in self._subscriptions.values())
+
+    def next_id(self) -> str:
+        """Id of the next event published by this process."""
+        self._sequence += 1
+        return f"{self._prefix}-{self._sequence}"
+
+    def subscribe(
+        self, topic_id: str, last_event_id: Optional[str] = None
+    ) -> Subscription:
+        """
+        Subscribe to the events of a topic, from the ones following
+        `last_event_id` if given and still known.
+        """
+        subscription = Subscription(self, topic_id, self.queue_size)
+        if last_event_id is not None:
+            missed = self.__since(last_event_id, topic_id)
+            if missed is None or len(missed) > self.queue_size:
+                subscription.reset = True
+                self.stats.resets += 1
+            else:
+                for event in missed:
+                    subscription.push(event)
+        self._subscriptions.setdefault(topic_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Remove a subscription, if it is still there."""
+        subscriptions = self._subscriptions.get(subscription.topic_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.topic_id]
+
+    def publish(self, event: LiveEvent) -> None:
+        """Send an event to the subscribers of its topic."""
+        self.stats.published += 1
+        self._history.append(event)
+        for subscription in list(self._subscriptions.get(event.topic, ())):
+            if not subscription.push(event):
+                subscription.evict()
+                self.unsubscribe(subscription)
+                self.stats.evicted += 1
+
+    def __since(
+        self, last_event_id: str, topic_id: str
+    ) -> Optional[List[LiveEvent]]:
+        """Events of a topic after an event, None if it is not known."""
+        found = False
+        missed: List[LiveEvent] = []
+        for event in self._history:
+            if found and event.topic == topic_id:
+                missed.append(event)
+            elif event.event_id == last_event_id:
+                found = True
+        return missed if found else None
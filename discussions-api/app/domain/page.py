@@ -0,0 +1,110 @@
+"""Page domain module."""
+
+import base64
+import binascii
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel, Field
+
+# A cursor holds the sort key values of the document it points to
+CursorKey = List[Any]
+# Most documents a page can hold
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(Exception):
+    """Custom error that is raised when a page cursor can not be decoded."""
+
+    def __init__(self, cursor: str, message: str) -> None:
+        self.cursor = cursor
+        self.message = message
+        super().__init__(message)
+
+
+class Page(BaseModel):
+    """Page of results with opaque cursors to the neighbouring pages."""
+
+    items: List[Any] = Field(...)
+    next_cursor: Optional[str] = Field(default=None)
+    prev_cursor: Optional[str] = Field(default=None)
+
+    class Config:
+        """Pydantic config class."""
+
+        schema_extra = {
+            "example": {
+                "items": [],
+                "next_cursor": "WyIyMDIxLTA4LTA4VDE4OjE0OjQwIiwgIjliMSJd",
+                "prev_cursor": None,
+            }
+        }
+
+
+def encode_cursor(key: Sequence[Any]) -> str:
+    """Encode sort key values into an opaque cursor."""
+    raw = json.dumps(list(key), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[CursorKey]:
+    """Decode an opaque cursor holding `size` sort key values."""
+    if cursor is None:
+        return None
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (binascii.Error, ValueError):
+        raise InvalidCursor(cursor=cursor, message="invalid page cursor")
+    if not isinstance(key, list) or len(key) != size:
+        raise InvalidCursor(cursor=cursor, message="invalid page cursor")
+    return key
+
+
+def decode_cursors(
+    after: Optional[str], before: Optional[str], size: int
+) -> Tuple[Optional[CursorKey], Optional[CursorKey]]:
+    """Decode the page cursors, only one direction can be requested."""
+    if after is not None and before is not None:
+        raise InvalidCursor(
+            cursor=after, message="after and before can not be combined"
+        )
+    return decode_cursor(after, size), decode_cursor(before, size)
+
+
+def build_page(
+    docs: List[Any],
+    limit: int,
+    key_fields: Sequence[str],
+    after: Optional[CursorKey] = None,
+    before: Optional[CursorKey] = None,
+    skip: int = 0,
+) -> Page:
+    """
+    Build a page from up to `limit + 1` documents in sort order.
+
+    The extra document only tells whether there are more documents in the
+    paging direction and is not returned.
+    """
+    has_more = len(docs) > limit
+    if before is not None:
+        items = docs[-limit:] if has_more else docs
+    else:
+        items = docs[:limit]
+    # The documents come from the database, they are not validated again
+    if not items:
+        return Page.construct(items=items)
+
+    def cursor(doc: Any) -> str:
+        return encode_cursor([doc[field] for field in key_fields])
+
+    if before is not None:
+        next_cursor: Optional[str] = cursor(items[-1])
+        prev_cursor = cursor(items[0]) if has_more else None
+    else:
+        next_cursor = cursor(items[-1]) if has_more else None
+        paged = after is not None or skip > 0
+        prev_cursor = cursor(items[0]) if paged else None
+    return Page.construct(
+        items=items, next_cursor=next_cursor, prev_cursor=prev_cursor
+    )
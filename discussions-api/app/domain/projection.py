@@ -0,0 +1,67 @@
+"""Projection domain module."""
+
+from typing import Dict, List, Optional, Sequence, Type
+
+from pydantic import BaseModel
+
+from app.domain.comment import Comment
+from app.domain.topic import Topic
+
+
+class InvalidFields(Exception):
+    """Custom error that is raised when a requested field does not exist."""
+
+    def __init__(self, fields: str, message: str) -> None:
+        self.fields = fields
+        self.message = message
+        super().__init__(message)
+
+
+class Projection:
+    """
+    Fields of a model that can be requested, by alias, or by preset name.
+
+    Some fields are always returned: the page cursors and the entity tags of
+    the responses are computed from them.
+    """
+
+    def __init__(
+        self,
+        model: Type[BaseModel],
+        always: Sequence[str],
+        presets: Dict[str, Sequence[str]],
+    ) -> None:
+        self.aliases = {field.alias for field in model.__fields__.values()}
+        self.always = list(always)
+        self.presets = presets
+
+    def parse(self, fields: Optional[str]) -> Optional[List[str]]:
+        """Parse comma separated fields, None selects the whole document."""
+        if fields is None:
+            return None
+        selected = list(self.always)
+        for name in fields.split(","):
+            name = name.strip()
+            if name in self.presets:
+                selected += self.presets[name]
+            elif name in self.aliases:
+                selected.append(name)
+            elif name:
+                raise InvalidFields(
+                    fields=fields, message=f"unknown field {name}"
+                )
+        return list(dict.fromkeys(selected))
+
+
+TOPIC_PROJECTION = Projection(
+    Topic,
+    always=["_id", "created", "updated"],
+    presets={
+        "summary": ["title", "username", "comment_count", "last_comment_at"]
+    },
+)
+COMMENT_PROJECTION = Projection(
+    Comment,
+    always=["_id", "created", "updated"],
+    presets={"summary": ["username", "reply"]},
+)
@@ -0,0 +1,185 @@
+"""Search domain module."""
+
+import bisect
+import html
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel, Field
+
+from app.domain.page import CursorKey
+
+# A ranked search result is its text score and its id
+RankedId = List[Any]
+# Results ranked at once for a search, pages past them run the search again
+SEARCH_WINDOW = 1000
+# Most results a search ranks, as a multiple of its first window
+MAX_WINDOW_FACTOR = 10
+# Fields matches are highlighted in
+HIGHLIGHT_FIELDS = ("title", "content")
+# Characters of context around a highlighted match
+SNIPPET_CONTEXT = 40
+MAX_SNIPPETS = 3
+
+WORD = re.compile(r"\w+")
+
+
+class SearchTooDeep(Exception):
+    """
+    Custom error that is raised when a search page is past the most results
+    a search ranks.
+    """
+
+    def __init__(self, max_results: int, message: str) -> None:
+        self.max_results = max_results
+        self.message = message
+        super().__init__(message)
+
+
+class SearchFilters(BaseModel):
+    """Structured search filters, combined with the search term."""
+
+    username: Optional[str] = Field(default=None)
+    created_after: Optional[datetime] = Field(default=None)
+    created_before: Optional[datetime] = Field(default=None)
+    has_comments: Optional[bool] = Field(default=None)
+    # Set by the comment search only
+    topic: Optional[str] = Field(default=None)
+
+    def created_range(self) -> Dict[str, str]:
+        """Creation range as comparisons of the stored ISO dates."""
+        created: Dict[str, str] = {}
+        if self.created_after is not None:
+            created["$gte"] = stored_date(self.created_after)
+        if self.created_before is not None:
+            created["$lt"] = stored_date(self.created_before)
+        return created
+
+    def accepts(self, doc: Dict[str, Any]) -> bool:
+        """Whether the filters accept a stored document."""
+        if self.topic is not None and doc.get("topic") != self.topic:
+            return False
+        if self.username is not None and doc.get("username") != self.username:
+            return False
+        created = doc.get("created")
+        if self.created_after is not None and (
+            created is None or created < stored_date(self.created_after)
+        ):
+            return False
+        if self.created_before is not None and (
+            created is None or created >= stored_date(self.created_before)
+        ):
+            return False
+        if self.has_comments is not None:
+            # Missing counters are topics without comments
+            commented = (doc.get("comment_count") or 0) > 0
+            if commented != self.has_comments:
+                return False
+        return True
+
+
+def stored_date(value: datetime) -> str:
+    """ISO date as stored, naive in the local time of the server."""
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value.isoformat()
+
+
+def normalize_term(term: Optional[str]) -> str:
+    """Normalize a search term, so equivalent searches share a cache."""
+    return " ".join((term or "").lower().split())
+
+
+def search_words(term: str) -> List[str]:
+    """Words a term looks for, negated words left out."""
+    words: List[str] = []
+    for part in term.split():
+        if not part.startswith("-"):
+            words += WORD.findall(part.lower())
+    return words
+
+
+def window_slice(
+    ranked: List[RankedId],
+    full: bool,
+    limit: int,
+    after: Optional[CursorKey] = None,
+    before: Optional[CursorKey] = None,
+    skip: int = 0,
+) -> Optional[List[RankedId]]:
+    """
+    Slice up to `limit` results of a page from a ranked window, in order.
+
+    Results are sorted by descending score, then by id, as the cursors are.
+    None is returned when the page runs past the end of a `full` window,
+    which does not tell what comes after it.
+    """
+    keys = [(-score, doc_id) for score, doc_id in ranked]
+    if before is not None:
+        position = bisect.bisect_left(keys, (-before[0], before[1]))
+        if full and position == len(keys):
+            return None
+        end = max(position - skip, 0)
+        start = max(end - limit, 0)
+        return ranked[start:end]
+    start = skip
+    if after is not None:
+        start += bisect.bisect_right(keys, (-after[0], after[1]))
+    end = start + limit
+    window = ranked[start:end]
+    if full and len(window) < limit:
+        return None
+    return window
+
+
+def highlight(
+    doc: Dict[str, Any], words: Sequence[str]
+) -> Dict[str, List[str]]:
+    """Snippets of the text fields of a document, matches in `<em>`."""
+    highlights: Dict[str, List[str]] = {}
+    for field in HIGHLIGHT_FIELDS:
+        text = doc.get(field)
+        if not isinstance(text, str):
+            continue
+        spans = [
+            match.span()
+            for match in WORD.finditer(text)
+            if matches_word(match.group().lower(), words)
+        ]
+        if spans:
+            highlights[field] = snippets(text, spans)
+    return highlights
+
+
+def matches_word(word: str, words: Sequence[str]) -> bool:
+    """Whether a word of the text roughly matches a searched word."""
+    return any(
+        word.startswith(searched)
+        or (len(word) > 3 and searched.startswith(word))
+        for searched in words
+    )
+
+
+def snippets(text: str, spans: List[Tuple[int, int]]) -> List[str]:
+    """Escaped snippets around the first matches, merged when they meet."""
+    windows: List[List[int]] = []
+    for start, end in spans:
+        if windows and start - SNIPPET_CONTEXT <= windows[-1][1]:
+            windows[-1][1] = end + SNIPPET_CONTEXT
+        elif len(windows) < MAX_SNIPPETS:
+            windows.append([start - SNIPPET_CONTEXT, end + SNIPPET_CONTEXT])
+    result: List[str] = []
+    for first, last in windows:
+        first, last = max(first, 0), min(last, len(text))
+        marked, position = [], first
+        for start, end in spans:
+            if start >= first and end <= last:
+                marked.append(html.escape(text[position:start]))
+                marked.append(f"<em>{html.escape(text[start:end])}</em>")
+                position = end
+        marked.append(html.escape(text[position:last]))
+        prefix = "…" if first > 0 else ""
+        suffix = "…" if last < len(text) else ""
+        result.append(prefix + "".join(marked).strip() + suffix)
+    return result
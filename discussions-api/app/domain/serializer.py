@@ -0,0 +1,73 @@
+"""Serializer domain module."""
+
+import uuid
+from datetime import date, datetime
+from typing import Any, Dict, List, Tuple, Type
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+
+class ModelSerializer:
+    """
+    Serializer of a flat model into a document keyed by the field aliases.
+
+    The field names and aliases are computed once per model, and the types
+    stored by the models are converted directly; other values go through the
+    generic `jsonable_encoder`. The result is the same as
+    `jsonable_encoder(model)`.
+    """
+
+    _serializers: Dict[Type[BaseModel], "ModelSerializer"] = {}
+
+    def __init__(self, model: Type[BaseModel]) -> None:
+        self.fields: List[Tuple[str, str]] = [
+            (name, field.alias) for name, field in model.__fields__.items()
+        ]
+
+    @classmethod
+    def of(cls, model: Type[BaseModel]) -> "ModelSerializer":
+        """Get the serializer of a model class."""
+        serializer = cls._serializers.get(model)
+        if serializer is None:
+            serializer = cls._serializers[model] = cls(model)
+        return serializer
+
+    def dump(self, instance: BaseModel) -> Dict[str, Any]:
+        """Serialize a model instance."""
+        values = instance.__dict__
+        return {
+            alias: to_jsonable(values[name]) for name, alias in self.fields
+        }
+
+    def shallow(self, instance: BaseModel) -> Dict[str, Any]:
+        """Get the values of a model instance by alias, as they are."""
+        values = instance.__dict__
+        return {alias: values[name] for name, alias in self.fields}
+
+
+def dump(instance: BaseModel) -> Any:
+    """Serialize a model instance into a document keyed by field aliases."""
+    return ModelSerializer.of(type(instance)).dump(instance)
+
+
+def json_default(value: Any) -> Any:
+    """
+    Convert a value a JSON encoder does not support, as its `default`.
+
+    Models are converted shallowly, the encoder handles their values.
+    """
+    if isinstance(value, BaseModel):
+        return ModelSerializer.of(type(value)).shallow(value)
+    return to_jsonable(value)
+
+
+def to_jsonable(value: Any) -> Any:
+    """Convert a value into one JSON supports."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return jsonable_encoder(value)
@@ -0,0 +1,107 @@
+"""Thread domain module."""
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+# Replies nested deeper than this are counted but not returned
+MAX_THREAD_DEPTH = 100
+# Comments returned at most by a single thread request
+MAX_THREAD_SIZE = 50000
+
+
+class Thread(BaseModel):
+    """Comments of a topic nested under the comments they reply to."""
+
+    comments: List[Any] = Field(...)
+    size: int = Field(...)
+    truncated: bool = Field(default=False)
+
+    class Config:
+        """Pydantic config class."""
+
+        schema_extra = {
+            "example": {
+                "comments": [
+                    {
+                        "_id": "54539bf6-7f01-4002-b850-7ec3e9dee441",
+                        "content": "Can anyone help?",
+                        "username": "Bob",
+                        "reply_count": 1,
+                        "replies": [
+                            {
+                                "_id": "9b1c8a41-5a2e-4f0e-8d43-2f6a7e1b0c55",
+                                "content": "Sure! I can help you!",
+                                "username": "Nephew Bob",
+                                "reply_count": 0,
+                                "replies": [],
+                            }
+                        ],
+                    }
+                ],
+                "size": 2,
+                "truncated": False,
+            }
+        }
+
+    def walk(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over the returned comments, depth first."""
+        stack = list(reversed(self.comments))
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node["replies"]))
+
+
+def thread_bounds(max_depth: Optional[int], limit: int) -> Tuple[int, int]:
+    """Clamp the depth and size requested for a thread."""
+    if max_depth is None:
+        max_depth = MAX_THREAD_DEPTH
+    return (
+        max(0, min(max_depth, MAX_THREAD_DEPTH)),
+        max(1, min(limit, MAX_THREAD_SIZE)),
+    )
+
+
+def build_thread(
+    comments: List[Any],
+    limit: int,
+    max_depth: int = MAX_THREAD_DEPTH,
+    root_id: Optional[str] = None,
+) -> Thread:
+    """
+    Nest comments sorted by creation under the comments they reply to.
+
+    Callers fetch `limit + 1` comments to tell whether the thread was
+    truncated. As a reply is always created after its comment, a prefix of
+    the sorted comments never loses the comments its replies point to.
+    Nodes deeper than `max_depth` are dropped, but still counted in the
+    `reply_count` of their parent. Replies to deleted comments are
+    returned at the top level. The work is linear in the comments.
+    """
+    truncated = len(comments) > limit
+    nodes: Dict[str, Dict[str, Any]] = {}
+    for comment in comments[:limit]:
+        nodes[comment["_id"]] = {**comment, "reply_count": 0, "replies": []}
+
+    top_level: List[Dict[str, Any]] = []
+    for node in nodes.values():
+        parent = None
+        if node["_id"] != root_id and node.get("reply"):
+            parent = nodes.get(node["reply"])
+        if parent is not None:
+            parent["replies"].append(node)
+            parent["reply_count"] += 1
+        else:
+            top_level.append(node)
+
+    size = 0
+    stack = [(node, 0) for node in top_level]
+    while stack:
+        node, depth = stack.pop()
+        size += 1
+        if depth >= max_depth:
+            node["replies"] = []
+        else:
+            stack.extend((reply, depth + 1) for reply in node["replies"])
+    return Thread.construct(comments=top_level, size=size, truncated=truncated)
@@ -17,6 +17,8 @@ class Topic(BaseModel):
     discussion_type: str = Field(default="topic", alias="type")
     created: datetime = Field(default_factory=datetime.now)
     updated: Optional[datetime] = Field(default=None)
+    comment_count: int = Field(default=0)
+    last_comment_at: Optional[datetime] = Field(default=None)
 
     class Config:
         """Pydantic config class."""
@@ -1,11 +1,100 @@
 """Community discussions module."""
 
+import logging
+
 from fastapi import FastAPI
+from fastapi.responses import Response
 
+from app.api import deps
+from app.api.consistency import ConsistencyMiddleware
+from app.api.metrics import MetricsMiddleware, metrics_response
 from app.api.v1.router import api_router_v1
+from app.metrics import (
+    register_cache_metrics,
+    register_live_metrics,
+    register_single_flight_metrics,
+    register_write_behind_metrics,
+)
+from app.repository.indexes import ensure_indexes
+from app.repository.live import ChangeStreamFeed
 from config import settings
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(
     title=settings.APP_NAME, openapi_url=f"{settings.API_V1}/openapi.json",
 )
 app.include_router(api_router_v1, prefix=settings.API_V1)
+app.add_middleware(ConsistencyMiddleware, window=deps.consistency_window())
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics() -> Response:
+        """Expose the metrics to Prometheus."""
+        return metrics_response()
+
+
+@app.on_event("startup")
+async def connect_to_mongodb() -> None:
+    """Create the MongoDB client and usecases shared by every request."""
+    app.state.mongodb_client = deps.get_mongodb_client()
+    mongodb = app.state.mongodb_client[settings.db_name]
+    shards = deps.shard_databases(mongodb)
+    if settings.db_ensure_indexes:
+        for shard in shards:
+            report = await ensure_indexes(
+                shard, deps.mongo_repositories(shard)
+            )
+            for line in report.lines():
+                logger.warning("index migration: %s: %s", shard.name, line)
+    app.state.cache = deps.build_cache()
+    if settings.metrics_enabled and app.state.cache is not None:
+        register_cache_metrics(app.state.cache.stats.dict)
+    flights = deps.build_single_flight()
+    if settings.metrics_enabled and flights is not None:
+        register_single_flight_metrics(flights.stats.dict)
+    hub = deps.build_live_hub()
+    if settings.metrics_enabled:
+        register_live_metrics(hub.stats.dict, hub.__len__)
+    app.state.live_feeds = []
+    if not hub.local:
+        # A change stream per shard, the changes of a topic come from one
+        for shard in shards:
+            (_, comment_repo), _ = deps.mongo_layouts(shard)
+            feed = ChangeStreamFeed(comment_repo.mongodb, hub)
+            feed.start()
+            app.state.live_feeds.append(feed)
+    app.state.batchers = deps.build_insert_batchers(mongodb)
+    if settings.metrics_enabled and app.state.batchers:
+        register_write_behind_metrics(app.state.batchers[0].stats.dict)
+    app.state.search_backend = deps.build_search_backend()
+    if app.state.search_backend is not None:
+        await deps.open_search_backend(app.state.search_backend, mongodb)
+    (
+        app.state.topic_usecase,
+        app.state.comment_usecase,
+    ) = deps.build_usecases(
+        mongodb,
+        app.state.cache,
+        app.state.search_backend,
+        flights,
+        hub,
+        app.state.batchers,
+    )
+
+
+@app.on_event("shutdown")
+async def close_mongodb_connection() -> None:
+    """Close the MongoDB client and its connection pool."""
+    # The comments waiting for a batch are inserted before closing
+    for batcher in app.state.batchers:
+        await batcher.close()
+    for feed in app.state.live_feeds:
+        await feed.close()
+    if app.state.cache is not None:
+        await app.state.cache.close()
+    if app.state.search_backend is not None:
+        await app.state.search_backend.close()
+    deps.close_shard_clients()
+    app.state.mongodb_client.close()
@@ -0,0 +1,419 @@
+"""Metrics module, rendered in the Prometheus text format."""
+
+import bisect
+import functools
+import inspect
+import math
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+# Latency buckets, in seconds, from 1 ms to 10 s
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+Labels = Tuple[str, ...]
+T = TypeVar("T")
+
+
+class Metric:
+    """
+    Metric family with a value per combination of label values.
+
+    Observations only update numbers in a dict, no lock is taken: metrics
+    are updated from the event loop thread.
+    """
+
+    kind = ""
+
+    def __init__(
+        self, name: str, documentation: str, labels: Sequence[str] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+    def samples(self) -> Iterable[Tuple[str, Labels, float]]:
+        """Sample suffixes, label values and values of the family."""
+        raise NotImplementedError()
+
+    def render(self) -> List[str]:
+        """Render the family in the text exposition format."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for suffix, values, value in self.samples():
+            names = self.labels + (("le",) if suffix == "_bucket" else ())
+            lines.append(
+                f"{self.name}{suffix}{format_labels(names, values)} "
+                f"{format_value(value)}"
+            )
+        return lines
+
+
+class Counter(Metric):
+    """Monotonic counter, or counters read from a callback on every scrape."""
+
+    kind = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        callback: Optional[Callable[[], Dict[Labels, float]]] = None,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.values: Dict[Labels, float] = {}
+        self.callback = callback
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        """Increment the counter of the label values."""
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterable[Tuple[str, Labels, float]]:
+        values = self.callback() if self.callback else self.values
+        for labels, value in values.items():
+            yield "_total", labels, value
+
+
+class Gauge(Metric):
+    """Value going up and down, or read from a callback on every scrape."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        callback: Optional[Callable[[], Dict[Labels, float]]] = None,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.values: Dict[Labels, float] = {}
+        self.callback = callback
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        """Increment the gauge of the label values."""
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        """Decrement the gauge of the label values."""
+        self.values[labels] = self.values.get(labels, 0.0) - amount
+
+    def samples(self) -> Iterable[Tuple[str, Labels, float]]:
+        values = self.callback() if self.callback else self.values
+        for labels, value in values.items():
+            yield "", labels, value
+
+
+class Histogram(Metric):
+    """Distribution of observations in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # Observation count per bucket, the last one is +Inf, and the sum
+        self.values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Record an observation of the label values."""
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = ([0] * (len(self.buckets) + 1), [0])
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    def count(self, *labels: str) -> int:
+        """Number of observations of the label values."""
+        entry = self.values.get(labels)
+        return sum(entry[0]) if entry else 0
+
+    def samples(self) -> Iterable[Tuple[str, Labels, float]]:
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield "_bucket", labels + (format_value(bound),), cumulative
+            yield "_sum", labels, total[0]
+            yield "_count", labels, cumulative
+
+
+class Registry:
+    """Metric families exposed together."""
+
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Any:
+        """Add a metric family, replacing any with the same name."""
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Render every family in the text exposition format."""
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(names: Labels, values: Labels) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{escape(str(value))}"' for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REGISTRY = Registry()
+REQUEST_LATENCY: Histogram = REGISTRY.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Latency of the HTTP requests by route template.",
+        ("method", "route", "status"),
+    )
+)
+REQUESTS_IN_FLIGHT: Gauge = REGISTRY.register(
+    Gauge(
+        "http_requests_in_flight", "HTTP requests being served.", ("method",),
+    )
+)
+REPOSITORY_LATENCY: Histogram = REGISTRY.register(
+    Histogram(
+        "repository_operation_duration_seconds",
+        "Latency of the database operations by repository method.",
+        ("repository", "operation"),
+    )
+)
+REPOSITORY_ERRORS: Counter = REGISTRY.register(
+    Counter(
+        "repository_operation_errors",
+        "Database operations that raised, by repository method.",
+        ("repository", "operation"),
+    )
+)
+STAGE_LATENCY: Histogram = REGISTRY.register(
+    Histogram(
+        "request_stage_duration_seconds",
+        "Latency of the stages of a request outside of the database.",
+        ("stage",),
+    )
+)
+
+
+def register_cache_metrics(stats: Callable[[], Dict[str, float]]) -> None:
+    """Expose the counters of a cache, read on every scrape."""
+    REGISTRY.register(
+        Counter(
+            "cache_operations",
+            "Cache lookups by result, and evictions and expirations.",
+            ("result",),
+            callback=lambda: {
+                (name,): value
+                for name, value in stats().items()
+                if name != "hit_ratio"
+            },
+        )
+    )
+    REGISTRY.register(
+        Gauge(
+            "cache_hit_ratio",
+            "Share of the cache lookups served from the cache.",
+            callback=lambda: {(): stats()["hit_ratio"]},
+        )
+    )
+
+
+def register_single_flight_metrics(
+    stats: Callable[[], Dict[str, float]]
+) -> None:
+    """Expose the counters of the coalesced reads, read on every scrape."""
+    REGISTRY.register(
+        Counter(
+            "single_flight_reads",
+            "Reads that sent a query, were coalesced into an identical one "
+            "in flight, or waited too long for it.",
+            ("result",),
+            callback=lambda: {
+                (name,): value for name, value in stats().items()
+            },
+        )
+    )
+
+
+def register_write_behind_metrics(
+    stats: Callable[[], Dict[str, float]]
+) -> None:
+    """Expose the counters of the batched inserts, read on every scrape."""
+    REGISTRY.register(
+        Counter(
+            "write_behind_inserts",
+            "Batches of comment inserts sent, documents they carried and "
+            "documents that failed.",
+            ("result",),
+            callback=lambda: {
+                (name,): value for name, value in stats().items()
+            },
+        )
+    )
+
+
+def register_live_metrics(
+    stats: Callable[[], Dict[str, float]], subscribers: Callable[[], int]
+) -> None:
+    """Expose the counters of the live updates, read on every scrape."""
+    REGISTRY.register(
+        Counter(
+            "live_updates",
+            "Comment changes published and delivered, subscribers evicted "
+            "for being too slow and resumed too late.",
+            ("result",),
+            callback=lambda: {
+                (name,): value for name, value in stats().items()
+            },
+        )
+    )
+    REGISTRY.register(
+        Gauge(
+            "live_subscribers",
+            "Clients streaming the comment changes.",
+            callback=lambda: {(): subscribers()},
+        )
+    )
+
+
+def instrument(repository: str) -> Callable[[T], T]:
+    """
+    Class decorator recording the latency and errors of every public
+    method of a repository, coroutines and async generators alike.
+    """
+
+    def decorate(cls: T) -> T:
+        for name, method in list(vars(cls).items()):
+            if name.startswith("_"):
+                continue
+            if inspect.iscoroutinefunction(method):
+                setattr(cls, name, timed_coroutine(method, repository, name))
+            elif inspect.isasyncgenfunction(method):
+                setattr(cls, name, timed_generator(method, repository, name))
+        return cls
+
+    return decorate
+
+
+def timed_coroutine(
+    method: Callable[..., Any], repository: str, operation: str
+) -> Callable[..., Any]:
+    @functools.wraps(method)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        except Exception:
+            REPOSITORY_ERRORS.inc(repository, operation)
+            raise
+        finally:
+            REPOSITORY_LATENCY.observe(
+                time.perf_counter() - started, repository, operation
+            )
+
+    return wrapper
+
+
+def timed_generator(
+    method: Callable[..., Any], repository: str, operation: str
+) -> Callable[..., Any]:
+    """Time an async generator over its whole iteration."""
+
+    @functools.wraps(method)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        generator = method(*args, **kwargs)
+        try:
+            async for item in generator:
+                yield item
+        except Exception:
+            REPOSITORY_ERRORS.inc(repository, operation)
+            raise
+        finally:
+            # Closed right away, as the caller closing the wrapper expects
+            await generator.aclose()
+            REPOSITORY_LATENCY.observe(
+                time.perf_counter() - started, repository, operation
+            )
+
+    return wrapper
+
+
+def timed_stage(stage: str) -> Callable[[T], T]:
+    """Decorator recording the latency of a request stage, sync or not."""
+
+    def decorate(function: Any) -> Any:
+        if inspect.iscoroutinefunction(function):
+
+            @functools.wraps(function)
+            async def coroutine(*args: Any, **kwargs: Any) -> Any:
+                started = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    STAGE_LATENCY.observe(time.perf_counter() - started, stage)
+
+            return coroutine
+
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                STAGE_LATENCY.observe(time.perf_counter() - started, stage)
+
+        return wrapper
+
+    return decorate
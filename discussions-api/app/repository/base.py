@@ -1,72 +1,256 @@
 """Base repository module."""
 
 import abc
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from pymongo import ASCENDING, DESCENDING
 
 from app.domain.comment import Comment
+from app.domain.page import CursorKey
+from app.domain.search import RankedId, SearchFilters
 from app.domain.topic import Topic
 
 
+def to_projection(fields: Optional[List[str]]) -> Optional[Dict[str, int]]:
+    """MongoDB projection of fields, None for the whole document."""
+    if fields is None:
+        return None
+    return {field: 1 for field in fields}
+
+
+# Messages of the write errors by code, as the database ones name its
+# collections and indexes
+WRITE_ERRORS = {11000: "duplicate id"}
+
+
+def write_error(error: Dict[str, Any]) -> str:
+    """Message of an error of a bulk write that can be sent to clients."""
+    return WRITE_ERRORS.get(error.get("code", 0), "could not be written")
+
+
 class TopicRepository:
     """Topic repository base."""
 
     COLLECTION_NAME = "discussions"
+    # Stable sort orders, the fields double as the page cursor key
+    SORT = [("created", ASCENDING), ("_id", ASCENDING)]
+    SEARCH_SORT = [("score", DESCENDING), ("_id", ASCENDING)]
 
     @abc.abstractmethod
-    async def find(self, skip: int, limit: int) -> List[Topic]:
+    async def find(
+        self,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Topic]:
         """Find topics."""
         raise NotImplementedError()
 
     @abc.abstractmethod
     async def search(
-        self, query: List[Dict[str, Any]], term: str, skip: int, limit: int
+        self,
+        query: List[Dict[str, Any]],
+        term: str,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
     ) -> List[Any]:
         """Search for topics."""
         raise NotImplementedError()
 
     @abc.abstractmethod
-    async def get(self, topic_id: str) -> Optional[Topic]:
+    async def rank(
+        self, filters: SearchFilters, term: str, limit: int
+    ) -> List[RankedId]:
+        """Rank the ids of the first topics matching a search."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def get_many(
+        self, topic_ids: List[str], fields: Optional[List[str]] = None
+    ) -> List[Topic]:
+        """Get topics by id, in no particular order."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def get(
+        self, topic_id: str, fields: Optional[List[str]] = None
+    ) -> Optional[Topic]:
         """Get a topic."""
         raise NotImplementedError()
 
+    @abc.abstractmethod
+    def export(self, batch_size: int) -> AsyncIterator[Topic]:
+        """Iterate over every topic, fetching `batch_size` at a time."""
+        raise NotImplementedError()
+
     @abc.abstractmethod
     async def create(self, topic: Dict[str, Any]) -> str:
         """Create a topic."""
         raise NotImplementedError()
 
+    @abc.abstractmethod
+    async def create_many(
+        self, topics: List[Dict[str, Any]]
+    ) -> Dict[int, str]:
+        """Create topics, getting the errors by index."""
+        raise NotImplementedError()
+
     @abc.abstractmethod
     async def update(self, topic_id: str, topic: Dict[str, Any]) -> int:
         """Update a topic."""
         raise NotImplementedError()
 
     @abc.abstractmethod
-    async def delete(self, topic_id: str) -> int:
+    async def update_and_get(
+        self,
+        topic_id: str,
+        topic: Dict[str, Any],
+        without_comments: bool = False,
+    ) -> Optional[Topic]:
+        """Update a topic and get it back in the same round trip."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def delete(
+        self, topic_id: str, without_comments: bool = False
+    ) -> int:
         """Delete a topic."""
         raise NotImplementedError()
 
+    @abc.abstractmethod
+    async def get_comment_count(self, topic_id: str) -> Optional[int]:
+        """Get the comment counter of a topic, if the topic exists."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def increment_comments(
+        self, topic_id: str, amount: int, commented_at: Optional[str] = None
+    ) -> bool:
+        """Increment the comment counter of a topic."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def set_comment_stats(
+        self, stats: Dict[str, Tuple[int, Optional[str]]]
+    ) -> int:
+        """Overwrite the comment counters that differ from `stats`."""
+        raise NotImplementedError()
+
 
 class CommentRepository:
     """Comment repository base."""
 
     COLLECTION_NAME = "discussions"
+    # Stable sort orders, the fields double as the page cursor key
+    SORT = [("created", ASCENDING), ("_id", ASCENDING)]
+    SEARCH_SORT = [("score", DESCENDING), ("_id", ASCENDING)]
 
     @abc.abstractmethod
     async def find_by_topic(
-        self, topic_id: str, skip: int, limit: int
+        self,
+        topic_id: str,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
     ) -> List[Comment]:
         """Find comments by topic."""
         raise NotImplementedError()
 
     @abc.abstractmethod
-    async def get(self, topic_id: str, comment_id: str) -> Optional[Comment]:
+    async def search(
+        self,
+        query: List[Dict[str, Any]],
+        term: str,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Any]:
+        """Search for comments."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def rank(
+        self, filters: SearchFilters, term: str, limit: int
+    ) -> List[RankedId]:
+        """Rank the ids of the first comments matching a search."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def get_many(
+        self, comment_ids: List[str], fields: Optional[List[str]] = None
+    ) -> List[Comment]:
+        """Get comments by id, in no particular order."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def get(
+        self,
+        topic_id: str,
+        comment_id: str,
+        fields: Optional[List[str]] = None,
+    ) -> Optional[Comment]:
         """Get a comment."""
         raise NotImplementedError()
 
+    @abc.abstractmethod
+    def export(
+        self, topic_id: Optional[str], batch_size: int
+    ) -> AsyncIterator[Comment]:
+        """
+        Iterate over the comments of a topic, or of every topic if it is
+        None, fetching `batch_size` at a time.
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def find_thread(self, topic_id: str, limit: int) -> List[Comment]:
+        """Find the first comments of a topic, sorted by creation."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def find_replies(
+        self,
+        topic_id: str,
+        comment_id: str,
+        max_depth: Optional[int],
+        limit: int,
+    ) -> List[Comment]:
+        """Find the first replies under a comment, sorted by creation."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def exists(self, topic_id: str, comment_id: str) -> bool:
+        """Check if a comment exists."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def find_existing(
+        self, topic_id: str, comment_ids: List[str]
+    ) -> Set[str]:
+        """Find which of the comments exist."""
+        raise NotImplementedError()
+
     @abc.abstractmethod
     async def create(self, comment: Dict[str, Any]) -> str:
         """Create a comment."""
         raise NotImplementedError()
 
+    @abc.abstractmethod
+    async def create_many(
+        self, comments: List[Dict[str, Any]]
+    ) -> Dict[int, str]:
+        """Create comments, getting the errors by index."""
+        raise NotImplementedError()
+
     @abc.abstractmethod
     async def update(
         self, topic_id: str, comment_id: str, comment: Dict[str, Any]
@@ -74,7 +258,250 @@ class CommentRepository:
         """Update a comment."""
         raise NotImplementedError()
 
+    @abc.abstractmethod
+    async def update_and_get(
+        self, topic_id: str, comment_id: str, comment: Dict[str, Any]
+    ) -> Optional[Comment]:
+        """Update a comment and get it back in the same round trip."""
+        raise NotImplementedError()
+
     @abc.abstractmethod
     async def delete(self, topic_id: str, comment_id: str) -> int:
         """Delete a comment."""
         raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def count_by_topic(self) -> Dict[str, Tuple[int, Optional[str]]]:
+        """Count comments and get the last comment date of every topic."""
+        raise NotImplementedError()
+
+
+class TopicRepositoryProxy(TopicRepository):
+    """
+    Topic repository handing every operation to another one, for the
+    repositories layered over another to override only what they change.
+    """
+
+    def __init__(self, repository: TopicRepository) -> None:
+        self.repository = repository
+
+    async def find(
+        self,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Topic]:
+        """Find topics."""
+        return await self.repository.find(skip, limit, after, before, fields)
+
+    async def search(
+        self,
+        query: List[Dict[str, Any]],
+        term: str,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Any]:
+        """Search for topics."""
+        return await self.repository.search(
+            query, term, skip, limit, after, before, fields
+        )
+
+    async def rank(
+        self, filters: SearchFilters, term: str, limit: int
+    ) -> List[RankedId]:
+        """Rank the ids of the first topics matching a search."""
+        return await self.repository.rank(filters, term, limit)
+
+    async def get_many(
+        self, topic_ids: List[str], fields: Optional[List[str]] = None
+    ) -> List[Topic]:
+        """Get topics by id, in no particular order."""
+        return await self.repository.get_many(topic_ids, fields)
+
+    async def get(
+        self, topic_id: str, fields: Optional[List[str]] = None
+    ) -> Optional[Topic]:
+        """Get a topic."""
+        return await self.repository.get(topic_id, fields)
+
+    def export(self, batch_size: int) -> AsyncIterator[Topic]:
+        """Iterate over every topic, fetching `batch_size` at a time."""
+        return self.repository.export(batch_size)
+
+    async def create(self, topic: Dict[str, Any]) -> str:
+        """Create a topic."""
+        return await self.repository.create(topic)
+
+    async def create_many(
+        self, topics: List[Dict[str, Any]]
+    ) -> Dict[int, str]:
+        """Create topics, getting the errors by index."""
+        return await self.repository.create_many(topics)
+
+    async def update(self, topic_id: str, topic: Dict[str, Any]) -> int:
+        """Update a topic."""
+        return await self.repository.update(topic_id, topic)
+
+    async def update_and_get(
+        self,
+        topic_id: str,
+        topic: Dict[str, Any],
+        without_comments: bool = False,
+    ) -> Optional[Topic]:
+        """Update a topic and get it back in the same round trip."""
+        return await self.repository.update_and_get(
+            topic_id, topic, without_comments
+        )
+
+    async def delete(
+        self, topic_id: str, without_comments: bool = False
+    ) -> int:
+        """Delete a topic."""
+        return await self.repository.delete(topic_id, without_comments)
+
+    async def get_comment_count(self, topic_id: str) -> Optional[int]:
+        """Get the comment counter of a topic, if the topic exists."""
+        return await self.repository.get_comment_count(topic_id)
+
+    async def increment_comments(
+        self, topic_id: str, amount: int, commented_at: Optional[str] = None
+    ) -> bool:
+        """Increment the comment counter of a topic."""
+        return await self.repository.increment_comments(
+            topic_id, amount, commented_at
+        )
+
+    async def set_comment_stats(
+        self, stats: Dict[str, Tuple[int, Optional[str]]]
+    ) -> int:
+        """Overwrite the comment counters that differ from `stats`."""
+        return await self.repository.set_comment_stats(stats)
+
+
+class CommentRepositoryProxy(CommentRepository):
+    """
+    Comment repository handing every operation to another one, for the
+    repositories layered over another to override only what they change.
+    """
+
+    def __init__(self, repository: CommentRepository) -> None:
+        self.repository = repository
+
+    async def find_by_topic(
+        self,
+        topic_id: str,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Comment]:
+        """Find comments by topic."""
+        return await self.repository.find_by_topic(
+            topic_id, skip, limit, after, before, fields
+        )
+
+    async def search(
+        self,
+        query: List[Dict[str, Any]],
+        term: str,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Any]:
+        """Search for comments."""
+        return await self.repository.search(
+            query, term, skip, limit, after, before, fields
+        )
+
+    async def rank(
+        self, filters: SearchFilters, term: str, limit: int
+    ) -> List[RankedId]:
+        """Rank the ids of the first comments matching a search."""
+        return await self.repository.rank(filters, term, limit)
+
+    async def get_many(
+        self, comment_ids: List[str], fields: Optional[List[str]] = None
+    ) -> List[Comment]:
+        """Get comments by id, in no particular order."""
+        return await self.repository.get_many(comment_ids, fields)
+
+    async def get(
+        self,
+        topic_id: str,
+        comment_id: str,
+        fields: Optional[List[str]] = None,
+    ) -> Optional[Comment]:
+        """Get a comment."""
+        return await self.repository.get(topic_id, comment_id, fields)
+
+    def export(
+        self, topic_id: Optional[str], batch_size: int
+    ) -> AsyncIterator[Comment]:
+        """Iterate over the comments of a topic, or of every topic."""
+        return self.repository.export(topic_id, batch_size)
+
+    async def find_thread(self, topic_id: str, limit: int) -> List[Comment]:
+        """Find the first comments of a topic, sorted by creation."""
+        return await self.repository.find_thread(topic_id, limit)
+
+    async def find_replies(
+        self,
+        topic_id: str,
+        comment_id: str,
+        max_depth: Optional[int],
+        limit: int,
+    ) -> List[Comment]:
+        """Find the first replies under a comment, sorted by creation."""
+        return await self.repository.find_replies(
+            topic_id, comment_id, max_depth, limit
+        )
+
+    async def exists(self, topic_id: str, comment_id: str) -> bool:
+        """Check if a comment exists."""
+        return await self.repository.exists(topic_id, comment_id)
+
+    async def find_existing(
+        self, topic_id: str, comment_ids: List[str]
+    ) -> Set[str]:
+        """Find which of the comments exist."""
+        return await self.repository.find_existing(topic_id, comment_ids)
+
+    async def create(self, comment: Dict[str, Any]) -> str:
+        """Create a comment."""
+        return await self.repository.create(comment)
+
+    async def create_many(
+        self, comments: List[Dict[str, Any]]
+    ) -> Dict[int, str]:
+        """Create comments, getting the errors by index."""
+        return await self.repository.create_many(comments)
+
+    async def update(
+        self, topic_id: str, comment_id: str, comment: Dict[str, Any]
+    ) -> int:
+        """Update a comment."""
+        return await self.repository.update(topic_id, comment_id, comment)
+
+    async def update_and_get(
+        self, topic_id: str, comment_id: str, comment: Dict[str, Any]
+    ) -> Optional[Comment]:
+        """Update a comment and get it back in the same round trip."""
+        return await self.repository.update_and_get(
+            topic_id, comment_id, comment
+        )
+
+    async def delete(self, topic_id: str, comment_id: str) -> int:
+        """Delete a comment."""
+        return await self.repository.delete(topic_id, comment_id)
+
+    async def count_by_topic(self) -> Dict[str, Tuple[int, Optional[str]]]:
+        """Count comments and get the last comment date of every topic."""
+        return await self.repository.count_by_topic()
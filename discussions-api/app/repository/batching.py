@@ -0,0 +1,157 @@
+"""Insert batching repository module."""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import (
+    BulkWriteError,
+    DuplicateKeyError,
+    WriteConcernError,
+    WriteError,
+)
+
+from app.repository.base import CommentRepository, CommentRepositoryProxy
+
+# Code of the write errors raised as DuplicateKeyError by insert_one
+DUPLICATE_KEY = 11000
+
+Pending = Tuple[Dict[str, Any], "asyncio.Future[Any]"]
+
+
+class InsertBatchStats:
+    """Insert batching counters."""
+
+    def __init__(self) -> None:
+        self.batches = 0
+        self.documents = 0
+        self.errors = 0
+
+    def dict(self) -> Dict[str, float]:
+        """Counters as a dict."""
+        return {
+            "batches": self.batches,
+            "documents": self.documents,
+            "errors": self.errors,
+        }
+
+
+class InsertBatcher:
+    """
+    Coalesces concurrent inserts into unordered `insert_many` round trips.
+
+    Inserts are collected for up to `max_delay` seconds, or until
+    `max_size` are pending, then sent at once. Every caller still waits for
+    the acknowledgement of its own document, under the write concern of the
+    collection, and gets the error `insert_one` would have raised for it.
+    Batchers of several collections can share their `stats`.
+    """
+
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection,
+        max_size: int = 500,
+        max_delay: float = 0.005,
+        stats: Optional[InsertBatchStats] = None,
+    ) -> None:
+        self.collection = collection
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.stats = stats if stats is not None else InsertBatchStats()
+        self._pending: List[Pending] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batches: Set["asyncio.Future[None]"] = set()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def insert(self, doc: Dict[str, Any]) -> Any:
+        """Insert a document with the next batch, getting its id."""
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self._pending.append((doc, future))
+        if len(self._pending) >= self.max_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self.flush)
+        # A cancelled caller does not take its document out of the batch
+        return await asyncio.shield(future)
+
+    def flush(self) -> None:
+        """Send the pending documents right away."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        sent = asyncio.ensure_future(self.__send(batch))
+        self._batches.add(sent)
+        sent.add_done_callback(self._batches.discard)
+
+    async def close(self) -> None:
+        """Send the pending documents and wait for every batch to land."""
+        self.flush()
+        if self._batches:
+            await asyncio.gather(*self._batches)
+
+    async def __send(self, batch: List[Pending]) -> None:
+        """
+        Insert a batch at once, then resolve the wait of every document with
+        its id or its own error.
+        """
+        self.stats.batches += 1
+        self.stats.documents += len(batch)
+        errors: Dict[int, Exception] = {}
+        failure: Optional[Exception] = None
+        try:
+            await self.collection.insert_many(
+                [doc for doc, _ in batch], ordered=False
+            )
+        except BulkWriteError as err:
+            for error in err.details["writeErrors"]:
+                errors[error["index"]] = to_write_exception(error)
+            concern_errors = err.details.get("writeConcernErrors")
+            if concern_errors:
+                failure = WriteConcernError(
+                    concern_errors[0]["errmsg"],
+                    concern_errors[0].get("code"),
+                    concern_errors[0],
+                )
+        except Exception as err:
+            failure = err
+        for index, (doc, future) in enumerate(batch):
+            error = errors.get(index, failure)
+            if error is not None:
+                self.stats.errors += 1
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(doc["_id"])
+            else:
+                future.set_exception(error)
+
+
+def to_write_exception(error: Dict[str, Any]) -> WriteError:
+    """Error of a document of a bulk write, as `insert_one` raises it."""
+    if error.get("code") == DUPLICATE_KEY:
+        return DuplicateKeyError(error["errmsg"], error["code"], error)
+    return WriteError(error["errmsg"], error.get("code"), error)
+
+
+class BatchedCommentRepository(CommentRepositoryProxy):
+    """
+    Comment repository sending the comments created one by one through an
+    insert batcher. Every other operation goes to another repository.
+    """
+
+    def __init__(
+        self, repository: CommentRepository, batcher: InsertBatcher
+    ) -> None:
+        super().__init__(repository)
+        self.batcher = batcher
+
+    async def create(self, comment: Dict[str, Any]) -> str:
+        """Create a comment with the next batch of inserts."""
+        comment_id: str = await self.batcher.insert(comment)
+        return comment_id
@@ -0,0 +1,503 @@
+"""Cache repository module."""
+
+import abc
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.domain.comment import Comment
+from app.domain.page import CursorKey
+from app.domain.search import RankedId, SearchFilters
+from app.domain.topic import Topic
+from app.repository.base import (
+    CommentRepository,
+    CommentRepositoryProxy,
+    TopicRepository,
+    TopicRepositoryProxy,
+)
+from app.repository.routing import routing_key
+
+logger = logging.getLogger(__name__)
+
+# Errors of a backend that make the cache fall back to the repository
+CACHE_ERRORS = (OSError, EOFError, asyncio.TimeoutError)
+# How many entry lifetimes a namespace version is kept
+VERSION_TTL_FACTOR = 10
+# Namespace of the search rankings, which writes do not invalidate
+SEARCH_NAMESPACE = "search"
+
+
+class CacheStats:
+    """Cache counters."""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        """Share of lookups served from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def dict(self) -> Dict[str, float]:
+        """Counters as a dict."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "hit_ratio": self.hit_ratio,
+        }
+
+
+class CacheBackend:
+    """Cache storage base, keys are strings and values JSON-like."""
+
+    def __init__(self) -> None:
+        self.stats = CacheStats()
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        """Get a value, telling whether it was found."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        """Set a value for `ttl` seconds."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def delete(self, key: str) -> None:
+        """Delete a value."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def get_version(self, key: str) -> int:
+        """Get a version counter, 0 if it was never incremented."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def incr_version(self, key: str, ttl: float) -> int:
+        """Increment a version counter that lives at least `ttl` seconds."""
+        raise NotImplementedError()
+
+    async def close(self) -> None:
+        """Release the resources held by the backend."""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    In-process backend with least recently used eviction.
+
+    Cached values are shared between callers and must not be mutated.
+    Versions are kept apart from the entries so they are never evicted,
+    they expire after the `ttl` of their last increment instead.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        super().__init__()
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._versions: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        """Get a value, telling whether it was found."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.stats.expirations += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        """Set a value, evicting the least recently used ones if full."""
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    async def delete(self, key: str) -> None:
+        """Delete a value."""
+        self._entries.pop(key, None)
+
+    async def get_version(self, key: str) -> int:
+        """Get a version counter, 0 if it was never incremented."""
+        self.__expire_versions()
+        return self._versions.get(key, (0.0, 0))[1]
+
+    async def incr_version(self, key: str, ttl: float) -> int:
+        """Increment a version counter that lives `ttl` seconds."""
+        self.__expire_versions()
+        version = self._versions.get(key, (0.0, 0))[1] + 1
+        self._versions[key] = (time.monotonic() + ttl, version)
+        self._versions.move_to_end(key)
+        return version
+
+    def __expire_versions(self) -> None:
+        """Drop the expired versions, oldest incremented first."""
+        now = time.monotonic()
+        while self._versions:
+            key, (expires_at, _) = next(iter(self._versions.items()))
+            if expires_at > now:
+                break
+            del self._versions[key]
+
+
+class Cache:
+    """
+    Read-through cache over a backend.
+
+    Concurrent misses for the same key in a process wait for a single load,
+    which is shielded so a cancelled caller does not cancel it for others.
+    Entries are grouped by namespace (a topic): the namespace version is
+    part of their keys, so bumping it invalidates all of them in a single
+    operation, and a load that started before the bump can not cache a
+    stale value under the new version. Backend failures degrade to loading
+    from the repository.
+    """
+
+    def __init__(
+        self, backend: CacheBackend, ttl: float, prefix: str = ""
+    ) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self._loading: Dict[str, "asyncio.Future[Any]"] = {}
+
+    @property
+    def stats(self) -> CacheStats:
+        """Cache counters."""
+        return self.backend.stats
+
+    async def get_or_load(
+        self,
+        namespace: str,
+        key: List[Any],
+        load: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+    ) -> Any:
+        """Get a value of a namespace, loading it on a miss."""
+        try:
+            version = await self.backend.get_version(self.__version(namespace))
+            cache_key = self.__key(namespace, version, key)
+            found, value = await self.backend.get(cache_key)
+        except CACHE_ERRORS as err:
+            logger.warning("cache backend unavailable: %r", err)
+            self.stats.errors += 1
+            return await load()
+        if found:
+            self.stats.hits += 1
+            return value
+        self.stats.misses += 1
+
+        loading = self._loading.get(cache_key)
+        if loading is not None:
+            self.stats.coalesced += 1
+            return await asyncio.shield(loading)
+
+        future = asyncio.ensure_future(
+            self.__load(cache_key, load, self.ttl if ttl is None else ttl)
+        )
+        self._loading[cache_key] = future
+        future.add_done_callback(lambda _: self._loading.pop(cache_key, None))
+        return await asyncio.shield(future)
+
+    async def invalidate(self, namespace: str) -> None:
+        """Invalidate every entry of a namespace."""
+        try:
+            # Versions outlive the entries they invalidate
+            await self.backend.incr_version(
+                self.__version(namespace), self.ttl * VERSION_TTL_FACTOR
+            )
+        except CACHE_ERRORS as err:
+            logger.warning("cache backend unavailable: %r", err)
+            self.stats.errors += 1
+
+    async def close(self) -> None:
+        """Close the backend."""
+        await self.backend.close()
+
+    async def __load(
+        self, cache_key: str, load: Callable[[], Awaitable[Any]], ttl: float
+    ) -> Any:
+        """Load a value and cache it, errors are never cached."""
+        value = await load()
+        try:
+            await self.backend.set(cache_key, value, ttl)
+        except CACHE_ERRORS as err:
+            logger.warning("cache backend unavailable: %r", err)
+            self.stats.errors += 1
+        return value
+
+    def __version(self, namespace: str) -> str:
+        return f"{self.prefix}version:{namespace}"
+
+    def __key(self, namespace: str, version: int, key: List[Any]) -> str:
+        parts = json.dumps(
+            routing_key(list(key)), separators=(",", ":"), default=str
+        )
+        return f"{self.prefix}{namespace}:{version}:{parts}"
+
+
+class CachedTopicRepository(TopicRepositoryProxy):
+    """
+    Topic repository caching single topics of another repository.
+
+    Every write invalidates the cached reads of the topic, creations too as
+    the topic may have been cached missing. Search rankings are not
+    invalidated, they are cached for `search_ttl` seconds instead.
+    """
+
+    def __init__(
+        self,
+        repository: TopicRepository,
+        cache: Cache,
+        search_ttl: Optional[float] = None,
+    ) -> None:
+        super().__init__(repository)
+        self.cache = cache
+        self.search_ttl = search_ttl
+
+    async def rank(
+        self, filters: SearchFilters, term: str, limit: int
+    ) -> List[RankedId]:
+        """Rank the ids of the first topics matching a search."""
+        ranked: List[RankedId] = await self.cache.get_or_load(
+            SEARCH_NAMESPACE,
+            ["topics", filters.dict(), term, limit],
+            lambda: self.repository.rank(filters, term, limit),
+            self.search_ttl,
+        )
+        return ranked
+
+    async def get(
+        self, topic_id: str, fields: Optional[List[str]] = None
+    ) -> Optional[Topic]:
+        """Get a topic."""
+        topic: Optional[Topic] = await self.cache.get_or_load(
+            topic_id,
+            ["topic", fields],
+            lambda: self.repository.get(topic_id, fields),
+        )
+        return topic
+
+    async def create(self, topic: Dict[str, Any]) -> str:
+        """Create a topic."""
+        try:
+            return await self.repository.create(topic)
+        finally:
+            await self.cache.invalidate(topic["_id"])
+
+    async def create_many(
+        self, topics: List[Dict[str, Any]]
+    ) -> Dict[int, str]:
+        """Create topics, getting the errors by index."""
+        try:
+            return await self.repository.create_many(topics)
+        finally:
+            for topic in topics:
+                await self.cache.invalidate(topic["_id"])
+
+    async def update(self, topic_id: str, topic: Dict[str, Any]) -> int:
+        """Update a topic."""
+        try:
+            return await self.repository.update(topic_id, topic)
+        finally:
+            await self.cache.invalidate(topic_id)
+
+    async def update_and_get(
+        self,
+        topic_id: str,
+        topic: Dict[str, Any],
+        without_comments: bool = False,
+    ) -> Optional[Topic]:
+        """Update a topic and get it back in the same round trip."""
+        try:
+            return await self.repository.update_and_get(
+                topic_id, topic, without_comments
+            )
+        finally:
+            await self.cache.invalidate(topic_id)
+
+    async def delete(
+        self, topic_id: str, without_comments: bool = False
+    ) -> int:
+        """Delete a topic."""
+        try:
+            return await self.repository.delete(topic_id, without_comments)
+        finally:
+            await self.cache.invalidate(topic_id)
+
+    async def increment_comments(
+        self, topic_id: str, amount: int, commented_at: Optional[str] = None
+    ) -> bool:
+        """Increment the comment counter of a topic."""
+        try:
+            return await self.repository.increment_comments(
+                topic_id, amount, commented_at
+            )
+        finally:
+            await self.cache.invalidate(topic_id)
+
+    async def set_comment_stats(
+        self, stats: Dict[str, Tuple[int, Optional[str]]]
+    ) -> int:
+        """Overwrite the comment counters that differ from `stats`."""
+        try:
+            return await self.repository.set_comment_stats(stats)
+        finally:
+            for topic_id in stats:
+                await self.cache.invalidate(topic_id)
+
+
+class CachedCommentRepository(CommentRepositoryProxy):
+    """
+    Comment repository caching the comment pages of another repository.
+
+    Every write invalidates all the cached comment pages of the topic at
+    once, along with the topic itself. Search rankings are cached for
+    `search_ttl` seconds instead.
+    """
+
+    def __init__(
+        self,
+        repository: CommentRepository,
+        cache: Cache,
+        search_ttl: Optional[float] = None,
+    ) -> None:
+        super().__init__(repository)
+        self.cache = cache
+        self.search_ttl = search_ttl
+
+    async def find_by_topic(
+        self,
+        topic_id: str,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Comment]:
+        """Find comments by topic."""
+        comments: List[Comment] = await self.cache.get_or_load(
+            topic_id,
+            ["comments", skip, limit, after, before, fields],
+            lambda: self.repository.find_by_topic(
+                topic_id, skip, limit, after, before, fields
+            ),
+        )
+        return comments
+
+    async def rank(
+        self, filters: SearchFilters, term: str, limit: int
+    ) -> List[RankedId]:
+        """Rank the ids of the first comments matching a search."""
+        ranked: List[RankedId] = await self.cache.get_or_load(
+            SEARCH_NAMESPACE,
+            ["comments", filters.dict(), term, limit],
+            lambda: self.repository.rank(filters, term, limit),
+            self.search_ttl,
+        )
+        return ranked
+
+    async def get(
+        self,
+        topic_id: str,
+        comment_id: str,
+        fields: Optional[List[str]] = None,
+    ) -> Optional[Comment]:
+        """Get a comment."""
+        comment: Optional[Comment] = await self.cache.get_or_load(
+            topic_id,
+            ["comment", comment_id, fields],
+            lambda: self.repository.get(topic_id, comment_id, fields),
+        )
+        return comment
+
+    async def find_thread(self, topic_id: str, limit: int) -> List[Comment]:
+        """Find the first comments of a topic, sorted by creation."""
+        comments: List[Comment] = await self.cache.get_or_load(
+            topic_id,
+            ["thread", limit],
+            lambda: self.repository.find_thread(topic_id, limit),
+        )
+        return comments
+
+    async def find_replies(
+        self,
+        topic_id: str,
+        comment_id: str,
+        max_depth: Optional[int],
+        limit: int,
+    ) -> List[Comment]:
+        """Find the first replies under a comment, sorted by creation."""
+        comments: List[Comment] = await self.cache.get_or_load(
+            topic_id,
+            ["replies", comment_id, max_depth, limit],
+            lambda: self.repository.find_replies(
+                topic_id, comment_id, max_depth, limit
+            ),
+        )
+        return comments
+
+    async def create(self, comment: Dict[str, Any]) -> str:
+        """Create a comment."""
+        try:
+            return await self.repository.create(comment)
+        finally:
+            await self.cache.invalidate(comment["topic"])
+
+    async def create_many(
+        self, comments: List[Dict[str, Any]]
+    ) -> Dict[int, str]:
+        """Create comments, getting the errors by index."""
+        try:
+            return await self.repository.create_many(comments)
+        finally:
+            for topic_id in {comment["topic"] for comment in comments}:
+                await self.cache.invalidate(topic_id)
+
+    async def update(
+        self, topic_id: str, comment_id: str, comment: Dict[str, Any]
+    ) -> int:
+        """Update a comment."""
+        try:
+            return await self.repository.update(topic_id, comment_id, comment)
+        finally:
+            await self.cache.invalidate(topic_id)
+
+    async def update_and_get(
+        self, topic_id: str, comment_id: str, comment: Dict[str, Any]
+    ) -> Optional[Comment]:
+        """Update a comment and get it back in the same round trip."""
+        try:
+            return await self.repository.update_and_get(
+                topic_id, comment_id, comment
+            )
+        finally:
+            await self.cache.invalidate(topic_id)
+
+    async def delete(self, topic_id: str, comment_id: str) -> int:
+        """Delete a comment."""
+        try:
+            return await self.repository.delete(topic_id, comment_id)
+        finally:
+            await self.cache.invalidate(topic_id)
@@ -1,50 +1,271 @@
 """Comment repository module."""
 
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
 
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, TEXT, IndexModel, ReturnDocument
+from pymongo.errors import BulkWriteError
 
 from app.domain.comment import Comment
-from app.repository.base import CommentRepository
+from app.domain.page import CursorKey
+from app.domain.search import RankedId, SearchFilters
+from app.metrics import instrument
+from app.repository.base import CommentRepository, to_projection, write_error
+from app.repository.keyset import keyset_filter, keyset_sort
+from app.repository.search import get_many, rank_ids, search_page
 
 
+@instrument("comments")
 class CommentRepositoryMongo(CommentRepository):
     """Comments repository MongoDB."""
 
     DISCUSSION_TYPE = "comment"
+    INDEXES = [
+        IndexModel(
+            [
+                ("type", ASCENDING),
+                ("topic", ASCENDING),
+                ("created", ASCENDING),
+                ("_id", ASCENDING),
+            ]
+        ),
+        # Followed by $graphLookup to walk down the replies
+        IndexModel([("reply", ASCENDING)]),
+    ]
+    # Indexes of a collection of comments only, searched on their own
+    SPLIT_INDEXES = [
+        IndexModel(
+            [("topic", ASCENDING), ("created", ASCENDING), ("_id", ASCENDING)]
+        ),
+        IndexModel([("reply", ASCENDING)]),
+        IndexModel([("content", TEXT)]),
+    ]
 
-    def __init__(self, mongodb_client: AsyncIOMotorClient) -> None:
-        self.mongodb = mongodb_client[CommentRepositoryMongo.COLLECTION_NAME]
+    def __init__(
+        self,
+        mongodb_client: AsyncIOMotorClient,
+        collection_name: Optional[str] = None,
+    ) -> None:
+        """
+        Comments are stored along with the topics, told apart by their
+        type, or in `collection_name` if given, holding comments only.
+        """
+        self.type_filter: Dict[str, Any] = {}
+        if collection_name is None:
+            collection_name = CommentRepositoryMongo.COLLECTION_NAME
+            self.indexes = CommentRepositoryMongo.INDEXES
+            self.type_filter["type"] = CommentRepositoryMongo.DISCUSSION_TYPE
+        else:
+            self.indexes = CommentRepositoryMongo.SPLIT_INDEXES
+        self.collection_name = collection_name
+        self.mongodb = mongodb_client[collection_name]
 
     async def find_by_topic(
-        self, topic_id: str, skip: int = 0, limit: int = 10
+        self,
+        topic_id: str,
+        skip: int = 0,
+        limit: int = 10,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
     ) -> List[Comment]:
         """Find comments by topic."""
         cursor = self.mongodb.find(
-            {"topic": topic_id, "type": CommentRepositoryMongo.DISCUSSION_TYPE}
+            {
+                "topic": topic_id,
+                **self.type_filter,
+                **keyset_filter(CommentRepositoryMongo.SORT, after, before),
+            },
+            to_projection(fields),
         )
+        cursor.sort(keyset_sort(CommentRepositoryMongo.SORT, before))
         cursor.skip(skip).limit(limit)
         comments: List[Comment] = []
         async for doc in cursor:
             comments.append(doc)
+        if before is not None:
+            comments.reverse()
         return comments
 
-    async def get(self, topic_id: str, comment_id: str) -> Optional[Comment]:
+    async def search(
+        self,
+        query: List[Dict[str, Any]],
+        term: str = None,
+        skip: int = 0,
+        limit: int = 10,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Comment]:
+        """Search for comments."""
+        return await search_page(
+            self.mongodb,
+            [*query, self.type_filter],
+            term,
+            CommentRepositoryMongo.SORT,
+            CommentRepositoryMongo.SEARCH_SORT,
+            skip,
+            limit,
+            after,
+            before,
+            fields,
+        )
+
+    async def rank(
+        self, filters: SearchFilters, term: str, limit: int
+    ) -> List[RankedId]:
+        """Rank the ids of the first comments matching a search."""
+        return await rank_ids(
+            self.mongodb,
+            filters,
+            term,
+            CommentRepositoryMongo.SEARCH_SORT,
+            limit,
+            self.type_filter,
+        )
+
+    async def get_many(
+        self, comment_ids: List[str], fields: Optional[List[str]] = None
+    ) -> List[Comment]:
+        """Get comments by id, in no particular order."""
+        return await get_many(
+            self.mongodb, self.type_filter, comment_ids, fields
+        )
+
+    async def get(
+        self,
+        topic_id: str,
+        comment_id: str,
+        fields: Optional[List[str]] = None,
+    ) -> Optional[Comment]:
         """Get a comment."""
         comment = await self.mongodb.find_one(
+            {"_id": comment_id, "topic": topic_id, **self.type_filter},
+            to_projection(fields),
+        )
+        return comment
+
+    async def export(
+        self, topic_id: Optional[str], batch_size: int
+    ) -> AsyncIterator[Comment]:
+        """
+        Iterate over the comments of a topic, or of every topic if it is
+        None, fetching `batch_size` at a time.
+
+        Comments of every topic are read in natural order, as sorting them
+        all could not use an index.
+        """
+        query = dict(self.type_filter)
+        if topic_id is not None:
+            query["topic"] = topic_id
+        cursor = self.mongodb.find(query)
+        if topic_id is not None:
+            cursor.sort(CommentRepositoryMongo.SORT)
+        cursor.batch_size(batch_size)
+        try:
+            async for doc in cursor:
+                yield doc
+        finally:
+            await cursor.close()
+
+    async def find_thread(self, topic_id: str, limit: int) -> List[Comment]:
+        """Find the first comments of a topic, sorted by creation."""
+        cursor = self.mongodb.find({"topic": topic_id, **self.type_filter})
+        cursor.sort(CommentRepositoryMongo.SORT).limit(limit)
+        comments: List[Comment] = await cursor.to_list(length=limit)
+        return comments
+
+    async def find_replies(
+        self,
+        topic_id: str,
+        comment_id: str,
+        max_depth: Optional[int],
+        limit: int,
+    ) -> List[Comment]:
+        """
+        Find the first replies under a comment, sorted by creation.
+
+        Replies of replies are found recursively by a single aggregation,
+        down to `max_depth` levels below the direct replies.
+        """
+        graph_lookup: Dict[str, Any] = {
+            "from": self.collection_name,
+            "startWith": "$_id",
+            "connectFromField": "_id",
+            "connectToField": "reply",
+            "as": "replies",
+            "restrictSearchWithMatch": {
+                "topic": topic_id,
+                **self.type_filter,
+            },
+        }
+        if max_depth is not None:
+            graph_lookup["maxDepth"] = max_depth
+        cursor = self.mongodb.aggregate(
+            [
+                {
+                    "$match": {
+                        "_id": comment_id,
+                        "topic": topic_id,
+                        **self.type_filter,
+                    }
+                },
+                {"$graphLookup": graph_lookup},
+                {"$project": {"replies": 1}},
+                {"$unwind": "$replies"},
+                {"$replaceRoot": {"newRoot": "$replies"}},
+                {"$sort": dict(CommentRepositoryMongo.SORT)},
+                {"$limit": limit},
+            ]
+        )
+        comments: List[Comment] = await cursor.to_list(length=limit)
+        return comments
+
+    async def exists(self, topic_id: str, comment_id: str) -> bool:
+        """Check if a comment exists."""
+        comment = await self.mongodb.find_one(
+            {"_id": comment_id, "topic": topic_id, **self.type_filter},
+            {"_id": 1},
+        )
+        return comment is not None
+
+    async def find_existing(
+        self, topic_id: str, comment_ids: List[str]
+    ) -> Set[str]:
+        """Find which of the comments exist."""
+        cursor = self.mongodb.find(
             {
-                "_id": comment_id,
+                "_id": {"$in": comment_ids},
                 "topic": topic_id,
-                "type": CommentRepositoryMongo.DISCUSSION_TYPE,
-            }
+                **self.type_filter,
+            },
+            {"_id": 1},
         )
-        return comment
+        return {doc["_id"] async for doc in cursor}
 
     async def create(self, comment: Dict[str, Any]) -> str:
         """Create a comment."""
         result = await self.mongodb.insert_one(comment)
         return result.inserted_id
 
+    async def create_many(
+        self, comments: List[Dict[str, Any]]
+    ) -> Dict[int, str]:
+        """
+        Create comments, getting the errors by index.
+
+        The insert is unordered, so a failed comment does not stop the others.
+        """
+        if not comments:
+            return {}
+        try:
+            await self.mongodb.insert_many(comments, ordered=False)
+        except BulkWriteError as err:
+            return {
+                e["index"]: write_error(e) for e in err.details["writeErrors"]
+            }
+        return {}
+
     async def update(
         self, topic_id: str, comment_id: str, comment: Dict[str, Any]
     ) -> int:
@@ -54,9 +275,39 @@ class CommentRepositoryMongo(CommentRepository):
         )
         return result.modified_count
 
+    async def update_and_get(
+        self, topic_id: str, comment_id: str, comment: Dict[str, Any]
+    ) -> Optional[Comment]:
+        """Update a comment and get it back in the same round trip."""
+        updated_comment = await self.mongodb.find_one_and_update(
+            {"_id": comment_id, "topic": topic_id, **self.type_filter},
+            {"$set": comment},
+            return_document=ReturnDocument.AFTER,
+        )
+        return updated_comment
+
     async def delete(self, topic_id: str, comment_id: str) -> int:
         """Delete a comment."""
         result = await self.mongodb.delete_one(
             {"_id": comment_id, "topic": topic_id}
         )
         return result.deleted_count
+
+    async def count_by_topic(self) -> Dict[str, Tuple[int, Optional[str]]]:
+        """Count comments and get the last comment date of every topic."""
+        cursor = self.mongodb.aggregate(
+            [
+                {"$match": self.type_filter},
+                {
+                    "$group": {
+                        "_id": "$topic",
+                        "count": {"$sum": 1},
+                        "last_comment_at": {"$max": "$created"},
+                    }
+                },
+            ]
+        )
+        stats: Dict[str, Tuple[int, Optional[str]]] = {}
+        async for doc in cursor:
+            stats[doc["_id"]] = (doc["count"], doc["last_comment_at"])
+        return stats
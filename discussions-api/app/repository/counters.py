@@ -0,0 +1,77 @@
+"""Comment counters backfill module."""
+
+from typing import Any, Dict, List
+
+from app.repository.comment import CommentRepositoryMongo
+from app.repository.topic import TopicRepositoryMongo
+
+# Matches the topics created before topics kept a comment counter
+WITHOUT_COMMENT_STATS = {"comment_count": {"$exists": False}}
+
+
+async def backfill_comment_stats(
+    topic_repo: TopicRepositoryMongo,
+    comment_repo: CommentRepositoryMongo,
+    batch_size: int,
+) -> int:
+    """
+    Set the comment counter of the topics that have none by counting their
+    comments, `batch_size` topics at a time. Until then those topics can
+    not be changed, as they can not tell whether comments reference them.
+    """
+    cursor = topic_repo.mongodb.find(
+        {**topic_repo.type_filter, **WITHOUT_COMMENT_STATS}, {"_id": 1}
+    ).batch_size(batch_size)
+    topic_ids: List[Any] = []
+    filled = 0
+    async for topic in cursor:
+        topic_ids.append(topic["_id"])
+        if len(topic_ids) >= batch_size:
+            filled += await _fill(topic_repo, comment_repo, topic_ids)
+    if topic_ids:
+        filled += await _fill(topic_repo, comment_repo, topic_ids)
+    return filled
+
+
+async def _fill(
+    topic_repo: TopicRepositoryMongo,
+    comment_repo: CommentRepositoryMongo,
+    topic_ids: List[Any],
+) -> int:
+    """Count the comments of topics and set their counters."""
+    cursor = comment_repo.mongodb.aggregate(
+        [
+            {
+                "$match": {
+                    **comment_repo.type_filter,
+                    "topic": {"$in": topic_ids},
+                }
+            },
+            {
+                "$group": {
+                    "_id": "$topic",
+                    "count": {"$sum": 1},
+                    "last_comment_at": {"$max": "$created"},
+                }
+            },
+        ]
+    )
+    stats: Dict[Any, Dict[str, Any]] = {
+        doc["_id"]: doc async for doc in cursor
+    }
+    filled = 0
+    for topic_id in topic_ids:
+        doc = stats.get(topic_id, {})
+        # Skips the topics filled meanwhile by another run
+        result = await topic_repo.mongodb.update_one(
+            {"_id": topic_id, **WITHOUT_COMMENT_STATS},
+            {
+                "$set": {
+                    "comment_count": doc.get("count", 0),
+                    "last_comment_at": doc.get("last_comment_at"),
+                }
+            },
+        )
+        filled += result.modified_count
+    topic_ids.clear()
+    return filled
@@ -0,0 +1,190 @@
+"""Dual-write repository module."""
+
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from app.domain.comment import Comment
+from app.domain.topic import Topic
+from app.repository.base import (
+    CommentRepository,
+    CommentRepositoryProxy,
+    TopicRepository,
+    TopicRepositoryProxy,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DualWriteTopicRepository(TopicRepositoryProxy):
+    """
+    Topic repository reading from a repository and writing to it, then to
+    a mirror, while the topics move from a collection layout to another.
+
+    The mirror is written only once the write succeeded, and its errors are
+    logged rather than raised: the collections sync reconciles them.
+    """
+
+    def __init__(
+        self, repository: TopicRepository, mirror: TopicRepository
+    ) -> None:
+        super().__init__(repository)
+        self.mirror = mirror
+
+    async def create(self, topic: Dict[str, Any]) -> str:
+        """Create a topic."""
+        topic_id = await self.repository.create(topic)
+        await mirror_write("create topic", self.mirror.create(topic))
+        return topic_id
+
+    async def create_many(
+        self, topics: List[Dict[str, Any]]
+    ) -> Dict[int, str]:
+        """Create topics, getting the errors by index."""
+        errors = await self.repository.create_many(topics)
+        created = [
+            topic for index, topic in enumerate(topics) if index not in errors
+        ]
+        await mirror_write("create topics", self.mirror.create_many(created))
+        return errors
+
+    async def update(self, topic_id: str, topic: Dict[str, Any]) -> int:
+        """Update a topic."""
+        modified = await self.repository.update(topic_id, topic)
+        if modified:
+            await mirror_write(
+                "update topic", self.mirror.update(topic_id, topic)
+            )
+        return modified
+
+    async def update_and_get(
+        self,
+        topic_id: str,
+        topic: Dict[str, Any],
+        without_comments: bool = False,
+    ) -> Optional[Topic]:
+        """Update a topic and get it back in the same round trip."""
+        updated_topic = await self.repository.update_and_get(
+            topic_id, topic, without_comments
+        )
+        if updated_topic is not None:
+            # Already checked, the counters of the mirror may lag behind
+            await mirror_write(
+                "update topic", self.mirror.update(topic_id, topic)
+            )
+        return updated_topic
+
+    async def delete(
+        self, topic_id: str, without_comments: bool = False
+    ) -> int:
+        """Delete a topic."""
+        deleted = await self.repository.delete(topic_id, without_comments)
+        if deleted:
+            await mirror_write("delete topic", self.mirror.delete(topic_id))
+        return deleted
+
+    async def increment_comments(
+        self, topic_id: str, amount: int, commented_at: Optional[str] = None
+    ) -> bool:
+        """Increment the comment counter of a topic."""
+        matched = await self.repository.increment_comments(
+            topic_id, amount, commented_at
+        )
+        if matched:
+            await mirror_write(
+                "increment comments",
+                self.mirror.increment_comments(topic_id, amount, commented_at),
+            )
+        return matched
+
+    async def set_comment_stats(
+        self, stats: Dict[str, Tuple[int, Optional[str]]]
+    ) -> int:
+        """Overwrite the comment counters that differ from `stats`."""
+        fixed = await self.repository.set_comment_stats(stats)
+        await mirror_write(
+            "set comment stats", self.mirror.set_comment_stats(stats)
+        )
+        return fixed
+
+
+class DualWriteCommentRepository(CommentRepositoryProxy):
+    """
+    Comment repository reading from a repository and writing to it, then
+    to a mirror, while the comments move from a collection layout to
+    another. Errors of the mirror are logged rather than raised.
+    """
+
+    def __init__(
+        self, repository: CommentRepository, mirror: CommentRepository
+    ) -> None:
+        super().__init__(repository)
+        self.mirror = mirror
+
+    async def create(self, comment: Dict[str, Any]) -> str:
+        """Create a comment."""
+        comment_id = await self.repository.create(comment)
+        await mirror_write("create comment", self.mirror.create(comment))
+        return comment_id
+
+    async def create_many(
+        self, comments: List[Dict[str, Any]]
+    ) -> Dict[int, str]:
+        """Create comments, getting the errors by index."""
+        errors = await self.repository.create_many(comments)
+        created = [
+            comment
+            for index, comment in enumerate(comments)
+            if index not in errors
+        ]
+        await mirror_write("create comments", self.mirror.create_many(created))
+        return errors
+
+    async def update(
+        self, topic_id: str, comment_id: str, comment: Dict[str, Any]
+    ) -> int:
+        """Update a comment."""
+        modified = await self.repository.update(topic_id, comment_id, comment)
+        if modified:
+            await mirror_write(
+                "update comment",
+                self.mirror.update(topic_id, comment_id, comment),
+            )
+        return modified
+
+    async def update_and_get(
+        self, topic_id: str, comment_id: str, comment: Dict[str, Any]
+    ) -> Optional[Comment]:
+        """Update a comment and get it back in the same round trip."""
+        updated_comment = await self.repository.update_and_get(
+            topic_id, comment_id, comment
+        )
+        if updated_comment is not None:
+            await mirror_write(
+                "update comment",
+                self.mirror.update(topic_id, comment_id, comment),
+            )
+        return updated_comment
+
+    async def delete(self, topic_id: str, comment_id: str) -> int:
+        """Delete a comment."""
+        deleted = await self.repository.delete(topic_id, comment_id)
+        if deleted:
+            await mirror_write(
+                "delete comment", self.mirror.delete(topic_id, comment_id)
+            )
+        return deleted
+
+
+async def mirror_write(operation: str, write: Any) -> None:
+    """
+    Wait for a write to the mirror, logging its errors. A document the
+    collections sync already copied is not an error.
+    """
+    try:
+        await write
+    except DuplicateKeyError:
+        pass
+    except PyMongoError as err:
+        logger.warning("dual write of %s failed: %s", operation, err)
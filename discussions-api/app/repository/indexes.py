@@ -0,0 +1,171 @@
+"""Index migration module."""
+
+from typing import Any, Dict, Iterable, List, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import TEXT, IndexModel
+
+# Options that change the behaviour of an index and must match to be equal
+INDEX_OPTIONS = (
+    "unique",
+    "sparse",
+    "partialFilterExpression",
+    "expireAfterSeconds",
+)
+
+
+class IndexDrift:
+    """An index whose definition in the database differs from the code."""
+
+    def __init__(self, collection: str, name: str, reason: str) -> None:
+        self.collection = collection
+        self.name = name
+        self.reason = reason
+
+    def __str__(self) -> str:
+        return f"{self.collection}.{self.name}: {self.reason}"
+
+
+class IndexReport:
+    """Outcome of comparing the declared indexes with the database."""
+
+    def __init__(self) -> None:
+        self.created: List[str] = []
+        self.missing: List[str] = []
+        self.unchanged: List[str] = []
+        self.undeclared: List[str] = []
+        self.drifted: List[IndexDrift] = []
+
+    @property
+    def has_drift(self) -> bool:
+        """Whether an index differs from its declaration."""
+        return len(self.drifted) > 0
+
+    def lines(self) -> List[str]:
+        """Human readable summary of the report."""
+        lines = [f"created {name}" for name in self.created]
+        lines += [f"missing {name}" for name in self.missing]
+        lines += [f"drifted {drift}" for drift in self.drifted]
+        lines += [f"undeclared {name}" for name in self.undeclared]
+        return lines
+
+
+async def ensure_indexes(
+    mongodb: AsyncIOMotorDatabase,
+    repositories: Iterable[Any],
+    create: bool = True,
+) -> IndexReport:
+    """
+    Create the indexes declared by the repositories that do not exist yet,
+    in the collections the repositories are bound to.
+
+    Indexes that exist with a different definition are reported as drift
+    and left untouched, as rebuilding them is an operational decision.
+    """
+    report = IndexReport()
+    for collection_name, models in _group_by_collection(repositories):
+        collection = mongodb[collection_name]
+        existing = await collection.index_information()
+        existing_specs = {
+            name: _normalize_info(info) for name, info in existing.items()
+        }
+        to_create: List[IndexModel] = []
+        for model in models:
+            name = model.document["name"]
+            qualified_name = f"{collection_name}.{name}"
+            spec = _normalize_model(model)
+            if name in existing_specs:
+                if existing_specs[name] == spec:
+                    report.unchanged.append(qualified_name)
+                else:
+                    report.drifted.append(
+                        IndexDrift(
+                            collection_name,
+                            name,
+                            f"expected {spec}, found {existing_specs[name]}",
+                        )
+                    )
+                continue
+            same_spec = [n for n, s in existing_specs.items() if s == spec]
+            if same_spec:
+                report.drifted.append(
+                    IndexDrift(
+                        collection_name,
+                        name,
+                        f"exists with a different name {same_spec[0]}",
+                    )
+                )
+                continue
+            to_create.append(model)
+
+        declared = {model.document["name"] for model in models}
+        report.undeclared += [
+            f"{collection_name}.{name}"
+            for name in existing
+            if name != "_id_" and name not in declared
+        ]
+        qualified = [
+            f"{collection_name}.{model.document['name']}"
+            for model in to_create
+        ]
+        if to_create and create:
+            await collection.create_indexes(to_create)
+            report.created += qualified
+        else:
+            report.missing += qualified
+    return report
+
+
+def _group_by_collection(
+    repositories: Iterable[Any],
+) -> List[Tuple[str, List[IndexModel]]]:
+    """Group the declared indexes by collection, dropping duplicates."""
+    collections: Dict[str, Dict[str, IndexModel]] = {}
+    for repository in repositories:
+        models = collections.setdefault(repository.collection_name, {})
+        for model in repository.indexes:
+            models.setdefault(model.document["name"], model)
+    return [
+        (name, list(models.values())) for name, models in collections.items()
+    ]
+
+
+def _normalize_model(model: IndexModel) -> Dict[str, Any]:
+    """Comparable spec of a declared index."""
+    document = dict(model.document)
+    keys = list(document.pop("key").items())
+    text_fields = [field for field, kind in keys if kind == TEXT]
+    if text_fields:
+        weights = dict(document.get("weights", {}))
+        document["weights"] = {
+            field: weights.get(field, 1) for field in text_fields
+        }
+        keys = [(f, k) for f, k in keys if k != TEXT]
+        keys += [("_fts", TEXT), ("_ftsx", 1)]
+    return _spec(keys, document)
+
+
+def _normalize_info(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Comparable spec of an index returned by `index_information`."""
+    keys = [(field, kind) for field, kind in info["key"]]
+    return _spec(keys, info)
+
+
+def _spec(
+    keys: List[Tuple[str, Any]], options: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Build a spec from index keys and options."""
+    spec: Dict[str, Any] = {
+        "key": [(field, _direction(kind)) for field, kind in keys]
+    }
+    if "weights" in options:
+        spec["weights"] = dict(options["weights"])
+    for option in INDEX_OPTIONS:
+        if options.get(option):
+            spec[option] = options[option]
+    return spec
+
+
+def _direction(kind: Any) -> Any:
+    """Normalize numeric index directions, as the server may store floats."""
+    return int(kind) if isinstance(kind, (int, float)) else kind
@@ -0,0 +1,43 @@
+"""Keyset pagination module."""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pymongo import ASCENDING
+
+SortSpec = Sequence[Tuple[str, int]]
+
+
+def keyset_filter(
+    sort: SortSpec,
+    after: Optional[Sequence[Any]] = None,
+    before: Optional[Sequence[Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Filter documents strictly after (or before) a key in `sort` order.
+
+    For `[("created", 1), ("_id", 1)]` and a key `(c, i)` this builds
+    `created > c or (created == c and _id > i)`, which an index on the
+    sort fields resolves with a range scan instead of skipping documents.
+    """
+    key = after if after is not None else before
+    if key is None:
+        return {}
+    clauses: List[Dict[str, Any]] = []
+    for position, (field, direction) in enumerate(sort):
+        forward = (direction == ASCENDING) == (after is not None)
+        clause: Dict[str, Any] = {
+            prev_field: key[index]
+            for index, (prev_field, _) in enumerate(sort[:position])
+        }
+        clause[field] = {"$gt" if forward else "$lt": key[position]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+
+def keyset_sort(
+    sort: SortSpec, before: Optional[Sequence[Any]] = None
+) -> List[Tuple[str, int]]:
+    """Sort order to fetch a page; reversed when paging backwards."""
+    if before is None:
+        return list(sort)
+    return [(field, -direction) for field, direction in sort]
@@ -0,0 +1,133 @@
+"""Live updates feed module."""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import PyMongoError
+
+from app.domain.live import DELETE_MARK, LiveEvent, LiveHub
+from app.repository.comment import CommentRepositoryMongo
+
+logger = logging.getLogger(__name__)
+
+KINDS = {
+    "insert": LiveEvent.CREATED,
+    "replace": LiveEvent.UPDATED,
+    "update": LiveEvent.UPDATED,
+    "delete": LiveEvent.DELETED,
+}
+DELETE_MARK_UPDATE = f"updateDescription.updatedFields.{DELETE_MARK}"
+
+
+class ChangeStreamFeed:
+    """
+    Publishes the comment changes of every process to a hub, from a single
+    MongoDB change stream on the comments collection, resumed after the
+    last change on errors.
+
+    A delete only carries the id of the comment, so the comments deleted
+    through the usecase are first marked with their topic, which the update
+    tells whether or not the comment is still there to be looked up. The
+    topic of the comments seen since the feed started is remembered too, up
+    to `max_known` of them, for the deletes made otherwise.
+    """
+
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection,
+        hub: LiveHub,
+        max_known: int = 100000,
+        retry_delay: float = 1.0,
+    ) -> None:
+        self.collection = collection
+        self.hub = hub
+        self.max_known = max_known
+        self.retry_delay = retry_delay
+        self.resume_token: Optional[Dict[str, Any]] = None
+        self._topics: "OrderedDict[str, str]" = OrderedDict()
+        self._task: Optional["asyncio.Future[None]"] = None
+
+    def start(self) -> None:
+        """Follow the change stream in the background."""
+        self._task = asyncio.ensure_future(self.run())
+
+    async def close(self) -> None:
+        """Stop following the change stream."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def run(self) -> None:
+        """Follow the change stream, resuming it after errors."""
+        pipeline: List[Dict[str, Any]] = [
+            {
+                "$match": {
+                    "$or": [
+                        {
+                            "fullDocument.type": (
+                                CommentRepositoryMongo.DISCUSSION_TYPE
+                            )
+                        },
+                        {"operationType": "delete"},
+                        {DELETE_MARK_UPDATE: {"$exists": True}},
+                    ]
+                }
+            }
+        ]
+        while True:
+            try:
+                async with self.collection.watch(
+                    pipeline,
+                    full_document="updateLookup",
+                    resume_after=self.resume_token,
+                ) as stream:
+                    async for change in stream:
+                        self.resume_token = change["_id"]
+                        event = self.to_event(change)
+                        if event is not None:
+                            self.hub.publish(event)
+            except PyMongoError as err:
+                logger.warning("change stream interrupted: %s", err)
+                await asyncio.sleep(self.retry_delay)
+
+    def to_event(self, change: Dict[str, Any]) -> Optional[LiveEvent]:
+        """Event of a change, None if it is not about a known comment."""
+        kind = KINDS.get(change["operationType"])
+        if kind is None:
+            return None
+        comment_id = change["documentKey"]["_id"]
+        comment = change.get("fullDocument")
+        updated_fields = change.get("updateDescription", {}).get(
+            "updatedFields", {}
+        )
+        topic: Optional[str]
+        if DELETE_MARK in updated_fields:
+            # About to be deleted, its delete follows
+            self.__remember(comment_id, updated_fields[DELETE_MARK])
+            return None
+        if kind == LiveEvent.DELETED:
+            topic = self._topics.pop(comment_id, None)
+            comment = {"_id": comment_id, "topic": topic}
+        elif comment is None:
+            # Deleted before the update was looked up, its delete follows
+            return None
+        else:
+            topic = comment["topic"]
+            self.__remember(comment_id, comment["topic"])
+        if topic is None:
+            return None
+        # The resume token is the id, so it stays valid across processes
+        return LiveEvent(change["_id"]["_data"], kind, topic, comment)
+
+    def __remember(self, comment_id: str, topic: str) -> None:
+        """Remember the topic of a comment, forgetting the oldest one."""
+        self._topics[comment_id] = topic
+        self._topics.move_to_end(comment_id)
+        if len(self._topics) > self.max_known:
+            self._topics.popitem(last=False)
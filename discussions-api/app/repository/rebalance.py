@@ -0,0 +1,168 @@
+"""Shards rebalancing module."""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+from app.repository.sharding import HashRing
+
+# Code of the write errors of documents already in the target
+DUPLICATE_KEY = 11000
+# Collection of the shards recording when their documents were last copied
+COPIES_COLLECTION = "rebalance"
+
+
+class RebalanceReport:
+    """Outcome of moving the misplaced documents of a shard collection."""
+
+    def __init__(self, shard: str, collection: str) -> None:
+        self.shard = shard
+        self.collection = collection
+        self.misplaced = 0
+        self.copied = 0
+        self.replaced = 0
+        self.deleted = 0
+
+    def lines(self) -> List[str]:
+        """Human readable summary of the report."""
+        return [
+            f"{self.shard}.{self.collection}: {self.misplaced} misplaced, "
+            f"{self.copied} copied, {self.replaced} replaced, "
+            f"{self.deleted} deleted"
+        ]
+
+
+async def rebalance(
+    shards: List[Any],
+    ring: HashRing,
+    key: str,
+    batch_size: int,
+    fix: bool = True,
+    prune: bool = False,
+) -> List[RebalanceReport]:
+    """
+    Move the documents the `ring` places on another shard than the one
+    holding them, `shards` being the repositories of a collection on every
+    shard of the ring, in order, and `key` the field holding the topic id.
+
+    Misplaced documents are copied to their shard `batch_size` at a time,
+    and the time the copy started is recorded on the shard they are copied
+    from. A copy already there is replaced only if the document was updated
+    since, so running it again picks up the writes made meanwhile.
+
+    With `prune`, run once the ring is in use, the copies are read and
+    written by the API, so a missing copy was deleted there: only the
+    documents created after the last copy started, which never had one,
+    are copied. The documents are then deleted from the shard they left.
+    Without `fix` they are only counted.
+    """
+    reports = []
+    for index, shard in enumerate(shards):
+        report = RebalanceReport(ring.shards[index], shard.collection_name)
+        pending: Dict[int, List[Dict[str, Any]]] = {}
+        copies = shard.mongodb.database[COPIES_COLLECTION]
+        # Topics and comments can share a collection, copied one at a time
+        copy_id = f"{shard.collection_name}:{key}"
+        copied_at: Optional[str] = None
+        if fix and prune:
+            copied_at = await _last_copy(copies, copy_id)
+        elif fix:
+            await copies.update_one(
+                {"_id": copy_id},
+                {"$set": {"copied_at": datetime.now().isoformat()}},
+                upsert=True,
+            )
+        cursor = shard.mongodb.find(shard.type_filter).batch_size(batch_size)
+        async for doc in cursor:
+            target = ring.shard_of(doc[key])
+            if target == index:
+                continue
+            report.misplaced += 1
+            if not fix:
+                continue
+            docs = pending.setdefault(target, [])
+            docs.append(doc)
+            if len(docs) >= batch_size:
+                await _move(shard, shards[target], docs, copied_at, report)
+        for target, docs in pending.items():
+            if docs:
+                await _move(shard, shards[target], docs, copied_at, report)
+        reports.append(report)
+    return reports
+
+
+async def _last_copy(copies: Any, copy_id: str) -> str:
+    """Time the last copy of some documents started."""
+    last_copy = await copies.find_one({"_id": copy_id})
+    if last_copy is None:
+        raise ValueError(f"{copy_id} was never copied, copy it before pruning")
+    copied_at: str = last_copy["copied_at"]
+    return copied_at
+
+
+async def _move(
+    source: Any,
+    target: Any,
+    docs: List[Dict[str, Any]],
+    copied_at: Optional[str],
+    report: RebalanceReport,
+) -> None:
+    """
+    Copy documents to their shard, then delete them from the source if
+    pruning, the copies being in use since `copied_at`.
+    """
+    ids = [doc["_id"] for doc in docs]
+    cursor = target.mongodb.find({"_id": {"$in": ids}}, {"updated": 1})
+    copies = {copy["_id"]: copy async for copy in cursor}
+    missing = [
+        doc
+        for doc in docs
+        if doc["_id"] not in copies
+        and (copied_at is None or doc["created"] >= copied_at)
+    ]
+    try:
+        if missing:
+            await target.mongodb.insert_many(missing, ordered=False)
+    except BulkWriteError as err:
+        if any(
+            error["code"] != DUPLICATE_KEY
+            for error in err.details["writeErrors"]
+        ):
+            raise
+    report.copied += len(missing)
+    for doc in docs:
+        copy = copies.get(doc["_id"])
+        if copy is not None and _newer(doc, copy):
+            await target.mongodb.replace_one({"_id": doc["_id"]}, doc)
+            report.replaced += 1
+    if copied_at is not None:
+        result = await source.mongodb.delete_many({"_id": {"$in": ids}})
+        report.deleted += result.deleted_count
+    docs.clear()
+
+
+def _newer(doc: Dict[str, Any], copy: Dict[str, Any]) -> bool:
+    """Whether a document was updated after its copy."""
+    updated = _as_datetime(doc.get("updated"))
+    if updated is None:
+        return False
+    copy_updated = _as_datetime(copy.get("updated"))
+    return copy_updated is None or updated > copy_updated
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    """
+    Parse a stored date, an ISO string when dumped with the document or a
+    datetime when updated, as naive local time like datetime.now().
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
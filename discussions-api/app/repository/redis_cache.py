@@ -0,0 +1,183 @@
+"""Redis cache backend module."""
+
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+from app.repository.cache import CacheBackend
+
+
+class RedisError(ConnectionError):
+    """Custom error that is raised when the server replies with an error."""
+
+
+class RedisConnection:
+    """Connection speaking the Redis serialization protocol (RESP2)."""
+
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    async def execute(self, *args: Any) -> Any:
+        """Send a command and read its reply."""
+        self.writer.write(self.__encode(args))
+        await self.writer.drain()
+        return await self.__read_reply()
+
+    async def close(self) -> None:
+        """Close the connection."""
+        self.writer.close()
+        await self.writer.wait_closed()
+
+    def __encode(self, args: Tuple[Any, ...]) -> bytes:
+        """Encode a command as an array of bulk strings."""
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    async def __read_reply(self) -> Any:
+        """Read a single reply."""
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by the cache server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            size = int(payload)
+            if size == -1:
+                return None
+            data = await self.reader.readexactly(size + 2)
+            return data[:-2]
+        if kind == b"*":
+            size = int(payload)
+            if size == -1:
+                return None
+            return [await self.__read_reply() for _ in range(size)]
+        raise RedisError(f"unexpected reply {line!r}")
+
+
+class RedisClient:
+    """Pool of connections to a Redis compatible server."""
+
+    def __init__(
+        self, url: str, pool_size: int = 10, timeout: float = 1.0
+    ) -> None:
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._pool: "asyncio.LifoQueue[Optional[RedisConnection]]" = (
+            asyncio.LifoQueue()
+        )
+        self._connections: Set[RedisConnection] = set()
+        # Connections are opened lazily, the pool holds placeholders
+        for _ in range(pool_size):
+            self._pool.put_nowait(None)
+
+    async def execute(self, *args: Any) -> Any:
+        """Run a command on a pooled connection."""
+        connection = await self._pool.get()
+        try:
+            if connection is None:
+                connection = await self.__connect()
+            reply = await asyncio.wait_for(
+                connection.execute(*args), self.timeout
+            )
+        except BaseException:
+            # The connection state is unknown after a failure
+            if connection is not None:
+                self._connections.discard(connection)
+                connection.writer.close()
+            self._pool.put_nowait(None)
+            raise
+        self._pool.put_nowait(connection)
+        return reply
+
+    async def close(self) -> None:
+        """Close every open connection."""
+        for connection in list(self._connections):
+            await connection.close()
+        self._connections.clear()
+
+    async def __connect(self) -> RedisConnection:
+        """Open a connection and select the database."""
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        connection = RedisConnection(reader, writer)
+        try:
+            if self.password:
+                await connection.execute("AUTH", self.password)
+            if self.db:
+                await connection.execute("SELECT", self.db)
+        except BaseException:
+            writer.close()
+            raise
+        self._connections.add(connection)
+        return connection
+
+
+class RedisCacheBackend(CacheBackend):
+    """Backend shared by every worker through a Redis compatible server."""
+
+    def __init__(self, client: RedisClient) -> None:
+        super().__init__()
+        self.client = client
+
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        """Get a value, telling whether it was found."""
+        data = await self.client.execute("GET", key)
+        if data is None:
+            return False, None
+        return True, json.loads(data, object_hook=_decode_datetime)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        """Set a value for `ttl` seconds."""
+        data = json.dumps(value, separators=(",", ":"), default=_encode)
+        await self.client.execute("SET", key, data, "PX", int(ttl * 1000))
+
+    async def delete(self, key: str) -> None:
+        """Delete a value."""
+        await self.client.execute("DEL", key)
+
+    async def get_version(self, key: str) -> int:
+        """Get a version counter, 0 if it was never incremented."""
+        version = await self.client.execute("GET", key)
+        return int(version) if version is not None else 0
+
+    async def incr_version(self, key: str, ttl: float) -> int:
+        """Increment a version counter that lives at least `ttl` seconds."""
+        version: int = await self.client.execute("INCR", key)
+        await self.client.execute("PEXPIRE", key, int(ttl * 1000))
+        return version
+
+    async def close(self) -> None:
+        """Close the connections to the server."""
+        await self.client.close()
+
+
+def _encode(value: Any) -> Any:
+    """Encode the values JSON does not support, keeping datetimes typed."""
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    return str(value)
+
+
+def _decode_datetime(value: Any) -> Any:
+    """Decode the datetimes encoded by `_encode`."""
+    if isinstance(value, dict) and len(value) == 1 and "$date" in value:
+        return datetime.fromisoformat(value["$date"])
+    return value
@@ -0,0 +1,226 @@
+"""Read routing repository module."""
+
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from app.domain.comment import Comment
+from app.domain.page import CursorKey
+from app.domain.search import RankedId, SearchFilters
+from app.domain.topic import Topic
+from app.repository.base import (
+    CommentRepository,
+    CommentRepositoryProxy,
+    TopicRepository,
+    TopicRepositoryProxy,
+)
+
+# Whether the reads of the request must see the writes its client made,
+# set from the consistency token the client sent back
+READ_YOUR_WRITES: ContextVar[bool] = ContextVar(
+    "read_your_writes", default=False
+)
+
+
+def routing_key(key: List[Any]) -> List[Any]:
+    """
+    Key of a read for the caches and coalescing over the routing, as the
+    reads of a client that must see its writes can not share the result of
+    a read sent to the replicas.
+    """
+    if READ_YOUR_WRITES.get():
+        return [*key, "read-your-writes"]
+    return key
+
+
+class ReadRoutingTopicRepository(TopicRepositoryProxy):
+    """
+    Topic repository sending some reads to a replica of another one.
+
+    The `operations` read from `replica`, a repository of the same
+    collections preferring the secondaries, unless the client of the
+    request must see its writes. Every other read and every write goes to
+    `repository`.
+    """
+
+    def __init__(
+        self,
+        repository: TopicRepository,
+        replica: TopicRepository,
+        operations: Set[str],
+    ) -> None:
+        super().__init__(repository)
+        self.replica = replica
+        self.operations = operations
+
+    def reader(self, operation: str) -> TopicRepository:
+        """Repository a read operation goes to."""
+        if operation in self.operations and not READ_YOUR_WRITES.get():
+            return self.replica
+        return self.repository
+
+    async def find(
+        self,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Topic]:
+        """Find topics."""
+        return await self.reader("find").find(
+            skip, limit, after, before, fields
+        )
+
+    async def search(
+        self,
+        query: List[Dict[str, Any]],
+        term: str,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Any]:
+        """Search for topics."""
+        return await self.reader("search").search(
+            query, term, skip, limit, after, before, fields
+        )
+
+    async def rank(
+        self, filters: SearchFilters, term: str, limit: int
+    ) -> List[RankedId]:
+        """Rank the ids of the first topics matching a search."""
+        return await self.reader("rank").rank(filters, term, limit)
+
+    async def get_many(
+        self, topic_ids: List[str], fields: Optional[List[str]] = None
+    ) -> List[Topic]:
+        """Get topics by id, in no particular order."""
+        return await self.reader("get_many").get_many(topic_ids, fields)
+
+    async def get(
+        self, topic_id: str, fields: Optional[List[str]] = None
+    ) -> Optional[Topic]:
+        """Get a topic."""
+        return await self.reader("get").get(topic_id, fields)
+
+    def export(self, batch_size: int) -> AsyncIterator[Topic]:
+        """Iterate over every topic, fetching `batch_size` at a time."""
+        return self.reader("export").export(batch_size)
+
+    async def get_comment_count(self, topic_id: str) -> Optional[int]:
+        """Get the comment counter of a topic, if the topic exists."""
+        return await self.reader("get_comment_count").get_comment_count(
+            topic_id
+        )
+
+
+class ReadRoutingCommentRepository(CommentRepositoryProxy):
+    """
+    Comment repository sending the `operations` reads to a replica of
+    another one, unless the client of the request must see its writes.
+    """
+
+    def __init__(
+        self,
+        repository: CommentRepository,
+        replica: CommentRepository,
+        operations: Set[str],
+    ) -> None:
+        super().__init__(repository)
+        self.replica = replica
+        self.operations = operations
+
+    def reader(self, operation: str) -> CommentRepository:
+        """Repository a read operation goes to."""
+        if operation in self.operations and not READ_YOUR_WRITES.get():
+            return self.replica
+        return self.repository
+
+    async def find_by_topic(
+        self,
+        topic_id: str,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Comment]:
+        """Find comments by topic."""
+        return await self.reader("find_by_topic").find_by_topic(
+            topic_id, skip, limit, after, before, fields
+        )
+
+    async def search(
+        self,
+        query: List[Dict[str, Any]],
+        term: str,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Any]:
+        """Search for comments."""
+        return await self.reader("search").search(
+            query, term, skip, limit, after, before, fields
+        )
+
+    async def rank(
+        self, filters: SearchFilters, term: str, limit: int
+    ) -> List[RankedId]:
+        """Rank the ids of the first comments matching a search."""
+        return await self.reader("rank").rank(filters, term, limit)
+
+    async def get_many(
+        self, comment_ids: List[str], fields: Optional[List[str]] = None
+    ) -> List[Comment]:
+        """Get comments by id, in no particular order."""
+        return await self.reader("get_many").get_many(comment_ids, fields)
+
+    async def get(
+        self,
+        topic_id: str,
+        comment_id: str,
+        fields: Optional[List[str]] = None,
+    ) -> Optional[Comment]:
+        """Get a comment."""
+        return await self.reader("get").get(topic_id, comment_id, fields)
+
+    def export(
+        self, topic_id: Optional[str], batch_size: int
+    ) -> AsyncIterator[Comment]:
+        """Iterate over the comments of a topic, or of every topic."""
+        return self.reader("export").export(topic_id, batch_size)
+
+    async def find_thread(self, topic_id: str, limit: int) -> List[Comment]:
+        """Find the first comments of a topic, sorted by creation."""
+        return await self.reader("find_thread").find_thread(topic_id, limit)
+
+    async def find_replies(
+        self,
+        topic_id: str,
+        comment_id: str,
+        max_depth: Optional[int],
+        limit: int,
+    ) -> List[Comment]:
+        """Find the first replies under a comment, sorted by creation."""
+        return await self.reader("find_replies").find_replies(
+            topic_id, comment_id, max_depth, limit
+        )
+
+    async def exists(self, topic_id: str, comment_id: str) -> bool:
+        """Check if a comment exists."""
+        return await self.reader("exists").exists(topic_id, comment_id)
+
+    async def find_existing(
+        self, topic_id: str, comment_ids: List[str]
+    ) -> Set[str]:
+        """Find which of the comments exist."""
+        return await self.reader("find_existing").find_existing(
+            topic_id, comment_ids
+        )
+
+    async def count_by_topic(self) -> Dict[str, Tuple[int, Optional[str]]]:
+        """Count comments and get the last comment date of every topic."""
+        return await self.reader("count_by_topic").count_by_topic()
@@ -0,0 +1,127 @@
+"""Text search module."""
+
+from typing import Any, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app.domain.page import CursorKey
+from app.domain.search import RankedId, SearchFilters
+from app.repository.base import to_projection
+from app.repository.keyset import SortSpec, keyset_filter, keyset_sort
+
+
+def to_search_query(filters: SearchFilters) -> List[Dict[str, Any]]:
+    """MongoDB conditions of the search filters."""
+    query: List[Dict[str, Any]] = []
+    if filters.topic is not None:
+        query.append({"topic": filters.topic})
+    if filters.username is not None:
+        query.append({"username": filters.username})
+    if created := filters.created_range():
+        query.append({"created": created})
+    if filters.has_comments is not None:
+        # Missing counters are topics without comments
+        commented: Dict[str, Any] = {"$gt": 0}
+        query.append(
+            {
+                "comment_count": commented
+                if filters.has_comments
+                else {"$not": commented}
+            }
+        )
+    return query
+
+
+async def search_page(
+    collection: AsyncIOMotorCollection,
+    query: List[Dict[str, Any]],
+    term: Optional[str],
+    sort: SortSpec,
+    search_sort: SortSpec,
+    skip: int = 0,
+    limit: int = 10,
+    after: Optional[CursorKey] = None,
+    before: Optional[CursorKey] = None,
+    fields: Optional[List[str]] = None,
+) -> List[Any]:
+    """
+    Find a page of the documents matching all of `query`, in `sort` order,
+    or by relevance to a text search `term` in `search_sort` order.
+    """
+    query = list(query)
+    if not term:
+        query.append(keyset_filter(sort, after, before))
+        cursor = collection.find({"$and": query}, to_projection(fields))
+        cursor.sort(keyset_sort(sort, before))
+        cursor.skip(skip).limit(limit)
+    else:
+        # The text score only exists inside the query, so paging on it
+        # needs an aggregation
+        query.append({"$text": {"$search": term}})
+        pipeline: List[Dict[str, Any]] = [
+            {"$match": {"$and": query}},
+            {"$addFields": {"score": {"$meta": "textScore"}}},
+        ]
+        if after is not None or before is not None:
+            pipeline.append(
+                {"$match": keyset_filter(search_sort, after, before)}
+            )
+        pipeline.append({"$sort": dict(keyset_sort(search_sort, before))})
+        if skip:
+            pipeline.append({"$skip": skip})
+        pipeline.append({"$limit": limit})
+        if fields is not None:
+            # The score is kept, as the page cursors point to it
+            pipeline.append({"$project": to_projection([*fields, "score"])})
+        cursor = collection.aggregate(pipeline)
+
+    docs: List[Any] = []
+    async for doc in cursor:
+        docs.append(doc)
+    if before is not None:
+        docs.reverse()
+    return docs
+
+
+async def rank_ids(
+    collection: AsyncIOMotorCollection,
+    filters: SearchFilters,
+    term: str,
+    search_sort: SortSpec,
+    limit: int,
+    query: Dict[str, Any],
+) -> List[RankedId]:
+    """Score and id of the first `limit` documents matching a search."""
+    cursor = collection.aggregate(
+        [
+            {
+                "$match": {
+                    "$and": [
+                        query,
+                        *to_search_query(filters),
+                        {"$text": {"$search": term}},
+                    ]
+                }
+            },
+            {"$addFields": {"score": {"$meta": "textScore"}}},
+            {"$sort": dict(search_sort)},
+            {"$limit": limit},
+            {"$project": {"score": 1}},
+        ]
+    )
+    return [[doc["score"], doc["_id"]] async for doc in cursor]
+
+
+async def get_many(
+    collection: AsyncIOMotorCollection,
+    query: Dict[str, Any],
+    ids: List[str],
+    fields: Optional[List[str]] = None,
+) -> List[Any]:
+    """Get the documents matching `query` by id, in no particular order."""
+    if not ids:
+        return []
+    cursor = collection.find(
+        {"_id": {"$in": ids}, **query}, to_projection(fields)
+    )
+    return [doc async for doc in cursor]
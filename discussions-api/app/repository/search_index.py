@@ -0,0 +1,366 @@
+"""Search index repository module."""
+
+import abc
+import fcntl
+import json
+import logging
+import os
+from typing import IO, Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.domain.bm25 import InvertedIndex
+from app.domain.comment import Comment
+from app.domain.search import RankedId, SearchFilters
+from app.domain.topic import Topic
+from app.repository.base import (
+    CommentRepository,
+    CommentRepositoryProxy,
+    TopicRepository,
+    TopicRepositoryProxy,
+)
+
+logger = logging.getLogger(__name__)
+
+TOPIC = "topic"
+COMMENT = "comment"
+# Text fields of the indexed documents, weighted as the MongoDB text index
+WEIGHTS = {
+    TOPIC: {"title": 10.0, "content": 2.0},
+    COMMENT: {"content": 2.0},
+}
+# Fields the searches are filtered on
+ATTRIBUTES = ("topic", "username", "created", "comment_count")
+SNAPSHOT_VERSION = 1
+
+
+class SnapshotInUse(Exception):
+    """
+    Custom error that is raised when another process uses the same search
+    snapshot.
+    """
+
+    def __init__(self, path: str, message: str) -> None:
+        self.path = path
+        self.message = message
+        super().__init__(message)
+
+
+class SearchBackend:
+    """Search engine base, ranking topics and comments apart."""
+
+    @abc.abstractmethod
+    async def rank(
+        self, kind: str, filters: SearchFilters, term: str, limit: int
+    ) -> List[RankedId]:
+        """Rank the ids of the first documents of a kind matching a search."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def index(self, kind: str, doc: Any) -> None:
+        """Index a document, or update the fields of an indexed one."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def update_attributes(
+        self, kind: str, doc_id: str, attributes: Dict[str, Any]
+    ) -> None:
+        """Update the filtered fields of a document, if it is indexed."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def increment(
+        self, kind: str, doc_id: str, field: str, amount: int
+    ) -> None:
+        """Increment a counter of an indexed document."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def remove(self, kind: str, doc_id: str) -> None:
+        """Remove a document."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def rebuild(
+        self, topics: AsyncIterator[Topic], comments: AsyncIterator[Comment]
+    ) -> None:
+        """Index every topic and comment from scratch."""
+        raise NotImplementedError()
+
+    async def open(self) -> bool:
+        """Load the persisted index, telling whether there was one."""
+        return False
+
+    async def close(self) -> None:
+        """Persist the index and release its resources."""
+
+
+class MemorySearchBackend(SearchBackend):
+    """
+    In-process BM25 search engine, snapshotted to a file.
+
+    The index only follows the writes of its own process, so it is meant
+    for a single process: the snapshot of a stopped process is stale for
+    the writes made while it was down. It is removed once loaded, so that
+    a process that did not stop cleanly has its index rebuilt rather than
+    loaded from an older snapshot. A snapshot is locked by the process
+    using it, a second process sharing it refuses to open it.
+    """
+
+    def __init__(self, snapshot_path: Optional[str] = None) -> None:
+        self.snapshot_path = snapshot_path
+        self.indexes = {kind: InvertedIndex(WEIGHTS[kind]) for kind in WEIGHTS}
+        self._lock: Optional[IO[str]] = None
+
+    async def rank(
+        self, kind: str, filters: SearchFilters, term: str, limit: int
+    ) -> List[RankedId]:
+        """Rank the ids of the first documents of a kind matching a search."""
+        return self.indexes[kind].search(term, limit, filters.accepts)
+
+    async def index(self, kind: str, doc: Any) -> None:
+        """Index a document, or update the fields of an indexed one."""
+        index = self.indexes[kind]
+        attributes = {a: doc[a] for a in ATTRIBUTES if a in doc}
+        texts = {f: doc[f] for f in index.weights if doc.get(f) is not None}
+        if texts or doc["_id"] not in index:
+            index.add(doc["_id"], texts, attributes)
+        else:
+            index.update_attributes(doc["_id"], **attributes)
+
+    async def update_attributes(
+        self, kind: str, doc_id: str, attributes: Dict[str, Any]
+    ) -> None:
+        """Update the filtered fields of a document, if it is indexed."""
+        index = self.indexes[kind]
+        if doc_id in index:
+            index.update_attributes(doc_id, **attributes)
+
+    async def increment(
+        self, kind: str, doc_id: str, field: str, amount: int
+    ) -> None:
+        """Increment a counter of an indexed document."""
+        index = self.indexes[kind]
+        if doc_id in index:
+            value = index.attributes[doc_id].get(field) or 0
+            index.update_attributes(doc_id, **{field: value + amount})
+
+    async def remove(self, kind: str, doc_id: str) -> None:
+        """Remove a document."""
+        self.indexes[kind].remove(doc_id)
+
+    async def rebuild(
+        self, topics: AsyncIterator[Topic], comments: AsyncIterator[Comment]
+    ) -> None:
+        """Index every topic and comment from scratch."""
+        for index in self.indexes.values():
+            index.clear()
+        async for topic in topics:
+            await self.index(TOPIC, topic)
+        async for comment in comments:
+            await self.index(COMMENT, comment)
+
+    async def open(self) -> bool:
+        """Load the snapshot and remove it, telling whether there was one."""
+        if not self.snapshot_path:
+            return False
+        self.__lock(self.snapshot_path)
+        if not os.path.exists(self.snapshot_path):
+            return False
+        with open(self.snapshot_path) as snapshot:
+            data = json.load(snapshot)
+        if data.get("version") != SNAPSHOT_VERSION:
+            logger.warning("ignoring search snapshot %s", self.snapshot_path)
+            return False
+        for kind, index in self.indexes.items():
+            index.load(data["indexes"][kind])
+        os.remove(self.snapshot_path)
+        return True
+
+    async def close(self) -> None:
+        """Write the snapshot, replacing the previous one at once."""
+        if not self.snapshot_path:
+            return
+        self.__lock(self.snapshot_path)
+        data = {
+            "version": SNAPSHOT_VERSION,
+            "indexes": {
+                kind: index.dump() for kind, index in self.indexes.items()
+            },
+        }
+        partial = f"{self.snapshot_path}.tmp"
+        with open(partial, "w") as snapshot:
+            json.dump(data, snapshot, separators=(",", ":"))
+        os.replace(partial, self.snapshot_path)
+        self.__unlock()
+
+    def __lock(self, path: str) -> None:
+        """Lock the snapshot, raising if another process holds it."""
+        if self._lock is not None:
+            return
+        lock = open(f"{path}.lock", "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            raise SnapshotInUse(
+                path=path,
+                message=f"search snapshot {path} is used by another process",
+            )
+        self._lock = lock
+
+    def __unlock(self) -> None:
+        """Release the lock of the snapshot."""
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+
+class IndexedTopicRepository(TopicRepositoryProxy):
+    """
+    Topic repository ranking searches with a search backend instead of the
+    database, and indexing the writes of another repository.
+    """
+
+    def __init__(
+        self, repository: TopicRepository, backend: SearchBackend
+    ) -> None:
+        super().__init__(repository)
+        self.backend = backend
+
+    async def rank(
+        self, filters: SearchFilters, term: str, limit: int
+    ) -> List[RankedId]:
+        """Rank the ids of the first topics matching a search."""
+        return await self.backend.rank(TOPIC, filters, term, limit)
+
+    async def create(self, topic: Dict[str, Any]) -> str:
+        """Create a topic."""
+        topic_id = await self.repository.create(topic)
+        await self.backend.index(TOPIC, topic)
+        return topic_id
+
+    async def create_many(
+        self, topics: List[Dict[str, Any]]
+    ) -> Dict[int, str]:
+        """Create topics, getting the errors by index."""
+        errors = await self.repository.create_many(topics)
+        for i, topic in enumerate(topics):
+            if i not in errors:
+                await self.backend.index(TOPIC, topic)
+        return errors
+
+    async def update(self, topic_id: str, topic: Dict[str, Any]) -> int:
+        """Update a topic."""
+        modified = await self.repository.update(topic_id, topic)
+        if modified:
+            await self.backend.index(TOPIC, {**topic, "_id": topic_id})
+        return modified
+
+    async def update_and_get(
+        self,
+        topic_id: str,
+        topic: Dict[str, Any],
+        without_comments: bool = False,
+    ) -> Optional[Topic]:
+        """Update a topic and get it back in the same round trip."""
+        updated_topic = await self.repository.update_and_get(
+            topic_id, topic, without_comments
+        )
+        if updated_topic is not None:
+            await self.backend.index(TOPIC, updated_topic)
+        return updated_topic
+
+    async def delete(
+        self, topic_id: str, without_comments: bool = False
+    ) -> int:
+        """Delete a topic."""
+        deleted = await self.repository.delete(topic_id, without_comments)
+        if deleted:
+            await self.backend.remove(TOPIC, topic_id)
+        return deleted
+
+    async def increment_comments(
+        self, topic_id: str, amount: int, commented_at: Optional[str] = None
+    ) -> bool:
+        """Increment the comment counter of a topic."""
+        found = await self.repository.increment_comments(
+            topic_id, amount, commented_at
+        )
+        if found:
+            await self.backend.increment(
+                TOPIC, topic_id, "comment_count", amount
+            )
+        return found
+
+    async def set_comment_stats(
+        self, stats: Dict[str, Tuple[int, Optional[str]]]
+    ) -> int:
+        """Overwrite the comment counters that differ from `stats`."""
+        fixed = await self.repository.set_comment_stats(stats)
+        # Topics missing from the index are not added for a counter
+        for topic_id, (count, _) in stats.items():
+            await self.backend.update_attributes(
+                TOPIC, topic_id, {"comment_count": count}
+            )
+        return fixed
+
+
+class IndexedCommentRepository(CommentRepositoryProxy):
+    """
+    Comment repository ranking searches with a search backend instead of
+    the database, and indexing the writes of another repository.
+    """
+
+    def __init__(
+        self, repository: CommentRepository, backend: SearchBackend
+    ) -> None:
+        super().__init__(repository)
+        self.backend = backend
+
+    async def rank(
+        self, filters: SearchFilters, term: str, limit: int
+    ) -> List[RankedId]:
+        """Rank the ids of the first comments matching a search."""
+        return await self.backend.rank(COMMENT, filters, term, limit)
+
+    async def create(self, comment: Dict[str, Any]) -> str:
+        """Create a comment."""
+        comment_id = await self.repository.create(comment)
+        await self.backend.index(COMMENT, comment)
+        return comment_id
+
+    async def create_many(
+        self, comments: List[Dict[str, Any]]
+    ) -> Dict[int, str]:
+        """Create comments, getting the errors by index."""
+        errors = await self.repository.create_many(comments)
+        for i, comment in enumerate(comments):
+            if i not in errors:
+                await self.backend.index(COMMENT, comment)
+        return errors
+
+    async def update(
+        self, topic_id: str, comment_id: str, comment: Dict[str, Any]
+    ) -> int:
+        """Update a comment."""
+        modified = await self.repository.update(topic_id, comment_id, comment)
+        if modified:
+            await self.backend.index(COMMENT, {**comment, "_id": comment_id})
+        return modified
+
+    async def update_and_get(
+        self, topic_id: str, comment_id: str, comment: Dict[str, Any]
+    ) -> Optional[Comment]:
+        """Update a comment and get it back in the same round trip."""
+        updated_comment = await self.repository.update_and_get(
+            topic_id, comment_id, comment
+        )
+        if updated_comment is not None:
+            await self.backend.index(COMMENT, updated_comment)
+        return updated_comment
+
+    async def delete(self, topic_id: str, comment_id: str) -> int:
+        """Delete a comment."""
+        deleted = await self.repository.delete(topic_id, comment_id)
+        if deleted:
+            await self.backend.remove(COMMENT, comment_id)
+        return deleted
@@ -0,0 +1,493 @@
+"""Sharding repository module."""
+
+import asyncio
+import bisect
+import functools
+import hashlib
+import heapq
+import itertools
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from pymongo import ASCENDING
+
+from app.domain.comment import Comment
+from app.domain.page import CursorKey
+from app.domain.search import RankedId, SearchFilters
+from app.domain.topic import Topic
+from app.repository.base import CommentRepository, TopicRepository
+from app.repository.keyset import SortSpec
+
+
+class HashRing:
+    """
+    Consistent hashing of topic ids onto shards.
+
+    Every shard owns `vnodes` points of a ring of 64-bit hashes of its
+    name, and a topic belongs to the shard owning the first point at or
+    after the hash of its id. Adding a shard only moves the topics of the
+    points it takes, about 1 in N + 1, and the order of the shards does
+    not matter. Hashes are stable across processes.
+    """
+
+    def __init__(self, shards: Sequence[str], vnodes: int = 64) -> None:
+        if not shards:
+            raise ValueError("a hash ring needs at least one shard")
+        if len(set(shards)) != len(shards):
+            raise ValueError("shard names must be unique")
+        self.shards = list(shards)
+        points = sorted(
+            (hash_key(f"{name}#{vnode}"), index)
+            for index, name in enumerate(self.shards)
+            for vnode in range(vnodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [index for _, index in points]
+
+    def __len__(self) -> int:
+        return len(self.shards)
+
+    def shard_of(self, key: str) -> int:
+        """Index of the shard a topic id belongs to."""
+        position = bisect.bisect_left(self._hashes, hash_key(key))
+        return self._owners[position % len(self._owners)]
+
+
+def hash_key(key: str) -> int:
+    """64-bit hash of a key, the same in every process."""
+    digest = hashlib.md5(key.encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def merge_pages(
+    pages: List[List[Any]],
+    sort: SortSpec,
+    skip: int,
+    limit: int,
+    before: Optional[CursorKey] = None,
+) -> List[Any]:
+    """
+    Merge the pages the shards returned for the same query into one.
+
+    Each page holds up to `skip + limit` documents in `sort` order, so
+    the first ones in that order, or the last ones when paging `before` a
+    cursor, are among them. A document found twice, copied to another
+    shard by a rebalancing, is kept once.
+    """
+    merged: List[Any] = []
+    for doc in heapq.merge(*pages, key=sort_key(sort)):
+        if not merged or merged[-1]["_id"] != doc["_id"]:
+            merged.append(doc)
+    if before is not None:
+        # The page ends `skip` documents before the cursor
+        merged.reverse()
+        page = merged[skip:][:limit]
+        page.reverse()
+        return page
+    return merged[skip:][:limit]
+
+
+def sort_key(sort: SortSpec) -> Callable[[Any], Any]:
+    """Key function ordering documents like MongoDB would in `sort`."""
+
+    def compare(left: Any, right: Any) -> int:
+        for field, direction in sort:
+            if left[field] != right[field]:
+                less = left[field] < right[field]
+                return -1 if less == (direction == ASCENDING) else 1
+        return 0
+
+    return functools.cmp_to_key(compare)
+
+
+async def gather_shards(calls: List[Awaitable[Any]]) -> List[Any]:
+    """Wait for a query sent to several shards at once."""
+    return list(await asyncio.gather(*calls))
+
+
+class ShardedTopicRepository(TopicRepository):
+    """
+    Topic repository spreading the topics over shards by their id.
+
+    A topic is read and written on its shard only. Listings and searches
+    are sent to every shard at once and their pages merged in sort order.
+    """
+
+    def __init__(self, shards: List[TopicRepository], ring: HashRing) -> None:
+        if len(shards) != len(ring):
+            raise ValueError("a repository is needed for every shard")
+        self.shards = shards
+        self.ring = ring
+
+    def shard(self, topic_id: str) -> TopicRepository:
+        """Repository of the shard of a topic."""
+        return self.shards[self.ring.shard_of(topic_id)]
+
+    async def find(
+        self,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Topic]:
+        """Find topics."""
+        pages = await gather_shards(
+            [
+                shard.find(0, skip + limit, after, before, fields)
+                for shard in self.shards
+            ]
+        )
+        return merge_pages(pages, self.SORT, skip, limit, before)
+
+    async def search(
+        self,
+        query: List[Dict[str, Any]],
+        term: str,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Any]:
+        """Search for topics."""
+        pages = await gather_shards(
+            [
+                shard.search(
+                    query, term, 0, skip + limit, after, before, fields
+                )
+                for shard in self.shards
+            ]
+        )
+        sort = self.SEARCH_SORT if term else self.SORT
+        return merge_pages(pages, sort, skip, limit, before)
+
+    async def rank(
+        self, filters: SearchFilters, term: str, limit: int
+    ) -> List[RankedId]:
+        """Rank the ids of the first topics matching a search."""
+        rankings = await gather_shards(
+            [shard.rank(filters, term, limit) for shard in self.shards]
+        )
+        return merge_rankings(rankings, limit)
+
+    async def get_many(
+        self, topic_ids: List[str], fields: Optional[List[str]] = None
+    ) -> List[Topic]:
+        """Get topics by id, in no particular order."""
+        by_shard = group_by_shard(self.ring, topic_ids)
+        found = await gather_shards(
+            [
+                self.shards[index].get_many(
+                    [topic_ids[position] for position in positions], fields
+                )
+                for index, positions in by_shard.items()
+            ]
+        )
+        return [topic for topics in found for topic in topics]
+
+    async def get(
+        self, topic_id: str, fields: Optional[List[str]] = None
+    ) -> Optional[Topic]:
+        """Get a topic."""
+        return await self.shard(topic_id).get(topic_id, fields)
+
+    async def export(self, batch_size: int) -> AsyncIterator[Topic]:
+        """Iterate over every topic, one shard after the other."""
+        for shard in self.shards:
+            async for topic in shard.export(batch_size):
+                yield topic
+
+    async def create(self, topic: Dict[str, Any]) -> str:
+        """Create a topic."""
+        return await self.shard(topic["_id"]).create(topic)
+
+    async def create_many(
+        self, topics: List[Dict[str, Any]]
+    ) -> Dict[int, str]:
+        """Create topics, getting the errors by index."""
+        by_shard = group_by_shard(
+            self.ring, [topic["_id"] for topic in topics]
+        )
+        results = await gather_shards(
+            [
+                self.shards[index].create_many(
+                    [topics[position] for position in positions]
+                )
+                for index, positions in by_shard.items()
+            ]
+        )
+        return remap_errors(list(by_shard.values()), results)
+
+    async def update(self, topic_id: str, topic: Dict[str, Any]) -> int:
+        """Update a topic."""
+        return await self.shard(topic_id).update(topic_id, topic)
+
+    async def update_and_get(
+        self,
+        topic_id: str,
+        topic: Dict[str, Any],
+        without_comments: bool = False,
+    ) -> Optional[Topic]:
+        """Update a topic and get it back in the same round trip."""
+        return await self.shard(topic_id).update_and_get(
+            topic_id, topic, without_comments
+        )
+
+    async def delete(
+        self, topic_id: str, without_comments: bool = False
+    ) -> int:
+        """Delete a topic."""
+        return await self.shard(topic_id).delete(topic_id, without_comments)
+
+    async def get_comment_count(self, topic_id: str) -> Optional[int]:
+        """Get the comment counter of a topic, if the topic exists."""
+        return await self.shard(topic_id).get_comment_count(topic_id)
+
+    async def increment_comments(
+        self, topic_id: str, amount: int, commented_at: Optional[str] = None
+    ) -> bool:
+        """Increment the comment counter of a topic."""
+        return await self.shard(topic_id).increment_comments(
+            topic_id, amount, commented_at
+        )
+
+    async def set_comment_stats(
+        self, stats: Dict[str, Tuple[int, Optional[str]]]
+    ) -> int:
+        """Overwrite the comment counters that differ from `stats`."""
+        # Every shard only walks its own topics
+        fixed = await gather_shards(
+            [shard.set_comment_stats(stats) for shard in self.shards]
+        )
+        return sum(fixed)
+
+
+class ShardedCommentRepository(CommentRepository):
+    """
+    Comment repository keeping the comments on the shard of their topic.
+
+    Reads of a topic go to its shard only. Searches not filtered on a
+    topic, and comments looked up by id alone, are sent to every shard.
+    """
+
+    def __init__(
+        self, shards: List[CommentRepository], ring: HashRing
+    ) -> None:
+        if len(shards) != len(ring):
+            raise ValueError("a repository is needed for every shard")
+        self.shards = shards
+        self.ring = ring
+
+    def shard(self, topic_id: str) -> CommentRepository:
+        """Repository of the shard of a topic."""
+        return self.shards[self.ring.shard_of(topic_id)]
+
+    def shards_of(self, topic_id: Optional[str]) -> List[CommentRepository]:
+        """Shards holding the comments of a topic, or of every topic."""
+        if topic_id is None:
+            return self.shards
+        return [self.shard(topic_id)]
+
+    async def find_by_topic(
+        self,
+        topic_id: str,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Comment]:
+        """Find comments by topic."""
+        return await self.shard(topic_id).find_by_topic(
+            topic_id, skip, limit, after, before, fields
+        )
+
+    async def search(
+        self,
+        query: List[Dict[str, Any]],
+        term: str,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Any]:
+        """Search for comments."""
+        topics = [
+            condition["topic"]
+            for condition in query
+            if isinstance(condition.get("topic"), str)
+        ]
+        shards = self.shards_of(topics[0] if topics else None)
+        pages = await gather_shards(
+            [
+                shard.search(
+                    query, term, 0, skip + limit, after, before, fields
+                )
+                for shard in shards
+            ]
+        )
+        sort = self.SEARCH_SORT if term else self.SORT
+        return merge_pages(pages, sort, skip, limit, before)
+
+    async def rank(
+        self, filters: SearchFilters, term: str, limit: int
+    ) -> List[RankedId]:
+        """Rank the ids of the first comments matching a search."""
+        rankings = await gather_shards(
+            [
+                shard.rank(filters, term, limit)
+                for shard in self.shards_of(filters.topic)
+            ]
+        )
+        return merge_rankings(rankings, limit)
+
+    async def get_many(
+        self, comment_ids: List[str], fields: Optional[List[str]] = None
+    ) -> List[Comment]:
+        """Get comments by id, in no particular order."""
+        if not comment_ids:
+            return []
+        # Without their topic, the comments may be on any shard
+        found = await gather_shards(
+            [shard.get_many(comment_ids, fields) for shard in self.shards]
+        )
+        comments: Dict[str, Comment] = {}
+        for shard_comments in found:
+            for comment in shard_comments:
+                comments.setdefault(comment["_id"], comment)
+        return list(comments.values())
+
+    async def get(
+        self,
+        topic_id: str,
+        comment_id: str,
+        fields: Optional[List[str]] = None,
+    ) -> Optional[Comment]:
+        """Get a comment."""
+        return await self.shard(topic_id).get(topic_id, comment_id, fields)
+
+    async def export(
+        self, topic_id: Optional[str], batch_size: int
+    ) -> AsyncIterator[Comment]:
+        """Iterate over the comments of a topic, or of every topic."""
+        for shard in self.shards_of(topic_id):
+            async for comment in shard.export(topic_id, batch_size):
+                yield comment
+
+    async def find_thread(self, topic_id: str, limit: int) -> List[Comment]:
+        """Find the first comments of a topic, sorted by creation."""
+        return await self.shard(topic_id).find_thread(topic_id, limit)
+
+    async def find_replies(
+        self,
+        topic_id: str,
+        comment_id: str,
+        max_depth: Optional[int],
+        limit: int,
+    ) -> List[Comment]:
+        """Find the first replies under a comment, sorted by creation."""
+        return await self.shard(topic_id).find_replies(
+            topic_id, comment_id, max_depth, limit
+        )
+
+    async def exists(self, topic_id: str, comment_id: str) -> bool:
+        """Check if a comment exists."""
+        return await self.shard(topic_id).exists(topic_id, comment_id)
+
+    async def find_existing(
+        self, topic_id: str, comment_ids: List[str]
+    ) -> Set[str]:
+        """Find which of the comments exist."""
+        return await self.shard(topic_id).find_existing(topic_id, comment_ids)
+
+    async def create(self, comment: Dict[str, Any]) -> str:
+        """Create a comment."""
+        return await self.shard(comment["topic"]).create(comment)
+
+    async def create_many(
+        self, comments: List[Dict[str, Any]]
+    ) -> Dict[int, str]:
+        """Create comments, getting the errors by index."""
+        by_shard = group_by_shard(
+            self.ring, [comment["topic"] for comment in comments]
+        )
+        results = await gather_shards(
+            [
+                self.shards[index].create_many(
+                    [comments[position] for position in positions]
+                )
+                for index, positions in by_shard.items()
+            ]
+        )
+        return remap_errors(list(by_shard.values()), results)
+
+    async def update(
+        self, topic_id: str, comment_id: str, comment: Dict[str, Any]
+    ) -> int:
+        """Update a comment."""
+        return await self.shard(topic_id).update(topic_id, comment_id, comment)
+
+    async def update_and_get(
+        self, topic_id: str, comment_id: str, comment: Dict[str, Any]
+    ) -> Optional[Comment]:
+        """Update a comment and get it back in the same round trip."""
+        return await self.shard(topic_id).update_and_get(
+            topic_id, comment_id, comment
+        )
+
+    async def delete(self, topic_id: str, comment_id: str) -> int:
+        """Delete a comment."""
+        return await self.shard(topic_id).delete(topic_id, comment_id)
+
+    async def count_by_topic(self) -> Dict[str, Tuple[int, Optional[str]]]:
+        """Count comments and get the last comment date of every topic."""
+        counts = await gather_shards(
+            [shard.count_by_topic() for shard in self.shards]
+        )
+        # The comments of a topic are all on the same shard
+        return {
+            topic_id: stats
+            for shard_counts in counts
+            for topic_id, stats in shard_counts.items()
+        }
+
+
+def group_by_shard(
+    ring: HashRing, topic_ids: List[str]
+) -> Dict[int, List[int]]:
+    """Positions of the documents of a batch, by shard of their topic."""
+    by_shard: Dict[int, List[int]] = {}
+    for position, topic_id in enumerate(topic_ids):
+        by_shard.setdefault(ring.shard_of(topic_id), []).append(position)
+    return by_shard
+
+
+def remap_errors(
+    positions: List[List[int]], results: List[Dict[int, str]]
+) -> Dict[int, str]:
+    """Errors of the sub-batches of the shards, by index in the batch."""
+    return {
+        shard_positions[index]: error
+        for shard_positions, errors in zip(positions, results)
+        for index, error in errors.items()
+    }
+
+
+def merge_rankings(
+    rankings: List[List[RankedId]], limit: int
+) -> List[RankedId]:
+    """First `limit` ids of the rankings of the shards, best score first."""
+    merged = heapq.merge(*rankings, key=lambda ranked: (-ranked[0], ranked[1]))
+    return list(itertools.islice(merged, limit))
@@ -0,0 +1,413 @@
+"""Single-flight repository module."""
+
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.domain.comment import Comment
+from app.domain.page import CursorKey
+from app.domain.search import RankedId, SearchFilters
+from app.domain.topic import Topic
+from app.repository.base import (
+    CommentRepository,
+    CommentRepositoryProxy,
+    TopicRepository,
+    TopicRepositoryProxy,
+)
+from app.repository.routing import routing_key
+
+
+class SingleFlightStats:
+    """Single-flight counters."""
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def dict(self) -> Dict[str, float]:
+        """Counters as a dict."""
+        return {
+            "queries": self.queries,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent reads into a single query.
+
+    A read whose key is already in flight waits for that query's result,
+    which every waiter shares and must not mutate, rather than sending its
+    own. The query is shielded, so a cancelled caller does not cancel it
+    for the others, and a waiter that waits more than `timeout` seconds
+    sends its own query. Errors are shared the same way and never kept.
+    """
+
+    def __init__(self, timeout: Optional[float] = None) -> None:
+        self.timeout = timeout
+        self.stats = SingleFlightStats()
+        self._flights: Dict[str, "asyncio.Future[Any]"] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(
+        self, key: List[Any], load: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Load the value of a key, or wait for the load in flight."""
+        flight_key = json.dumps(
+            routing_key(key), separators=(",", ":"), default=str
+        )
+        flight = self._flights.get(flight_key)
+        if flight is not None:
+            try:
+                value = await asyncio.wait_for(
+                    asyncio.shield(flight), self.timeout
+                )
+            except asyncio.TimeoutError:
+                # Only the wait is cancelled, the query goes on for others
+                self.stats.timeouts += 1
+                self.stats.queries += 1
+                return await load()
+            self.stats.coalesced += 1
+            return value
+
+        self.stats.queries += 1
+        flight = asyncio.ensure_future(load())
+        self._flights[flight_key] = flight
+        flight.add_done_callback(lambda done: self.__land(flight_key, done))
+        return await asyncio.shield(flight)
+
+    def forget(self) -> None:
+        """
+        Make the next reads send new queries, once data was written. The
+        queries in flight still answer the reads waiting for them.
+        """
+        self._flights.clear()
+
+    def __land(self, flight_key: str, flight: "asyncio.Future[Any]") -> None:
+        if self._flights.get(flight_key) is flight:
+            del self._flights[flight_key]
+        # Retrieved, so an error nobody waits for anymore is not logged
+        if not flight.cancelled():
+            flight.exception()
+
+
+class SingleFlightTopicRepository(TopicRepositoryProxy):
+    """
+    Topic repository coalescing the identical concurrent reads of another
+    repository. Writes make the next reads send new queries.
+    """
+
+    def __init__(
+        self, repository: TopicRepository, flights: SingleFlight
+    ) -> None:
+        super().__init__(repository)
+        self.flights = flights
+
+    async def find(
+        self,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Topic]:
+        """Find topics."""
+        topics: List[Topic] = await self.flights.do(
+            ["topics.find", skip, limit, after, before, fields],
+            lambda: self.repository.find(skip, limit, after, before, fields),
+        )
+        return topics
+
+    async def search(
+        self,
+        query: List[Dict[str, Any]],
+        term: str,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Any]:
+        """Search for topics."""
+        topics: List[Any] = await self.flights.do(
+            ["topics.search", query, term, skip, limit, after, before, fields],
+            lambda: self.repository.search(
+                query, term, skip, limit, after, before, fields
+            ),
+        )
+        return topics
+
+    async def rank(
+        self, filters: SearchFilters, term: str, limit: int
+    ) -> List[RankedId]:
+        """Rank the ids of the first topics matching a search."""
+        ranked: List[RankedId] = await self.flights.do(
+            ["topics.rank", filters.dict(), term, limit],
+            lambda: self.repository.rank(filters, term, limit),
+        )
+        return ranked
+
+    async def get_many(
+        self, topic_ids: List[str], fields: Optional[List[str]] = None
+    ) -> List[Topic]:
+        """Get topics by id, in no particular order."""
+        topics: List[Topic] = await self.flights.do(
+            ["topics.get_many", topic_ids, fields],
+            lambda: self.repository.get_many(topic_ids, fields),
+        )
+        return topics
+
+    async def get(
+        self, topic_id: str, fields: Optional[List[str]] = None
+    ) -> Optional[Topic]:
+        """Get a topic."""
+        topic: Optional[Topic] = await self.flights.do(
+            ["topics.get", topic_id, fields],
+            lambda: self.repository.get(topic_id, fields),
+        )
+        return topic
+
+    async def create(self, topic: Dict[str, Any]) -> str:
+        """Create a topic."""
+        try:
+            return await self.repository.create(topic)
+        finally:
+            self.flights.forget()
+
+    async def create_many(
+        self, topics: List[Dict[str, Any]]
+    ) -> Dict[int, str]:
+        """Create topics, getting the errors by index."""
+        try:
+            return await self.repository.create_many(topics)
+        finally:
+            self.flights.forget()
+
+    async def update(self, topic_id: str, topic: Dict[str, Any]) -> int:
+        """Update a topic."""
+        try:
+            return await self.repository.update(topic_id, topic)
+        finally:
+            self.flights.forget()
+
+    async def update_and_get(
+        self,
+        topic_id: str,
+        topic: Dict[str, Any],
+        without_comments: bool = False,
+    ) -> Optional[Topic]:
+        """Update a topic and get it back in the same round trip."""
+        try:
+            return await self.repository.update_and_get(
+                topic_id, topic, without_comments
+            )
+        finally:
+            self.flights.forget()
+
+    async def delete(
+        self, topic_id: str, without_comments: bool = False
+    ) -> int:
+        """Delete a topic."""
+        try:
+            return await self.repository.delete(topic_id, without_comments)
+        finally:
+            self.flights.forget()
+
+    async def get_comment_count(self, topic_id: str) -> Optional[int]:
+        """Get the comment counter of a topic, if the topic exists."""
+        count: Optional[int] = await self.flights.do(
+            ["topics.get_comment_count", topic_id],
+            lambda: self.repository.get_comment_count(topic_id),
+        )
+        return count
+
+    async def increment_comments(
+        self, topic_id: str, amount: int, commented_at: Optional[str] = None
+    ) -> bool:
+        """Increment the comment counter of a topic."""
+        try:
+            return await self.repository.increment_comments(
+                topic_id, amount, commented_at
+            )
+        finally:
+            self.flights.forget()
+
+    async def set_comment_stats(
+        self, stats: Dict[str, Tuple[int, Optional[str]]]
+    ) -> int:
+        """Overwrite the comment counters that differ from `stats`."""
+        try:
+            return await self.repository.set_comment_stats(stats)
+        finally:
+            self.flights.forget()
+
+
+class SingleFlightCommentRepository(CommentRepositoryProxy):
+    """
+    Comment repository coalescing the identical concurrent reads of another
+    repository. Writes make the next reads send new queries.
+    """
+
+    def __init__(
+        self, repository: CommentRepository, flights: SingleFlight
+    ) -> None:
+        super().__init__(repository)
+        self.flights = flights
+
+    async def find_by_topic(
+        self,
+        topic_id: str,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Comment]:
+        """Find comments by topic."""
+        comments: List[Comment] = await self.flights.do(
+            ["comments.find", topic_id, skip, limit, after, before, fields],
+            lambda: self.repository.find_by_topic(
+                topic_id, skip, limit, after, before, fields
+            ),
+        )
+        return comments
+
+    async def search(
+        self,
+        query: List[Dict[str, Any]],
+        term: str,
+        skip: int,
+        limit: int,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Any]:
+        """Search for comments."""
+        comments: List[Any] = await self.flights.do(
+            [
+                "comments.search",
+                query,
+                term,
+                skip,
+                limit,
+                after,
+                before,
+                fields,
+            ],
+            lambda: self.repository.search(
+                query, term, skip, limit, after, before, fields
+            ),
+        )
+        return comments
+
+    async def rank(
+        self, filters: SearchFilters, term: str, limit: int
+    ) -> List[RankedId]:
+        """Rank the ids of the first comments matching a search."""
+        ranked: List[RankedId] = await self.flights.do(
+            ["comments.rank", filters.dict(), term, limit],
+            lambda: self.repository.rank(filters, term, limit),
+        )
+        return ranked
+
+    async def get_many(
+        self, comment_ids: List[str], fields: Optional[List[str]] = None
+    ) -> List[Comment]:
+        """Get comments by id, in no particular order."""
+        comments: List[Comment] = await self.flights.do(
+            ["comments.get_many", comment_ids, fields],
+            lambda: self.repository.get_many(comment_ids, fields),
+        )
+        return comments
+
+    async def get(
+        self,
+        topic_id: str,
+        comment_id: str,
+        fields: Optional[List[str]] = None,
+    ) -> Optional[Comment]:
+        """Get a comment."""
+        comment: Optional[Comment] = await self.flights.do(
+            ["comments.get", topic_id, comment_id, fields],
+            lambda: self.repository.get(topic_id, comment_id, fields),
+        )
+        return comment
+
+    async def find_thread(self, topic_id: str, limit: int) -> List[Comment]:
+        """Find the first comments of a topic, sorted by creation."""
+        comments: List[Comment] = await self.flights.do(
+            ["comments.thread", topic_id, limit],
+            lambda: self.repository.find_thread(topic_id, limit),
+        )
+        return comments
+
+    async def find_replies(
+        self,
+        topic_id: str,
+        comment_id: str,
+        max_depth: Optional[int],
+        limit: int,
+    ) -> List[Comment]:
+        """Find the first replies under a comment, sorted by creation."""
+        comments: List[Comment] = await self.flights.do(
+            ["comments.replies", topic_id, comment_id, max_depth, limit],
+            lambda: self.repository.find_replies(
+                topic_id, comment_id, max_depth, limit
+            ),
+        )
+        return comments
+
+    async def exists(self, topic_id: str, comment_id: str) -> bool:
+        """Check if a comment exists."""
+        exists: bool = await self.flights.do(
+            ["comments.exists", topic_id, comment_id],
+            lambda: self.repository.exists(topic_id, comment_id),
+        )
+        return exists
+
+    async def create(self, comment: Dict[str, Any]) -> str:
+        """Create a comment."""
+        try:
+            return await self.repository.create(comment)
+        finally:
+            self.flights.forget()
+
+    async def create_many(
+        self, comments: List[Dict[str, Any]]
+    ) -> Dict[int, str]:
+        """Create comments, getting the errors by index."""
+        try:
+            return await self.repository.create_many(comments)
+        finally:
+            self.flights.forget()
+
+    async def update(
+        self, topic_id: str, comment_id: str, comment: Dict[str, Any]
+    ) -> int:
+        """Update a comment."""
+        try:
+            return await self.repository.update(topic_id, comment_id, comment)
+        finally:
+            self.flights.forget()
+
+    async def update_and_get(
+        self, topic_id: str, comment_id: str, comment: Dict[str, Any]
+    ) -> Optional[Comment]:
+        """Update a comment and get it back in the same round trip."""
+        try:
+            return await self.repository.update_and_get(
+                topic_id, comment_id, comment
+            )
+        finally:
+            self.flights.forget()
+
+    async def delete(self, topic_id: str, comment_id: str) -> int:
+        """Delete a comment."""
+        try:
+            return await self.repository.delete(topic_id, comment_id)
+        finally:
+            self.flights.forget()
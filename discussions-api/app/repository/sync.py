@@ -0,0 +1,161 @@
+"""Collections sync module."""
+
+from typing import Any, Dict, List, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorCursor
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
+
+# Code of the write errors of documents already in the target
+DUPLICATE_KEY = 11000
+
+
+class SyncReport:
+    """Outcome of comparing the documents of a collection with another."""
+
+    def __init__(self, source: str, target: str) -> None:
+        self.source = source
+        self.target = target
+        self.missing = 0
+        self.extra = 0
+        self.changed = 0
+        self.unchanged = 0
+
+    @property
+    def in_sync(self) -> bool:
+        """Whether the target holds exactly the documents of the source."""
+        return self.missing == self.extra == self.changed == 0
+
+    def lines(self) -> List[str]:
+        """Human readable summary of the report."""
+        return [
+            f"{self.source} -> {self.target}: {self.unchanged} unchanged, "
+            f"{self.missing} missing, {self.extra} extra, "
+            f"{self.changed} changed"
+        ]
+
+
+async def sync_collection(
+    source: Any, target: Any, batch_size: int, fix: bool = True
+) -> SyncReport:
+    """
+    Make the documents of the `target` repository those of `source`, their
+    collections and type filters being read from the repositories.
+
+    Both are read in `_id` order, `batch_size` documents per round trip,
+    and merged. Missing documents are inserted `batch_size` at a time,
+    extra ones deleted and changed ones replaced, unless `fix` is false
+    and the differences are only counted. Memory stays constant whatever
+    the size of the collections, and running it again resumes a copy.
+
+    Documents written while syncing are checked again in the source right
+    before being fixed, so that documents dual writes created are not
+    deleted, nor deleted ones copied back. Running it until it reports no
+    difference leaves the collections in sync.
+    """
+    report = SyncReport(source.collection_name, target.collection_name)
+    to_insert: List[Dict[str, Any]] = []
+    to_delete: List[Any] = []
+    source_cursor = _ordered(source, batch_size)
+    target_cursor = _ordered(target, batch_size)
+    source_doc = await _next(source_cursor)
+    target_doc = await _next(target_cursor)
+    try:
+        while source_doc is not None or target_doc is not None:
+            if source_doc is not None and (
+                target_doc is None or source_doc["_id"] < target_doc["_id"]
+            ):
+                report.missing += 1
+                to_insert.append(source_doc)
+                source_doc = await _next(source_cursor)
+            elif target_doc is not None and (
+                source_doc is None or target_doc["_id"] < source_doc["_id"]
+            ):
+                report.extra += 1
+                to_delete.append(target_doc["_id"])
+                target_doc = await _next(target_cursor)
+            elif source_doc == target_doc:
+                report.unchanged += 1
+                source_doc = await _next(source_cursor)
+                target_doc = await _next(target_cursor)
+            else:
+                report.changed += 1
+                if fix and target_doc is not None:
+                    await _replace(source, target, target_doc["_id"])
+                source_doc = await _next(source_cursor)
+                target_doc = await _next(target_cursor)
+            if not fix:
+                to_insert.clear()
+                to_delete.clear()
+            if len(to_insert) >= batch_size:
+                await _insert(source, target, to_insert)
+            if len(to_delete) >= batch_size:
+                await _delete(source, target, to_delete)
+        if to_insert:
+            await _insert(source, target, to_insert)
+        if to_delete:
+            await _delete(source, target, to_delete)
+    finally:
+        await source_cursor.close()
+        await target_cursor.close()
+    return report
+
+
+def _ordered(repository: Any, batch_size: int) -> AsyncIOMotorCursor:
+    """Documents of a repository in `_id` order."""
+    cursor = repository.mongodb.find(repository.type_filter)
+    return cursor.sort([("_id", ASCENDING)]).batch_size(batch_size)
+
+
+async def _next(cursor: AsyncIOMotorCursor) -> Optional[Dict[str, Any]]:
+    """Next document of a cursor, None once exhausted."""
+    try:
+        doc: Dict[str, Any] = await cursor.__anext__()
+    except StopAsyncIteration:
+        return None
+    return doc
+
+
+async def _existing(source: Any, ids: List[Any]) -> Set[Any]:
+    """Ids of the documents still in the source."""
+    cursor = source.mongodb.find(
+        {"_id": {"$in": ids}, **source.type_filter}, {"_id": 1}
+    )
+    return {doc["_id"] async for doc in cursor}
+
+
+async def _insert(
+    source: Any, target: Any, docs: List[Dict[str, Any]]
+) -> None:
+    """
+    Insert the documents still in the source, those already written by
+    dual writes aside.
+    """
+    existing = await _existing(source, [doc["_id"] for doc in docs])
+    docs[:] = [doc for doc in docs if doc["_id"] in existing]
+    try:
+        if docs:
+            await target.mongodb.insert_many(docs, ordered=False)
+    except BulkWriteError as err:
+        if any(
+            error["code"] != DUPLICATE_KEY
+            for error in err.details["writeErrors"]
+        ):
+            raise
+    docs.clear()
+
+
+async def _delete(source: Any, target: Any, ids: List[Any]) -> None:
+    """Delete the documents by id, unless they are now in the source."""
+    existing = await _existing(source, ids)
+    extra = [doc_id for doc_id in ids if doc_id not in existing]
+    if extra:
+        await target.mongodb.delete_many({"_id": {"$in": extra}})
+    ids.clear()
+
+
+async def _replace(source: Any, target: Any, doc_id: Any) -> None:
+    """Replace a document with its current version in the source."""
+    doc = await source.mongodb.find_one({"_id": doc_id, **source.type_filter})
+    if doc is not None:
+        await target.mongodb.replace_one({"_id": doc_id}, doc)
@@ -1,30 +1,86 @@
 """Topic repository module."""
 
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, TEXT, IndexModel, ReturnDocument
+from pymongo.errors import BulkWriteError
 
+from app.domain.page import CursorKey
+from app.domain.search import RankedId, SearchFilters
 from app.domain.topic import Topic
-from app.repository.base import TopicRepository
+from app.metrics import instrument
+from app.repository.base import TopicRepository, to_projection, write_error
+from app.repository.keyset import keyset_filter, keyset_sort
+from app.repository.search import get_many, rank_ids, search_page
 
 
+@instrument("topics")
 class TopicRepositoryMongo(TopicRepository):
     """Topics repository MongoDB."""
 
     DISCUSSION_TYPE = "topic"
+    # Matches topics that can still be changed, not the ones whose counter
+    # is not backfilled yet, which could be referenced by comments
+    WITHOUT_COMMENTS = {"comment_count": {"$lte": 0}}
+    TEXT_INDEX = IndexModel(
+        [("title", TEXT), ("content", TEXT)],
+        weights={"title": 10, "content": 2},
+    )
+    INDEXES = [
+        IndexModel(
+            [("type", ASCENDING), ("created", ASCENDING), ("_id", ASCENDING)]
+        ),
+        TEXT_INDEX,
+    ]
+    # Indexes of a collection of topics only
+    SPLIT_INDEXES = [
+        IndexModel([("created", ASCENDING), ("_id", ASCENDING)]),
+        TEXT_INDEX,
+    ]
 
-    def __init__(self, mongodb_client: AsyncIOMotorClient) -> None:
-        self.mongodb = mongodb_client[TopicRepositoryMongo.COLLECTION_NAME]
+    def __init__(
+        self,
+        mongodb_client: AsyncIOMotorClient,
+        collection_name: Optional[str] = None,
+    ) -> None:
+        """
+        Topics are stored along with the comments, told apart by their
+        type, or in `collection_name` if given, holding topics only.
+        """
+        self.type_filter: Dict[str, Any] = {}
+        if collection_name is None:
+            collection_name = TopicRepositoryMongo.COLLECTION_NAME
+            self.indexes = TopicRepositoryMongo.INDEXES
+            self.type_filter["type"] = TopicRepositoryMongo.DISCUSSION_TYPE
+        else:
+            self.indexes = TopicRepositoryMongo.SPLIT_INDEXES
+        self.collection_name = collection_name
+        self.mongodb = mongodb_client[collection_name]
 
-    async def find(self, skip: int, limit: int) -> List[Topic]:
+    async def find(
+        self,
+        skip: int = 0,
+        limit: int = 10,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Topic]:
         """Find topics."""
         cursor = self.mongodb.find(
-            {"type": TopicRepositoryMongo.DISCUSSION_TYPE}
+            {
+                **self.type_filter,
+                **keyset_filter(TopicRepositoryMongo.SORT, after, before),
+            },
+            to_projection(fields),
         )
+        cursor.sort(keyset_sort(TopicRepositoryMongo.SORT, before))
         cursor.skip(skip).limit(limit)
         topics: List[Topic] = []
         async for doc in cursor:
             topics.append(doc)
+        if before is not None:
+            topics.reverse()
         return topics
 
     async def search(
@@ -33,37 +89,87 @@ class TopicRepositoryMongo(TopicRepository):
         term: str = None,
         skip: int = 0,
         limit: int = 10,
+        after: Optional[CursorKey] = None,
+        before: Optional[CursorKey] = None,
+        fields: Optional[List[str]] = None,
     ) -> List[Topic]:
         """Search for topics."""
-        query.append({"type": TopicRepositoryMongo.DISCUSSION_TYPE})
-        if term:
-            query.append({"$text": {"$search": term}})
-            cursor = self.mongodb.find(
-                {"$and": query}, {"score": {"$meta": "textScore"}},
-            )
-            # Sorting results in ascending order by text score
-            cursor.sort([("score", {"$meta": "textScore"})])
-        else:
-            cursor = self.mongodb.find({"$and": query})
-        cursor.skip(skip).limit(limit)
+        return await search_page(
+            self.mongodb,
+            [*query, self.type_filter],
+            term,
+            TopicRepositoryMongo.SORT,
+            TopicRepositoryMongo.SEARCH_SORT,
+            skip,
+            limit,
+            after,
+            before,
+            fields,
+        )
 
-        topics: List[Topic] = []
-        async for doc in cursor:
-            topics.append(doc)
-        return topics
+    async def rank(
+        self, filters: SearchFilters, term: str, limit: int
+    ) -> List[RankedId]:
+        """Rank the ids of the first topics matching a search."""
+        return await rank_ids(
+            self.mongodb,
+            filters,
+            term,
+            TopicRepositoryMongo.SEARCH_SORT,
+            limit,
+            self.type_filter,
+        )
+
+    async def get_many(
+        self, topic_ids: List[str], fields: Optional[List[str]] = None
+    ) -> List[Topic]:
+        """Get topics by id, in no particular order."""
+        return await get_many(
+            self.mongodb, self.type_filter, topic_ids, fields
+        )
 
-    async def get(self, topic_id: str) -> Optional[Topic]:
+    async def get(
+        self, topic_id: str, fields: Optional[List[str]] = None
+    ) -> Optional[Topic]:
         """Get a topic."""
         topic = await self.mongodb.find_one(
-            {"_id": topic_id, "type": TopicRepositoryMongo.DISCUSSION_TYPE}
+            {"_id": topic_id, **self.type_filter}, to_projection(fields)
         )
         return topic
 
+    async def export(self, batch_size: int) -> AsyncIterator[Topic]:
+        """Iterate over every topic, fetching `batch_size` at a time."""
+        cursor = self.mongodb.find(self.type_filter)
+        cursor.sort(TopicRepositoryMongo.SORT).batch_size(batch_size)
+        try:
+            async for doc in cursor:
+                yield doc
+        finally:
+            await cursor.close()
+
     async def create(self, topic: Dict[str, Any]) -> str:
         """Create a topic."""
         result = await self.mongodb.insert_one(topic)
         return result.inserted_id
 
+    async def create_many(
+        self, topics: List[Dict[str, Any]]
+    ) -> Dict[int, str]:
+        """
+        Create topics, getting the errors by index.
+
+        The insert is unordered, so a failed topic does not stop the others.
+        """
+        if not topics:
+            return {}
+        try:
+            await self.mongodb.insert_many(topics, ordered=False)
+        except BulkWriteError as err:
+            return {
+                e["index"]: write_error(e) for e in err.details["writeErrors"]
+            }
+        return {}
+
     async def update(self, topic_id: str, topic: Dict[str, Any]) -> int:
         """Update a topic."""
         result = await self.mongodb.update_one(
@@ -71,7 +177,83 @@ class TopicRepositoryMongo(TopicRepository):
         )
         return result.modified_count
 
-    async def delete(self, topic_id: str) -> int:
+    async def update_and_get(
+        self,
+        topic_id: str,
+        topic: Dict[str, Any],
+        without_comments: bool = False,
+    ) -> Optional[Topic]:
+        """Update a topic and get it back in the same round trip."""
+        updated_topic = await self.mongodb.find_one_and_update(
+            self.__filter(topic_id, without_comments),
+            {"$set": topic},
+            return_document=ReturnDocument.AFTER,
+        )
+        return updated_topic
+
+    async def delete(
+        self, topic_id: str, without_comments: bool = False
+    ) -> int:
         """Delete a topic."""
-        result = await self.mongodb.delete_one({"_id": topic_id})
+        result = await self.mongodb.delete_one(
+            self.__filter(topic_id, without_comments)
+        )
         return result.deleted_count
+
+    async def get_comment_count(self, topic_id: str) -> Optional[int]:
+        """Get the comment counter of a topic, if the topic exists."""
+        topic = await self.mongodb.find_one(
+            self.__filter(topic_id), {"comment_count": 1}
+        )
+        if topic is None:
+            return None
+        comment_count: int = topic.get("comment_count", 0)
+        return comment_count
+
+    async def increment_comments(
+        self, topic_id: str, amount: int, commented_at: Optional[str] = None
+    ) -> bool:
+        """Increment the comment counter of a topic."""
+        update: Dict[str, Any] = {"$inc": {"comment_count": amount}}
+        if commented_at is not None:
+            update["$max"] = {"last_comment_at": commented_at}
+        result = await self.mongodb.update_one(self.__filter(topic_id), update)
+        return result.matched_count > 0
+
+    async def set_comment_stats(
+        self, stats: Dict[str, Tuple[int, Optional[str]]]
+    ) -> int:
+        """Overwrite the comment counters that differ from `stats`."""
+        cursor = self.mongodb.find(
+            self.type_filter, {"comment_count": 1, "last_comment_at": 1}
+        )
+        fixed = 0
+        async for doc in cursor:
+            count, last_comment_at = stats.get(doc["_id"], (0, None))
+            if (
+                doc.get("comment_count") != count
+                or doc.get("last_comment_at") != last_comment_at
+            ):
+                await self.mongodb.update_one(
+                    {"_id": doc["_id"]},
+                    {
+                        "$set": {
+                            "comment_count": count,
+                            "last_comment_at": last_comment_at,
+                        }
+                    },
+                )
+                fixed += 1
+        return fixed
+
+    def __filter(
+        self, topic_id: str, without_comments: bool = False
+    ) -> Dict[str, Any]:
+        """Filter a single topic, optionally only if it has no comments."""
+        query: Dict[str, Any] = {
+            "_id": topic_id,
+            **self.type_filter,
+        }
+        if without_comments:
+            query.update(TopicRepositoryMongo.WITHOUT_COMMENTS)
+        return query
@@ -1,12 +1,17 @@
 """Comment usecase module."""
 
-from typing import List, Optional
-
-from fastapi.encoders import jsonable_encoder
+import asyncio
+from typing import Any, Dict, List, Optional, Set
 
 from app.domain.comment import Comment, UpdateComment
-from app.repository.comment import CommentRepositoryMongo
-from app.repository.topic import TopicRepositoryMongo
+from app.domain.live import DELETE_MARK, LiveEvent, LiveHub, Subscription
+from app.domain.page import Page, build_page, decode_cursors
+from app.domain.projection import COMMENT_PROJECTION
+from app.domain.search import SEARCH_WINDOW, SearchFilters
+from app.domain.serializer import dump
+from app.domain.thread import Thread, build_thread, thread_bounds
+from app.repository.base import CommentRepository, TopicRepository
+from app.usecase.search import search
 
 
 class CommentNotFoundToBeReplied(Exception):
@@ -34,93 +39,328 @@ class CommentUsecase:
 
     def __init__(
         self,
-        topic_repo: TopicRepositoryMongo,
-        comment_repo: CommentRepositoryMongo,
+        topic_repo: TopicRepository,
+        comment_repo: CommentRepository,
+        hub: Optional[LiveHub] = None,
     ) -> None:
         self.topic_repo = topic_repo
         self.comment_repo = comment_repo
+        self.hub = hub if hub is not None else LiveHub()
 
     async def find_by_topic(
-        self, topic_id: str, skip: int, limit: int
-    ) -> List[Comment]:
+        self,
+        topic_id: str,
+        skip: int,
+        limit: int,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        fields: Optional[str] = None,
+    ) -> Page:
         """Find comments by topic."""
+        sort = self.comment_repo.SORT
+        after_key, before_key = decode_cursors(after, before, len(sort))
+        # Fetching one more comment tells whether there is a next page
         comments: List[Comment] = await self.comment_repo.find_by_topic(
-            topic_id, skip, limit
+            topic_id,
+            skip,
+            limit + 1,
+            after_key,
+            before_key,
+            COMMENT_PROJECTION.parse(fields),
+        )
+        return build_page(
+            comments, limit, [f for f, _ in sort], after_key, before_key, skip
         )
-        return comments
 
-    async def get(self, topic_id: str, comment_id: str) -> Optional[Comment]:
-        """Get a single comment in a topic."""
-        topic_exists = await self.__check_topic_exists(topic_id)
-        if not topic_exists:
-            raise TopicNotFound(topic=topic_id, message="topic not found")
+    async def search(
+        self,
+        topic_id: str,
+        term: Optional[str],
+        skip: int,
+        limit: int,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        fields: Optional[str] = None,
+        filters: Optional[SearchFilters] = None,
+        window: int = SEARCH_WINDOW,
+    ) -> Page:
+        """Search for comments of a topic, by relevance to a term."""
+        return await search(
+            self.comment_repo,
+            (filters or SearchFilters()).copy(update={"topic": topic_id}),
+            term,
+            skip,
+            limit,
+            after,
+            before,
+            COMMENT_PROJECTION.parse(fields),
+            window,
+        )
 
-        comment = await self.comment_repo.get(topic_id, comment_id)
+    async def get(
+        self, topic_id: str, comment_id: str, fields: Optional[str] = None
+    ) -> Optional[Comment]:
+        """Get a single comment in a topic."""
+        # A topic with comments can not be deleted, so finding the comment
+        # proves the topic exists; only a miss needs the topic check
+        comment = await self.comment_repo.get(
+            topic_id, comment_id, COMMENT_PROJECTION.parse(fields)
+        )
+        if comment is None:
+            await self.__ensure_topic_exists(topic_id)
         return comment
 
+    async def thread(
+        self,
+        topic_id: str,
+        comment_id: Optional[str] = None,
+        max_depth: Optional[int] = None,
+        limit: int = 1000,
+    ) -> Optional[Thread]:
+        """
+        Get the comments of a topic, or the replies under one of its
+        comments, nested under the comments they reply to.
+        """
+        max_depth, limit = thread_bounds(max_depth, limit)
+        # Fetching one more comment tells whether the thread is truncated
+        if comment_id is None:
+            comments = await self.comment_repo.find_thread(topic_id, limit + 1)
+            if not comments:
+                await self.__ensure_topic_exists(topic_id)
+            return build_thread(comments, limit, max_depth)
+
+        # Replies are looked up one level deeper than returned, so that the
+        # deepest comments returned still have their replies counted
+        root, replies = await asyncio.gather(
+            self.comment_repo.get(topic_id, comment_id),
+            self.comment_repo.find_replies(
+                topic_id, comment_id, max_depth, limit
+            ),
+        )
+        if root is None:
+            await self.__ensure_topic_exists(topic_id)
+            return None
+        return build_thread([root, *replies], limit, max_depth, comment_id)
+
     async def create(
         self, topic_id: str, comment: Comment
     ) -> Optional[Comment]:
         """Create a comment in a topic."""
-        topic_exists = await self.__check_topic_exists(topic_id)
-        if not topic_exists:
-            raise TopicNotFound(topic=topic_id, message="topic not found")
+        comment.topic_id = topic_id
+        created_comment = dump(comment)
 
+        # Incrementing the counter doubles as the topic existence check and
+        # runs along with the reply check, then the comment is inserted. A
+        # refused comment only rolls back the counter, last_comment_at is
+        # left for the repair job
         reply_comment_id = comment.reply_comment
-        if reply_comment_id:
-            reply_comment = await self.comment_repo.get(
-                topic_id, reply_comment_id
-            )
-            if not reply_comment:
+        topic_exists, reply_exists = await asyncio.gather(
+            self.topic_repo.increment_comments(
+                topic_id, 1, created_comment["created"]
+            ),
+            self.__check_comment_exists(topic_id, reply_comment_id),
+        )
+        if not topic_exists:
+            raise TopicNotFound(topic=topic_id, message="topic not found")
+        try:
+            if not reply_exists:
                 raise CommentNotFoundToBeReplied(
                     comment=reply_comment_id,
                     message="comment does not exist to be replied",
                 )
-
-        comment.topic_id = topic_id
-        inserted_id = await self.comment_repo.create(jsonable_encoder(comment))
-        created_comment = await self.comment_repo.get(topic_id, inserted_id)
+            # The inserted document is returned as is, without reading it
+            await self.comment_repo.create(created_comment)
+        except Exception:
+            await self.topic_repo.increment_comments(topic_id, -1)
+            raise
+        self.__publish(LiveEvent.CREATED, topic_id, created_comment)
         return created_comment
 
+    async def create_many(
+        self, topic_id: str, comments: List[Comment]
+    ) -> Dict[int, str]:
+        """
+        Create comments in a topic, getting the errors by index.
+
+        Replies may point to comments of the same batch. The comments
+        replied to are looked up at once, along with the counter increment
+        that checks the topic exists, then the comments are inserted at
+        once. Replies to comments of the batch that failed, and did not
+        exist before, are then deleted and reported as failed too.
+        """
+        created_comments: List[Dict[str, Any]] = []
+        for comment in comments:
+            comment.topic_id = topic_id
+            created_comments.append(dump(comment))
+        batch_ids = {doc["_id"] for doc in created_comments}
+        # Comments of the batch are looked up too, as they may fail to be
+        # inserted for existing already
+        reply_ids = {doc["reply"] for doc in created_comments if doc["reply"]}
+        topic_exists, existing_ids = await asyncio.gather(
+            self.topic_repo.increment_comments(
+                topic_id, len(created_comments)
+            ),
+            self.__find_existing(topic_id, reply_ids),
+        )
+        if not topic_exists:
+            raise TopicNotFound(topic=topic_id, message="topic not found")
+
+        errors: Dict[int, str] = {}
+        valid: List[int] = []
+        for index, doc in enumerate(created_comments):
+            reply = doc["reply"]
+            if reply and reply not in batch_ids and reply not in existing_ids:
+                errors[index] = "comment does not exist to be replied"
+            else:
+                valid.append(index)
+        try:
+            insert_errors = await self.comment_repo.create_many(
+                [created_comments[index] for index in valid]
+            )
+        except Exception:
+            await self.topic_repo.increment_comments(
+                topic_id, -len(created_comments)
+            )
+            raise
+        for position, error in insert_errors.items():
+            errors[valid[position]] = error
+        await self.__drop_orphan_replies(
+            topic_id, created_comments, existing_ids, errors
+        )
+        last_created = max(
+            (
+                created_comments[index]["created"]
+                for index in valid
+                if index not in errors
+            ),
+            default=None,
+        )
+        if errors or last_created is not None:
+            await self.topic_repo.increment_comments(
+                topic_id, -len(errors), last_created
+            )
+        for index in valid:
+            if index not in errors:
+                self.__publish(
+                    LiveEvent.CREATED, topic_id, created_comments[index]
+                )
+        return errors
+
     async def update(
         self, topic_id: str, comment_id: str, comment: UpdateComment
     ) -> Optional[Comment]:
         """Update a comment in a topic."""
-        topic_exists = await self.__check_topic_exists(topic_id)
-        if not topic_exists:
-            raise TopicNotFound(topic=topic_id, message="topic not found")
-
         # Cleaning up the request body
         comment_clean = {
             k: v for k, v in comment.dict().items() if v is not None
         }
         if len(comment_clean) >= 1:
-            modified_count = await self.comment_repo.update(
+            updated_comment = await self.comment_repo.update_and_get(
                 topic_id, comment_id, comment_clean
             )
-            if modified_count == 1:
-                if (
-                    updated_comment := await self.comment_repo.get(
-                        topic_id, comment_id
-                    )
-                ) is not None:
-                    return updated_comment
-
-        existing_comment = await self.comment_repo.get(topic_id, comment_id)
-        return existing_comment
+            if updated_comment is not None:
+                self.__publish(LiveEvent.UPDATED, topic_id, updated_comment)
+        else:
+            updated_comment = await self.comment_repo.get(topic_id, comment_id)
+        if updated_comment is None:
+            await self.__ensure_topic_exists(topic_id)
+        return updated_comment
 
     async def delete(self, topic_id: str, comment_id: str) -> bool:
         """Delete a comment in a topic."""
-        topic_exists = await self.__check_topic_exists(topic_id)
-        if not topic_exists:
-            raise TopicNotFound(topic=topic_id, message="topic not found")
-
+        if not self.hub.local:
+            # Tells the change stream the topic of the deleted comment
+            await self.comment_repo.update(
+                topic_id, comment_id, {DELETE_MARK: topic_id}
+            )
         deleted_count: int = await self.comment_repo.delete(
             topic_id, comment_id
         )
+        if deleted_count > 0:
+            await self.topic_repo.increment_comments(topic_id, -deleted_count)
+            self.__publish(
+                LiveEvent.DELETED,
+                topic_id,
+                {"_id": comment_id, "topic": topic_id},
+            )
+        else:
+            await self.__ensure_topic_exists(topic_id)
         return deleted_count > 0
 
-    async def __check_topic_exists(self, topic_id: str) -> bool:
-        """Check if a topic exists."""
-        topic = await self.topic_repo.get(topic_id)
-        return topic is not None
+    async def subscribe(
+        self, topic_id: str, last_event_id: Optional[str] = None
+    ) -> Subscription:
+        """
+        Subscribe to the changes of the comments of a topic, from the ones
+        following `last_event_id` if given.
+        """
+        await self.__ensure_topic_exists(topic_id)
+        return self.hub.subscribe(topic_id, last_event_id)
+
+    def __publish(self, kind: str, topic_id: str, comment: Any) -> None:
+        """Publish a change, unless a change stream publishes them all."""
+        if self.hub.local:
+            event = LiveEvent(self.hub.next_id(), kind, topic_id, comment)
+            self.hub.publish(event)
+
+    async def __ensure_topic_exists(self, topic_id: str) -> None:
+        """Raise if a topic does not exist."""
+        comment_count = await self.topic_repo.get_comment_count(topic_id)
+        if comment_count is None:
+            raise TopicNotFound(topic=topic_id, message="topic not found")
+
+    async def __find_existing(
+        self, topic_id: str, comment_ids: Set[str]
+    ) -> Set[str]:
+        """Find which of the comments exist, without a lookup for none."""
+        if not comment_ids:
+            return set()
+        return await self.comment_repo.find_existing(
+            topic_id, list(comment_ids)
+        )
+
+    async def __drop_orphan_replies(
+        self,
+        topic_id: str,
+        comments: List[Dict[str, Any]],
+        existing_ids: Set[str],
+        errors: Dict[int, str],
+    ) -> None:
+        """
+        Delete the created replies to comments of the same batch that
+        failed and did not exist before, then the replies to those, adding
+        them to the errors.
+        """
+        created_ids = {
+            doc["_id"]
+            for index, doc in enumerate(comments)
+            if index not in errors
+        }
+        failed_ids = {comments[index]["_id"] for index in errors}
+        failed_ids -= created_ids | existing_ids
+        orphan_ids: List[str] = []
+        while failed_ids:
+            orphans = [
+                index
+                for index, doc in enumerate(comments)
+                if index not in errors and doc["reply"] in failed_ids
+            ]
+            for index in orphans:
+                errors[index] = "comment replied to could not be created"
+            failed_ids = {comments[index]["_id"] for index in orphans}
+            orphan_ids += failed_ids
+        await asyncio.gather(
+            *(
+                self.comment_repo.delete(topic_id, comment_id)
+                for comment_id in orphan_ids
+            )
+        )
+
+    async def __check_comment_exists(
+        self, topic_id: str, comment_id: Optional[str]
+    ) -> bool:
+        """Check if a comment exists, no comment always does."""
+        if not comment_id:
+            return True
+        exists: bool = await self.comment_repo.exists(topic_id, comment_id)
+        return exists
@@ -0,0 +1,96 @@
+"""Search usecase module."""
+
+from typing import List, Optional, Union
+
+from app.domain.page import InvalidCursor, Page, build_page, decode_cursors
+from app.domain.search import (
+    MAX_WINDOW_FACTOR,
+    SEARCH_WINDOW,
+    RankedId,
+    SearchFilters,
+    SearchTooDeep,
+    highlight,
+    normalize_term,
+    search_words,
+    window_slice,
+)
+from app.repository.base import CommentRepository, TopicRepository
+from app.repository.search import to_search_query
+
+SearchRepository = Union[TopicRepository, CommentRepository]
+
+
+async def search(
+    repository: SearchRepository,
+    filters: SearchFilters,
+    term: Optional[str],
+    skip: int,
+    limit: int,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    window: int = SEARCH_WINDOW,
+) -> Page:
+    """
+    Search a repository, by relevance to `term` if there is one.
+
+    The ids of the first `window` results are ranked at once, and cached by
+    the repository, so the pages within the window are fetched by id. A
+    page past a full window doubles it until the page fits, up to
+    `MAX_WINDOW_FACTOR` times the first window: pages past that raise
+    `SearchTooDeep`. Every result gets the highlights of the term.
+    """
+    term = normalize_term(term)
+    sort = repository.SEARCH_SORT if term else repository.SORT
+    key_fields = [f for f, _ in sort]
+    after_key, before_key = decode_cursors(after, before, len(sort))
+    # Fetching one more result tells whether there is a next page
+    if not term:
+        docs = await repository.search(
+            to_search_query(filters),
+            term,
+            skip,
+            limit + 1,
+            after_key,
+            before_key,
+            fields,
+        )
+        return build_page(docs, limit, key_fields, after_key, before_key, skip)
+
+    # Scores are compared to the cursors outside of the database
+    cursor, key = (after, after_key) if after else (before, before_key)
+    if cursor and key and not isinstance(key[0], (int, float)):
+        raise InvalidCursor(cursor=cursor, message="invalid page cursor")
+    max_window = window * MAX_WINDOW_FACTOR
+    ranked_page: Optional[List[RankedId]] = None
+    while ranked_page is None:
+        ranked = await repository.rank(filters, term, window)
+        ranked_page = window_slice(
+            ranked,
+            len(ranked) >= window,
+            limit + 1,
+            after_key,
+            before_key,
+            skip,
+        )
+        if ranked_page is None and window >= max_window:
+            raise SearchTooDeep(
+                max_results=max_window,
+                message=f"page past the first {max_window} results",
+            )
+        window = min(window * 2, max_window)
+    found = {
+        doc["_id"]: doc
+        for doc in await repository.get_many(
+            [doc_id for _, doc_id in ranked_page], fields
+        )
+    }
+    # Results deleted since they were ranked are left out
+    docs = [
+        {**found[doc_id], "score": score}
+        for score, doc_id in ranked_page
+        if doc_id in found
+    ]
+    words = search_words(term)
+    docs = [{**doc, "highlights": highlight(doc, words)} for doc in docs]
+    return build_page(docs, limit, key_fields, after_key, before_key, skip)
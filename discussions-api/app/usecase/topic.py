@@ -1,13 +1,14 @@
 """Topic usecase module."""
 
-from typing import List, Optional, Tuple
+from typing import Any, AsyncGenerator, Dict, List, Optional
 
-from fastapi.encoders import jsonable_encoder
-
-from app.domain.comment import Comment
+from app.domain.page import Page, build_page, decode_cursors
+from app.domain.projection import TOPIC_PROJECTION
+from app.domain.search import SEARCH_WINDOW, SearchFilters
+from app.domain.serializer import dump
 from app.domain.topic import Topic, UpdateTopic
-from app.repository.comment import CommentRepositoryMongo
-from app.repository.topic import TopicRepositoryMongo
+from app.repository.base import CommentRepository, TopicRepository
+from app.usecase.search import search
 
 
 class TopicCanNotBeChanged(Exception):
@@ -24,36 +25,105 @@ class TopicUsecase:
     """Topics usecase."""
 
     def __init__(
-        self,
-        topic_repo: TopicRepositoryMongo,
-        comment_repo: CommentRepositoryMongo,
+        self, topic_repo: TopicRepository, comment_repo: CommentRepository,
     ) -> None:
         self.topic_repo = topic_repo
         self.comment_repo = comment_repo
 
-    async def find(self, skip: int, limit: int) -> List[Topic]:
+    async def find(
+        self,
+        skip: int,
+        limit: int,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        fields: Optional[str] = None,
+    ) -> Page:
         """Find all topics."""
-        topics: List[Topic] = await self.topic_repo.find(skip, limit)
-        return topics
+        sort = self.topic_repo.SORT
+        after_key, before_key = decode_cursors(after, before, len(sort))
+        # Fetching one more topic tells whether there is a next page
+        topics: List[Topic] = await self.topic_repo.find(
+            skip,
+            limit + 1,
+            after_key,
+            before_key,
+            TOPIC_PROJECTION.parse(fields),
+        )
+        return build_page(
+            topics, limit, [f for f, _ in sort], after_key, before_key, skip
+        )
 
-    async def search(self, term: str, skip: int, limit: int) -> List[Topic]:
-        """Search for topics."""
-        topics: List[Topic] = await self.topic_repo.search(
-            query=[], term=term, skip=skip, limit=limit
+    async def search(
+        self,
+        term: Optional[str],
+        skip: int,
+        limit: int,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        fields: Optional[str] = None,
+        filters: Optional[SearchFilters] = None,
+        window: int = SEARCH_WINDOW,
+    ) -> Page:
+        """Search for topics matching the filters, by relevance to a term."""
+        return await search(
+            self.topic_repo,
+            filters or SearchFilters(),
+            term,
+            skip,
+            limit,
+            after,
+            before,
+            TOPIC_PROJECTION.parse(fields),
+            window,
         )
-        return topics
 
-    async def get(self, topic_id: str) -> Optional[Topic]:
+    async def get(
+        self, topic_id: str, fields: Optional[str] = None
+    ) -> Optional[Topic]:
         """Get a single topic."""
-        topic = await self.topic_repo.get(topic_id)
+        topic = await self.topic_repo.get(
+            topic_id, TOPIC_PROJECTION.parse(fields)
+        )
         return topic
 
+    async def export(
+        self, batch_size: int, include_comments: bool = False
+    ) -> AsyncGenerator[Any, None]:
+        """Iterate over every topic, then every comment if asked to."""
+        async for topic in self.topic_repo.export(batch_size):
+            yield topic
+        if include_comments:
+            async for comment in self.comment_repo.export(None, batch_size):
+                yield comment
+
+    async def export_topic(
+        self, topic_id: str, batch_size: int
+    ) -> Optional[AsyncGenerator[Any, None]]:
+        """Iterate over a topic and its comments, if the topic exists."""
+        topic = await self.topic_repo.get(topic_id)
+        if topic is None:
+            return None
+        return self.__export_topic(topic_id, topic, batch_size)
+
     async def create(self, topic: Topic) -> Optional[Topic]:
         """Create a topic."""
-        inserted_id = await self.topic_repo.create(jsonable_encoder(topic))
-        created_topic = await self.topic_repo.get(inserted_id)
+        # Comment stats are maintained by the comment writes only
+        topic.comment_count = 0
+        topic.last_comment_at = None
+        # The inserted document is returned as is, without reading it back
+        created_topic = dump(topic)
+        await self.topic_repo.create(created_topic)
         return created_topic
 
+    async def create_many(self, topics: List[Topic]) -> Dict[int, str]:
+        """Create topics in a single round trip, getting errors by index."""
+        created_topics = []
+        for topic in topics:
+            topic.comment_count = 0
+            topic.last_comment_at = None
+            created_topics.append(dump(topic))
+        return await self.topic_repo.create_many(created_topics)
+
     async def update(
         self, topic_id: str, topic: UpdateTopic
     ) -> Optional[Topic]:
@@ -62,44 +132,51 @@ class TopicUsecase:
         topic_clean = {k: v for k, v in topic.dict().items() if v is not None}
 
         if len(topic_clean) >= 1:
-            # Check if the topic is not referenced by any comment
-            _, comments_count = await self.__get_comments_by_topic(topic_id)
-            if comments_count > 0:
-                raise TopicCanNotBeChanged(
-                    topic=topic_id,
-                    comments_count=comments_count,
-                    message="can not update topic containing comments",
-                )
-            modified_count = await self.topic_repo.update(
-                topic_id, topic_clean
+            # Only topics not referenced by any comment match the update
+            updated_topic = await self.topic_repo.update_and_get(
+                topic_id, topic_clean, without_comments=True
             )
-            if modified_count == 1:
-                if (
-                    updated_topic := await self.topic_repo.get(topic_id)
-                ) is not None:
-                    return updated_topic
+            if updated_topic is None:
+                await self.__check_topic_has_no_comments(
+                    topic_id, "can not update topic containing comments"
+                )
+            return updated_topic
 
         existing_topic = await self.topic_repo.get(topic_id)
         return existing_topic
 
     async def delete(self, topic_id: str) -> bool:
         """Delete a topic."""
-        # Check if the topic is not referenced by any comment
-        _, comments_count = await self.__get_comments_by_topic(topic_id)
-        if comments_count > 0:
-            raise TopicCanNotBeChanged(
-                topic=topic_id,
-                comments_count=comments_count,
-                message="can not delete topic containing comments",
+        # Only topics not referenced by any comment match the delete
+        deleted_count: int = await self.topic_repo.delete(
+            topic_id, without_comments=True
+        )
+        if deleted_count == 0:
+            await self.__check_topic_has_no_comments(
+                topic_id, "can not delete topic containing comments"
             )
-        deleted_count: int = await self.topic_repo.delete(topic_id)
         return deleted_count > 0
 
-    async def __get_comments_by_topic(
-        self, topic_id: str
-    ) -> Tuple[List[Comment], int]:
-        """Get comments by topic."""
-        comments: List[Comment] = await self.comment_repo.find_by_topic(
-            topic_id=topic_id, limit=100
-        )
-        return comments, len(comments)
+    async def repair_comment_stats(self) -> int:
+        """Recompute the comment counter of every topic."""
+        stats = await self.comment_repo.count_by_topic()
+        fixed: int = await self.topic_repo.set_comment_stats(stats)
+        return fixed
+
+    async def __export_topic(
+        self, topic_id: str, topic: Topic, batch_size: int
+    ) -> AsyncGenerator[Any, None]:
+        """Iterate over a topic and its comments."""
+        yield topic
+        async for comment in self.comment_repo.export(topic_id, batch_size):
+            yield comment
+
+    async def __check_topic_has_no_comments(
+        self, topic_id: str, message: str
+    ) -> None:
+        """Raise if a topic exists and is referenced by comments."""
+        comments_count = await self.topic_repo.get_comment_count(topic_id)
+        if comments_count is not None and comments_count > 0:
+            raise TopicCanNotBeChanged(
+                topic=topic_id, comments_count=comments_count, message=message,
+            )
@@ -0,0 +1,86 @@
+"""Comment creation burst benchmark.
+
+Creates comments concurrently in a topic over a simulated 5 ms network
+round trip, on a server spending 0.5 ms on each round trip one at a time,
+as during a live event, comparing the per-request inserts with the inserts
+batched by `InsertBatcher`.
+
+Every scenario reports its throughput, p50 and p99 latencies and the
+MongoDB round trips per comment. The counter increment of the topic is
+still sent per comment, batching only saves the insert round trips.
+
+Usage:
+    python -m benchmarks.bench_comment_burst [comments] [concurrency]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+from typing import List, Optional
+
+from app.api import deps
+from app.domain.comment import Comment
+from app.domain.topic import Topic
+from app.repository.batching import InsertBatcher
+from testing.mongo import FakeMotorClient
+
+RTT = 0.005
+SERVICE_TIME = 0.0005
+
+
+async def measure(
+    name: str, max_delay: Optional[float], total: int, concurrency: int
+) -> None:
+    """
+    Create `total` comments, `concurrency` at a time, batching the inserts
+    for up to `max_delay` seconds if given.
+    """
+    client = FakeMotorClient(latency=RTT, service_time=SERVICE_TIME)
+    mongodb = client["bench"]
+    batchers = []
+    if max_delay is not None:
+        batchers.append(InsertBatcher(mongodb["discussions"], 500, max_delay))
+    topic_usecase, comment_usecase = deps.build_usecases(
+        mongodb, batchers=batchers
+    )
+    topic = await topic_usecase.create(
+        Topic(title="Live!", content="Comment here", username="Bob")
+    )
+    client.calls.clear()
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def create(i: int) -> None:
+        async with semaphore:
+            sent = time.perf_counter()
+            await comment_usecase.create(
+                topic["_id"], Comment(content=f"{i}", username="Alice")
+            )
+            latencies.append((time.perf_counter() - sent) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(create(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+    for batcher in batchers:
+        await batcher.close()
+    latencies.sort()
+    print(
+        f"{name:<12} {total / elapsed:8.1f} comments/s  "
+        f"p50 {statistics.median(latencies):6.2f} ms  "
+        f"p99 {latencies[int(total * 0.99) - 1]:6.2f} ms  "
+        f"{len(client.calls) / total:5.2f} round trips"
+    )
+
+
+async def main(total: int = 2000, concurrency: int = 200) -> None:
+    """Run every scenario against a fake with a 5 ms round trip."""
+    await measure("per request", None, total, concurrency)
+    for max_delay in (0.001, 0.005):
+        await measure(
+            f"batched {max_delay * 1000:g} ms", max_delay, total, concurrency
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*[int(arg) for arg in sys.argv[1:3]]))
@@ -0,0 +1,93 @@
+"""Comment creation latency benchmark.
+
+Replies to a comment over a simulated 5 ms network round trip, comparing
+the former sequential validation (topic check, reply lookup, insert and
+read back) with the current pipelined one.
+
+Usage:
+    python -m benchmarks.bench_comment_create [requests]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+
+from app.api import deps
+from app.domain.comment import Comment
+from app.domain.topic import Topic
+from app.repository.comment import CommentRepositoryMongo
+from app.repository.topic import TopicRepositoryMongo
+from testing.mongo import FakeMotorClient
+
+RTT = 0.005
+
+
+async def sequential_create(
+    topic_repo: TopicRepositoryMongo,
+    comment_repo: CommentRepositoryMongo,
+    topic_id: str,
+    comment: Comment,
+) -> Dict[str, Any]:
+    """The comment creation as it was before pipelining."""
+    if await topic_repo.get(topic_id) is None:
+        raise LookupError(topic_id)
+    if await comment_repo.get(topic_id, comment.reply_comment) is None:
+        raise LookupError(comment.reply_comment)
+    comment.topic_id = topic_id
+    inserted_id = await comment_repo.create(jsonable_encoder(comment))
+    created: Dict[str, Any] = await comment_repo.get(topic_id, inserted_id)
+    return created
+
+
+async def measure(
+    name: str, create: Callable[[Comment], Awaitable[Any]], total: int
+) -> None:
+    """Create `total` replies one after the other and report latencies."""
+    latencies: List[float] = []
+    for _ in range(total):
+        reply = Comment(content="Thanks", username="Bob", reply="c0")
+        start = time.perf_counter()
+        await create(reply)
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(
+        f"{name:<12} mean {statistics.mean(latencies):6.2f} ms  "
+        f"p99 {sorted(latencies)[int(total * 0.99) - 1]:6.2f} ms"
+    )
+
+
+async def main(total: int = 200) -> None:
+    """Run both scenarios against a fake with a 5 ms round trip."""
+    mongodb = FakeMotorClient(latency=RTT)["bench"]
+    topic_usecase, comment_usecase = deps.build_usecases(mongodb)
+    topic = await topic_usecase.create(
+        Topic(title="Hey!", content="Can you help me?", username="Bob")
+    )
+    await mongodb["discussions"].insert_one(
+        jsonable_encoder(
+            Comment(
+                comment_id="c0",
+                topic=topic["_id"],
+                content="Sure!",
+                username="A",
+            )
+        )
+    )
+    topic_repo = TopicRepositoryMongo(mongodb)
+    comment_repo = CommentRepositoryMongo(mongodb)
+
+    await measure(
+        "sequential",
+        lambda c: sequential_create(topic_repo, comment_repo, topic["_id"], c),
+        total,
+    )
+    await measure(
+        "pipelined", lambda c: comment_usecase.create(topic["_id"], c), total,
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*[int(arg) for arg in sys.argv[1:2]]))
@@ -0,0 +1,86 @@
+"""Comment tree benchmark.
+
+Renders the thread of a synthetic topic with 50k comments, replies picking
+a random earlier comment, comparing paging through the comments and
+nesting them on the client with the single-scan tree endpoint. The
+assembly and serialization of the tree are timed on their own as well.
+The fake scans the whole collection for every query where MongoDB would use
+an index, so compare the round trips rather than the paging time.
+
+Usage:
+    python -m benchmarks.bench_comment_tree [comments]
+"""
+
+import asyncio
+import sys
+import time
+from typing import Any, List
+
+from app.api import deps
+from app.api.responses import dumps
+from app.domain.thread import build_thread
+from app.usecase.comment import CommentUsecase
+from benchmarks.data import generate_comments, generate_topics, insert
+from testing.mongo import FakeMotorClient
+
+RTT = 0.001
+PAGE_SIZE = 1000
+
+
+async def paged(usecase: CommentUsecase, topic_id: str) -> int:
+    """Page through every comment, then nest them as a client would."""
+    comments: List[Any] = []
+    cursor = None
+    while True:
+        page = await usecase.find_by_topic(topic_id, 0, PAGE_SIZE, cursor)
+        comments += page.items
+        if page.next_cursor is None:
+            break
+        cursor = page.next_cursor
+    return build_thread(comments, len(comments)).size
+
+
+async def tree(usecase: CommentUsecase, topic_id: str, total: int) -> int:
+    """Fetch the nested thread at once."""
+    thread = await usecase.thread(topic_id, limit=total)
+    assert thread is not None
+    return thread.size
+
+
+def timed(name: str, started: float, detail: str = "") -> None:
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"{name:<12} {elapsed:9.1f} ms  {detail}")
+
+
+async def main(total: int = 50000) -> None:
+    """Run the scenarios against a fake with a 1 ms round trip."""
+    client = FakeMotorClient()
+    mongodb = client["bench"]
+    _, comment_usecase = deps.build_usecases(mongodb)
+    topic = generate_topics(1)[0]
+    topic_id = topic["_id"]
+    comments = generate_comments(topic, total)
+    await insert(mongodb, [topic, *comments])
+    client.calls.clear()
+    client.latency = RTT
+
+    started = time.perf_counter()
+    size = await paged(comment_usecase, topic_id)
+    timed("paged", started, f"{len(client.calls)} round trips, {size} nodes")
+
+    client.calls.clear()
+    started = time.perf_counter()
+    size = await tree(comment_usecase, topic_id, total)
+    timed("tree", started, f"{len(client.calls)} round trips, {size} nodes")
+
+    started = time.perf_counter()
+    thread = build_thread(comments, total)
+    timed("assembly", started, f"depth-first {sum(1 for _ in thread.walk())}")
+
+    started = time.perf_counter()
+    dumps(thread)
+    timed("serialize", started)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*[int(arg) for arg in sys.argv[1:2]]))
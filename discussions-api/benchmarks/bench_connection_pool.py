@@ -0,0 +1,72 @@
+"""Connection pool benchmark.
+
+Compares the requests/sec of the old dependency wiring, which built two
+MongoDB clients per request (one for each repository), against a single
+client shared by the whole process.
+
+Usage:
+    python -m benchmarks.bench_connection_pool [requests] [concurrency]
+"""
+
+import asyncio
+import sys
+import time
+from typing import Awaitable, Callable
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.api import deps
+from config import settings
+
+
+async def per_request_client() -> None:
+    """Simulate a request served with a new client per repository."""
+    clients = [AsyncIOMotorClient(settings.db_url) for _ in range(2)]
+    try:
+        await clients[0][settings.db_name]["discussions"].find_one(
+            {"type": "topic"}
+        )
+    finally:
+        for client in clients:
+            client.close()
+
+
+def shared_client_request() -> Callable[[], Awaitable[None]]:
+    """Simulate a request served with the process wide client."""
+    client = deps.get_mongodb_client()
+    collection = client[settings.db_name]["discussions"]
+
+    async def request() -> None:
+        await collection.find_one({"type": "topic"})
+
+    return request
+
+
+async def run(
+    name: str,
+    request: Callable[[], Awaitable[None]],
+    total: int,
+    concurrency: int,
+) -> None:
+    """Run `total` requests with at most `concurrency` in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded() -> None:
+        async with semaphore:
+            await request()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<20} {total / elapsed:>10.1f} req/s ({elapsed:.2f}s)")
+
+
+async def main(total: int = 1000, concurrency: int = 50) -> None:
+    """Run the before and after scenarios."""
+    await run("per-request client", per_request_client, total, concurrency)
+    await run("shared client", shared_client_request(), total, concurrency)
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    asyncio.run(main(*args))
@@ -0,0 +1,326 @@
+"""Endpoint benchmarks.
+
+Drives every endpoint of the API in-process, through the whole ASGI stack
+(routing, validation, usecases, repositories and serialization), against
+the in-memory MongoDB stand-in seeded with reproducible synthetic data:
+1000 topics, a topic with 2000 comments and a reply chain 200 deep.
+
+Every scenario reports its throughput, p50 and p99 latencies, the MongoDB
+round trips per request and the peak memory allocated per request. The
+round trips barely depend on the machine and the allocations only by a few
+KiB, the latencies do: compare them with a baseline taken on the same
+machine.
+
+Usage:
+    python -m benchmarks.bench_endpoints [--requests N] [--only NAME]
+        [--save] [--check]
+
+`--save` writes the results to `benchmarks/baselines/endpoints.json`,
+`--check` compares them with it and exits with 1 on a regression.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from starlette.types import Message
+
+from app.api import deps
+from app.main import app
+from app.repository.indexes import ensure_indexes
+from benchmarks.data import (
+    generate_chain,
+    generate_comments,
+    generate_topics,
+    insert,
+)
+from config import settings
+from testing.mongo import FakeMotorClient
+
+BASELINE = Path(__file__).parent / "baselines" / "endpoints.json"
+TOPICS = f"{settings.api_v1}/topics"
+# Slack allowed over the baseline before a result is a regression
+LATENCY_TOLERANCE = 1.5
+MEMORY_TOLERANCE = 1.25
+# Allocations that small vary by a few KiB between interpreter builds
+MEMORY_FLOOR_KIB = 8.0
+
+Request = Tuple[str, str, Optional[Any]]
+
+
+@dataclass
+class Result:
+    """Measures of a scenario."""
+
+    status: int
+    throughput: float
+    p50_ms: float
+    p99_ms: float
+    round_trips: float
+    peak_kib: float
+
+
+async def call(
+    method: str, url: str, body: Optional[Any] = None
+) -> Tuple[int, bytes]:
+    """Send a request to the application, without any network."""
+    parts = urlsplit(url)
+    content = b"" if body is None else json.dumps(body).encode()
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": parts.path,
+        "raw_path": parts.path.encode(),
+        "query_string": parts.query.encode(),
+        "root_path": "",
+        "headers": [
+            (b"host", b"bench"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(content)).encode()),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    received = False
+    status = 0
+    chunks: List[bytes] = []
+
+    async def receive() -> Message:
+        nonlocal received
+        if received:
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": content, "more_body": False}
+
+    async def send(message: Message) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+def scenarios(
+    topics: List[Dict[str, Any]],
+    large: Dict[str, Any],
+    comments: List[Dict[str, Any]],
+    chain: Dict[str, Any],
+) -> List[Tuple[str, Callable[[int], Request]]]:
+    """
+    Request of every scenario, by iteration. Reads come first, so that the
+    writes do not change the data they run on.
+    """
+    large_id, chain_id = large["_id"], chain["_id"]
+    comments_of = f"{TOPICS}/{large_id}/comments"
+    # Topics without comments, which can be updated and deleted
+    free = [topic["_id"] for topic in topics[2:]]
+    topic = {"title": "Hey!", "content": "Can you help me?", "username": "B"}
+    comment = {"content": "Sure! I can help you!", "username": "Alice"}
+    return [
+        ("list topics", lambda i: ("GET", f"{TOPICS}?limit=20", None)),
+        (
+            "list topics fields",
+            lambda i: ("GET", f"{TOPICS}?limit=20&fields=summary", None),
+        ),
+        (
+            "search topics",
+            lambda i: ("GET", f"{TOPICS}/search?term=mongodb+cursor", None),
+        ),
+        (
+            "filter topics",
+            lambda i: ("GET", f"{TOPICS}/search?username=user7", None),
+        ),
+        ("get topic", lambda i: ("GET", f"{TOPICS}/{large_id}", None)),
+        ("export topics", lambda i: ("GET", f"{TOPICS}/export", None)),
+        (
+            "export topic",
+            lambda i: ("GET", f"{TOPICS}/{large_id}/export", None),
+        ),
+        ("list comments", lambda i: ("GET", f"{comments_of}?limit=20", None)),
+        (
+            "search comments",
+            lambda i: ("GET", f"{comments_of}/search?term=reply", None),
+        ),
+        ("comment tree", lambda i: ("GET", f"{comments_of}/tree", None)),
+        (
+            "reply chain tree",
+            lambda i: ("GET", f"{TOPICS}/{chain_id}/comments/tree", None),
+        ),
+        (
+            "get comment",
+            lambda i: (
+                "GET",
+                f"{comments_of}/{comments[i % len(comments)]['_id']}",
+                None,
+            ),
+        ),
+        ("create topic", lambda i: ("POST", TOPICS, topic)),
+        ("create topics", lambda i: ("POST", f"{TOPICS}:bulk", [topic] * 20)),
+        (
+            "update topic",
+            lambda i: ("PUT", f"{TOPICS}/{free[i]}", {"title": f"{i}"}),
+        ),
+        ("create comment", lambda i: ("POST", comments_of, comment)),
+        (
+            "reply comment",
+            lambda i: (
+                "POST",
+                comments_of,
+                {**comment, "reply": comments[i % len(comments)]["_id"]},
+            ),
+        ),
+        (
+            "create comments",
+            lambda i: ("POST", f"{comments_of}:bulk", [comment] * 20),
+        ),
+        (
+            "update comment",
+            lambda i: (
+                "PUT",
+                f"{comments_of}/{comments[i % len(comments)]['_id']}",
+                {"content": f"{i}"},
+            ),
+        ),
+        (
+            "delete comment",
+            lambda i: (
+                "DELETE",
+                f"{comments_of}/{comments[-1 - i]['_id']}",
+                None,
+            ),
+        ),
+        (
+            "delete topic",
+            lambda i: ("DELETE", f"{TOPICS}/{free[-1 - i]}", None),
+        ),
+    ]
+
+
+async def measure(
+    client: FakeMotorClient, request: Callable[[int], Request], total: int
+) -> Result:
+    """Send `total` requests one after the other, then a few traced ones."""
+    latencies: List[float] = []
+    client.calls.clear()
+    status = 0
+    started = time.perf_counter()
+    for i in range(total):
+        sent = time.perf_counter()
+        status, _ = await call(*request(i))
+        latencies.append((time.perf_counter() - sent) * 1000)
+    elapsed = time.perf_counter() - started
+    round_trips = len(client.calls) / total
+
+    # Traced apart, as tracing slows every allocation down
+    peaks: List[int] = []
+    tracemalloc.start()
+    for i in range(total, total + min(total, 20)):
+        tracemalloc.clear_traces()
+        await call(*request(i))
+        peaks.append(tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+    latencies.sort()
+    return Result(
+        status=status,
+        throughput=round(total / elapsed, 1),
+        p50_ms=round(statistics.median(latencies), 3),
+        p99_ms=round(latencies[int(total * 0.99) - 1], 3),
+        round_trips=round(round_trips, 2),
+        peak_kib=round(statistics.median(peaks) / 1024, 1),
+    )
+
+
+def regressions(
+    name: str, result: Result, baseline: Dict[str, Any]
+) -> List[str]:
+    """What got worse than the baseline of a scenario."""
+    found: List[str] = []
+    if result.status != baseline["status"]:
+        found.append(f"status {result.status} != {baseline['status']}")
+    if result.round_trips > baseline["round_trips"]:
+        found.append(
+            f"round trips {result.round_trips} > {baseline['round_trips']}"
+        )
+    if result.p50_ms > baseline["p50_ms"] * LATENCY_TOLERANCE:
+        found.append(f"p50 {result.p50_ms} ms > {baseline['p50_ms']} ms")
+    peak_kib = max(
+        baseline["peak_kib"] * MEMORY_TOLERANCE,
+        baseline["peak_kib"] + MEMORY_FLOOR_KIB,
+    )
+    if result.peak_kib > peak_kib:
+        found.append(
+            f"peak {result.peak_kib} KiB > {baseline['peak_kib']} KiB"
+        )
+    return [f"{name}: {regression}" for regression in found]
+
+
+async def run(total: int, only: Optional[str]) -> Dict[str, Result]:
+    """Seed the data, then run every scenario."""
+    client = FakeMotorClient()
+    mongodb = client[settings.db_name]
+    await ensure_indexes(mongodb, deps.mongo_repositories(mongodb))
+    topics = generate_topics(1000 + total + 20)
+    large, chain = topics[0], topics[1]
+    comments = generate_comments(large, 2000)
+    await insert(mongodb, [*topics, *comments, *generate_chain(chain, 200)])
+    app.state.topic_usecase, app.state.comment_usecase = deps.build_usecases(
+        mongodb
+    )
+
+    results: Dict[str, Result] = {}
+    for name, request in scenarios(topics, large, comments, chain):
+        if only and only not in name:
+            continue
+        results[name] = result = await measure(client, request, total)
+        print(
+            f"{name:<20} {result.status}  {result.throughput:8.1f} req/s  "
+            f"p50 {result.p50_ms:8.3f} ms  p99 {result.p99_ms:8.3f} ms  "
+            f"{result.round_trips:5.2f} round trips  "
+            f"{result.peak_kib:8.1f} KiB"
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the endpoints.")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--only", help="scenarios whose name contains it")
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.requests, args.only))
+    if args.check:
+        baseline = json.loads(BASELINE.read_text())
+        found = [
+            regression
+            for name, result in results.items()
+            if name in baseline
+            for regression in regressions(name, result, baseline[name])
+        ]
+        for regression in found:
+            print(f"regression: {regression}")
+        if found:
+            sys.exit(1)
+    if args.save:
+        BASELINE.parent.mkdir(exist_ok=True)
+        content = {name: asdict(result) for name, result in results.items()}
+        BASELINE.write_text(json.dumps(content, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
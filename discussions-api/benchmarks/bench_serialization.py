@@ -0,0 +1,89 @@
+"""Serialization microbenchmarks.
+
+Compares the generic path (`jsonable_encoder`, then the stdlib `json` of
+`JSONResponse`) with the dedicated serializer and `FastJSONResponse`, which
+uses orjson when it is installed, for:
+
+- a model being stored on create,
+- a single document being rendered,
+- a page of 100 documents being rendered,
+- a thread of 5000 comments being rendered.
+
+Usage:
+    python -m benchmarks.bench_serialization [rounds]
+"""
+
+import sys
+import timeit
+from datetime import datetime
+from typing import Any, Callable, List, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.api.responses import FastJSONResponse, orjson
+from app.domain.comment import Comment
+from app.domain.page import Page
+from app.domain.serializer import dump
+from app.domain.thread import build_thread
+from app.domain.topic import Topic
+
+
+def comments(total: int) -> List[Any]:
+    """Stored comments, each replying to the previous one every other."""
+    docs: List[Any] = []
+    for i in range(total):
+        reply = docs[-1]["_id"] if docs and i % 2 else None
+        doc = dump(
+            Comment(
+                topic="t", reply=reply, content=f"comment {i}", username="Bob"
+            )
+        )
+        doc["updated"] = datetime.now()
+        docs.append(doc)
+    return docs
+
+
+def scenarios() -> List[Tuple[str, Callable[[], Any], Callable[[], Any]]]:
+    """Pairs of generic and fast ways to do the same thing."""
+    topic = Topic(title="Hey!", content="Can you help me?", username="Bob")
+    doc = dump(topic)
+    page = Page(items=comments(100))
+    thread = build_thread(comments(5000), 5000)
+    return [
+        ("store model", lambda: jsonable_encoder(topic), lambda: dump(topic)),
+        (
+            "render doc",
+            lambda: JSONResponse(jsonable_encoder(doc)),
+            lambda: FastJSONResponse(doc),
+        ),
+        (
+            "render page",
+            lambda: JSONResponse(jsonable_encoder(page)),
+            lambda: FastJSONResponse(page),
+        ),
+        (
+            "render tree",
+            lambda: JSONResponse(jsonable_encoder(thread)),
+            lambda: FastJSONResponse(thread),
+        ),
+    ]
+
+
+def main(rounds: int = 5) -> None:
+    """Time every scenario, best of `rounds`."""
+    print(f"fast encoder: {'orjson' if orjson is not None else 'json'}")
+    for name, generic, fast in scenarios():
+        timer = timeit.Timer(generic)
+        number, _ = timer.autorange()
+        generic_time = min(timer.repeat(rounds, number)) / number
+        fast_time = min(timeit.Timer(fast).repeat(rounds, number)) / number
+        print(
+            f"{name:<12} generic {generic_time * 1e6:10.1f} us  "
+            f"fast {fast_time * 1e6:10.1f} us  "
+            f"x{generic_time / fast_time:5.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
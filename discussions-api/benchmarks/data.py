@@ -0,0 +1,124 @@
+"""Synthetic data for the benchmarks and the perf tests.
+
+Ids and dates are drawn from seeded generators, so every run gets the
+same documents, which are stored as the repositories store them.
+"""
+
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.domain.comment import Comment
+from app.domain.serializer import dump
+from app.domain.topic import Topic
+
+COLLECTION_NAME = "discussions"
+START = datetime(2021, 1, 1)
+WORDS = (
+    "python mongodb async index cursor page thread reply search cache "
+    "latency deploy docker query schema migration topic comment help"
+).split()
+
+
+def new_id(rng: random.Random) -> str:
+    """A reproducible uuid4."""
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def sentence(rng: random.Random, length: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def generate_topics(total: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """`total` topics without comments, by a few hundred users."""
+    rng = random.Random(seed)
+    return [
+        dump(
+            Topic(
+                topic_id=new_id(rng),
+                title=sentence(rng, 4),
+                content=sentence(rng, 30),
+                username=f"user{rng.randrange(300)}",
+                created=START + timedelta(minutes=i),
+            )
+        )
+        for i in range(total)
+    ]
+
+
+def generate_comments(
+    topic: Dict[str, Any], total: int, reply_ratio: float = 0.8
+) -> List[Dict[str, Any]]:
+    """
+    `total` comments of a topic, a `reply_ratio` of them replying to an
+    earlier one, recent comments being more likely to be replied to. The
+    comment counters of the topic are updated.
+    """
+    rng = topic_random(topic)
+    comments: List[Dict[str, Any]] = []
+    for i in range(total):
+        reply: Optional[str] = None
+        if comments and rng.random() < reply_ratio:
+            reply = comments[int(len(comments) * rng.random() ** 0.3)]["_id"]
+        comments.append(comment(topic, rng, i, reply))
+    count_comments(topic, comments)
+    return comments
+
+
+def generate_chain(topic: Dict[str, Any], depth: int) -> List[Dict[str, Any]]:
+    """A chain of `depth` comments of a topic, each replying to the last."""
+    rng = topic_random(topic)
+    comments: List[Dict[str, Any]] = []
+    for i in range(depth):
+        reply = comments[-1]["_id"] if comments else None
+        comments.append(comment(topic, rng, i, reply))
+    count_comments(topic, comments)
+    return comments
+
+
+async def insert(
+    mongodb: AsyncIOMotorDatabase,
+    docs: List[Dict[str, Any]],
+    batch_size: int = 1000,
+) -> None:
+    """Insert documents, `batch_size` per round trip."""
+    collection = mongodb[COLLECTION_NAME]
+    for start in range(0, len(docs), batch_size):
+        end = start + batch_size
+        await collection.insert_many(docs[start:end])
+
+
+def topic_random(topic: Dict[str, Any]) -> random.Random:
+    """Generator seeded by a topic, so comment ids never meet topic ids."""
+    return random.Random(topic["_id"])
+
+
+def comment(
+    topic: Dict[str, Any],
+    rng: random.Random,
+    position: int,
+    reply: Optional[str],
+) -> Dict[str, Any]:
+    created = datetime.fromisoformat(topic["created"])
+    return dump(
+        Comment(
+            comment_id=new_id(rng),
+            topic=topic["_id"],
+            reply=reply,
+            content=sentence(rng, 12),
+            username=f"user{rng.randrange(300)}",
+            created=created + timedelta(seconds=position + 1),
+        )
+    )
+
+
+def count_comments(
+    topic: Dict[str, Any], comments: List[Dict[str, Any]]
+) -> None:
+    """Update the comment counters of a topic, as creating comments does."""
+    topic["comment_count"] = topic.get("comment_count", 0) + len(comments)
+    if comments:
+        topic["last_comment_at"] = comments[-1]["created"]
@@ -5,3 +5,18 @@ from dynaconf import Dynaconf
 settings = Dynaconf(
     envvar_prefix="", settings_files=["settings.toml", ".secrets.toml"],
 )
+
+# Reads of each repository sent with DB_REPLICA_READ_PREFERENCE: listings
+# and searches, which can lag behind the writes. Every other read, and the
+# reads of a client that must see its own writes, go to the primary
+REPLICA_READS = {
+    "topic": {"find", "search", "rank", "export"},
+    "comment": {
+        "find_by_topic",
+        "search",
+        "rank",
+        "export",
+        "find_thread",
+        "find_replies",
+    },
+}
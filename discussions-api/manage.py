@@ -0,0 +1,242 @@
+"""Management commands module."""
+
+import argparse
+import asyncio
+import sys
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.api import deps
+from app.repository.counters import backfill_comment_stats
+from app.repository.indexes import ensure_indexes
+from app.repository.rebalance import rebalance
+from app.repository.search_index import SnapshotInUse
+from app.repository.sync import sync_collection
+from config import settings
+
+
+async def migrate_indexes(args: argparse.Namespace) -> int:
+    """Create the missing indexes and report any drift."""
+    client = deps.get_mongodb_client()
+    try:
+        shards = deps.shard_databases(client[settings.db_name])
+        reports = [
+            (
+                shard.name,
+                await ensure_indexes(
+                    shard,
+                    deps.mongo_repositories(shard),
+                    create=not args.check,
+                ),
+            )
+            for shard in shards
+        ]
+    finally:
+        deps.close_shard_clients()
+        client.close()
+    for name, report in reports:
+        for line in report.lines():
+            print(f"{name}: {line}")
+    if any(
+        report.has_drift or (args.check and report.missing)
+        for _, report in reports
+    ):
+        return 1
+    if not any(report.lines() for _, report in reports):
+        print("indexes are up to date")
+    return 0
+
+
+async def repair_comment_stats(args: argparse.Namespace) -> int:
+    """Recompute the comment counter of every topic."""
+    client = deps.get_mongodb_client()
+    try:
+        if args.backfill:
+            return await _backfill_comment_stats(client[settings.db_name])
+        topic_usecase, _ = deps.build_usecases(client[settings.db_name])
+        fixed = await topic_usecase.repair_comment_stats()
+    finally:
+        deps.close_shard_clients()
+        client.close()
+    print(f"fixed the comment counter of {fixed} topics")
+    return 0
+
+
+async def _backfill_comment_stats(mongodb: AsyncIOMotorDatabase) -> int:
+    """Count the comments of the topics without a counter, on every shard."""
+    for shard in deps.shard_databases(mongodb):
+        (topic_repo, comment_repo), _ = deps.mongo_layouts(shard)
+        filled = await backfill_comment_stats(
+            topic_repo, comment_repo, settings.export_batch_size
+        )
+        print(f"{shard.name}: filled the comment counter of {filled} topics")
+    return 0
+
+
+async def rebuild_search_index(args: argparse.Namespace) -> int:
+    """Rebuild the search index from the database and snapshot it."""
+    backend = deps.build_search_backend()
+    if backend is None:
+        print("the search backend is MongoDB, there is no index to build")
+        return 1
+    client = deps.get_mongodb_client()
+    try:
+        topic_repo, comment_repo = deps.build_mongo_repositories(
+            client[settings.db_name]
+        )
+        await backend.rebuild(
+            topic_repo.export(settings.export_batch_size),
+            comment_repo.export(None, settings.export_batch_size),
+        )
+    finally:
+        deps.close_shard_clients()
+        client.close()
+    try:
+        await backend.close()
+    except SnapshotInUse as err:
+        # The running process would overwrite it on shutdown
+        print(err)
+        return 1
+    print("search index rebuilt")
+    return 0
+
+
+async def sync_collections(args: argparse.Namespace) -> int:
+    """
+    Copy the topics and comments of the collection layout read from to the
+    other one, or only report how they differ.
+    """
+    client = deps.get_mongodb_client()
+    try:
+        reports = []
+        for shard in deps.shard_databases(client[settings.db_name]):
+            layout, other = deps.mongo_layouts(shard)
+            if not args.check:
+                await ensure_indexes(shard, other)
+            for source, target in zip(layout, other):
+                reports.append(
+                    await sync_collection(
+                        source, target, args.batch_size, not args.check
+                    )
+                )
+    finally:
+        deps.close_shard_clients()
+        client.close()
+    for report in reports:
+        for line in report.lines():
+            print(line)
+    if args.check and not all(report.in_sync for report in reports):
+        return 1
+    return 0
+
+
+async def rebalance_shards(args: argparse.Namespace) -> int:
+    """
+    Copy the topics and their comments to the shard they belong to, then
+    delete them from the one they left if asked to.
+    """
+    if not settings.db_shards:
+        print("the topics are not sharded, there is nothing to rebalance")
+        return 1
+    client = deps.get_mongodb_client()
+    try:
+        shards = deps.shard_databases(client[settings.db_name])
+        topic_repos, comment_repos = zip(
+            *(deps.mongo_layouts(shard)[0] for shard in shards)
+        )
+        ring = deps.build_hash_ring()
+        reports = []
+        # Comments follow the shard of their topic
+        for repos, key in ((topic_repos, "_id"), (comment_repos, "topic")):
+            reports += await rebalance(
+                list(repos),
+                ring,
+                key,
+                args.batch_size,
+                fix=not args.check,
+                prune=args.prune,
+            )
+    except ValueError as err:
+        print(err)
+        return 1
+    finally:
+        deps.close_shard_clients()
+        client.close()
+    for report in reports:
+        for line in report.lines():
+            print(line)
+    if args.check and any(report.misplaced for report in reports):
+        return 1
+    return 0
+
+
+def main() -> int:
+    """Parse the command line and run the selected command."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    indexes = commands.add_parser("indexes", help=migrate_indexes.__doc__)
+    indexes.add_argument(
+        "--check",
+        action="store_true",
+        help="only report missing or drifted indexes",
+    )
+    indexes.set_defaults(handler=migrate_indexes)
+
+    comment_stats = commands.add_parser(
+        "comment-stats", help=repair_comment_stats.__doc__
+    )
+    comment_stats.add_argument(
+        "--backfill",
+        action="store_true",
+        help="only count the comments of the topics without a counter",
+    )
+    comment_stats.set_defaults(handler=repair_comment_stats)
+
+    search_index = commands.add_parser(
+        "search-index", help=rebuild_search_index.__doc__
+    )
+    search_index.set_defaults(handler=rebuild_search_index)
+
+    collections = commands.add_parser(
+        "collections", help=sync_collections.__doc__
+    )
+    collections.add_argument(
+        "--check",
+        action="store_true",
+        help="only report the documents that differ",
+    )
+    collections.add_argument(
+        "--batch-size",
+        type=int,
+        default=settings.export_batch_size,
+        help="documents read and written per round trip",
+    )
+    collections.set_defaults(handler=sync_collections)
+
+    shards = commands.add_parser("shards", help=rebalance_shards.__doc__)
+    shards.add_argument(
+        "--check",
+        action="store_true",
+        help="only report the documents on the wrong shard",
+    )
+    shards.add_argument(
+        "--prune",
+        action="store_true",
+        help="once the new shards are deployed, copy the documents created "
+        "since the last copy and delete them from the shard they left",
+    )
+    shards.add_argument(
+        "--batch-size",
+        type=int,
+        default=settings.export_batch_size,
+        help="documents read and written per round trip",
+    )
+    shards.set_defaults(handler=rebalance_shards)
+
+    args = parser.parse_args()
+    return asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,781 @@
+"""In-memory stand-in for the parts of Motor used by the repositories."""
+
+import asyncio
+import copy
+import re
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import (
+    DeleteResult,
+    InsertManyResult,
+    InsertOneResult,
+    UpdateResult,
+)
+
+MISSING = object()
+
+
+def get_path(doc: Dict[str, Any], path: str) -> Any:
+    """Get a dotted path from a document, or MISSING."""
+    value: Any = doc
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return MISSING
+        value = value[part]
+    return value
+
+
+def sort_key(value: Any) -> Tuple[int, Any]:
+    """Order values of different types the way MongoDB does (roughly)."""
+    if value is MISSING or value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (3, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (4, str(value))
+
+
+def constrained_fields(query: Dict[str, Any]) -> Set[str]:
+    """Fields a query constrains, through `$and` but not `$or`."""
+    fields: Set[str] = set()
+    for key, value in query.items():
+        if key == "$and":
+            for sub in value:
+                fields |= constrained_fields(sub)
+        elif not key.startswith("$"):
+            fields.add(key)
+    return fields
+
+
+def tokenize(text: Any) -> List[str]:
+    """Split a text into lower case words."""
+    return re.findall(r"\w+", str(text).lower())
+
+
+class FakeCollection:
+    """In-memory collection recording every round trip."""
+
+    def __init__(self, database: "FakeDatabase", name: str) -> None:
+        self.database = database
+        self.name = name
+        self.docs: Dict[Any, Dict[str, Any]] = {}
+        self.indexes: Dict[str, Dict[str, Any]] = {
+            "_id_": {"key": [("_id", 1)], "v": 2}
+        }
+        self.calls: List[str] = []
+
+    # Helpers
+
+    async def _record(self, operation: str) -> None:
+        """Record a round trip, waiting for the simulated network latency."""
+        self.calls.append(operation)
+        client = self.database.client
+        client.calls.append(f"{self.name}.{operation}")
+        if client.service_time:
+            # Created on first use, in the loop of the caller
+            if client.server is None:
+                client.server = asyncio.Lock()
+            async with client.server:
+                await asyncio.sleep(client.service_time)
+        if client.latency:
+            await asyncio.sleep(client.latency)
+
+    def text_weights(self) -> Dict[str, int]:
+        """Weights of the text index of the collection."""
+        for info in self.indexes.values():
+            if "weights" in info:
+                return dict(info["weights"])
+        return {}
+
+    def text_score(self, doc: Dict[str, Any], search: str) -> float:
+        """Score a document against a `$text` search."""
+        weights = self.text_weights()
+        if not weights:
+            raise OperationFailure("text index required for $text query", 27)
+        terms = set(tokenize(search))
+        score = 0.0
+        for field, weight in weights.items():
+            value = get_path(doc, field)
+            if value is MISSING:
+                continue
+            words = tokenize(value)
+            matches = sum(1 for word in words if word in terms)
+            score += weight * matches
+        return score
+
+    def matches(self, doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+        """Whether a document matches a query."""
+        for key, condition in query.items():
+            if key == "$and":
+                if not all(self.matches(doc, q) for q in condition):
+                    return False
+            elif key == "$or":
+                if not any(self.matches(doc, q) for q in condition):
+                    return False
+            elif key == "$nor":
+                if any(self.matches(doc, q) for q in condition):
+                    return False
+            elif key == "$text":
+                if self.text_score(doc, condition["$search"]) <= 0:
+                    return False
+            elif not self._match_value(get_path(doc, key), condition):
+                return False
+        return True
+
+    def _match_value(self, value: Any, condition: Any) -> bool:
+        if isinstance(condition, dict) and any(
+            k.startswith("$") for k in condition
+        ):
+            return all(
+                self._match_operator(value, op, arg)
+                for op, arg in condition.items()
+            )
+        if value is MISSING:
+            return condition is None
+        if isinstance(value, list) and not isinstance(condition, list):
+            return condition in value
+        return bool(value == condition)
+
+    def _match_operator(self, value: Any, op: str, arg: Any) -> bool:
+        if op == "$eq":
+            return self._match_value(value, arg)
+        if op == "$ne":
+            return not self._match_value(value, arg)
+        if op == "$in":
+            return any(self._match_value(value, a) for a in arg)
+        if op == "$nin":
+            return not any(self._match_value(value, a) for a in arg)
+        if op == "$exists":
+            return (value is not MISSING) == bool(arg)
+        if op == "$not":
+            return not self._match_value(value, arg)
+        if op in ("$gt", "$gte", "$lt", "$lte"):
+            if value is MISSING or value is None:
+                return False
+            if type(value) is not type(arg) and not (
+                isinstance(value, (int, float))
+                and isinstance(arg, (int, float))
+            ):
+                return False
+            return {
+                "$gt": value > arg,
+                "$gte": value >= arg,
+                "$lt": value < arg,
+                "$lte": value <= arg,
+            }[op]
+        if op == "$regex":
+            return value is not MISSING and bool(re.search(arg, str(value)))
+        raise NotImplementedError(op)
+
+    def project(
+        self,
+        doc: Dict[str, Any],
+        projection: Optional[Dict[str, Any]],
+        query: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Apply a projection to a document."""
+        doc = copy.deepcopy(doc)
+        if not projection:
+            return doc
+        meta = {
+            k: v
+            for k, v in projection.items()
+            if isinstance(v, dict) and "$meta" in v
+        }
+        plain = {k: v for k, v in projection.items() if k not in meta}
+        if any(v for k, v in plain.items() if k != "_id"):
+            result = {k: doc[k] for k, v in plain.items() if v and k in doc}
+            if plain.get("_id", 1) and "_id" in doc:
+                result["_id"] = doc["_id"]
+        else:
+            result = {k: v for k, v in doc.items() if plain.get(k, 1)}
+        for key in meta:
+            result[key] = self.text_score(doc, self._search(query))
+        return result
+
+    def _search(self, query: Optional[Dict[str, Any]]) -> str:
+        """Find the `$text` search of a query."""
+        for key, value in (query or {}).items():
+            if key == "$text":
+                return str(value["$search"])
+            if key in ("$and", "$or"):
+                for sub in value:
+                    if search := self._search(sub):
+                        return search
+        return ""
+
+    def query_plan(
+        self, query: Dict[str, Any], sort: List[Tuple[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Winning plan MongoDB would roughly pick: the text index for a text
+        search, else the index whose leading fields the query constrains
+        the most, else one whose leading field it is sorted on, else a
+        collection scan.
+        """
+        if self._search(query):
+            for name, info in self.indexes.items():
+                if "weights" in info:
+                    return {
+                        "stage": "TEXT_MATCH",
+                        "inputStage": {"stage": "TEXT_OR", "indexName": name},
+                    }
+            raise OperationFailure("text index required for $text query")
+        fields = constrained_fields(query)
+        best, best_prefix = None, 0
+        for name, info in self.indexes.items():
+            keys = [key for key, _ in info["key"]]
+            prefix = 0
+            while prefix < len(keys) and keys[prefix] in fields:
+                prefix += 1
+            if prefix > best_prefix:
+                best, best_prefix = name, prefix
+        if best is None and sort:
+            for name, info in self.indexes.items():
+                if info["key"][0][0] == sort[0][0]:
+                    best = name
+        if best is None:
+            return {"stage": "COLLSCAN", "filter": query}
+        return {
+            "stage": "FETCH",
+            "inputStage": {
+                "stage": "IXSCAN",
+                "indexName": best,
+                "keyPattern": dict(self.indexes[best]["key"]),
+            },
+        }
+
+    def explain(
+        self, query: Dict[str, Any], sort: List[Tuple[str, Any]]
+    ) -> Dict[str, Any]:
+        return {
+            "queryPlanner": {
+                "namespace": f"{self.database.name}.{self.name}",
+                "parsedQuery": query,
+                "winningPlan": self.query_plan(query, sort),
+            },
+            "ok": 1.0,
+        }
+
+    def explain_pipeline(
+        self, pipeline: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Plan of the leading `$match` and `$sort` of a pipeline."""
+        query = pipeline[0].get("$match", {}) if pipeline else {}
+        rest = pipeline[1:] if query else pipeline
+        sort: List[Tuple[str, Any]] = []
+        if rest and "$sort" in rest[0]:
+            sort = list(rest[0]["$sort"].items())
+        cursor = {"$cursor": self.explain(query, sort)}
+        return {"stages": [cursor, *rest], "ok": 1.0}
+
+    def _filter(self, query: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        for doc in list(self.docs.values()):
+            if self.matches(doc, query):
+                yield doc
+
+    def _apply_update(
+        self, doc: Dict[str, Any], update: Dict[str, Any], insert: bool
+    ) -> None:
+        for op, fields in update.items():
+            for key, value in fields.items():
+                if op == "$set":
+                    doc[key] = copy.deepcopy(value)
+                elif op == "$setOnInsert":
+                    if insert:
+                        doc[key] = copy.deepcopy(value)
+                elif op == "$unset":
+                    doc.pop(key, None)
+                elif op == "$inc":
+                    doc[key] = doc.get(key, 0) + value
+                elif op == "$max":
+                    if key not in doc or sort_key(value) > sort_key(doc[key]):
+                        doc[key] = value
+                elif op == "$min":
+                    if key not in doc or sort_key(value) < sort_key(doc[key]):
+                        doc[key] = value
+                else:
+                    raise NotImplementedError(op)
+
+    def _upsert_doc(
+        self, query: Dict[str, Any], update: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        doc = {
+            k: v
+            for k, v in query.items()
+            if not k.startswith("$") and not isinstance(v, dict)
+        }
+        self._apply_update(doc, update, insert=True)
+        self._insert(doc)
+        return doc
+
+    def _insert(self, doc: Dict[str, Any]) -> Any:
+        if "_id" not in doc:
+            raise ValueError("fake collection documents need an _id")
+        if doc["_id"] in self.docs:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error _id: {doc['_id']}", 11000
+            )
+        self.docs[doc["_id"]] = copy.deepcopy(doc)
+        return doc["_id"]
+
+    # Motor API
+
+    def find(
+        self,
+        query: Optional[Dict[str, Any]] = None,
+        projection: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> "FakeCursor":
+        return FakeCursor(self, query or {}, projection)
+
+    async def find_one(
+        self,
+        query: Optional[Dict[str, Any]] = None,
+        projection: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> Optional[Dict[str, Any]]:
+        await self._record("find_one")
+        for doc in self._filter(query or {}):
+            return self.project(doc, projection, query)
+        return None
+
+    async def count_documents(
+        self, query: Dict[str, Any], **kwargs: Any
+    ) -> int:
+        await self._record("count_documents")
+        return sum(1 for _ in self._filter(query))
+
+    def with_options(self, **kwargs: Any) -> "FakeCollection":
+        """The same collection, options such as write concerns are moot."""
+        return self
+
+    async def insert_one(
+        self, doc: Dict[str, Any], **kwargs: Any
+    ) -> InsertOneResult:
+        await self._record("insert_one")
+        return InsertOneResult(self._insert(doc), True)
+
+    async def insert_many(
+        self, docs: List[Dict[str, Any]], ordered: bool = True, **kwargs: Any
+    ) -> InsertManyResult:
+        await self._record("insert_many")
+        if not docs:
+            raise TypeError("documents must be a non-empty list")
+        inserted_ids: List[Any] = []
+        write_errors: List[Dict[str, Any]] = []
+        for index, doc in enumerate(docs):
+            try:
+                inserted_ids.append(self._insert(doc))
+            except DuplicateKeyError as err:
+                write_errors.append(
+                    {"index": index, "code": err.code, "errmsg": str(err)}
+                )
+                if ordered:
+                    break
+        if write_errors:
+            raise BulkWriteError(
+                {
+                    "writeErrors": write_errors,
+                    "writeConcernErrors": [],
+                    "nInserted": len(inserted_ids),
+                }
+            )
+        return InsertManyResult(inserted_ids, True)
+
+    async def update_one(
+        self,
+        query: Dict[str, Any],
+        update: Dict[str, Any],
+        upsert: bool = False,
+        **kwargs: Any,
+    ) -> UpdateResult:
+        await self._record("update_one")
+        for doc in self._filter(query):
+            before = copy.deepcopy(doc)
+            self._apply_update(doc, update, insert=False)
+            modified = int(before != doc)
+            return UpdateResult({"n": 1, "nModified": modified}, True)
+        if upsert:
+            doc = self._upsert_doc(query, update)
+            return UpdateResult(
+                {"n": 1, "nModified": 0, "upserted": doc["_id"]}, True
+            )
+        return UpdateResult({"n": 0, "nModified": 0}, True)
+
+    async def find_one_and_update(
+        self,
+        query: Dict[str, Any],
+        update: Dict[str, Any],
+        projection: Optional[Dict[str, Any]] = None,
+        upsert: bool = False,
+        return_document: bool = ReturnDocument.BEFORE,
+        **kwargs: Any,
+    ) -> Optional[Dict[str, Any]]:
+        await self._record("find_one_and_update")
+        for doc in self._filter(query):
+            before = self.project(doc, projection)
+            self._apply_update(doc, update, insert=False)
+            if return_document == ReturnDocument.AFTER:
+                return self.project(doc, projection)
+            return before
+        if upsert:
+            doc = self._upsert_doc(query, update)
+            if return_document == ReturnDocument.AFTER:
+                return self.project(doc, projection)
+        return None
+
+    async def delete_one(
+        self, query: Dict[str, Any], **kwargs: Any
+    ) -> DeleteResult:
+        await self._record("delete_one")
+        for doc in self._filter(query):
+            del self.docs[doc["_id"]]
+            return DeleteResult({"n": 1}, True)
+        return DeleteResult({"n": 0}, True)
+
+    async def delete_many(
+        self, query: Dict[str, Any], **kwargs: Any
+    ) -> DeleteResult:
+        await self._record("delete_many")
+        deleted = list(self._filter(query))
+        for doc in deleted:
+            del self.docs[doc["_id"]]
+        return DeleteResult({"n": len(deleted)}, True)
+
+    async def replace_one(
+        self, query: Dict[str, Any], replacement: Dict[str, Any], **kwargs: Any
+    ) -> UpdateResult:
+        await self._record("replace_one")
+        for doc in self._filter(query):
+            self.docs[doc["_id"]] = {
+                **copy.deepcopy(replacement),
+                "_id": doc["_id"],
+            }
+            return UpdateResult({"n": 1, "nModified": 1}, True)
+        return UpdateResult({"n": 0, "nModified": 0}, True)
+
+    async def create_indexes(
+        self, models: List[Any], **kwargs: Any
+    ) -> List[str]:
+        await self._record("create_indexes")
+        names = []
+        for model in models:
+            document = dict(model.document)
+            name = document.pop("name")
+            keys = list(document.pop("key").items())
+            if any(kind == "text" for _, kind in keys):
+                text_fields = [f for f, kind in keys if kind == "text"]
+                weights = document.pop("weights", {})
+                document["weights"] = {
+                    f: weights.get(f, 1) for f in text_fields
+                }
+                keys = [(f, k) for f, k in keys if k != "text"]
+                keys += [("_fts", "text"), ("_ftsx", 1)]
+            self.indexes[name] = {"key": keys, "v": 2, **document}
+            names.append(name)
+        return names
+
+    async def index_information(self) -> Dict[str, Dict[str, Any]]:
+        await self._record("index_information")
+        return copy.deepcopy(self.indexes)
+
+    async def drop_index(self, name: str, **kwargs: Any) -> None:
+        await self._record("drop_index")
+        del self.indexes[name]
+
+    def aggregate(
+        self, pipeline: List[Dict[str, Any]], **kwargs: Any
+    ) -> "FakeCommandCursor":
+        return FakeCommandCursor(self, pipeline)
+
+    def sort_docs(
+        self,
+        docs: List[Dict[str, Any]],
+        sort: List[Tuple[str, Any]],
+        search: str = "",
+    ) -> List[Dict[str, Any]]:
+        """Sort documents by a list of (key, direction) pairs."""
+        for key, direction in reversed(sort):
+            if isinstance(direction, dict):
+                docs.sort(
+                    key=lambda d: self.text_score(d, search), reverse=True
+                )
+            else:
+                docs.sort(
+                    key=lambda d: sort_key(get_path(d, key)),
+                    reverse=direction == -1,
+                )
+        return docs
+
+    def run_pipeline(
+        self, pipeline: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Run the aggregation stages supported by the fake."""
+        search = ""
+        docs: List[Dict[str, Any]] = [
+            copy.deepcopy(doc) for doc in self.docs.values()
+        ]
+        for stage in pipeline:
+            ((name, arg),) = stage.items()
+            if name == "$match":
+                search = search or self._search(arg)
+                docs = [doc for doc in docs if self.matches(doc, arg)]
+            elif name == "$addFields":
+                for doc in docs:
+                    for key, value in arg.items():
+                        if isinstance(value, dict) and "$meta" in value:
+                            doc[key] = self.text_score(doc, search)
+                        elif isinstance(value, str) and value.startswith("$"):
+                            doc[key] = get_path(doc, value[1:])
+                        else:
+                            doc[key] = value
+            elif name == "$sort":
+                docs = self.sort_docs(docs, list(arg.items()), search)
+            elif name == "$skip":
+                docs = docs[arg:]
+            elif name == "$limit":
+                docs = docs[:arg]
+            elif name == "$group":
+                docs = self._group(docs, arg)
+            elif name == "$project":
+                docs = [self.project(doc, arg) for doc in docs]
+            elif name == "$graphLookup":
+                for doc in docs:
+                    doc[arg["as"]] = self._graph_lookup(doc, arg)
+            elif name == "$unwind":
+                field = arg[1:]
+                docs = [
+                    {**doc, field: value}
+                    for doc in docs
+                    for value in doc.get(field) or []
+                ]
+            elif name == "$replaceRoot":
+                docs = [self._expression(doc, arg["newRoot"]) for doc in docs]
+            else:
+                raise NotImplementedError(name)
+        return docs
+
+    def _graph_lookup(
+        self, doc: Dict[str, Any], spec: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Search a collection recursively, breadth first."""
+        collection = self.database[spec["from"]]
+        restrict = spec.get("restrictSearchWithMatch", {})
+        max_depth = spec.get("maxDepth")
+        values = [self._expression(doc, spec["startWith"])]
+        found: Dict[Any, Dict[str, Any]] = {}
+        depth = 0
+        while values and (max_depth is None or depth <= max_depth):
+            level = [
+                other
+                for other in collection.docs.values()
+                if other["_id"] not in found
+                and other.get(spec["connectToField"]) in values
+                and collection.matches(other, restrict)
+            ]
+            for other in level:
+                found[other["_id"]] = copy.deepcopy(other)
+                if "depthField" in spec:
+                    found[other["_id"]][spec["depthField"]] = depth
+            values = [other.get(spec["connectFromField"]) for other in level]
+            depth += 1
+        return list(found.values())
+
+    def _group(
+        self, docs: List[Dict[str, Any]], spec: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        groups: Dict[Any, Dict[str, Any]] = {}
+        for doc in docs:
+            group_id = self._expression(doc, spec["_id"])
+            group = groups.setdefault(group_id, {"_id": group_id})
+            for field, accumulator in spec.items():
+                if field == "_id":
+                    continue
+                ((op, expression),) = accumulator.items()
+                value = self._expression(doc, expression)
+                if op == "$sum":
+                    group[field] = group.get(field, 0) + value
+                elif op == "$max":
+                    if field not in group or value > group[field]:
+                        group[field] = value
+                elif op == "$min":
+                    if field not in group or value < group[field]:
+                        group[field] = value
+                elif op == "$push":
+                    group.setdefault(field, []).append(value)
+                else:
+                    raise NotImplementedError(op)
+        return list(groups.values())
+
+    def _expression(self, doc: Dict[str, Any], expression: Any) -> Any:
+        if isinstance(expression, str) and expression.startswith("$"):
+            value = get_path(doc, expression[1:])
+            return None if value is MISSING else value
+        return expression
+
+
+class FakeCommandCursor:
+    """In-memory aggregation cursor."""
+
+    def __init__(
+        self, collection: FakeCollection, pipeline: List[Dict[str, Any]]
+    ) -> None:
+        self.collection = collection
+        self.pipeline = pipeline
+        self._results: Optional[Iterator[Dict[str, Any]]] = None
+
+    async def _run(self) -> List[Dict[str, Any]]:
+        await self.collection._record("aggregate")
+        return self.collection.run_pipeline(self.pipeline)
+
+    def __aiter__(self) -> "FakeCommandCursor":
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        if self._results is None:
+            self._results = iter(await self._run())
+        try:
+            return next(self._results)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length: Optional[int]) -> List[Dict[str, Any]]:
+        docs = await self._run()
+        return docs[:length] if length else docs
+
+
+class FakeCursor:
+    """In-memory cursor that runs its query on first iteration."""
+
+    def __init__(
+        self,
+        collection: FakeCollection,
+        query: Dict[str, Any],
+        projection: Optional[Dict[str, Any]],
+    ) -> None:
+        self.collection = collection
+        self.query = query
+        self.projection = projection
+        self._sort: List[Tuple[str, Any]] = []
+        self._skip = 0
+        self._limit = 0
+        self._batch_size = 0
+        self._results: Optional[Iterator[Dict[str, Any]]] = None
+        self.closed = False
+
+    def sort(self, key: Any, direction: Any = None) -> "FakeCursor":
+        if isinstance(key, str):
+            self._sort = [(key, direction or 1)]
+        else:
+            self._sort = list(key)
+        return self
+
+    def skip(self, skip: int) -> "FakeCursor":
+        self._skip = skip
+        return self
+
+    def limit(self, limit: int) -> "FakeCursor":
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size: int) -> "FakeCursor":
+        self._batch_size = batch_size
+        return self
+
+    async def _run(self) -> List[Dict[str, Any]]:
+        await self.collection._record("find")
+        search = self.collection._search(self.query)
+        docs = list(self.collection._filter(self.query))
+        docs = self.collection.sort_docs(docs, self._sort, search)
+        del docs[: self._skip]
+        if self._limit:
+            docs = docs[: self._limit]
+        return [
+            self.collection.project(doc, self.projection, self.query)
+            for doc in docs
+        ]
+
+    def __aiter__(self) -> "FakeCursor":
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        if self._results is None:
+            self._results = iter(await self._run())
+        try:
+            return next(self._results)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length: Optional[int]) -> List[Dict[str, Any]]:
+        docs = await self._run()
+        return docs[:length] if length else docs
+
+    async def explain(self) -> Dict[str, Any]:
+        await self.collection._record("explain")
+        return self.collection.explain(self.query, self._sort)
+
+    async def close(self) -> None:
+        self.closed = True
+        self._results = iter([])
+
+
+class FakeDatabase:
+    """In-memory database."""
+
+    def __init__(self, client: "FakeMotorClient", name: str) -> None:
+        self.client = client
+        self.name = name
+        self.collections: Dict[str, FakeCollection] = {}
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(self, name)
+        return self.collections[name]
+
+    def with_options(self, **kwargs: Any) -> "FakeDatabase":
+        return self
+
+    async def command(
+        self, command: str, value: Any = None, **kwargs: Any
+    ) -> Dict[str, Any]:
+        """Run a command; only `ping` and explained aggregations."""
+        if command == "ping":
+            return {"ok": 1.0}
+        if command == "aggregate" and kwargs.get("explain"):
+            collection = self[str(value)]
+            await collection._record("explain")
+            return collection.explain_pipeline(kwargs["pipeline"])
+        raise OperationFailure(f"no such command: '{command}'")
+
+
+class FakeMotorClient:
+    """
+    In-memory client; `calls` records every round trip in order.
+
+    Each round trip waits `latency` seconds to simulate the network, and
+    `service_time` seconds on a server serving one round trip at a time to
+    simulate a busy primary.
+    """
+
+    def __init__(
+        self, latency: float = 0.0, service_time: float = 0.0
+    ) -> None:
+        self.databases: Dict[str, FakeDatabase] = {}
+        self.calls: List[str] = []
+        self.latency = latency
+        self.service_time = service_time
+        self.server: Optional[asyncio.Lock] = None
+
+    def __getitem__(self, name: str) -> FakeDatabase:
+        if name not in self.databases:
+            self.databases[name] = FakeDatabase(self, name)
+        return self.databases[name]
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,92 @@
+"""In-memory server speaking the subset of the Redis protocol we use."""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class FakeRedisServer:
+    """Redis compatible server for tests, run with `async with`."""
+
+    def __init__(self) -> None:
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.commands: List[str] = []
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.port = 0
+
+    @property
+    def url(self) -> str:
+        return f"redis://127.0.0.1:{self.port}/0"
+
+    async def __aenter__(self) -> "FakeRedisServer":
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        assert self.server.sockets is not None
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        assert self.server is not None
+        self.server.close()
+        await self.server.wait_closed()
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def _run(self, args: List[bytes]) -> bytes:
+        command = args[0].decode().upper()
+        self.commands.append(command)
+        if command in ("PING", "AUTH", "SELECT", "FLUSHALL"):
+            if command == "FLUSHALL":
+                self.data.clear()
+            return b"+OK\r\n"
+        if command == "GET":
+            value = self._get(args[1])
+            if value is None:
+                return b"$-1\r\n"
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        if command == "SET":
+            expires_at = None
+            if len(args) == 5 and args[3].upper() == b"PX":
+                expires_at = time.monotonic() + int(args[4]) / 1000
+            self.data[args[1]] = (args[2], expires_at)
+            return b"+OK\r\n"
+        if command == "DEL":
+            deleted = sum(self.data.pop(k, None) is not None for k in args[1:])
+            return b":%d\r\n" % deleted
+        if command == "INCR":
+            entry = self.data.get(args[1])
+            count = int(self._get(args[1]) or 0) + 1
+            expires_at = entry[1] if entry else None
+            self.data[args[1]] = (str(count).encode(), expires_at)
+            return b":%d\r\n" % count
+        if command == "PEXPIRE":
+            if self._get(args[1]) is None:
+                return b":0\r\n"
+            value, _ = self.data[args[1]]
+            expires_at = time.monotonic() + int(args[2]) / 1000
+            self.data[args[1]] = (value, expires_at)
+            return b":1\r\n"
+        return b"-ERR unknown command '%s'\r\n" % command.encode()
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while line := await reader.readline():
+                args = []
+                for _ in range(int(line[1:-2])):
+                    size = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(size + 2))[:-2])
+                writer.write(self._run(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,60 @@
+"""Bulk requests module test."""
+
+import json
+
+from _pytest.monkeypatch import MonkeyPatch
+from fastapi.testclient import TestClient
+
+from app.api import bulk
+from config import settings
+
+TOPICS = f"{settings.api_v1}/topics"
+
+
+def test_create_topics_reports_errors(fake_client: TestClient) -> None:
+    """Test invalid topics do not prevent the others from being created."""
+    topic = {"title": "Hey!", "content": "Can you help me?", "username": "Bob"}
+
+    response = fake_client.post(
+        f"{TOPICS}:bulk", json=[topic, {"title": "No content"}, topic]
+    )
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["created"] == 2
+    assert [error["index"] for error in result["errors"]] == [1]
+    assert fake_client.post(f"{TOPICS}:bulk", json={}).status_code == 422
+
+
+def test_create_comments_from_ndjson(
+    fake_client: TestClient, monkeypatch: MonkeyPatch
+) -> None:
+    """Test comments streamed as NDJSON are created chunk by chunk."""
+    monkeypatch.setattr(bulk.settings, "bulk_chunk_size", 2, raising=False)
+    topic_id = fake_client.post(
+        TOPICS,
+        json={
+            "title": "Hey!",
+            "content": "Can you help me?",
+            "username": "Bob",
+        },
+    ).json()["_id"]
+    lines = [
+        json.dumps({"_id": "c1", "content": "Sure!", "username": "Alice"}),
+        json.dumps({"content": "Thanks!", "username": "Bob", "reply": "c1"}),
+        "{not json",
+        json.dumps({"content": "You are welcome", "username": "Alice"}),
+    ]
+
+    response = fake_client.post(
+        f"{TOPICS}/{topic_id}/comments:bulk",
+        data="\n".join(lines).encode(),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["created"] == 3
+    assert [error["index"] for error in result["errors"]] == [2]
+    topic = fake_client.get(f"{TOPICS}/{topic_id}").json()
+    assert topic["comment_count"] == 3
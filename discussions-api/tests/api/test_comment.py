@@ -0,0 +1,143 @@
+"""Comment router module test."""
+
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.api import deps
+from app.domain.page import encode_cursor
+from app.repository.indexes import ensure_indexes
+from config import settings
+from testing.mongo import FakeDatabase
+
+TOPICS = f"{settings.api_v1}/topics"
+
+
+def test_get_comment_tree(fake_client: TestClient) -> None:
+    """Test the tree route is not taken for a comment id."""
+    topic_id = fake_client.post(
+        TOPICS,
+        json={
+            "title": "Hey!",
+            "content": "Can you help me?",
+            "username": "Bob",
+        },
+    ).json()["_id"]
+    comment_id = fake_client.post(
+        f"{TOPICS}/{topic_id}/comments",
+        json={"content": "Sure!", "username": "Alice"},
+    ).json()["_id"]
+    fake_client.post(
+        f"{TOPICS}/{topic_id}/comments",
+        json={"content": "Thanks!", "username": "Bob", "reply": comment_id},
+    )
+
+    response = fake_client.get(f"{TOPICS}/{topic_id}/comments/tree")
+
+    assert response.status_code == 200
+    thread = response.json()
+    assert thread["size"] == 2
+    assert thread["comments"][0]["_id"] == comment_id
+    assert thread["comments"][0]["replies"][0]["content"] == "Thanks!"
+
+    response = fake_client.get(
+        f"{TOPICS}/{topic_id}/comments/tree?comment_id=nope"
+    )
+    assert response.status_code == 404
+
+
+def test_list_comments_with_fields(fake_client: TestClient) -> None:
+    """Test comments are listed with the selected fields only."""
+    topic_id = fake_client.post(
+        TOPICS,
+        json={
+            "title": "Hey!",
+            "content": "Can you help me?",
+            "username": "Bob",
+        },
+    ).json()["_id"]
+    fake_client.post(
+        f"{TOPICS}/{topic_id}/comments",
+        json={"content": "Sure!", "username": "Alice"},
+    )
+
+    response = fake_client.get(f"{TOPICS}/{topic_id}/comments?fields=summary")
+
+    assert response.status_code == 200
+    assert set(response.json()["items"][0]) == {
+        "_id",
+        "created",
+        "updated",
+        "username",
+        "reply",
+    }
+
+    response = fake_client.get(f"{TOPICS}/{topic_id}/comments?fields=nope")
+    assert response.status_code == 422
+
+
+def test_search_comments(
+    fake_client: TestClient, fake_db: FakeDatabase
+) -> None:
+    """Test comments of a topic are searched with filters."""
+    asyncio.run(ensure_indexes(fake_db, deps.mongo_repositories(fake_db)))
+    topic_id = fake_client.post(
+        TOPICS,
+        json={
+            "title": "Hey!",
+            "content": "Can you help me?",
+            "username": "Bob",
+        },
+    ).json()["_id"]
+    for content, username in [
+        ("Sure, I can help!", "Alice"),
+        ("Help is on the way", "Carol"),
+        ("Nope", "Alice"),
+    ]:
+        fake_client.post(
+            f"{TOPICS}/{topic_id}/comments",
+            json={"content": content, "username": username},
+        )
+
+    response = fake_client.get(
+        f"{TOPICS}/{topic_id}/comments/search",
+        params={"term": "help", "username": "Alice"},
+    )
+
+    assert response.status_code == 200
+    (comment,) = response.json()["items"]
+    assert comment["highlights"] == {"content": ["Sure, I can <em>help</em>!"]}
+
+    response = fake_client.get(
+        f"{TOPICS}/{topic_id}/comments/search",
+        params={"term": "help", "after": encode_cursor(["2021-08-08", "c"])},
+    )
+    assert response.status_code == 422
+
+
+def test_page_bounds_are_validated(fake_client: TestClient) -> None:
+    """Test pages can not be empty, unbounded or start before the first."""
+    topic_id = fake_client.post(
+        TOPICS,
+        json={
+            "title": "Hey!",
+            "content": "Can you help me?",
+            "username": "Bob",
+        },
+    ).json()["_id"]
+    listings = [
+        TOPICS,
+        f"{TOPICS}/search",
+        f"{TOPICS}/{topic_id}/comments",
+        f"{TOPICS}/{topic_id}/comments/search",
+    ]
+
+    for url in listings:
+        for query in ("limit=-1", "limit=0", "limit=101", "skip=-1"):
+            response = fake_client.get(f"{url}?{query}")
+            assert response.status_code == 422, (url, query)
+        assert fake_client.get(f"{url}?limit=100").status_code == 200
+    tree = f"{TOPICS}/{topic_id}/comments/tree"
+    assert fake_client.get(f"{tree}?limit=0").status_code == 422
+    assert fake_client.get(f"{tree}?depth=-1").status_code == 422
+    assert fake_client.get(f"{tree}?limit=1").status_code == 200
@@ -0,0 +1,115 @@
+"""Conditional requests module test."""
+
+import asyncio
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from config import settings
+
+TOPICS = f"{settings.api_v1}/topics"
+
+
+def create_topic(client: TestClient) -> str:
+    response = client.post(
+        TOPICS,
+        json={
+            "title": "Hey!",
+            "content": "Can you help me?",
+            "username": "Bob",
+        },
+    )
+    assert response.status_code == 201
+    topic_id: str = response.json()["_id"]
+    return topic_id
+
+
+def test_get_topic_not_modified(fake_client: TestClient) -> None:
+    """Test a topic is not sent again while its entity tag matches."""
+    topic_id = create_topic(fake_client)
+    response = fake_client.get(f"{TOPICS}/{topic_id}")
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == settings.http_cache_control
+
+    response = fake_client.get(
+        f"{TOPICS}/{topic_id}", headers={"If-None-Match": etag}
+    )
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+def test_get_topic_modified_by_comment(fake_client: TestClient) -> None:
+    """Test a new comment changes the entity tag of its topic."""
+    topic_id = create_topic(fake_client)
+    etag = fake_client.get(f"{TOPICS}/{topic_id}").headers["etag"]
+    fake_client.post(
+        f"{TOPICS}/{topic_id}/comments",
+        json={"content": "Sure!", "username": "Alice"},
+    )
+
+    response = fake_client.get(
+        f"{TOPICS}/{topic_id}", headers={"If-None-Match": etag}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["comment_count"] == 1
+
+
+def test_get_comment_not_modified_since(fake_client: TestClient) -> None:
+    """Test a comment is compared with its last modification date."""
+    topic_id = create_topic(fake_client)
+    comment = fake_client.post(
+        f"{TOPICS}/{topic_id}/comments",
+        json={"content": "Sure!", "username": "Alice"},
+    ).json()
+    url = f"{TOPICS}/{topic_id}/comments/{comment['_id']}"
+    response = fake_client.get(url)
+    last_modified = response.headers["last-modified"]
+    created = datetime.fromisoformat(comment["created"]).astimezone()
+    assert parsedate_to_datetime(last_modified) == created.replace(
+        microsecond=0
+    )
+
+    response = fake_client.get(
+        url, headers={"If-Modified-Since": last_modified}
+    )
+    assert response.status_code == 304
+
+    fake_client.put(url, json={"content": "Sure, hold on"})
+    response = fake_client.get(
+        url, headers={"If-Modified-Since": "Sun, 06 Nov 1994 08:49:37 GMT"}
+    )
+    assert response.status_code == 200
+
+
+def test_undated_changes_are_not_modified_since(
+    fake_client: TestClient,
+) -> None:
+    """Test pages and topics changed without a new date are not dated."""
+    topic_id = create_topic(fake_client)
+    comments = f"{TOPICS}/{topic_id}/comments"
+    first = fake_client.post(
+        comments, json={"content": "Sure!", "username": "Alice"}
+    ).json()
+    fake_client.post(comments, json={"content": "Hi!", "username": "Bob"})
+    topic = fake_client.get(f"{TOPICS}/{topic_id}")
+    page = fake_client.get(comments)
+    assert "last-modified" not in topic.headers
+    assert "last-modified" not in page.headers
+    # Any date after the latest one of the documents
+    since = {"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"}
+
+    # Lowers the counter of the topic and takes a comment off the page
+    asyncio.run(app.state.comment_usecase.delete(topic_id, first["_id"]))
+
+    response = fake_client.get(f"{TOPICS}/{topic_id}", headers=since)
+    assert response.status_code == 200
+    assert response.json()["comment_count"] == 1
+    response = fake_client.get(comments, headers=since)
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == 1
@@ -0,0 +1,75 @@
+"""Consistency tokens module test."""
+
+import time
+from typing import Generator
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from fastapi.testclient import TestClient
+
+from app.api import deps
+from app.api.consistency import CONSISTENCY_HEADER, decode_token, encode_token
+from app.main import app
+from config import settings
+from testing.mongo import FakeDatabase
+
+TOPICS = f"{settings.api_v1}/topics"
+
+
+@pytest.fixture
+def lagging_client(
+    fake_db: FakeDatabase, monkeypatch: MonkeyPatch
+) -> Generator:
+    # The replica never catches up, so reads only see writes on the primary
+    monkeypatch.setattr(
+        deps, "replica_database", lambda mongodb: fake_db.client["replica"]
+    )
+    topic_usecase, comment_usecase = deps.build_usecases(fake_db)
+    app.state.topic_usecase = topic_usecase
+    app.state.comment_usecase = comment_usecase
+    yield TestClient(app)
+    del app.state.topic_usecase, app.state.comment_usecase
+
+
+def test_writes_answer_with_a_token(lagging_client: TestClient) -> None:
+    """Test successful writes answer with a token, reads do not."""
+    response = lagging_client.post(
+        TOPICS, json={"title": "Hey!", "content": "Hi", "username": "Bob"}
+    )
+    assert response.status_code == 201
+    written_at = decode_token(response.headers[CONSISTENCY_HEADER])
+    # Tokens are rounded to the millisecond
+    assert written_at is not None and written_at < time.time() + 0.001
+
+    response = lagging_client.get(f"{TOPICS}/{response.json()['_id']}")
+    assert CONSISTENCY_HEADER not in response.headers
+
+    response = lagging_client.post(TOPICS, json={"title": "Hey!"})
+    assert response.status_code == 422
+    assert CONSISTENCY_HEADER not in response.headers
+
+
+def test_token_reads_your_writes(lagging_client: TestClient) -> None:
+    """Test listings read the primary until the token is too old."""
+    response = lagging_client.post(
+        TOPICS, json={"title": "Hey!", "content": "Hi", "username": "Bob"}
+    )
+    token = response.headers[CONSISTENCY_HEADER]
+    expired = encode_token(time.time() - deps.consistency_window() - 1)
+
+    def listed(headers: dict) -> int:
+        response = lagging_client.get(TOPICS, headers=headers)
+        assert response.status_code == 200
+        return len(response.json()["items"])
+
+    assert listed({}) == 0
+    assert listed({CONSISTENCY_HEADER: token}) == 1
+    assert listed({CONSISTENCY_HEADER: expired}) == 0
+    assert listed({CONSISTENCY_HEADER: "nan"}) == 0
+    # A write on a host whose clock is a little ahead still counts
+    ahead = encode_token(time.time() + 0.5)
+    assert listed({CONSISTENCY_HEADER: ahead}) == 1
+    assert listed({CONSISTENCY_HEADER: encode_token(time.time() + 3600)}) == 0
+    # Single reads never lag
+    topic_id = response.json()["_id"]
+    assert lagging_client.get(f"{TOPICS}/{topic_id}").status_code == 200
@@ -0,0 +1,55 @@
+"""Export module test."""
+
+import json
+
+from fastapi.testclient import TestClient
+
+from config import settings
+
+TOPICS = f"{settings.api_v1}/topics"
+
+
+def test_export_topics_as_ndjson(fake_client: TestClient) -> None:
+    """Test every topic, then every comment, is streamed line by line."""
+    topic_ids = [
+        fake_client.post(
+            TOPICS,
+            json={"title": f"{i}", "content": "Help?", "username": "Bob"},
+        ).json()["_id"]
+        for i in range(3)
+    ]
+    fake_client.post(
+        f"{TOPICS}/{topic_ids[0]}/comments",
+        json={"content": "Sure!", "username": "Alice"},
+    )
+
+    response = fake_client.get(f"{TOPICS}/export")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    docs = [json.loads(line) for line in response.text.splitlines()]
+    assert [doc["_id"] for doc in docs] == topic_ids
+
+    response = fake_client.get(f"{TOPICS}/export?include_comments=true")
+    docs = [json.loads(line) for line in response.text.splitlines()]
+    assert [doc["type"] for doc in docs] == ["topic"] * 3 + ["comment"]
+
+
+def test_export_topic_with_comments(fake_client: TestClient) -> None:
+    """Test a topic is streamed before its comments."""
+    topic_id = fake_client.post(
+        TOPICS, json={"title": "Hey!", "content": "Help?", "username": "Bob"},
+    ).json()["_id"]
+    for content in ["Sure!", "Thanks!"]:
+        fake_client.put(f"{TOPICS}/{topic_id}", json={"title": "Hey you!"})
+        fake_client.post(
+            f"{TOPICS}/{topic_id}/comments",
+            json={"content": content, "username": "Alice"},
+        )
+
+    response = fake_client.get(f"{TOPICS}/{topic_id}/export")
+
+    docs = [json.loads(line) for line in response.text.splitlines()]
+    assert docs[0]["title"] == "Hey you!"
+    assert [doc["content"] for doc in docs[1:]] == ["Sure!", "Thanks!"]
+    assert fake_client.get(f"{TOPICS}/nope/export").status_code == 404
@@ -0,0 +1,102 @@
+"""Live updates module test."""
+
+import asyncio
+import json
+from typing import Any, List
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.api.live import sse_response
+from app.domain.live import LiveEvent, LiveHub
+from app.main import app
+from config import settings
+
+TOPICS = f"{settings.api_v1}/topics"
+
+
+def create_topic(fake_client: TestClient) -> str:
+    topic_id: str = fake_client.post(
+        TOPICS,
+        json={"title": "Hey!", "content": "Help me?", "username": "Bob"},
+    ).json()["_id"]
+    return topic_id
+
+
+def test_websocket_resumes_after_the_last_event(
+    fake_client: TestClient,
+) -> None:
+    """Test the changes missed since an event are sent over a WebSocket."""
+    topic_id = create_topic(fake_client)
+    hub: LiveHub = app.state.comment_usecase.hub
+    comments = f"{TOPICS}/{topic_id}/comments"
+    comment_id = fake_client.post(
+        comments, json={"content": "Sure!", "username": "Alice"}
+    ).json()["_id"]
+    first_id = hub.next_id()
+    hub.publish(LiveEvent(first_id, LiveEvent.CREATED, topic_id, {}))
+    fake_client.put(f"{comments}/{comment_id}", json={"content": "Edited"})
+    asyncio.run(app.state.comment_usecase.delete(topic_id, comment_id))
+
+    with fake_client.websocket_connect(
+        f"{comments}/ws?last_event_id={first_id}"
+    ) as websocket:
+        updated = json.loads(websocket.receive_text())
+        deleted = json.loads(websocket.receive_text())
+
+    assert updated["type"] == "updated"
+    assert updated["comment"]["content"] == "Edited"
+    assert deleted == {
+        "id": deleted["id"],
+        "type": "deleted",
+        "comment": {"_id": comment_id, "topic": topic_id},
+    }
+
+    with fake_client.websocket_connect(
+        f"{comments}/ws?last_event_id=unknown"
+    ) as websocket:
+        assert websocket.receive_json() == {"type": "reset"}
+    assert len(hub) == 0
+
+    with pytest.raises(WebSocketDisconnect) as err:
+        with fake_client.websocket_connect(f"{TOPICS}/missing/comments/ws"):
+            pass
+    assert err.value.code == 1008
+
+
+class FakeRequest:
+    """Request whose client disconnects after a few checks."""
+
+    def __init__(self, checks: int) -> None:
+        self.checks = checks
+
+    async def is_disconnected(self) -> bool:
+        self.checks -= 1
+        return self.checks < 0
+
+
+def test_server_sent_events() -> None:
+    """Test events, heartbeats and evictions are sent as SSE messages."""
+    hub = LiveHub(queue_size=1)
+
+    async def run() -> List[Any]:
+        subscription = hub.subscribe("t1", "unknown")
+        hub.publish(LiveEvent("e1", LiveEvent.CREATED, "t1", {"_id": "c1"}))
+        response = sse_response(FakeRequest(2), subscription, 0.01)
+        messages = []
+        async for chunk in response.body_iterator:
+            messages.append(chunk)
+            if len(messages) == 3:
+                hub.publish(LiveEvent("e2", "created", "t1", {}))
+                hub.publish(LiveEvent("e3", "created", "t1", {}))
+        return messages
+
+    assert asyncio.run(run()) == [
+        b"event: reset\ndata: {}\n\n",
+        b'id: e1\nevent: created\ndata: {"id":"e1","type":"created",'
+        b'"comment":{"_id":"c1"}}\n\n',
+        b": keepalive\n\n",
+        b'event: evicted\ndata: {"last_event_id":"e1"}\n\n',
+    ]
+    assert len(hub) == 0
@@ -0,0 +1,35 @@
+"""Metrics endpoint test."""
+
+from fastapi.testclient import TestClient
+
+from config import settings
+
+TOPICS = f"{settings.api_v1}/topics"
+
+
+def test_metrics_by_route_template(fake_client: TestClient) -> None:
+    """Test request latencies are labeled with the route template."""
+    topic_id = fake_client.post(
+        TOPICS, json={"title": "Hi", "content": "Help?", "username": "Bob"},
+    ).json()["_id"]
+    fake_client.get(f"{TOPICS}/{topic_id}")
+    fake_client.get("/missing")
+
+    response = fake_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    route = f"{TOPICS}/{{topic_id}}"
+    assert (
+        "http_request_duration_seconds_count"
+        f'{{method="GET",route="{route}",status="200"}}'
+    ) in response.text
+    assert topic_id not in response.text
+    assert 'route="unmatched",status="404"' in response.text
+    assert (
+        'repository_operation_duration_seconds_count{repository="topics"'
+        in (response.text)
+    )
+    assert 'request_stage_duration_seconds_count{stage="serialize"}' in (
+        response.text
+    )
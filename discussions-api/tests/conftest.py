@@ -4,8 +4,12 @@ import pytest
 from fastapi.testclient import TestClient
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from app.api import deps
 from app.main import app
+from app.usecase.comment import CommentUsecase
+from app.usecase.topic import TopicUsecase
 from config import settings
+from testing.mongo import FakeDatabase, FakeMotorClient
 
 
 @pytest.fixture(scope="session")
@@ -14,6 +18,31 @@ def db() -> Generator:
     yield mongodb_client[settings.db_name]
 
 
+@pytest.fixture
+def fake_db() -> FakeDatabase:
+    return FakeMotorClient()[settings.db_name]
+
+
+@pytest.fixture
+def topic_usecase(fake_db: FakeDatabase) -> TopicUsecase:
+    return deps.build_usecases(fake_db)[0]
+
+
+@pytest.fixture
+def comment_usecase(fake_db: FakeDatabase) -> CommentUsecase:
+    return deps.build_usecases(fake_db)[1]
+
+
+@pytest.fixture
+def fake_client(fake_db: FakeDatabase) -> Generator:
+    # Without a context the startup hooks do not connect to MongoDB
+    topic_usecase, comment_usecase = deps.build_usecases(fake_db)
+    app.state.topic_usecase = topic_usecase
+    app.state.comment_usecase = comment_usecase
+    yield TestClient(app)
+    del app.state.topic_usecase, app.state.comment_usecase
+
+
 @pytest.fixture(scope="module")
 def client() -> Generator:
     with TestClient(app) as c:
@@ -0,0 +1,65 @@
+"""BM25 module test."""
+
+from app.domain.bm25 import InvertedIndex, within_one_edit
+
+WEIGHTS = {"title": 10.0, "content": 2.0}
+
+
+def build_index() -> InvertedIndex:
+    index = InvertedIndex(WEIGHTS)
+    index.add("a", {"title": "Meaning of life", "content": "Why?"})
+    index.add("b", {"title": "Hey", "content": "What is life about?"})
+    index.add("c", {"title": "Lifestyle", "content": "Living well"})
+    index.add("d", {"title": "Cooking", "content": "Pasta recipes"})
+    return index
+
+
+def test_search_ranks_by_weighted_fields() -> None:
+    """Test title matches rank first and prefixes match at a lower score."""
+    index = build_index()
+    index.add("e", {"title": "Lifestyle", "content": "Life"})
+
+    ranked = index.search("life", 10)
+
+    assert [doc_id for _, doc_id in ranked] == ["a", "e", "c", "b"]
+
+
+def test_search_fuzzy_and_excluded_words() -> None:
+    """Test misspelled words match and negated words exclude."""
+    index = build_index()
+
+    assert [doc_id for _, doc_id in index.search("cookinh", 10)] == ["d"]
+    assert [doc_id for _, doc_id in index.search("life -why", 10)] == [
+        "c",
+        "b",
+    ]
+
+
+def test_update_remove_and_filter() -> None:
+    """Test updates replace the given fields only, and removals unindex."""
+    index = build_index()
+    index.add("d", {"title": "Life of a cook"}, {"username": "Bob"})
+    index.remove("a")
+
+    ranked = index.search(
+        "life", 10, lambda attributes: attributes.get("username") == "Bob"
+    )
+
+    assert [doc_id for _, doc_id in ranked] == ["d"]
+    assert index.search("pasta", 10)[0][1] == "d"
+    assert "meaning" not in index.vocabulary
+
+
+def test_dump_and_load() -> None:
+    """Test a loaded snapshot ranks as the index it was taken from."""
+    index = build_index()
+    loaded = InvertedIndex(WEIGHTS)
+    loaded.load(index.dump())
+
+    assert loaded.search("life", 10) == index.search("life", 10)
+
+
+def test_within_one_edit() -> None:
+    assert within_one_edit("life", "lift")
+    assert within_one_edit("life", "lie")
+    assert within_one_edit("life", "lives") is False
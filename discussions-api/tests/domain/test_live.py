@@ -0,0 +1,117 @@
+"""Live updates domain module test."""
+
+import asyncio
+from typing import Any, List, Optional
+
+import pytest
+
+from app.domain.live import LiveEvent, LiveHub, SubscriberEvicted
+
+
+def event(hub: LiveHub, topic: str, comment_id: str) -> LiveEvent:
+    return LiveEvent(
+        hub.next_id(), LiveEvent.CREATED, topic, {"_id": comment_id}
+    )
+
+
+def test_events_go_to_the_subscribers_of_their_topic() -> None:
+    """Test every subscriber of a topic gets its events, in order."""
+    hub = LiveHub()
+
+    async def run() -> List[List[Optional[str]]]:
+        first, second = hub.subscribe("t1"), hub.subscribe("t1")
+        other = hub.subscribe("t2")
+        for comment_id in ("c1", "c2"):
+            hub.publish(event(hub, "t1", comment_id))
+        received = []
+        for subscription in (first, second, other):
+            ids = []
+            for _ in range(2):
+                next_event = await subscription.next(0.01)
+                ids.append(next_event.comment["_id"] if next_event else None)
+            received.append(ids)
+        return received
+
+    assert asyncio.run(run()) == [["c1", "c2"], ["c1", "c2"], [None, None]]
+    assert hub.stats.dict() == {
+        "published": 2,
+        "delivered": 4,
+        "evicted": 0,
+        "resets": 0,
+    }
+
+
+def test_slow_subscribers_are_evicted() -> None:
+    """Test a full queue evicts its subscriber, not the others."""
+    hub = LiveHub(queue_size=2)
+
+    async def run() -> Any:
+        slow, fast = hub.subscribe("t1"), hub.subscribe("t1")
+        hub.publish(event(hub, "t1", "c1"))
+        delivered = await fast.next(0)
+        hub.publish(event(hub, "t1", "c2"))
+        hub.publish(event(hub, "t1", "c3"))
+        assert len(hub) == 1
+        with pytest.raises(SubscriberEvicted) as err:
+            await slow.next(0)
+        return delivered.event_id, err.value.last_event_id, len(fast)
+
+    delivered, last_event_id, queued = asyncio.run(run())
+
+    assert delivered.endswith("-1")
+    assert last_event_id is None
+    assert queued == 2
+    assert hub.stats.evicted == 1
+
+
+def test_subscribers_resume_after_their_last_event() -> None:
+    """Test missed events are replayed, or a reset is asked when lost."""
+    hub = LiveHub(queue_size=2, history_size=5)
+
+    async def run() -> Any:
+        events = [event(hub, "t1", f"c{i}") for i in range(5)]
+        hub.publish(events[0])
+        hub.publish(events[1])
+        hub.publish(event(hub, "t2", "other"))
+        resumed = hub.subscribe("t1", events[0].event_id)
+        replayed = [(await resumed.next(0)).comment["_id"]]
+        for missed in events[2:]:
+            hub.publish(missed)
+        # The first event left the history, the second is followed by more
+        # events of the topic than a queue takes
+        forgotten = hub.subscribe("t1", events[0].event_id)
+        behind = hub.subscribe("t1", events[1].event_id)
+        near = hub.subscribe("t1", events[2].event_id)
+        caught_up = [(await near.next(0)).comment["_id"] for _ in range(2)]
+        return (
+            resumed.reset,
+            replayed,
+            forgotten.reset,
+            behind.reset,
+            near.reset,
+            caught_up,
+        )
+
+    assert asyncio.run(run()) == (
+        False,
+        ["c1"],
+        True,
+        True,
+        False,
+        ["c3", "c4"],
+    )
+    assert hub.stats.resets == 2
+
+
+def test_closed_subscriptions_stop_receiving() -> None:
+    """Test closing a subscription removes it from the hub."""
+    hub = LiveHub()
+
+    async def run() -> int:
+        with hub.subscribe("t1") as subscription:
+            assert len(hub) == 1
+        hub.publish(event(hub, "t1", "c1"))
+        return len(subscription)
+
+    assert asyncio.run(run()) == 0
+    assert len(hub) == 0
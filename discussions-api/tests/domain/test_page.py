@@ -0,0 +1,46 @@
+"""Page module test."""
+
+import pytest
+
+from app.domain.page import (
+    InvalidCursor,
+    build_page,
+    decode_cursor,
+    encode_cursor,
+)
+
+
+def test_cursor_round_trip() -> None:
+    """Test a cursor decodes to the key it was built from."""
+    key = ["2021-08-08T18:14:40.692017", "9b1ebb4f"]
+
+    assert decode_cursor(encode_cursor(key), 2) == key
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", encode_cursor([1])])
+def test_invalid_cursor(cursor: str) -> None:
+    """Test malformed cursors are rejected."""
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, 2)
+
+
+def test_build_page_with_more_items() -> None:
+    """Test the extra item only sets the next cursor."""
+    docs = [{"created": i, "_id": str(i)} for i in range(4)]
+
+    page = build_page(docs, 3, ["created", "_id"])
+
+    assert page.items == docs[:3]
+    assert decode_cursor(page.next_cursor, 2) == [2, "2"]
+    assert page.prev_cursor is None
+
+
+def test_build_page_before_cursor() -> None:
+    """Test paging backwards drops the extra item at the start."""
+    docs = [{"created": i, "_id": str(i)} for i in range(4)]
+
+    page = build_page(docs, 3, ["created", "_id"], before=[4, "4"])
+
+    assert page.items == docs[1:]
+    assert decode_cursor(page.prev_cursor, 2) == [1, "1"]
+    assert decode_cursor(page.next_cursor, 2) == [3, "3"]
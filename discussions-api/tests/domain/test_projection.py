@@ -0,0 +1,35 @@
+"""Projection module test."""
+
+import pytest
+
+from app.domain.projection import (
+    COMMENT_PROJECTION,
+    TOPIC_PROJECTION,
+    InvalidFields,
+)
+
+
+def test_parse_fields_with_preset() -> None:
+    """Test presets expand and the paging fields are always selected."""
+    fields = TOPIC_PROJECTION.parse("summary, title")
+
+    assert fields == [
+        "_id",
+        "created",
+        "updated",
+        "title",
+        "username",
+        "comment_count",
+        "last_comment_at",
+    ]
+
+
+def test_parse_no_fields() -> None:
+    """Test the whole document is selected without fields."""
+    assert COMMENT_PROJECTION.parse(None) is None
+
+
+def test_parse_unknown_field() -> None:
+    """Test fields the model does not have are rejected."""
+    with pytest.raises(InvalidFields):
+        COMMENT_PROJECTION.parse("content,password")
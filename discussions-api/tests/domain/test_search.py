@@ -0,0 +1,65 @@
+"""Search module test."""
+
+import time
+from datetime import datetime, timezone
+
+from _pytest.monkeypatch import MonkeyPatch
+
+from app.domain.search import (
+    highlight,
+    search_words,
+    stored_date,
+    window_slice,
+)
+
+RANKED = [[3.0, "a"], [2.0, "b"], [2.0, "c"], [1.0, "d"]]
+
+
+def test_window_slice_pages() -> None:
+    """Test pages are sliced after and before a score and id cursor."""
+    assert window_slice(RANKED, False, 2) == [[3.0, "a"], [2.0, "b"]]
+    assert window_slice(RANKED, False, 3, after=[2.0, "b"]) == [
+        [2.0, "c"],
+        [1.0, "d"],
+    ]
+    assert window_slice(RANKED, False, 2, before=[1.0, "d"], skip=1) == [
+        [3.0, "a"],
+        [2.0, "b"],
+    ]
+
+
+def test_window_slice_past_full_window() -> None:
+    """Test a page is not sliced past the end of a full window."""
+    assert window_slice(RANKED, True, 3, after=[2.0, "b"]) is None
+    assert window_slice(RANKED, True, 2, before=[0.5, "e"]) is None
+    assert window_slice(RANKED, True, 2, after=[2.0, "b"]) == RANKED[2:]
+
+
+def test_highlight_matches() -> None:
+    """Test matches are marked in escaped snippets of the text fields."""
+    doc = {
+        "title": "Helping <you>",
+        "content": "x" * 100 + " can you help me? " + "y" * 100,
+    }
+
+    highlights = highlight(doc, search_words("Help -me"))
+
+    assert highlights["title"] == ["<em>Helping</em> &lt;you&gt;"]
+    (snippet,) = highlights["content"]
+    assert snippet.startswith("…x")
+    assert snippet.endswith("y…")
+    assert " can you <em>help</em> me? " in snippet
+
+
+def test_stored_date_is_local(monkeypatch: MonkeyPatch) -> None:
+    """Test aware dates are compared in the local time dates are saved in."""
+    monkeypatch.setenv("TZ", "Asia/Kolkata")
+    time.tzset()
+    try:
+        aware = datetime(2021, 8, 8, 12, 0, tzinfo=timezone.utc)
+        assert stored_date(aware) == "2021-08-08T17:30:00"
+        naive = datetime(2021, 8, 8, 12, 0)
+        assert stored_date(naive) == "2021-08-08T12:00:00"
+    finally:
+        monkeypatch.undo()
+        time.tzset()
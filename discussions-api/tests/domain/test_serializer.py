@@ -0,0 +1,42 @@
+"""Serializer domain module test."""
+
+import json
+import uuid
+from datetime import datetime
+
+from _pytest.monkeypatch import MonkeyPatch
+from fastapi.encoders import jsonable_encoder
+
+from app.api import responses
+from app.domain.comment import Comment
+from app.domain.page import Page
+from app.domain.serializer import dump
+from app.domain.topic import Topic
+
+
+def test_dump_matches_jsonable_encoder() -> None:
+    """Test models are serialized the same as the generic encoder does."""
+    topic = Topic(
+        title="Hey!",
+        content="Can you help me?",
+        username="Bob",
+        last_comment_at=datetime(2021, 8, 8, 18, 14, 40),
+    )
+    comment = Comment(
+        content="Sure!", username="Alice", reply=str(uuid.uuid4())
+    )
+
+    assert dump(topic) == jsonable_encoder(topic)
+    assert dump(comment) == jsonable_encoder(comment)
+
+
+def test_dumps_with_and_without_orjson(monkeypatch: MonkeyPatch) -> None:
+    """Test both encoders render raw documents and models alike."""
+    topic = Topic(title="Hey!", content="Can you help me?", username="Bob")
+    doc = {**dump(topic), "updated": datetime(2021, 8, 8, 18, 14, 40)}
+    page = Page(items=[doc, topic], next_cursor="abc")
+    expected = jsonable_encoder(page)
+
+    assert json.loads(responses.dumps(page)) == expected
+    monkeypatch.setattr(responses, "orjson", None)
+    assert json.loads(responses.dumps(page)) == expected
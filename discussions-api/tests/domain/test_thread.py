@@ -0,0 +1,53 @@
+"""Thread domain module test."""
+
+from typing import Any, Dict, Optional
+
+from app.domain.thread import build_thread
+
+
+def comment(comment_id: str, reply: Optional[str] = None) -> Dict[str, Any]:
+    return {"_id": comment_id, "reply": reply, "created": comment_id}
+
+
+def test_build_thread_nests_replies() -> None:
+    """Test replies are nested and counted under their comment."""
+    comments = [
+        comment("a"),
+        comment("b", "a"),
+        comment("c"),
+        comment("d", "b"),
+        comment("e", "a"),
+        comment("f", "deleted"),
+    ]
+
+    thread = build_thread(comments, 10)
+
+    assert [c["_id"] for c in thread.comments] == ["a", "c", "f"]
+    a = thread.comments[0]
+    assert a["reply_count"] == 2
+    assert [r["_id"] for r in a["replies"]] == ["b", "e"]
+    assert a["replies"][0]["replies"][0]["_id"] == "d"
+    assert [c["_id"] for c in thread.walk()] == ["a", "b", "d", "e", "c", "f"]
+    assert thread.size == 6
+    assert not thread.truncated
+
+
+def test_build_thread_limits_depth_and_size() -> None:
+    """Test deep replies are counted but not returned."""
+    comments = [comment("a"), comment("b", "a"), comment("c", "b")]
+
+    thread = build_thread(comments, 2, max_depth=0)
+
+    assert thread.truncated
+    assert thread.size == 1
+    assert thread.comments[0]["reply_count"] == 1
+    assert thread.comments[0]["replies"] == []
+
+
+def test_build_thread_under_comment() -> None:
+    """Test a subtree is rooted at its comment."""
+    comments = [comment("b", "a"), comment("c", "b")]
+
+    thread = build_thread(comments, 10, root_id="b")
+
+    assert [c["_id"] for c in thread.walk()] == ["b", "c"]
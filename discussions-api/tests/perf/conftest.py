@@ -0,0 +1,174 @@
+"""
+Fixtures of the perf tests.
+
+They run on a local `mongod`, started on a free port over a temporary
+directory when the binary is found, or on the in-memory fake otherwise.
+The dataset sizes and the binary are read from the environment:
+
+- PERF_MONGOD: `mongod` binary, `fake` to always use the fake
+- PERF_TOPICS, PERF_COMMENTS, PERF_DEPTH: topics, comments of the large
+  topic, and depth of the reply chain seeded
+- PERF_PLANS: file the explained query plans are written to, if set
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Generator,
+    Iterator,
+    List,
+    Optional,
+)
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import MongoClient
+
+from app.api import deps
+from app.repository.indexes import ensure_indexes
+from benchmarks.data import (
+    generate_chain,
+    generate_comments,
+    generate_topics,
+    insert,
+)
+from testing.mongo import FakeMotorClient
+
+DB_NAME = "perf"
+PERF_MONGOD = os.environ.get("PERF_MONGOD", "mongod")
+PERF_TOPICS = int(os.environ.get("PERF_TOPICS", "200"))
+PERF_COMMENTS = int(os.environ.get("PERF_COMMENTS", "500"))
+PERF_DEPTH = int(os.environ.get("PERF_DEPTH", "50"))
+PERF_PLANS = os.environ.get("PERF_PLANS")
+STARTUP_TIMEOUT_MS = 30000
+
+
+class PerfMongo:
+    """Database the perf tests run on: a local mongod, or the fake."""
+
+    def __init__(self, url: Optional[str]) -> None:
+        self.url = url
+        self.fake = FakeMotorClient() if url is None else None
+
+    @property
+    def name(self) -> str:
+        return "fake" if self.url is None else "mongod"
+
+    @asynccontextmanager
+    async def connect(self) -> AsyncIterator[AsyncIOMotorDatabase]:
+        """
+        Connect to the database. Motor clients belong to the event loop
+        they are created in, so every test connects in its own.
+        """
+        if self.fake is not None:
+            yield self.fake[DB_NAME]
+            return
+        client = AsyncIOMotorClient(self.url)
+        try:
+            yield client[DB_NAME]
+        finally:
+            client.close()
+
+
+@dataclass
+class Dataset:
+    """Ids of the seeded documents."""
+
+    topic_ids: List[str]
+    large_topic_id: str
+    chain_topic_id: str
+    comment_ids: List[str]
+    chain_ids: List[str]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port: int = sock.getsockname()[1]
+        return port
+
+
+@contextmanager
+def mongod_server(binary: Optional[str]) -> Iterator[Optional[str]]:
+    """Start a throwaway mongod, if the binary is found, and get its URL."""
+    path = shutil.which(binary) if binary else None
+    if path is None:
+        yield None
+        return
+    with tempfile.TemporaryDirectory() as dbpath:
+        port = free_port()
+        process = subprocess.Popen(
+            [
+                path,
+                "--dbpath",
+                dbpath,
+                "--port",
+                str(port),
+                "--bind_ip",
+                "127.0.0.1",
+                "--nounixsocket",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        url = f"mongodb://127.0.0.1:{port}"
+        try:
+            client: MongoClient = MongoClient(
+                url, serverSelectionTimeoutMS=STARTUP_TIMEOUT_MS
+            )
+            client.admin.command("ping")
+            client.close()
+            yield url
+        finally:
+            process.terminate()
+            process.wait()
+
+
+async def seed(mongo: PerfMongo) -> Dataset:
+    """Create the indexes, then store the synthetic dataset."""
+    topics = generate_topics(PERF_TOPICS + 2)
+    large, chain = topics[0], topics[1]
+    comments = generate_comments(large, PERF_COMMENTS)
+    replies = generate_chain(chain, PERF_DEPTH)
+    async with mongo.connect() as mongodb:
+        await ensure_indexes(mongodb, deps.mongo_repositories(mongodb))
+        await insert(mongodb, [*topics, *comments, *replies])
+    return Dataset(
+        topic_ids=[topic["_id"] for topic in topics[2:]],
+        large_topic_id=large["_id"],
+        chain_topic_id=chain["_id"],
+        comment_ids=[comment["_id"] for comment in comments],
+        chain_ids=[reply["_id"] for reply in replies],
+    )
+
+
+@pytest.fixture(scope="session")
+def perf_mongo() -> Generator:
+    binary = None if PERF_MONGOD == "fake" else PERF_MONGOD
+    with mongod_server(binary) as url:
+        yield PerfMongo(url)
+
+
+@pytest.fixture(scope="session")
+def dataset(perf_mongo: PerfMongo) -> Dataset:
+    return asyncio.run(seed(perf_mongo))
+
+
+@pytest.fixture(scope="session")
+def query_plans() -> Generator:
+    """Explained plans by repository method, written to PERF_PLANS."""
+    plans: Dict[str, List[Any]] = {}
+    yield plans
+    if PERF_PLANS:
+        with open(PERF_PLANS, "w") as output:
+            json.dump(plans, output, indent=2, default=str)
@@ -0,0 +1,166 @@
+"""Query plan recording for the perf tests."""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+# Operations taking a filter as their first argument
+FILTERED = (
+    "find_one",
+    "count_documents",
+    "update_one",
+    "update_many",
+    "find_one_and_update",
+    "delete_one",
+    "delete_many",
+)
+
+
+@dataclass
+class Query:
+    """A query sent to MongoDB, as needed to explain it."""
+
+    collection: str
+    operation: str
+    filter: Dict[str, Any] = field(default_factory=dict)
+    sort: List[Tuple[str, Any]] = field(default_factory=list)
+    pipeline: Optional[List[Dict[str, Any]]] = None
+
+
+class RecordingDatabase:
+    """Database recording the queries of the repositories using it."""
+
+    def __init__(self, mongodb: AsyncIOMotorDatabase) -> None:
+        self.mongodb = mongodb
+        self.queries: List[Query] = []
+
+    def __getitem__(self, name: str) -> "RecordingCollection":
+        return RecordingCollection(self.mongodb[name], name, self.queries)
+
+
+class RecordingCollection:
+    """Collection recording the queries sent through it."""
+
+    def __init__(self, collection: Any, name: str, queries: List[Query]):
+        self.collection = collection
+        self.name = name
+        self.queries = queries
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self.collection, name)
+        if name not in FILTERED:
+            return attribute
+
+        def recorded(query: Dict[str, Any], *args: Any, **kwargs: Any) -> Any:
+            self.queries.append(Query(self.name, name, query))
+            return attribute(query, *args, **kwargs)
+
+        return recorded
+
+    def find(
+        self, query: Optional[Dict[str, Any]] = None, *args: Any, **kwargs: Any
+    ) -> "RecordingCursor":
+        recorded = Query(self.name, "find", query or {})
+        self.queries.append(recorded)
+        cursor = self.collection.find(query, *args, **kwargs)
+        return RecordingCursor(cursor, recorded)
+
+    def aggregate(self, pipeline: List[Dict[str, Any]], **kwargs: Any) -> Any:
+        self.queries.append(Query(self.name, "aggregate", pipeline=pipeline))
+        return self.collection.aggregate(pipeline, **kwargs)
+
+
+class RecordingCursor:
+    """Cursor recording the sort of its query."""
+
+    def __init__(self, cursor: Any, query: Query) -> None:
+        self.cursor = cursor
+        self.query = query
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.cursor, name)
+
+    def __aiter__(self) -> Any:
+        return self.cursor.__aiter__()
+
+    def sort(self, key: Any, direction: Any = None) -> "RecordingCursor":
+        if isinstance(key, str):
+            self.query.sort = [(key, direction or 1)]
+        else:
+            self.query.sort = list(key)
+        self.cursor.sort(key, direction)
+        return self
+
+    def skip(self, skip: int) -> "RecordingCursor":
+        self.cursor.skip(skip)
+        return self
+
+    def limit(self, limit: int) -> "RecordingCursor":
+        self.cursor.limit(limit)
+        return self
+
+    def batch_size(self, batch_size: int) -> "RecordingCursor":
+        self.cursor.batch_size(batch_size)
+        return self
+
+
+async def explain(mongodb: AsyncIOMotorDatabase, query: Query) -> Any:
+    """Query plan MongoDB picks for a recorded query."""
+    if query.pipeline is not None:
+        return await mongodb.command(
+            "aggregate",
+            query.collection,
+            pipeline=query.pipeline,
+            explain=True,
+        )
+    # The other operations select their documents as a find would
+    cursor = mongodb[query.collection].find(query.filter)
+    if query.sort:
+        cursor.sort(query.sort)
+    return await cursor.explain()
+
+
+def stages(plan: Any) -> List[str]:
+    """Every stage of an explained plan, whatever its nesting."""
+    found: List[str] = []
+    if isinstance(plan, dict):
+        for key, value in plan.items():
+            if key == "stage":
+                found.append(value)
+            else:
+                found += stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            found += stages(value)
+    return found
+
+
+async def plan_problems(
+    mongodb: AsyncIOMotorDatabase, queries: List[Query]
+) -> Tuple[List[Any], List[str]]:
+    """
+    Plans of the recorded queries, and their collection scans. Lookups
+    of a `$graphLookup` never show in a plan, so their field must lead an
+    index of the collection they look up.
+    """
+    plans: List[Any] = []
+    problems: List[str] = []
+    for query in queries:
+        plan = await explain(mongodb, query)
+        plans.append(plan)
+        if "COLLSCAN" in stages(plan):
+            problems.append(
+                f"COLLSCAN: {query.operation} {query.filter or query.pipeline}"
+            )
+        for stage in query.pipeline or []:
+            lookup = stage.get("$graphLookup")
+            if lookup is None:
+                continue
+            indexes = await mongodb[lookup["from"]].index_information()
+            leading = {info["key"][0][0] for info in indexes.values()}
+            if lookup["connectToField"] not in leading:
+                problems.append(
+                    f"unindexed $graphLookup on {lookup['connectToField']}"
+                )
+    return plans, problems
@@ -0,0 +1,167 @@
+"""Query plans of the repositories test."""
+
+import asyncio
+import inspect
+from typing import Any, Callable, Dict, List, Tuple
+
+from app.domain.search import SearchFilters
+from app.repository.comment import CommentRepositoryMongo
+from app.repository.topic import TopicRepositoryMongo
+from benchmarks.data import generate_comments, generate_topics
+from tests.perf.conftest import Dataset, PerfMongo
+from tests.perf.plans import RecordingDatabase, plan_problems
+
+Calls = Dict[str, Callable[[Any], Any]]
+AFTER = ("2021-01-01T00:05:00", "")
+FILTERS = SearchFilters(username="user7")
+# Seeds comments with other ids than the dataset
+NEW_TOPIC = {"_id": "new", "created": "2021-01-01T00:00:00"}
+
+
+def public_methods(repository_class: type) -> List[str]:
+    return [
+        name
+        for name, method in vars(repository_class).items()
+        if not name.startswith("_") and callable(method)
+    ]
+
+
+async def explain_calls(
+    mongo: PerfMongo, repository_class: type, calls: Calls
+) -> Tuple[Dict[str, List[Any]], List[str]]:
+    """Call every repository method, then explain the queries it sent."""
+    plans: Dict[str, List[Any]] = {}
+    problems: List[str] = []
+    async with mongo.connect() as mongodb:
+        recorder = RecordingDatabase(mongodb)
+        repository = repository_class(recorder)
+        for name, call in calls.items():
+            recorder.queries.clear()
+            result = call(repository)
+            if inspect.isasyncgen(result):
+                async for _ in result:
+                    pass
+            else:
+                await result
+            method = f"{repository_class.__name__}.{name}"
+            plans[method], found = await plan_problems(
+                mongodb, recorder.queries
+            )
+            problems += [f"{method}: {problem}" for problem in found]
+    return plans, problems
+
+
+def test_topic_queries_use_indexes(
+    perf_mongo: PerfMongo, dataset: Dataset, query_plans: Dict[str, List[Any]],
+) -> None:
+    """Test no query of the topic repository scans the collection."""
+    topic_id = dataset.topic_ids[0]
+    # Another seed than the dataset, for other ids
+    new_topics = generate_topics(3, seed=0)
+    calls: Calls = {
+        "find": lambda r: r.find(0, 10, AFTER, None, ["title"]),
+        "search": lambda r: r.search(
+            [{"username": "user7"}], "", 0, 10, None, AFTER
+        ),
+        "rank": lambda r: r.rank(FILTERS, "mongodb cursor", 100),
+        "get_many": lambda r: r.get_many(dataset.topic_ids[:10]),
+        "get": lambda r: r.get(topic_id),
+        "export": lambda r: r.export(100),
+        "create": lambda r: r.create(new_topics[0]),
+        "create_many": lambda r: r.create_many(new_topics[1:]),
+        "update": lambda r: r.update(topic_id, {"title": "Hey!"}),
+        "update_and_get": lambda r: r.update_and_get(
+            topic_id, {"title": "Hey!"}, without_comments=True
+        ),
+        "delete": lambda r: r.delete(new_topics[0]["_id"], True),
+        "get_comment_count": lambda r: r.get_comment_count(topic_id),
+        "increment_comments": lambda r: r.increment_comments(
+            dataset.large_topic_id, 0
+        ),
+        "set_comment_stats": lambda r: r.set_comment_stats({}),
+    }
+    assert sorted(calls) == sorted(public_methods(TopicRepositoryMongo))
+
+    plans, problems = asyncio.run(
+        explain_calls(perf_mongo, TopicRepositoryMongo, calls)
+    )
+
+    query_plans.update(plans)
+    assert problems == []
+
+
+def test_comment_queries_use_indexes(
+    perf_mongo: PerfMongo, dataset: Dataset, query_plans: Dict[str, List[Any]],
+) -> None:
+    """Test no query of the comment repository scans the collection."""
+    topic_id, comment_ids = dataset.large_topic_id, dataset.comment_ids
+    new_comments = [
+        {**comment, "topic": topic_id}
+        for comment in generate_comments(NEW_TOPIC, 3)
+    ]
+    filters = FILTERS.copy(update={"topic": topic_id})
+    calls: Calls = {
+        "find_by_topic": lambda r: r.find_by_topic(topic_id, 0, 10, AFTER),
+        "search": lambda r: r.search(
+            [{"topic": topic_id}], "", 0, 10, None, AFTER
+        ),
+        "rank": lambda r: r.rank(filters, "reply", 100),
+        "get_many": lambda r: r.get_many(comment_ids[:10]),
+        "get": lambda r: r.get(topic_id, comment_ids[0]),
+        "export": lambda r: r.export(topic_id, 100),
+        "find_thread": lambda r: r.find_thread(topic_id, 100),
+        "find_replies": lambda r: r.find_replies(
+            dataset.chain_topic_id, dataset.chain_ids[0], None, 100
+        ),
+        "exists": lambda r: r.exists(topic_id, comment_ids[0]),
+        "find_existing": lambda r: r.find_existing(topic_id, comment_ids[:5]),
+        "create": lambda r: r.create(new_comments[0]),
+        "create_many": lambda r: r.create_many(new_comments[1:]),
+        "update": lambda r: r.update(
+            topic_id, comment_ids[0], {"content": "Sure!"}
+        ),
+        "update_and_get": lambda r: r.update_and_get(
+            topic_id, comment_ids[0], {"content": "Sure!"}
+        ),
+        "delete": lambda r: r.delete(topic_id, new_comments[0]["_id"]),
+        "count_by_topic": lambda r: r.count_by_topic(),
+    }
+    assert sorted(calls) == sorted(public_methods(CommentRepositoryMongo))
+
+    plans, problems = asyncio.run(
+        explain_calls(perf_mongo, CommentRepositoryMongo, calls)
+    )
+
+    query_plans.update(plans)
+    assert problems == []
+
+
+def test_collection_scans_are_reported(
+    perf_mongo: PerfMongo, dataset: Dataset
+) -> None:
+    """Test a query or a lookup on a field without an index is reported."""
+
+    async def explain_unindexed() -> List[str]:
+        async with perf_mongo.connect() as mongodb:
+            recorder = RecordingDatabase(mongodb)
+            await recorder["discussions"].find_one({"username": "user7"})
+            lookup = {
+                "from": "discussions",
+                "startWith": "$_id",
+                "connectFromField": "_id",
+                "connectToField": "username",
+                "as": "same",
+            }
+            cursor = recorder["discussions"].aggregate(
+                [{"$match": {"type": "topic"}}, {"$graphLookup": lookup}]
+            )
+            await cursor.to_list(length=1)
+            _, problems = await plan_problems(mongodb, recorder.queries)
+            return problems
+
+    problems = asyncio.run(explain_unindexed())
+
+    assert problems == [
+        "COLLSCAN: find_one {'username': 'user7'}",
+        "unindexed $graphLookup on username",
+    ]
@@ -0,0 +1,74 @@
+"""Insert batching repository module test."""
+
+import asyncio
+from typing import Any, List
+
+from pymongo.errors import DuplicateKeyError
+
+from app.repository.batching import BatchedCommentRepository, InsertBatcher
+from app.repository.comment import CommentRepositoryMongo
+from testing.mongo import FakeDatabase
+
+
+def comment(comment_id: str) -> dict:
+    return {"_id": comment_id, "topic": "t1", "type": "comment"}
+
+
+def test_concurrent_inserts_share_a_round_trip(fake_db: FakeDatabase) -> None:
+    """Test inserts are sent together, by delay or once a batch is full."""
+    fake_db.client.latency = 0.01
+    batcher = InsertBatcher(fake_db["discussions"], max_size=30)
+    repository = BatchedCommentRepository(
+        CommentRepositoryMongo(fake_db), batcher
+    )
+
+    async def run() -> List[Any]:
+        return await asyncio.gather(
+            *(repository.create(comment(f"c{i}")) for i in range(50))
+        )
+
+    ids = asyncio.run(run())
+
+    assert ids == [f"c{i}" for i in range(50)]
+    assert fake_db.client.calls == ["discussions.insert_many"] * 2
+    assert len(fake_db["discussions"].docs) == 50
+    assert batcher.stats.dict() == {
+        "batches": 2,
+        "documents": 50,
+        "errors": 0,
+    }
+
+
+def test_errors_go_to_their_caller(fake_db: FakeDatabase) -> None:
+    """Test a failed document fails its insert only."""
+    batcher = InsertBatcher(fake_db["discussions"])
+
+    async def run() -> List[Any]:
+        await batcher.insert(comment("c1"))
+        return await asyncio.gather(
+            batcher.insert(comment("c1")),
+            batcher.insert(comment("c2")),
+            return_exceptions=True,
+        )
+
+    duplicate, created = asyncio.run(run())
+
+    assert isinstance(duplicate, DuplicateKeyError)
+    assert created == "c2"
+    assert batcher.stats.errors == 1
+
+
+def test_close_sends_the_pending_inserts(fake_db: FakeDatabase) -> None:
+    """Test closing inserts the documents waiting for their batch."""
+    batcher = InsertBatcher(fake_db["discussions"], max_delay=60)
+
+    async def run() -> Any:
+        waiting = asyncio.ensure_future(batcher.insert(comment("c1")))
+        await asyncio.sleep(0)
+        assert len(batcher) == 1
+        await batcher.close()
+        return await waiting
+
+    assert asyncio.run(run()) == "c1"
+    assert "c1" in fake_db["discussions"].docs
+    assert len(batcher) == 0
@@ -0,0 +1,206 @@
+"""Cache repository module test."""
+
+import asyncio
+from datetime import datetime
+from typing import List
+
+from app.repository.cache import (
+    Cache,
+    CacheBackend,
+    CachedCommentRepository,
+    CachedTopicRepository,
+    MemoryCacheBackend,
+)
+from app.repository.comment import CommentRepositoryMongo
+from app.repository.redis_cache import RedisCacheBackend, RedisClient
+from app.repository.topic import TopicRepositoryMongo
+from testing.mongo import FakeDatabase, FakeMotorClient
+from testing.redis import FakeRedisServer
+
+
+def test_memory_backend_eviction_and_ttl() -> None:
+    """Test the least recently used and expired entries are dropped."""
+    backend = MemoryCacheBackend(max_size=2)
+
+    async def run() -> None:
+        await backend.set("a", 1, 60)
+        await backend.set("b", 2, 60)
+        await backend.get("a")
+        await backend.set("c", 3, 60)
+
+        assert await backend.get("b") == (False, None)
+        assert await backend.get("a") == (True, 1)
+
+        await backend.set("d", 4, 0)
+        assert await backend.get("d") == (False, None)
+
+    asyncio.run(run())
+    assert backend.stats.evictions == 2
+    assert backend.stats.expirations == 1
+
+
+def test_memory_backend_versions_expire() -> None:
+    """Test versions are dropped once their ttl is over."""
+    backend = MemoryCacheBackend(max_size=2)
+
+    async def run() -> None:
+        assert await backend.incr_version("a", 0) == 1
+        assert await backend.incr_version("b", 60) == 1
+        assert await backend.incr_version("b", 60) == 2
+
+        assert await backend.get_version("a") == 0
+        assert await backend.get_version("b") == 2
+
+    asyncio.run(run())
+    assert list(backend._versions) == ["b"]
+
+
+def test_concurrent_misses_are_coalesced() -> None:
+    """Test concurrent misses for a key run a single load."""
+    cache = Cache(MemoryCacheBackend(max_size=10), ttl=60)
+    loads: List[int] = []
+
+    async def load() -> int:
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return 42
+
+    async def run() -> List[int]:
+        return await asyncio.gather(
+            *(cache.get_or_load("t1", ["k"], load) for _ in range(10))
+        )
+
+    assert asyncio.run(run()) == [42] * 10
+    assert len(loads) == 1
+    assert cache.stats.coalesced == 9
+    assert asyncio.run(cache.get_or_load("t1", ["k"], load)) == 42
+    assert cache.stats.hits == 1
+
+
+def test_cancelled_caller_does_not_cancel_load() -> None:
+    """Test the load carries on for the callers still waiting."""
+    cache = Cache(MemoryCacheBackend(max_size=10), ttl=60)
+
+    async def load() -> int:
+        await asyncio.sleep(0.01)
+        return 42
+
+    async def run() -> int:
+        first = asyncio.ensure_future(cache.get_or_load("t1", ["k"], load))
+        second = asyncio.ensure_future(cache.get_or_load("t1", ["k"], load))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == 42
+
+
+async def check_writes_invalidate_cached_reads(
+    fake_db: FakeDatabase, backend: CacheBackend
+) -> None:
+    """Check comment and topic writes drop the cached reads of the topic."""
+    cache = Cache(backend, ttl=60, prefix="test:")
+    topic_repo = CachedTopicRepository(TopicRepositoryMongo(fake_db), cache)
+    comment_repo = CachedCommentRepository(
+        CommentRepositoryMongo(fake_db), cache
+    )
+    updated = datetime(2021, 8, 8, 18, 0)
+    fake_db["discussions"].docs["t1"] = {
+        "_id": "t1",
+        "type": "topic",
+        "updated": updated,
+    }
+    comment = {"_id": "c1", "topic": "t1", "type": "comment", "created": "1"}
+
+    assert await comment_repo.find_by_topic("t1", 0, 10) == []
+    assert (await topic_repo.get("t1"))["updated"] == updated
+    assert (await topic_repo.get("t1"))["updated"] == updated
+    await comment_repo.create(comment)
+    await topic_repo.increment_comments("t1", 1)
+    assert await comment_repo.find_by_topic("t1", 0, 10) == [comment]
+    assert (await topic_repo.get("t1"))["comment_count"] == 1
+    assert await topic_repo.get("t2") is None
+    assert await topic_repo.get("t3") is None
+    await topic_repo.create({"_id": "t2", "type": "topic"})
+    await topic_repo.create_many([{"_id": "t3", "type": "topic"}])
+    assert (await topic_repo.get("t2"))["_id"] == "t2"
+    assert (await topic_repo.get("t3"))["_id"] == "t3"
+    assert cache.stats.hits == 1
+
+
+def test_memory_writes_invalidate_cached_reads(fake_db: FakeDatabase) -> None:
+    """Test versioned invalidation on the in-memory backend."""
+    asyncio.run(
+        check_writes_invalidate_cached_reads(
+            fake_db, MemoryCacheBackend(max_size=100)
+        )
+    )
+
+
+def test_redis_writes_invalidate_cached_reads(fake_db: FakeDatabase) -> None:
+    """Test versioned invalidation shared through a Redis server."""
+
+    async def run() -> None:
+        async with FakeRedisServer() as server:
+            backend = RedisCacheBackend(RedisClient(server.url, pool_size=2))
+            await check_writes_invalidate_cached_reads(fake_db, backend)
+            await backend.close()
+            assert "INCR" in server.commands
+
+    asyncio.run(run())
+
+
+def test_redis_backend_round_trip() -> None:
+    """Test values, expiry and versions on a Redis server."""
+
+    async def run() -> None:
+        async with FakeRedisServer() as server:
+            backend = RedisCacheBackend(RedisClient(server.url, pool_size=2))
+            value = {"_id": "t1", "updated": datetime(2021, 8, 8, 18, 0)}
+            await backend.set("k", value, 60)
+            assert await backend.get("k") == (True, value)
+            await backend.set("expired", value, 0.001)
+            await asyncio.sleep(0.01)
+            assert await backend.get("expired") == (False, None)
+            assert await backend.get_version("v") == 0
+            assert await backend.incr_version("v", 60) == 1
+            assert await backend.get_version("v") == 1
+            await backend.close()
+
+    asyncio.run(run())
+
+
+def test_cache_degrades_without_backend(fake_db: FakeDatabase) -> None:
+    """Test an unreachable backend falls back to the repository."""
+    fake_db["discussions"].docs["t1"] = {"_id": "t1", "type": "topic"}
+
+    async def run() -> None:
+        backend = RedisCacheBackend(
+            RedisClient("redis://127.0.0.1:1/0", timeout=0.1)
+        )
+        cache = Cache(backend, ttl=60)
+        topic_repo = CachedTopicRepository(
+            TopicRepositoryMongo(fake_db), cache
+        )
+        assert (await topic_repo.get("t1"))["_id"] == "t1"
+        assert cache.stats.errors == 1
+
+    asyncio.run(run())
+
+
+def test_cache_saves_round_trips() -> None:
+    """Test repeated reads are served from the cache."""
+    fake_db = FakeMotorClient()["test"]
+    fake_db["discussions"].docs["t1"] = {"_id": "t1", "type": "topic"}
+    topic_repo = CachedTopicRepository(
+        TopicRepositoryMongo(fake_db),
+        Cache(MemoryCacheBackend(max_size=10), ttl=60),
+    )
+
+    async def run() -> None:
+        for _ in range(5):
+            await topic_repo.get("t1")
+
+    asyncio.run(run())
+
+    assert fake_db.client.calls == ["discussions.find_one"]
@@ -0,0 +1,43 @@
+"""Comment repository module test."""
+
+import asyncio
+from typing import List
+
+from app.repository.comment import CommentRepositoryMongo
+from testing.mongo import FakeDatabase
+
+
+def seed_comments(fake_db: FakeDatabase, topic_id: str, count: int) -> None:
+    """Insert `count` comments in a topic, two of them per timestamp."""
+    fake_db["discussions"].docs.update(
+        {
+            f"c{i:03}": {
+                "_id": f"c{i:03}",
+                "topic": topic_id,
+                "type": "comment",
+                "content": f"comment {i}",
+                "username": "Nephew Bob",
+                "created": f"2021-08-08T18:{i // 2:02}:00",
+            }
+            for i in range(count)
+        }
+    )
+
+
+def test_find_by_topic_keyset_pages(fake_db: FakeDatabase) -> None:
+    """Test walking every page forwards and backwards with keys."""
+    seed_comments(fake_db, "t1", 7)
+    repo = CommentRepositoryMongo(fake_db)
+
+    ids: List[str] = []
+    after = None
+    while len(page := asyncio.run(repo.find_by_topic("t1", 0, 3, after))):
+        ids += [doc["_id"] for doc in page]
+        after = [page[-1]["created"], page[-1]["_id"]]
+
+    assert ids == [f"c{i:03}" for i in range(7)]
+
+    before = ["2021-08-08T18:02:00", "c005"]
+    page = asyncio.run(repo.find_by_topic("t1", 0, 3, before=before))
+
+    assert [doc["_id"] for doc in page] == ["c002", "c003", "c004"]
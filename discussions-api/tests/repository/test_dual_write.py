@@ -0,0 +1,66 @@
+"""Dual-write repository module test."""
+
+import asyncio
+
+from _pytest.monkeypatch import MonkeyPatch
+from pymongo.errors import PyMongoError
+
+from app.api import deps
+from app.domain.comment import Comment
+from app.domain.topic import Topic
+from app.repository.dual_write import DualWriteTopicRepository
+from app.repository.topic import TopicRepositoryMongo
+from testing.mongo import FakeDatabase
+
+
+def test_writes_are_mirrored(
+    fake_db: FakeDatabase, monkeypatch: MonkeyPatch
+) -> None:
+    """Test the split collections follow the writes, reads do not."""
+    monkeypatch.setattr(deps.settings, "db_dual_write", True, raising=False)
+    topic_usecase, comment_usecase = deps.build_usecases(fake_db)
+
+    async def run() -> None:
+        topic = await topic_usecase.create(
+            Topic(title="Hello", content="World", username="Bob")
+        )
+        first = await comment_usecase.create(
+            topic["_id"], Comment(content="Hi", username="Alice")
+        )
+        second = await comment_usecase.create(
+            topic["_id"], Comment(content="Bye", username="Alice")
+        )
+        await comment_usecase.delete(topic["_id"], second["_id"])
+        fake_db.client.calls.clear()
+        await comment_usecase.get(topic["_id"], first["_id"])
+
+    asyncio.run(run())
+
+    shared = fake_db["discussions"].docs
+    assert fake_db["topics"].docs == {
+        doc_id: doc for doc_id, doc in shared.items() if doc["type"] == "topic"
+    }
+    assert fake_db["comments"].docs == {
+        doc_id: doc
+        for doc_id, doc in shared.items()
+        if doc["type"] == "comment"
+    }
+    assert len(fake_db["comments"].docs) == 1
+    assert fake_db.client.calls == ["discussions.find_one"]
+
+
+def test_mirror_errors_are_not_raised(fake_db: FakeDatabase) -> None:
+    """Test a failed mirror write leaves the write succeeded."""
+
+    class BrokenMirror(TopicRepositoryMongo):
+        async def create(self, topic: dict) -> str:
+            raise PyMongoError("unreachable")
+
+    repository = DualWriteTopicRepository(
+        TopicRepositoryMongo(fake_db), BrokenMirror(fake_db, "topics")
+    )
+
+    topic_id = asyncio.run(repository.create({"_id": "t1", "type": "topic"}))
+
+    assert topic_id == "t1"
+    assert fake_db["topics"].docs == {}
@@ -0,0 +1,86 @@
+"""Index migration module test."""
+
+import asyncio
+
+from _pytest.monkeypatch import MonkeyPatch
+from pymongo import ASCENDING, IndexModel
+
+from app.api import deps
+from app.api.deps import mongo_repositories
+from app.repository.indexes import ensure_indexes
+from testing.mongo import FakeDatabase
+
+
+def test_ensure_indexes_creates_declared_indexes(
+    fake_db: FakeDatabase,
+) -> None:
+    """Test the declared indexes are created once."""
+    report = asyncio.run(ensure_indexes(fake_db, mongo_repositories(fake_db)))
+
+    assert sorted(report.created) == [
+        "discussions.reply_1",
+        "discussions.title_text_content_text",
+        "discussions.type_1_created_1__id_1",
+        "discussions.type_1_topic_1_created_1__id_1",
+    ]
+    assert not report.has_drift
+
+    report = asyncio.run(ensure_indexes(fake_db, mongo_repositories(fake_db)))
+
+    assert report.created == []
+    assert len(report.unchanged) == 4
+
+
+def test_ensure_indexes_reports_drift(fake_db: FakeDatabase) -> None:
+    """Test indexes that differ from their declaration are reported."""
+    collection = fake_db["discussions"]
+    asyncio.run(
+        collection.create_indexes(
+            [
+                IndexModel(
+                    [("type", ASCENDING)], name="type_1_created_1__id_1"
+                ),
+                IndexModel([("username", ASCENDING)]),
+            ]
+        )
+    )
+
+    report = asyncio.run(ensure_indexes(fake_db, mongo_repositories(fake_db)))
+
+    assert [drift.name for drift in report.drifted] == [
+        "type_1_created_1__id_1"
+    ]
+    assert report.undeclared == ["discussions.username_1"]
+    assert collection.indexes["type_1_created_1__id_1"]["key"] == [("type", 1)]
+
+
+def test_ensure_indexes_check_only(fake_db: FakeDatabase) -> None:
+    """Test check mode reports missing indexes without creating them."""
+    report = asyncio.run(
+        ensure_indexes(fake_db, mongo_repositories(fake_db), create=False)
+    )
+
+    assert len(report.missing) == 4
+    assert list(fake_db["discussions"].indexes) == ["_id_"]
+
+
+def test_ensure_indexes_of_both_layouts(
+    fake_db: FakeDatabase, monkeypatch: MonkeyPatch
+) -> None:
+    """Test the collections dual writes go to are indexed too."""
+    monkeypatch.setattr(deps.settings, "db_collections", "split")
+    monkeypatch.setattr(deps.settings, "db_dual_write", True, raising=False)
+
+    report = asyncio.run(ensure_indexes(fake_db, mongo_repositories(fake_db)))
+
+    assert sorted(report.created) == [
+        "comments.content_text",
+        "comments.reply_1",
+        "comments.topic_1_created_1__id_1",
+        "discussions.reply_1",
+        "discussions.title_text_content_text",
+        "discussions.type_1_created_1__id_1",
+        "discussions.type_1_topic_1_created_1__id_1",
+        "topics.created_1__id_1",
+        "topics.title_text_content_text",
+    ]
@@ -0,0 +1,87 @@
+"""Live updates feed module test."""
+
+import asyncio
+from typing import Any, Dict
+
+from app.api import deps
+from app.domain.comment import Comment
+from app.domain.live import DELETE_MARK, LiveEvent, LiveHub
+from app.domain.topic import Topic
+from app.repository.live import ChangeStreamFeed
+from testing.mongo import FakeDatabase
+
+
+def change(operation: str, comment_id: str, **fields: str) -> dict:
+    document = {"_id": comment_id, "type": "comment", **fields}
+    return {
+        "_id": {"_data": f"{operation}-{comment_id}"},
+        "operationType": operation,
+        "documentKey": {"_id": comment_id},
+        "fullDocument": document if operation != "delete" else None,
+    }
+
+
+def test_changes_become_events_of_their_topic(fake_db: FakeDatabase) -> None:
+    """Test changes are routed to topics, deletes through the known ones."""
+    feed = ChangeStreamFeed(
+        fake_db["discussions"], LiveHub(local=False), max_known=1
+    )
+
+    created = feed.to_event(change("insert", "c1", topic="t1"))
+    updated = feed.to_event(change("update", "c1", topic="t1", content="!"))
+    deleted = feed.to_event(change("delete", "c1"))
+
+    assert created is not None and updated is not None
+    assert deleted is not None
+    assert (created.kind, created.topic) == (LiveEvent.CREATED, "t1")
+    assert created.event_id == "insert-c1"
+    assert updated.kind == LiveEvent.UPDATED
+    assert updated.comment["content"] == "!"
+    assert deleted.kind == LiveEvent.DELETED
+    assert deleted.comment == {"_id": "c1", "topic": "t1"}
+
+    # Only the last comment seen is remembered
+    feed.to_event(change("insert", "c2", topic="t1"))
+    feed.to_event(change("insert", "c3", topic="t2"))
+    assert feed.to_event(change("delete", "c2")) is None
+    assert feed.to_event(change("update", "c4", topic="t1")) is not None
+    assert feed.to_event(change("drop", "c4")) is None
+
+
+def test_deletes_marked_with_their_topic_are_published(
+    fake_db: FakeDatabase,
+) -> None:
+    """Test deletes through the usecase reach the topic of any comment."""
+    hub = LiveHub(local=False)
+    feed = ChangeStreamFeed(fake_db["discussions"], hub)
+    topic_usecase, comment_usecase = deps.build_usecases(fake_db, hub=hub)
+
+    async def run() -> Dict[str, Any]:
+        topic = await topic_usecase.create(
+            Topic(title="Hey!", content="Help me?", username="Bob")
+        )
+        comment = await comment_usecase.create(
+            topic["_id"], Comment(content="Sure!", username="Alice")
+        )
+        fake_db.client.calls.clear()
+        assert await comment_usecase.delete(topic["_id"], comment["_id"])
+        return comment
+
+    comment = asyncio.run(run())
+    assert fake_db.client.calls[:2] == [
+        "discussions.update_one",
+        "discussions.delete_one",
+    ]
+    # The comment is gone by the time the update is looked up
+    marked = change("update", comment["_id"])
+    marked["fullDocument"] = None
+    marked["updateDescription"] = {
+        "updatedFields": {DELETE_MARK: comment["topic"]}
+    }
+    assert feed.to_event(marked) is None
+    deleted = feed.to_event(change("delete", comment["_id"]))
+    assert deleted is not None
+    assert (deleted.kind, deleted.topic) == (
+        LiveEvent.DELETED,
+        comment["topic"],
+    )
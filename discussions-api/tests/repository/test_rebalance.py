@@ -0,0 +1,177 @@
+"""Shards rebalancing module test."""
+
+import asyncio
+from datetime import datetime
+from typing import List, Tuple
+
+from _pytest.monkeypatch import MonkeyPatch
+
+from app.api import deps
+from app.domain.comment import Comment
+from app.domain.topic import Topic
+from app.repository.rebalance import rebalance
+from testing.mongo import FakeDatabase
+
+
+def test_rebalance_after_adding_a_shard(
+    fake_db: FakeDatabase, monkeypatch: MonkeyPatch
+) -> None:
+    """Test topics and comments move to the new shard, then are pruned."""
+    monkeypatch.setattr(deps.settings, "db_shards", ["shard0", "shard1"])
+    topic_usecase, comment_usecase = deps.build_usecases(fake_db)
+
+    async def create() -> None:
+        for i in range(20):
+            topic = await topic_usecase.create(
+                Topic(title=f"Topic {i}", content="Hi", username="Bob")
+            )
+            await comment_usecase.create(
+                topic["_id"], Comment(content="Hey", username="Alice")
+            )
+
+    asyncio.run(create())
+    monkeypatch.setattr(
+        deps.settings, "db_shards", ["shard0", "shard1", "shard2"]
+    )
+    shards = [
+        deps.mongo_layouts(shard)[0] for shard in deps.shard_databases(fake_db)
+    ]
+    ring = deps.build_hash_ring()
+
+    async def run(fix: bool, prune: bool) -> int:
+        reports = []
+        for kind, key in ((0, "_id"), (1, "topic")):
+            reports += await rebalance(
+                [layout[kind] for layout in shards],
+                ring,
+                key,
+                batch_size=3,
+                fix=fix,
+                prune=prune,
+            )
+        return sum(report.misplaced for report in reports)
+
+    misplaced = asyncio.run(run(fix=False, prune=False))
+
+    assert misplaced > 0
+    assert fake_db.client["shard2"]["discussions"].docs == {}
+
+    assert asyncio.run(run(fix=True, prune=False)) == misplaced
+    assert len(fake_db.client["shard2"]["discussions"].docs) == misplaced
+    # Copies are read once, wherever the topic is found
+    topic_usecase, comment_usecase = deps.build_usecases(fake_db)
+    page = asyncio.run(topic_usecase.find(0, 50))
+    assert len(page.items) == 20
+
+    assert asyncio.run(run(fix=True, prune=True)) == misplaced
+    assert asyncio.run(run(fix=False, prune=False)) == 0
+    total = sum(
+        len(fake_db.client[name]["discussions"].docs)
+        for name in ("shard0", "shard1", "shard2")
+    )
+    assert total == 40
+    for topic in page.items:
+        comments = asyncio.run(
+            comment_usecase.find_by_topic(topic["_id"], 0, 10)
+        )
+        assert len(comments.items) == 1
+
+
+def test_prune_does_not_bring_deleted_documents_back(
+    fake_db: FakeDatabase, monkeypatch: MonkeyPatch
+) -> None:
+    """Test documents deleted on their new shard stay deleted once pruned."""
+    old, grown = ["shard0", "shard1"], ["shard0", "shard1", "shard2"]
+
+    async def create() -> List[Tuple[str, str]]:
+        topic_usecase, comment_usecase = deps.build_usecases(fake_db)
+        created = []
+        for i in range(20):
+            topic = await topic_usecase.create(
+                Topic(title=f"Topic {i}", content="Hi", username="Bob")
+            )
+            comment = await comment_usecase.create(
+                topic["_id"], Comment(content="Hey", username="Alice")
+            )
+            created.append((topic["_id"], comment["_id"]))
+        return created
+
+    async def run(prune: bool) -> None:
+        shards = [
+            deps.mongo_layouts(shard)[0]
+            for shard in deps.shard_databases(fake_db)
+        ]
+        for kind, key in ((0, "_id"), (1, "topic")):
+            await rebalance(
+                [layout[kind] for layout in shards],
+                deps.build_hash_ring(),
+                key,
+                batch_size=3,
+                prune=prune,
+            )
+
+    monkeypatch.setattr(deps.settings, "db_shards", old)
+    copied = asyncio.run(create())
+    monkeypatch.setattr(deps.settings, "db_shards", grown)
+    asyncio.run(run(prune=False))
+    # Written on the old shards after the copy, before the deploy
+    monkeypatch.setattr(deps.settings, "db_shards", old)
+    late = asyncio.run(create())
+    monkeypatch.setattr(deps.settings, "db_shards", grown)
+    topic_usecase, comment_usecase = deps.build_usecases(fake_db)
+    ring = deps.build_hash_ring()
+    moved = grown.index("shard2")
+
+    async def delete_copies() -> List[str]:
+        deleted = []
+        for topic_id, comment_id in copied:
+            if ring.shard_of(topic_id) == moved:
+                assert await comment_usecase.delete(topic_id, comment_id)
+                assert await topic_usecase.delete(topic_id)
+                deleted.append(topic_id)
+        return deleted
+
+    deleted = asyncio.run(delete_copies())
+    assert deleted
+
+    asyncio.run(run(prune=True))
+
+    for topic_id in deleted:
+        assert asyncio.run(topic_usecase.get(topic_id)) is None
+    for topic_id, _ in late:
+        comments = asyncio.run(comment_usecase.find_by_topic(topic_id, 0, 10))
+        assert len(comments.items) == 1
+    assert any(ring.shard_of(topic_id) == moved for topic_id, _ in late)
+    page = asyncio.run(topic_usecase.find(0, 100))
+    assert len(page.items) == 40 - len(deleted)
+
+
+def test_updates_are_copied_whatever_the_date_type(
+    fake_db: FakeDatabase, monkeypatch: MonkeyPatch
+) -> None:
+    """Test dates dumped as ISO strings compare with updated datetimes."""
+    monkeypatch.setattr(
+        deps.settings, "db_shards", ["shard0", "shard1", "shard2"]
+    )
+    ring = deps.build_hash_ring()
+    topic_id = next(f"t{i}" for i in range(100) if ring.shard_of(f"t{i}") == 2)
+    topic = {"_id": topic_id, "type": "topic", "created": "2021-08-08T18:00"}
+    # Updated through PATCH since, after a copy created with a date
+    fake_db.client["shard0"]["discussions"].docs[topic_id] = {
+        **topic,
+        "updated": datetime(2021, 8, 9, 18, 0),
+    }
+    fake_db.client["shard2"]["discussions"].docs[topic_id] = {
+        **topic,
+        "updated": "2021-08-08T18:00:00",
+    }
+    shards = [
+        deps.mongo_layouts(shard)[0][0]
+        for shard in deps.shard_databases(fake_db)
+    ]
+
+    reports = asyncio.run(rebalance(shards, ring, "_id", batch_size=3))
+
+    assert sum(report.replaced for report in reports) == 1
+    copy = fake_db.client["shard2"]["discussions"].docs[topic_id]
+    assert copy["updated"] == datetime(2021, 8, 9, 18, 0)
@@ -0,0 +1,48 @@
+"""Read routing repository module test."""
+
+import asyncio
+
+from _pytest.monkeypatch import MonkeyPatch
+
+from app.api import deps
+from app.domain.comment import Comment
+from app.domain.topic import Topic
+from app.repository.routing import READ_YOUR_WRITES, routing_key
+from testing.mongo import FakeDatabase
+
+
+def test_listings_read_the_replica(
+    fake_db: FakeDatabase, monkeypatch: MonkeyPatch
+) -> None:
+    """Test listings go to the replica unless the client reads its writes."""
+    # The replica never catches up, so it only holds what is written to it
+    replica = fake_db.client["replica"]
+    monkeypatch.setattr(deps, "replica_database", lambda mongodb: replica)
+    topic_usecase, comment_usecase = deps.build_usecases(fake_db)
+
+    async def run() -> None:
+        topic = await topic_usecase.create(
+            Topic(title="Hey!", content="Hi", username="Bob")
+        )
+        topic_id = topic["_id"]
+        await comment_usecase.create(
+            topic_id, Comment(content="Sure!", username="Alice")
+        )
+
+        assert (await topic_usecase.find(0, 10)).items == []
+        comments = await comment_usecase.find_by_topic(topic_id, 0, 10)
+        assert comments.items == []
+        assert await topic_usecase.get(topic_id) is not None
+
+        context = READ_YOUR_WRITES.set(True)
+        try:
+            assert len((await topic_usecase.find(0, 10)).items) == 1
+            comments = await comment_usecase.find_by_topic(topic_id, 0, 10)
+            assert len(comments.items) == 1
+            assert routing_key(["find"]) == ["find", "read-your-writes"]
+        finally:
+            READ_YOUR_WRITES.reset(context)
+        assert routing_key(["find"]) == ["find"]
+
+    asyncio.run(run())
+    assert replica["discussions"].docs == {}
@@ -0,0 +1,135 @@
+"""Search index repository module test."""
+
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from app.api import deps
+from app.domain.comment import Comment, UpdateComment
+from app.domain.search import SearchFilters
+from app.domain.topic import Topic, UpdateTopic
+from app.repository.search_index import (
+    COMMENT,
+    TOPIC,
+    IndexedTopicRepository,
+    MemorySearchBackend,
+    SnapshotInUse,
+)
+from app.repository.topic import TopicRepositoryMongo
+from testing.mongo import FakeDatabase
+
+
+def test_index_follows_writes(fake_db: FakeDatabase) -> None:
+    """Test searches are ranked by the backend as topics are written."""
+    backend = MemorySearchBackend()
+    topic_usecase, comment_usecase = deps.build_usecases(
+        fake_db, search_backend=backend
+    )
+
+    async def run() -> None:
+        first = await topic_usecase.create(
+            Topic(title="Meaning", content="Of lifestyle", username="Bob")
+        )
+        second = await topic_usecase.create(
+            Topic(title="Hey", content="Life?", username="Alice")
+        )
+        comment = await comment_usecase.create(
+            second["_id"], Comment(content="Lifelong", username="Bob")
+        )
+        await topic_usecase.update(first["_id"], UpdateTopic(title="Hello"))
+        await comment_usecase.update(
+            second["_id"], comment["_id"], UpdateComment(content="Nope")
+        )
+        fake_db.client.calls.clear()
+
+        page = await topic_usecase.search("lif", 0, 10)
+        assert [doc["_id"] for doc in page.items] == [
+            second["_id"],
+            first["_id"],
+        ]
+        # Only the ranked topics are read from the database
+        assert fake_db.client.calls == ["discussions.find"]
+        assert page.items[0]["highlights"] == {"content": ["<em>Life</em>?"]}
+
+        page = await topic_usecase.search(
+            "life", 0, 10, filters=SearchFilters(has_comments=True)
+        )
+        assert [doc["_id"] for doc in page.items] == [second["_id"]]
+        page = await comment_usecase.search(second["_id"], "lifelong", 0, 10)
+        assert page.items == []
+
+        await topic_usecase.delete(first["_id"])
+        assert first["_id"] not in backend.indexes[TOPIC]
+
+    asyncio.run(run())
+
+
+def test_comment_stats_only_update_indexed_topics(
+    fake_db: FakeDatabase,
+) -> None:
+    """Test fixing the counters does not index topics it does not know."""
+    backend = MemorySearchBackend()
+    topic_repo = IndexedTopicRepository(TopicRepositoryMongo(fake_db), backend)
+    topic = {
+        "_id": "t",
+        "type": "topic",
+        "title": "Meaning of life",
+        "content": "Why?",
+        "comment_count": 0,
+    }
+
+    async def run() -> None:
+        await topic_repo.create(topic)
+        await topic_repo.set_comment_stats({"t": (2, None), "gone": (1, None)})
+
+    asyncio.run(run())
+    assert "gone" not in backend.indexes[TOPIC]
+    assert backend.indexes[TOPIC].attributes["t"]["comment_count"] == 2
+
+
+def test_snapshot_round_trip(fake_db: FakeDatabase, tmp_path: Path) -> None:
+    """Test the index is snapshotted on close and loaded on open."""
+    path = str(tmp_path / "search.json")
+    backend = MemorySearchBackend(path)
+    topic = {
+        "_id": "t",
+        "title": "Meaning of life",
+        "content": "Why?",
+        "username": "Bob",
+        "created": "2021-08-08T18:14:40",
+        "comment_count": 0,
+    }
+    fake_db["discussions"].docs["t"] = {**topic, "type": "topic"}
+
+    async def run() -> None:
+        assert not await backend.open()
+        await deps.open_search_backend(backend, fake_db)
+        await backend.close()
+
+        loaded = MemorySearchBackend(path)
+        assert await loaded.open()
+        # Consumed, so that a crash is followed by a rebuild
+        assert not Path(path).exists()
+        for kind in (TOPIC, COMMENT):
+            assert loaded.indexes[kind].dump() == backend.indexes[kind].dump()
+        assert await loaded.rank(TOPIC, SearchFilters(), "life", 10) == (
+            await backend.rank(TOPIC, SearchFilters(), "life", 10)
+        )
+
+    asyncio.run(run())
+
+
+def test_snapshot_is_used_by_a_single_process(tmp_path: Path) -> None:
+    """Test a second backend can not share the snapshot of an open one."""
+    path = str(tmp_path / "search.json")
+    backend = MemorySearchBackend(path)
+
+    async def run() -> None:
+        assert not await backend.open()
+        with pytest.raises(SnapshotInUse):
+            await MemorySearchBackend(path).open()
+        await backend.close()
+        assert await MemorySearchBackend(path).open()
+
+    asyncio.run(run())
@@ -0,0 +1,92 @@
+"""Sharding repository module test."""
+
+import asyncio
+from typing import Any, List
+
+from _pytest.monkeypatch import MonkeyPatch
+
+from app.api import deps
+from app.domain.comment import Comment
+from app.domain.topic import Topic
+from app.repository.sharding import HashRing, merge_pages
+from app.repository.topic import TopicRepositoryMongo
+from testing.mongo import FakeDatabase
+
+SHARDS = ["shard0", "shard1", "shard2"]
+
+
+def test_adding_a_shard_moves_a_share_of_the_topics() -> None:
+    """Test topics only move to the new shard, about 1 in N + 1."""
+    ring = HashRing(SHARDS)
+    grown = HashRing([*SHARDS, "shard3"])
+    keys = [f"topic-{i}" for i in range(4000)]
+
+    moved = [key for key in keys if ring.shard_of(key) != grown.shard_of(key)]
+
+    assert HashRing(list(reversed(SHARDS))).shards[0] == "shard2"
+    assert {grown.shard_of(key) for key in moved} == {3}
+    assert 600 < len(moved) < 1400
+    placed = {index: 0 for index in range(len(SHARDS))}
+    for key in keys:
+        placed[ring.shard_of(key)] += 1
+    assert min(placed.values()) > 900
+
+
+def test_merge_pages_in_both_directions() -> None:
+    """Test pages of the shards are merged, skipped and deduplicated."""
+    sort = TopicRepositoryMongo.SORT
+    pages = [
+        [{"_id": "a", "created": 1}, {"_id": "d", "created": 4}],
+        [{"_id": "b", "created": 2}, {"_id": "d", "created": 4}],
+        [{"_id": "c", "created": 3}],
+    ]
+
+    def ids(docs: List[Any]) -> List[str]:
+        return [doc["_id"] for doc in docs]
+
+    assert ids(merge_pages(pages, sort, 1, 2)) == ["b", "c"]
+    assert ids(merge_pages(pages, sort, 0, 10)) == ["a", "b", "c", "d"]
+    assert ids(merge_pages(pages, sort, 1, 2, before=[5, "e"])) == ["b", "c"]
+
+
+def test_topics_and_comments_are_sharded_together(
+    fake_db: FakeDatabase, monkeypatch: MonkeyPatch
+) -> None:
+    """Test a topic and its comments share a shard, listings span all."""
+    monkeypatch.setattr(deps.settings, "db_shards", SHARDS)
+    topic_usecase, comment_usecase = deps.build_usecases(fake_db)
+    ring = deps.build_hash_ring()
+
+    async def run() -> List[str]:
+        topic_ids = []
+        for i in range(12):
+            topic = await topic_usecase.create(
+                Topic(title=f"Topic {i}", content="Hi", username="Bob")
+            )
+            await comment_usecase.create(
+                topic["_id"], Comment(content="Hey", username="Alice")
+            )
+            topic_ids.append(topic["_id"])
+        listed = []
+        page = await topic_usecase.find(0, 5)
+        listed += [topic["_id"] for topic in page.items]
+        while page.next_cursor is not None:
+            page = await topic_usecase.find(0, 5, after=page.next_cursor)
+            listed += [topic["_id"] for topic in page.items]
+        assert listed == topic_ids
+        return topic_ids
+
+    topic_ids = asyncio.run(run())
+
+    for topic_id in topic_ids:
+        shard = fake_db.client[SHARDS[ring.shard_of(topic_id)]]
+        docs = shard["discussions"].docs.values()
+        assert [doc["type"] for doc in docs if topic_id in doc.values()] == [
+            "topic",
+            "comment",
+        ]
+    assert fake_db["discussions"].docs == {}
+    assert (
+        sum(len(fake_db.client[name]["discussions"].docs) for name in SHARDS)
+        == 24
+    )
@@ -0,0 +1,119 @@
+"""Single-flight repository module test."""
+
+import asyncio
+from typing import Any, List
+
+import pytest
+
+from app.repository.comment import CommentRepositoryMongo
+from app.repository.single_flight import (
+    SingleFlight,
+    SingleFlightCommentRepository,
+)
+from testing.mongo import FakeDatabase
+
+
+def test_identical_reads_send_one_query(fake_db: FakeDatabase) -> None:
+    """Test identical concurrent reads share a query, others do not."""
+    fake_db.client.latency = 0.01
+    flights = SingleFlight()
+    repository = SingleFlightCommentRepository(
+        CommentRepositoryMongo(fake_db), flights
+    )
+
+    async def run() -> List[Any]:
+        return await asyncio.gather(
+            *(repository.find_by_topic("t1", 0, 10) for _ in range(50)),
+            repository.find_by_topic("t1", 0, 20),
+        )
+
+    pages = asyncio.run(run())
+
+    assert pages == [[]] * 51
+    assert fake_db.client.calls == ["discussions.find"] * 2
+    assert flights.stats.dict() == {
+        "queries": 2,
+        "coalesced": 49,
+        "timeouts": 0,
+    }
+    assert len(flights) == 0
+
+
+def test_writes_start_new_flights(fake_db: FakeDatabase) -> None:
+    """Test a read after a write does not wait for a query sent before."""
+    fake_db.client.latency = 0.01
+    flights = SingleFlight()
+    repository = SingleFlightCommentRepository(
+        CommentRepositoryMongo(fake_db), flights
+    )
+    comment = {"_id": "c1", "topic": "t1", "type": "comment"}
+
+    async def run() -> List[Any]:
+        before = asyncio.ensure_future(repository.find_by_topic("t1", 0, 10))
+        await asyncio.sleep(0)
+        await repository.create(comment)
+        after = await repository.find_by_topic("t1", 0, 10)
+        return [await before, after]
+
+    _, after = asyncio.run(run())
+
+    assert [c["_id"] for c in after] == ["c1"]
+    assert flights.stats.queries == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_query() -> None:
+    """Test the waiters get the result when the first caller gives up."""
+    flights = SingleFlight()
+    loads: List[int] = []
+
+    async def load() -> int:
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return 42
+
+    async def run() -> int:
+        first = asyncio.ensure_future(flights.do(["k"], load))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(flights.do(["k"], load))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == 42
+    assert len(loads) == 1
+
+
+def test_bounded_wait_and_shared_errors() -> None:
+    """Test a waiter queries on its own past the timeout, errors are shared."""
+    flights = SingleFlight(timeout=0.01)
+
+    async def slow() -> str:
+        await asyncio.sleep(0.05)
+        return "slow"
+
+    async def fast() -> str:
+        return "fast"
+
+    async def fail() -> str:
+        await asyncio.sleep(0.01)
+        raise ValueError("down")
+
+    async def run() -> List[Any]:
+        return await asyncio.gather(
+            flights.do(["slow"], slow), flights.do(["slow"], fast)
+        )
+
+    assert asyncio.run(run()) == ["slow", "fast"]
+    assert flights.stats.timeouts == 1
+
+    async def run_failing() -> List[Any]:
+        return await asyncio.gather(
+            flights.do(["fail"], fail),
+            flights.do(["fail"], fail),
+            return_exceptions=True,
+        )
+
+    errors = asyncio.run(run_failing())
+    assert [str(error) for error in errors] == ["down", "down"]
+    with pytest.raises(ValueError):
+        asyncio.run(flights.do(["fail"], fail))
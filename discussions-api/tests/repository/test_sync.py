@@ -0,0 +1,72 @@
+"""Collections sync module test."""
+
+import asyncio
+
+from app.repository.comment import CommentRepositoryMongo
+from app.repository.sync import sync_collection
+from app.repository.topic import TopicRepositoryMongo
+from testing.mongo import FakeDatabase
+
+
+def comment(comment_id: str, content: str = "Hi") -> dict:
+    return {
+        "_id": comment_id,
+        "topic": "t1",
+        "type": "comment",
+        "content": content,
+    }
+
+
+def test_sync_copies_the_source(fake_db: FakeDatabase) -> None:
+    """Test missing, extra and changed documents are fixed in batches."""
+    for doc in [
+        {"_id": "t1", "type": "topic", "title": "Hello"},
+        *(comment(f"c{i}") for i in range(5)),
+    ]:
+        fake_db["discussions"].docs[doc["_id"]] = doc
+    for doc in [comment("c1", "Outdated"), comment("c9")]:
+        fake_db["comments"].docs[doc["_id"]] = doc
+
+    report = asyncio.run(
+        sync_collection(
+            CommentRepositoryMongo(fake_db),
+            CommentRepositoryMongo(fake_db, "comments"),
+            batch_size=2,
+        )
+    )
+
+    assert report.lines() == [
+        "discussions -> comments: 0 unchanged, 4 missing, 1 extra, 1 changed"
+    ]
+    assert fake_db["comments"].docs == {
+        f"c{i}": comment(f"c{i}") for i in range(5)
+    }
+
+    report = asyncio.run(
+        sync_collection(
+            CommentRepositoryMongo(fake_db),
+            CommentRepositoryMongo(fake_db, "comments"),
+            batch_size=2,
+        )
+    )
+
+    assert report.in_sync
+    assert report.unchanged == 5
+
+
+def test_sync_check_only(fake_db: FakeDatabase) -> None:
+    """Test the differences are counted without being fixed."""
+    fake_db["topics"].docs["t1"] = {"_id": "t1", "type": "topic"}
+
+    report = asyncio.run(
+        sync_collection(
+            TopicRepositoryMongo(fake_db, "topics"),
+            TopicRepositoryMongo(fake_db),
+            batch_size=10,
+            fix=False,
+        )
+    )
+
+    assert not report.in_sync
+    assert report.missing == 1
+    assert fake_db["discussions"].docs == {}
@@ -0,0 +1,42 @@
+"""Topic repository module test."""
+
+import asyncio
+
+from app.api.deps import mongo_repositories
+from app.repository.indexes import ensure_indexes
+from app.repository.topic import TopicRepositoryMongo
+from testing.mongo import FakeDatabase
+
+
+def test_search_pages_by_score(fake_db: FakeDatabase) -> None:
+    """Test search pages continue after the last score and id."""
+    asyncio.run(ensure_indexes(fake_db, mongo_repositories(fake_db)))
+    fake_db["discussions"].docs.update(
+        {
+            f"t{i}": {
+                "_id": f"t{i}",
+                "type": "topic",
+                "title": "life " * (i % 3 + 1),
+                "content": "meaning",
+                "username": "John Doe",
+                "created": "2021-08-08T18:00:00",
+            }
+            for i in range(6)
+        }
+    )
+    repo = TopicRepositoryMongo(fake_db)
+
+    first = asyncio.run(repo.search([], "life", 0, 3))
+    last = first[-1]
+    second = asyncio.run(
+        repo.search([], "life", 0, 3, after=[last["score"], last["_id"]])
+    )
+
+    assert [doc["_id"] for doc in first + second] == [
+        "t2",
+        "t5",
+        "t1",
+        "t4",
+        "t0",
+        "t3",
+    ]
@@ -0,0 +1,93 @@
+"""Metrics module test."""
+
+import asyncio
+from typing import AsyncIterator
+
+from app.metrics import Counter, Histogram, Registry, instrument, timed_stage
+
+
+def test_render_histogram() -> None:
+    """Test a histogram renders cumulative buckets, sum and count."""
+    registry = Registry()
+    latency = registry.register(
+        Histogram("latency_seconds", "Latency.", ("route",), (0.1, 1.0))
+    )
+    latency.observe(0.05, "/topics")
+    latency.observe(0.5, "/topics")
+
+    lines = registry.render().splitlines()
+
+    assert lines == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/topics",le="0.1"} 1',
+        'latency_seconds_bucket{route="/topics",le="1"} 2',
+        'latency_seconds_bucket{route="/topics",le="+Inf"} 2',
+        'latency_seconds_sum{route="/topics"} 0.55',
+        'latency_seconds_count{route="/topics"} 2',
+    ]
+
+
+def test_render_counter_callback() -> None:
+    """Test a counter read from a callback renders its current values."""
+    values = {("hit",): 1.0}
+    counter = Counter("ops", "Ops.", ("result",), callback=lambda: values)
+    values[("miss",)] = 2.0
+
+    assert counter.render()[2:] == [
+        'ops_total{result="hit"} 1',
+        'ops_total{result="miss"} 2',
+    ]
+
+
+def test_instrument_repository() -> None:
+    """Test every public method is timed, errors and generators included."""
+    from app.metrics import REPOSITORY_ERRORS, REPOSITORY_LATENCY
+
+    @instrument("things")
+    class Repository:
+        async def get(self) -> int:
+            return 1
+
+        async def fail(self) -> None:
+            raise ValueError()
+
+        async def stream(self) -> AsyncIterator[int]:
+            for i in range(3):
+                yield i
+
+    async def run() -> None:
+        repository = Repository()
+        assert await repository.get() == 1
+        try:
+            await repository.fail()
+        except ValueError:
+            pass
+        stream = repository.stream()
+        assert await stream.__anext__() == 0
+        await stream.aclose()
+
+    asyncio.run(run())
+
+    assert REPOSITORY_LATENCY.count("things", "get") == 1
+    assert REPOSITORY_LATENCY.count("things", "fail") == 1
+    assert REPOSITORY_ERRORS.values[("things", "fail")] == 1
+    assert REPOSITORY_LATENCY.count("things", "stream") == 1
+
+
+def test_timed_stage() -> None:
+    """Test a stage is timed around sync functions and coroutines."""
+    from app.metrics import STAGE_LATENCY
+
+    @timed_stage("test_sync")
+    def double(value: int) -> int:
+        return value * 2
+
+    @timed_stage("test_async")
+    async def triple(value: int) -> int:
+        return value * 3
+
+    assert double(2) == 4
+    assert asyncio.run(triple(2)) == 6
+    assert STAGE_LATENCY.count("test_sync") == 1
+    assert STAGE_LATENCY.count("test_async") == 1
@@ -0,0 +1,308 @@
+"""Comment usecase module test."""
+
+import asyncio
+import time
+from typing import List, Optional, Tuple
+
+import pytest
+
+from app.api import deps
+from app.domain.comment import Comment, UpdateComment
+from app.domain.topic import Topic
+from app.usecase.comment import (
+    CommentNotFoundToBeReplied,
+    CommentUsecase,
+    TopicNotFound,
+)
+from app.usecase.topic import TopicUsecase
+from testing.mongo import FakeDatabase, FakeMotorClient
+
+
+def test_create_and_update_comment_round_trips(
+    fake_db: FakeDatabase,
+    topic_usecase: TopicUsecase,
+    comment_usecase: CommentUsecase,
+) -> None:
+    """Test writes do not read the comment back."""
+    topic = asyncio.run(
+        topic_usecase.create(
+            Topic(title="Hey!", content="Help me?", username="Bob")
+        )
+    )
+    fake_db.client.calls.clear()
+
+    comment = asyncio.run(
+        comment_usecase.create(
+            topic["_id"], Comment(content="Sure!", username="Alice")
+        )
+    )
+
+    assert comment["topic"] == topic["_id"]
+    assert fake_db.client.calls == [
+        "discussions.update_one",
+        "discussions.insert_one",
+    ]
+    fake_db.client.calls.clear()
+
+    updated = asyncio.run(
+        comment_usecase.update(
+            topic["_id"], comment["_id"], UpdateComment(content="Of course!")
+        )
+    )
+
+    assert updated["content"] == "Of course!"
+    assert fake_db.client.calls == ["discussions.find_one_and_update"]
+
+
+def test_comment_writes_maintain_topic_counter(
+    fake_db: FakeDatabase,
+    topic_usecase: TopicUsecase,
+    comment_usecase: CommentUsecase,
+) -> None:
+    """Test comment create and delete keep the topic counter up to date."""
+    topic = asyncio.run(
+        topic_usecase.create(
+            Topic(title="Hey!", content="Help me?", username="Bob")
+        )
+    )
+    comments = [
+        asyncio.run(
+            comment_usecase.create(
+                topic["_id"], Comment(content="Sure!", username="Alice")
+            )
+        )
+        for _ in range(2)
+    ]
+    asyncio.run(comment_usecase.delete(topic["_id"], comments[0]["_id"]))
+
+    stored = fake_db["discussions"].docs[topic["_id"]]
+    assert stored["comment_count"] == 1
+    assert stored["last_comment_at"] == comments[1]["created"]
+
+
+def test_create_reply_validates_concurrently() -> None:
+    """Test a reply costs two round trips of latency."""
+    latency = 0.05
+    fake_db = FakeMotorClient(latency=latency)["test"]
+    topic_usecase, comment_usecase = deps.build_usecases(fake_db)
+    topic = asyncio.run(
+        topic_usecase.create(
+            Topic(title="Hey!", content="Help me?", username="Bob")
+        )
+    )
+    comment = asyncio.run(
+        comment_usecase.create(
+            topic["_id"], Comment(content="Sure!", username="Alice")
+        )
+    )
+    reply = Comment(content="Thanks", username="Bob", reply=comment["_id"])
+
+    start = time.perf_counter()
+    asyncio.run(comment_usecase.create(topic["_id"], reply))
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 3 * latency
+
+
+def test_create_comment_rejections(
+    fake_db: FakeDatabase,
+    topic_usecase: TopicUsecase,
+    comment_usecase: CommentUsecase,
+) -> None:
+    """Test refused comments are not inserted nor counted."""
+    topic = asyncio.run(
+        topic_usecase.create(
+            Topic(title="Hey!", content="Help me?", username="Bob")
+        )
+    )
+    reply = Comment(content="Thanks", username="Bob", reply="missing")
+
+    with pytest.raises(CommentNotFoundToBeReplied):
+        asyncio.run(comment_usecase.create(topic["_id"], reply))
+    with pytest.raises(TopicNotFound):
+        asyncio.run(
+            comment_usecase.create(
+                "missing", Comment(content="Sure!", username="Alice")
+            )
+        )
+
+    docs = fake_db["discussions"].docs
+    assert list(docs) == [topic["_id"]]
+    assert docs[topic["_id"]]["comment_count"] == 0
+
+
+def test_thread_under_comment_single_aggregation(
+    fake_db: FakeDatabase,
+    topic_usecase: TopicUsecase,
+    comment_usecase: CommentUsecase,
+) -> None:
+    """Test a subtree is fetched along with its comment, in one lookup."""
+    topic = asyncio.run(
+        topic_usecase.create(
+            Topic(title="Hey!", content="Help me?", username="Bob")
+        )
+    )
+    reply_to = None
+    ids = []
+    for content in ["1", "2", "3", "4"]:
+        created = asyncio.run(
+            comment_usecase.create(
+                topic["_id"],
+                Comment(content=content, username="Bob", reply=reply_to),
+            )
+        )
+        reply_to = created["_id"]
+        ids.append(created["_id"])
+    fake_db.client.calls.clear()
+
+    thread = asyncio.run(
+        comment_usecase.thread(topic["_id"], ids[1], max_depth=1)
+    )
+
+    assert sorted(fake_db.client.calls) == [
+        "discussions.aggregate",
+        "discussions.find_one",
+    ]
+    assert [c["_id"] for c in thread.walk()] == ids[1:3]
+    assert thread.comments[0]["replies"][0]["reply_count"] == 1
+    assert asyncio.run(comment_usecase.thread(topic["_id"], "nope")) is None
+    with pytest.raises(TopicNotFound):
+        asyncio.run(comment_usecase.thread("nope"))
+
+
+def test_create_many_checks_replies_once(
+    fake_db: FakeDatabase,
+    topic_usecase: TopicUsecase,
+    comment_usecase: CommentUsecase,
+) -> None:
+    """Test a batch checks its replies in one lookup and inserts at once."""
+    topic = asyncio.run(
+        topic_usecase.create(
+            Topic(title="Hey!", content="Help me?", username="Bob")
+        )
+    )
+    existing = asyncio.run(
+        comment_usecase.create(
+            topic["_id"], Comment(content="First", username="Bob")
+        )
+    )
+    fake_db.client.calls.clear()
+
+    errors = asyncio.run(
+        comment_usecase.create_many(
+            topic["_id"],
+            [
+                Comment(comment_id="a", content="1", username="A"),
+                Comment(content="2", username="B", reply="a"),
+                Comment(content="3", username="C", reply=existing["_id"]),
+                Comment(content="4", username="D", reply="nope"),
+                Comment(comment_id=existing["_id"], content="5", username="E"),
+            ],
+        )
+    )
+
+    assert sorted(errors) == [3, 4]
+    assert errors[3] == "comment does not exist to be replied"
+    assert sorted(fake_db.client.calls) == [
+        "discussions.find",
+        "discussions.insert_many",
+        "discussions.update_one",
+        "discussions.update_one",
+    ]
+    assert asyncio.run(topic_usecase.get(topic["_id"]))["comment_count"] == 4
+    with pytest.raises(TopicNotFound):
+        asyncio.run(
+            comment_usecase.create_many(
+                "nope", [Comment(content="1", username="A")]
+            )
+        )
+
+
+def test_create_many_fails_replies_to_failed_comments(
+    topic_usecase: TopicUsecase, comment_usecase: CommentUsecase
+) -> None:
+    """Test replies to comments of the batch that failed fail as well."""
+    topic, other = (
+        asyncio.run(
+            topic_usecase.create(
+                Topic(title=title, content="Help me?", username="Bob")
+            )
+        )
+        for title in ("Hey!", "Ho!")
+    )
+    taken = asyncio.run(
+        comment_usecase.create(
+            other["_id"], Comment(content="Taken", username="Bob")
+        )
+    )
+
+    errors = asyncio.run(
+        comment_usecase.create_many(
+            topic["_id"],
+            [
+                Comment(comment_id=taken["_id"], content="1", username="A"),
+                Comment(
+                    comment_id="b",
+                    content="2",
+                    username="B",
+                    reply=taken["_id"],
+                ),
+                Comment(content="3", username="C", reply="b"),
+                Comment(content="4", username="D"),
+            ],
+        )
+    )
+
+    assert errors == {
+        0: "duplicate id",
+        1: "comment replied to could not be created",
+        2: "comment replied to could not be created",
+    }
+    comments = asyncio.run(comment_usecase.find_by_topic(topic["_id"], 0, 10))
+    assert [comment["content"] for comment in comments.items] == ["4"]
+    stats = asyncio.run(topic_usecase.get(topic["_id"]))
+    assert stats["comment_count"] == 1
+    assert stats["last_comment_at"] == comments.items[0]["created"]
+
+
+def test_comment_changes_are_published(
+    topic_usecase: TopicUsecase, comment_usecase: CommentUsecase
+) -> None:
+    """Test every comment written is sent to the topic subscribers."""
+    topic = asyncio.run(
+        topic_usecase.create(
+            Topic(title="Hey!", content="Help me?", username="Bob")
+        )
+    )
+    topic_id = topic["_id"]
+
+    async def run() -> List[Tuple[str, Optional[str]]]:
+        subscription = await comment_usecase.subscribe(topic_id)
+        comment = await comment_usecase.create(
+            topic_id, Comment(content="Sure!", username="Alice")
+        )
+        await comment_usecase.create_many(
+            topic_id,
+            [
+                Comment(content="Bulk", username="Alice"),
+                Comment(content="Nope", username="Alice", reply="missing"),
+            ],
+        )
+        await comment_usecase.update(
+            topic_id, comment["_id"], UpdateComment(content="Edited")
+        )
+        await comment_usecase.delete(topic_id, comment["_id"])
+        received = []
+        while len(subscription):
+            event = await subscription.next()
+            received.append((event.kind, event.comment.get("content")))
+        return received
+
+    assert asyncio.run(run()) == [
+        ("created", "Sure!"),
+        ("created", "Bulk"),
+        ("updated", "Edited"),
+        ("deleted", None),
+    ]
+    with pytest.raises(TopicNotFound):
+        asyncio.run(comment_usecase.subscribe("missing"))
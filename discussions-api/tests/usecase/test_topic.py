@@ -0,0 +1,206 @@
+"""Topic usecase module test."""
+
+import asyncio
+
+import pytest
+
+from app.api import deps
+from app.domain.search import SearchFilters, SearchTooDeep
+from app.domain.topic import Topic, UpdateTopic
+from app.repository.cache import Cache, MemoryCacheBackend
+from app.repository.counters import backfill_comment_stats
+from app.repository.indexes import ensure_indexes
+from app.usecase.topic import TopicCanNotBeChanged, TopicUsecase
+from testing.mongo import FakeDatabase
+
+
+def test_create_topic_single_round_trip(
+    fake_db: FakeDatabase, topic_usecase: TopicUsecase
+) -> None:
+    """Test creating a topic does not read it back."""
+    topic = Topic(title="Hey!", content="Can you help me?", username="Bob")
+
+    created = asyncio.run(topic_usecase.create(topic))
+
+    assert fake_db.client.calls == ["discussions.insert_one"]
+    assert created == fake_db["discussions"].docs[created["_id"]]
+
+
+def test_update_topic_returns_updated_document(
+    fake_db: FakeDatabase, topic_usecase: TopicUsecase
+) -> None:
+    """Test updating a topic gets it back with the update itself."""
+    topic = Topic(title="Hey!", content="Can you help me?", username="Bob")
+    created = asyncio.run(topic_usecase.create(topic))
+    fake_db.client.calls.clear()
+
+    updated = asyncio.run(
+        topic_usecase.update(created["_id"], UpdateTopic(title="Hello!"))
+    )
+
+    assert updated["title"] == "Hello!"
+    assert updated["content"] == "Can you help me?"
+    assert fake_db.client.calls[-1] == "discussions.find_one_and_update"
+    assert "discussions.find_one" not in fake_db.client.calls
+
+
+def test_update_missing_topic(topic_usecase: TopicUsecase) -> None:
+    """Test updating a missing topic returns nothing."""
+    updated = asyncio.run(
+        topic_usecase.update("missing", UpdateTopic(title="Hello!"))
+    )
+
+    assert updated is None
+
+
+def test_topic_with_comments_can_not_be_deleted(
+    fake_db: FakeDatabase, topic_usecase: TopicUsecase
+) -> None:
+    """Test the comment counter blocks deleting a topic."""
+    topic = Topic(title="Hey!", content="Can you help me?", username="Bob")
+    created = asyncio.run(topic_usecase.create(topic))
+    fake_db["discussions"].docs[created["_id"]]["comment_count"] = 2
+    fake_db.client.calls.clear()
+
+    with pytest.raises(TopicCanNotBeChanged) as err:
+        asyncio.run(topic_usecase.delete(created["_id"]))
+
+    assert err.value.comments_count == 2
+    assert "discussions.find" not in fake_db.client.calls
+    assert asyncio.run(topic_usecase.delete("missing")) is False
+
+
+def test_repair_comment_stats(
+    fake_db: FakeDatabase, topic_usecase: TopicUsecase
+) -> None:
+    """Test the repair job recomputes counters from the comments."""
+    topic = Topic(title="Hey!", content="Can you help me?", username="Bob")
+    created = asyncio.run(topic_usecase.create(topic))
+    docs = fake_db["discussions"].docs
+    docs[created["_id"]]["comment_count"] = 5
+    for i in range(2):
+        docs[f"c{i}"] = {
+            "_id": f"c{i}",
+            "topic": created["_id"],
+            "type": "comment",
+            "created": f"2021-08-08T18:0{i}:00",
+        }
+
+    fixed = asyncio.run(topic_usecase.repair_comment_stats())
+
+    assert fixed == 1
+    assert docs[created["_id"]]["comment_count"] == 2
+    assert docs[created["_id"]]["last_comment_at"] == "2021-08-08T18:01:00"
+
+
+def test_topics_without_counter_are_backfilled(
+    fake_db: FakeDatabase, topic_usecase: TopicUsecase
+) -> None:
+    """Test topics from before the counters are not changed unchecked."""
+    docs = fake_db["discussions"].docs
+    for topic_id in ("t1", "t2"):
+        topic = Topic(title="Hey!", content="Can you help me?", username="Bob")
+        docs[topic_id] = {**topic.dict(), "_id": topic_id, "type": "topic"}
+        del docs[topic_id]["comment_count"]
+    docs["c1"] = {
+        "_id": "c1",
+        "topic": "t1",
+        "type": "comment",
+        "created": "2021-08-08T18:00:00",
+    }
+
+    assert asyncio.run(topic_usecase.delete("t1")) is False
+    assert "t1" in docs
+
+    (topic_repo, comment_repo), _ = deps.mongo_layouts(fake_db)
+    filled = asyncio.run(backfill_comment_stats(topic_repo, comment_repo, 1))
+
+    assert filled == 2
+    assert docs["t1"]["comment_count"] == 1
+    assert docs["t1"]["last_comment_at"] == "2021-08-08T18:00:00"
+    assert docs["t2"]["comment_count"] == 0
+    with pytest.raises(TopicCanNotBeChanged):
+        asyncio.run(topic_usecase.update("t1", UpdateTopic(title="Hello!")))
+    assert asyncio.run(topic_usecase.delete("t2")) is True
+    filled = asyncio.run(backfill_comment_stats(topic_repo, comment_repo, 1))
+    assert filled == 0
+
+
+def test_find_topics_with_fields(
+    fake_db: FakeDatabase, topic_usecase: TopicUsecase
+) -> None:
+    """Test only the selected fields are read from the database."""
+    topic = Topic(title="Hey!", content="Can you help me?", username="Bob")
+    created = asyncio.run(topic_usecase.create(topic))
+
+    page = asyncio.run(topic_usecase.find(0, 10, fields="title"))
+    fetched = asyncio.run(topic_usecase.get(created["_id"], "summary"))
+
+    assert page.items == [
+        {
+            "_id": created["_id"],
+            "created": created["created"],
+            "updated": None,
+            "title": "Hey!",
+        }
+    ]
+    assert "content" not in fetched
+    assert fetched["comment_count"] == 0
+
+
+def test_search_pages_from_cached_ranking(fake_db: FakeDatabase) -> None:
+    """Test later search pages fetch ranked topics by id only."""
+    asyncio.run(ensure_indexes(fake_db, deps.mongo_repositories(fake_db)))
+    cache = Cache(MemoryCacheBackend(max_size=100), ttl=60)
+    topic_usecase, _ = deps.build_usecases(fake_db, cache)
+    for i in range(5):
+        topic = Topic(
+            title="life " * (i + 1),
+            content="What's the meaning of life?",
+            username="Bob" if i % 2 else "Alice",
+        )
+        asyncio.run(topic_usecase.create(topic))
+    fake_db.client.calls.clear()
+
+    first = asyncio.run(topic_usecase.search("Life", 0, 2))
+    second = asyncio.run(
+        topic_usecase.search("life ", 0, 2, after=first.next_cursor)
+    )
+    filtered = asyncio.run(
+        topic_usecase.search(
+            "life", 0, 10, filters=SearchFilters(username="Bob")
+        )
+    )
+
+    assert [len(doc["title"]) for doc in first.items + second.items] == [
+        25,
+        20,
+        15,
+        10,
+    ]
+    assert first.items[0]["highlights"]["title"][0].startswith("<em>life")
+    assert fake_db.client.calls[:4] == [
+        "discussions.aggregate",
+        "discussions.find",
+        "discussions.find",
+        "discussions.aggregate",
+    ]
+    assert {doc["username"] for doc in filtered.items} == {"Bob"}
+    assert len(filtered.items) == 2
+
+
+def test_search_window_is_bounded(fake_db: FakeDatabase) -> None:
+    """Test pages past the largest window are refused, not ranked."""
+    asyncio.run(ensure_indexes(fake_db, deps.mongo_repositories(fake_db)))
+    topic_usecase, _ = deps.build_usecases(fake_db)
+    for i in range(12):
+        topic = Topic(title="life", content="Why?", username="Bob")
+        asyncio.run(topic_usecase.create(topic))
+    fake_db.client.calls.clear()
+
+    page = asyncio.run(topic_usecase.search("life", 5, 2, window=1))
+    assert len(page.items) == 2
+    with pytest.raises(SearchTooDeep):
+        asyncio.run(topic_usecase.search("life", 20, 2, window=1))
+    # Windows of 1, 2, 4 and 8 then 1, 2, 4, 8 and 10 results
+    assert fake_db.client.calls.count("discussions.aggregate") == 9